@@ -39,6 +39,10 @@ ALLOWED_HOSTS = [
 # This is the URL that Claude Code CLI running on Magpie VMs will use to call back to LFG
 LFG_API_BASE_URL = os.environ.get('LFG_API_BASE_URL', 'https://www.turboship.ai')
 
+# Ticket CLI runs post their stream-json logs from the VM to /api/v1/cli/stream/batch/
+# in short batches (factory.cli_log_shipper) instead of the server writing them
+CLI_LOG_SHIPPING = os.environ.get('CLI_LOG_SHIPPING', 'True').lower() == 'true'
+
 CSRF_COOKIE_SECURE = False
 
 # HTTPS/SSL Settings for production
@@ -237,6 +241,7 @@ AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
 AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', 'us-east-1')
 AWS_S3_PROJECT_PREFIX = os.environ.get('AWS_S3_PROJECT_PREFIX', 'projects')
 AWS_S3_PRESIGNED_URL_EXPIRY = int(os.environ.get('AWS_S3_PRESIGNED_URL_EXPIRY') or 3600)  # Default 1 hour
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL') or None  # Local S3 stand-in (moto server, MinIO)
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -413,6 +418,19 @@ Q_CLUSTER = {
 ASYNC_EXECUTOR = {
     'max_concurrent_projects': int(os.getenv('EXECUTOR_MAX_CONCURRENT', 200)),
     'lock_ttl': int(os.getenv('EXECUTOR_LOCK_TTL', 7200)),  # 2 hours default
+    'metrics_port': int(os.getenv('EXECUTOR_METRICS_PORT') or 0) or None,  # Prometheus /metrics listener
+}
+
+# Bearer token for scraping /api/tasks/metrics/ without a staff session
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN', '')
+
+# Warm workspace pool for ticket execution (see tasks/workspace_pool.py)
+# Keeps pre-cloned, dependency-installed Mags workspaces per (project, stack)
+WORKSPACE_POOL = {
+    'enabled': os.getenv('WORKSPACE_POOL_ENABLED', 'False').lower() == 'true',
+    'target_size': int(os.getenv('WORKSPACE_POOL_TARGET_SIZE', 1)),
+    'max_size': int(os.getenv('WORKSPACE_POOL_MAX_SIZE', 3)),
+    'idle_ttl': int(os.getenv('WORKSPACE_POOL_IDLE_TTL', 1800)),  # 30 minutes
 }
 
 # Cache Configuration
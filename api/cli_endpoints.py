@@ -3,24 +3,27 @@ CLI API Endpoints
 
 These endpoints allow Claude Code CLI running on a VM to communicate
 with the LFG platform in real-time:
-- Stream logs as they happen
+- Stream logs as they happen (single entries or NDJSON batches)
 - Create/update tasks
 - Update ticket status
 
 Authentication is via a per-user CLI API key passed in the X-CLI-API-Key header.
 """
 
+import hashlib
 import json
 import logging
 from functools import wraps
 
+from django.db import IntegrityError, connection, transaction
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
 from accounts.models import Profile
+from factory.claude_stream import EVENT_TEXT, EVENT_TOOL_RESULT, EVENT_TOOL_USE, ClaudeStreamParser
 from projects.models import ProjectTicket, TicketLog, ProjectTodoList
-from projects.websocket_utils import async_send_ticket_log_notification
+from projects.websocket_utils import async_send_ticket_log_notification, async_send_ticket_logs_notification
 from tasks.task_definitions import broadcast_ticket_notification, broadcast_ticket_status_change
 
 logger = logging.getLogger(__name__)
@@ -72,64 +75,49 @@ def validate_ticket_access(request, ticket_id):
     return ticket, None
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-@cli_api_key_required
-def cli_stream_log(request):
-    """
-    Stream a log entry from Claude CLI to the LFG platform.
+# Batched ingestion limits
+STREAM_BATCH_SIZE = 500          # rows per bulk_create / WebSocket fan-out
+STREAM_MAX_JSON_ENTRIES = 5000   # entries accepted in a single JSON array body
+CLIENT_KEY_MAX_LENGTH = 64
 
-    POST /api/v1/cli/stream/
-    Header: X-CLI-API-Key: <key>
-    Body: {
-        "ticket_id": 123,
-        "type": "assistant" | "tool_use" | "tool_result" | "raw",
-        "data": {
-            // For assistant: {"content": "..."}
-            // For tool_use: {"name": "Bash", "input": {...}}
-            // For tool_result: {"content": "...", "is_error": false}
-            // For raw: {"content": "..."}
-        }
-    }
-    """
-    try:
-        body = json.loads(request.body)
-    except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
-    ticket_id = body.get('ticket_id')
-    log_type = body.get('type')
-    data = body.get('data', {})
-    logger.info(
-        "[CLI API] /stream received user=%s ticket_id=%s type=%s",
-        getattr(getattr(request, 'cli_user', None), 'id', None),
-        ticket_id,
-        log_type,
-    )
+def _normalize_client_key(key):
+    """Idempotency keys longer than the column are stored as their sha256."""
+    if key is None or key == '':
+        return None
+    key = str(key)
+    if len(key) > CLIENT_KEY_MAX_LENGTH:
+        key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return key
 
-    if not ticket_id:
-        return JsonResponse({'error': 'ticket_id required'}, status=400)
 
-    ticket, error = validate_ticket_access(request, ticket_id)
-    if error:
-        return error
+def build_cli_ticket_log(ticket_id, log_type, data, client_key=None):
+    """
+    Build an unsaved TicketLog for a CLI stream entry.
 
-    # Create log entry based on type
-    log_entry = None
+    Returns None for entries that are not worth logging (empty content,
+    small tool results, unknown types).
+    """
+    if not isinstance(data, dict):
+        data = {}
 
     if log_type == 'assistant':
         content = data.get('content', '')
-        if content:
-            log_entry = TicketLog.objects.create(
-                ticket_id=ticket_id,
-                log_type='ai_response',
-                command='Claude Code',
-                output=content[:10000]
-            )
+        if not content:
+            return None
+        return TicketLog(
+            ticket_id=ticket_id,
+            log_type='ai_response',
+            command='Claude Code',
+            output=content[:10000],
+            client_key=client_key,
+        )
 
-    elif log_type == 'tool_use':
+    if log_type == 'tool_use':
         tool_name = data.get('name', 'unknown')
         tool_input = data.get('input', {})
+        if not isinstance(tool_input, dict):
+            tool_input = {'value': tool_input}
 
         # Format based on tool type
         if tool_name == 'Bash':
@@ -165,50 +153,126 @@ def cli_stream_log(request):
             explanation = f"Using tool: {tool_name}"
             output_text = json.dumps(tool_input, indent=2)
 
-        log_entry = TicketLog.objects.create(
+        return TicketLog(
             ticket_id=ticket_id,
             log_type='command',
             command=tool_name,
             explanation=explanation[:500],
-            output=output_text[:5000]
+            output=output_text[:5000],
+            client_key=client_key,
         )
 
-    elif log_type == 'tool_result':
+    if log_type == 'tool_result':
         content = data.get('content', '')
         is_error = data.get('is_error', False)
 
         # Only log significant results or errors
         if is_error or len(str(content)) > 100:
-            log_entry = TicketLog.objects.create(
+            return TicketLog(
                 ticket_id=ticket_id,
                 log_type='command',
                 command='Result' + (' (Error)' if is_error else ''),
                 explanation='Tool execution result',
-                output=str(content)[:10000]
+                output=str(content)[:10000],
+                client_key=client_key,
             )
+        return None
 
-    elif log_type == 'raw':
+    if log_type == 'raw':
         content = data.get('content', '')
         if content:
-            log_entry = TicketLog.objects.create(
+            return TicketLog(
                 ticket_id=ticket_id,
                 log_type='command',
                 command='Output',
-                output=content[:10000]
+                output=content[:10000],
+                client_key=client_key,
             )
 
+    return None
+
+
+def _log_broadcast_payload(log_entry):
+    return {
+        'id': log_entry.id,
+        'log_type': log_entry.log_type,
+        'command': log_entry.command,
+        'explanation': getattr(log_entry, 'explanation', ''),
+        'output': log_entry.output or '',
+        'created_at': log_entry.created_at.isoformat()
+    }
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@cli_api_key_required
+def cli_stream_log(request):
+    """
+    Stream a log entry from Claude CLI to the LFG platform.
+
+    For anything more than an occasional entry use cli_stream_log_batch.
+
+    POST /api/v1/cli/stream/
+    Header: X-CLI-API-Key: <key>
+    Body: {
+        "ticket_id": 123,
+        "type": "assistant" | "tool_use" | "tool_result" | "raw",
+        "data": {
+            // For assistant: {"content": "..."}
+            // For tool_use: {"name": "Bash", "input": {...}}
+            // For tool_result: {"content": "...", "is_error": false}
+            // For raw: {"content": "..."}
+        },
+        "key": "optional-idempotency-key"
+    }
+    """
+    try:
+        body = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    ticket_id = body.get('ticket_id')
+    log_type = body.get('type')
+    data = body.get('data', {})
+    client_key = _normalize_client_key(body.get('key'))
+    logger.info(
+        "[CLI API] /stream received user=%s ticket_id=%s type=%s",
+        getattr(getattr(request, 'cli_user', None), 'id', None),
+        ticket_id,
+        log_type,
+    )
+
+    if not ticket_id:
+        return JsonResponse({'error': 'ticket_id required'}, status=400)
+
+    ticket, error = validate_ticket_access(request, ticket_id)
+    if error:
+        return error
+
+    if client_key:
+        existing_id = TicketLog.objects.filter(
+            ticket_id=ticket_id, client_key=client_key
+        ).values_list('id', flat=True).first()
+        if existing_id:
+            return JsonResponse({'status': 'ok', 'log_id': existing_id, 'duplicate': True})
+
+    # Create log entry based on type
+    log_entry = build_cli_ticket_log(ticket_id, log_type, data, client_key=client_key)
+    if log_entry:
+        try:
+            log_entry.save()
+        except IntegrityError:
+            # Concurrent retry with the same key won the race
+            existing_id = TicketLog.objects.filter(
+                ticket_id=ticket_id, client_key=client_key
+            ).values_list('id', flat=True).first()
+            return JsonResponse({'status': 'ok', 'log_id': existing_id, 'duplicate': True})
+
     # Broadcast via WebSocket
     if log_entry:
         try:
             from asgiref.sync import async_to_sync
-            async_to_sync(async_send_ticket_log_notification)(ticket_id, {
-                'id': log_entry.id,
-                'log_type': log_entry.log_type,
-                'command': log_entry.command,
-                'explanation': getattr(log_entry, 'explanation', ''),
-                'output': log_entry.output[:2000],
-                'created_at': log_entry.created_at.isoformat()
-            })
+            async_to_sync(async_send_ticket_log_notification)(ticket_id, _log_broadcast_payload(log_entry))
         except Exception as e:
             logger.warning(f"[CLI API] Failed to broadcast log: {e}")
 
@@ -218,6 +282,259 @@ def cli_stream_log(request):
     })
 
 
+def _bulk_insert_logs(ticket_id, logs):
+    """
+    bulk_create logs for one ticket, skipping idempotency keys that already
+    exist. Returns (created_logs, duplicate_count).
+    """
+    keys = [log.client_key for log in logs if log.client_key]
+    duplicates = 0
+
+    for attempt in range(2):
+        if keys:
+            existing = set(TicketLog.objects.filter(
+                ticket_id=ticket_id, client_key__in=keys
+            ).values_list('client_key', flat=True))
+            if existing:
+                kept = [log for log in logs if log.client_key not in existing]
+                duplicates += len(logs) - len(kept)
+                logs = kept
+        if not logs:
+            return [], duplicates
+
+        try:
+            with transaction.atomic():
+                if connection.features.can_return_rows_from_bulk_insert:
+                    return TicketLog.objects.bulk_create(logs), duplicates
+                for log in logs:
+                    log.save()
+                return logs, duplicates
+        except IntegrityError:
+            # A concurrent retry inserted some of the same keys; re-filter once
+            if attempt:
+                raise
+            for log in logs:
+                log.pk = None
+                log._state.adding = True
+            logger.info(f"[CLI API] Idempotency key conflict on ticket {ticket_id}, re-filtering batch")
+
+    return [], duplicates
+
+
+def _stream_entry_items(entry, parser):
+    """
+    Return (type, data, key) items for one batch entry.
+
+    A ``stream_json`` entry carries one raw Claude CLI stream-json message,
+    as posted by the workspace log shipper (factory.cli_log_shipper). It
+    expands to one item per text/tool block, keyed ``<key>:<block index>``.
+    """
+    if entry.get('type') != 'stream_json':
+        return [(entry.get('type'), entry.get('data', {}), entry.get('key'))]
+
+    message = entry.get('data')
+    if not isinstance(message, dict):
+        return []
+    key = entry.get('key')
+
+    items = []
+    for index, event in enumerate(parser.feed(json.dumps(message) + '\n')):
+        if event.kind == EVENT_TEXT:
+            log_type, data = 'assistant', {'content': event.text}
+        elif event.kind == EVENT_TOOL_USE:
+            log_type, data = 'tool_use', {'name': event.name, 'input': event.input}
+        elif event.kind == EVENT_TOOL_RESULT:
+            log_type, data = 'tool_result', {'content': event.text, 'is_error': event.is_error}
+        else:
+            continue
+        items.append((log_type, data, f"{key}:{index}" if key else None))
+    return items
+
+
+def _ingest_stream_batch(request, entries, default_ticket_id, access_cache, stats):
+    """
+    Validate, persist and broadcast one batch of CLI stream entries.
+
+    Ticket access is checked once per ticket (cached across batches of the
+    same request); rows are written with one bulk_create and announced with
+    one WebSocket message per ticket.
+    """
+    from asgiref.sync import async_to_sync
+
+    per_ticket = {}
+    seen_keys = set()
+    parser = ClaudeStreamParser(max_messages=0)
+
+    for entry in entries:
+        stats['received'] += 1
+        if not isinstance(entry, dict):
+            stats['errors'].append({'index': stats['received'] - 1, 'error': 'Entry must be an object'})
+            continue
+
+        ticket_id = entry.get('ticket_id') or default_ticket_id
+        if not ticket_id:
+            stats['errors'].append({'index': stats['received'] - 1, 'error': 'ticket_id required'})
+            continue
+
+        cache_key = str(ticket_id)
+        if cache_key not in access_cache:
+            ticket, error = validate_ticket_access(request, ticket_id)
+            if error:
+                try:
+                    message = json.loads(error.content).get('error')
+                except (ValueError, AttributeError):
+                    message = 'Access denied'
+                access_cache[cache_key] = (None, error.status_code, message)
+            else:
+                access_cache[cache_key] = (ticket, 200, None)
+
+        ticket, status_code, message = access_cache[cache_key]
+        if ticket is None:
+            stats['errors'].append({
+                'index': stats['received'] - 1,
+                'ticket_id': ticket_id,
+                'error': message,
+                'status': status_code,
+            })
+            continue
+
+        built = duplicate = False
+        for log_type, data, key in _stream_entry_items(entry, parser):
+            client_key = _normalize_client_key(key)
+            if client_key:
+                if (ticket.id, client_key) in seen_keys:
+                    duplicate = True
+                    continue
+                seen_keys.add((ticket.id, client_key))
+
+            log_entry = build_cli_ticket_log(ticket.id, log_type, data, client_key=client_key)
+            if log_entry is not None:
+                per_ticket.setdefault(ticket.id, []).append(log_entry)
+                built = True
+
+        if duplicate and not built:
+            stats['duplicates'] += 1
+        elif not built:
+            stats['skipped'] += 1
+
+    for ticket_id, logs in per_ticket.items():
+        created, duplicates = _bulk_insert_logs(ticket_id, logs)
+        stats['duplicates'] += duplicates
+        stats['accepted'] += len(created)
+        stats['log_ids'].extend(log.id for log in created)
+
+        try:
+            async_to_sync(async_send_ticket_logs_notification)(
+                ticket_id, [_log_broadcast_payload(log) for log in created]
+            )
+        except Exception as e:
+            logger.warning(f"[CLI API] Failed to broadcast log batch: {e}")
+
+
+def _iter_ndjson_batches(request, batch_size):
+    """Yield lists of parsed NDJSON entries, reading the body line by line."""
+    batch = []
+    for line_no, raw_line in enumerate(request, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            batch.append(json.loads(line))
+        except (ValueError, UnicodeDecodeError):
+            batch.append({'_invalid_line': line_no})
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@cli_api_key_required
+def cli_stream_log_batch(request):
+    """
+    Ingest many CLI log entries in one request.
+
+    POST /api/v1/cli/stream/batch/
+    Header: X-CLI-API-Key: <key>
+
+    Body (application/json), either:
+        {"ticket_id": 123, "entries": [{"type": "...", "data": {...}, "key": "..."}, ...]}
+        [{"ticket_id": 123, "type": "...", "data": {...}, "key": "..."}, ...]
+
+    Body (application/x-ndjson): one entry object per line, with no cap on
+    the entry count. Lines are parsed incrementally and committed and
+    broadcast every STREAM_BATCH_SIZE lines. The server receives the whole
+    body before the view runs, so a long-lived upload is not ingested
+    while it is still being sent. ``?ticket_id=`` sets a default.
+
+    Entries use the same type/data shape as cli_stream_log, or
+    ``{"type": "stream_json", "data": <raw CLI stream-json message>}`` as
+    sent by the workspace log shipper (factory.cli_log_shipper). ``key`` is
+    an optional idempotency key (unique per ticket): retried entries with a
+    key that was already stored are counted as duplicates, not re-created.
+
+    Returns: {"status": "ok", "accepted": n, "duplicates": n, "skipped": n,
+              "log_ids": [...], "errors": [...]}
+    """
+    content_type = (request.content_type or '').lower()
+    default_ticket_id = request.GET.get('ticket_id')
+    access_cache = {}
+    stats = {
+        'received': 0,
+        'accepted': 0,
+        'duplicates': 0,
+        'skipped': 0,
+        'log_ids': [],
+        'errors': [],
+    }
+
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        for batch in _iter_ndjson_batches(request, STREAM_BATCH_SIZE):
+            entries = []
+            for entry in batch:
+                if isinstance(entry, dict) and '_invalid_line' in entry:
+                    stats['received'] += 1
+                    stats['errors'].append({'line': entry['_invalid_line'], 'error': 'Invalid JSON'})
+                else:
+                    entries.append(entry)
+            _ingest_stream_batch(request, entries, default_ticket_id, access_cache, stats)
+    else:
+        try:
+            body = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+        if isinstance(body, dict):
+            default_ticket_id = body.get('ticket_id') or default_ticket_id
+            entries = body.get('entries', [])
+        else:
+            entries = body
+        if not isinstance(entries, list):
+            return JsonResponse({'error': 'entries must be a list'}, status=400)
+        if len(entries) > STREAM_MAX_JSON_ENTRIES:
+            return JsonResponse({
+                'error': f'Too many entries ({len(entries)} > {STREAM_MAX_JSON_ENTRIES}); use NDJSON for large uploads'
+            }, status=413)
+
+        for i in range(0, len(entries), STREAM_BATCH_SIZE):
+            _ingest_stream_batch(request, entries[i:i + STREAM_BATCH_SIZE], default_ticket_id, access_cache, stats)
+
+    logger.info(
+        "[CLI API] /stream/batch user=%s received=%s accepted=%s duplicates=%s skipped=%s errors=%s",
+        getattr(getattr(request, 'cli_user', None), 'id', None),
+        stats['received'], stats['accepted'], stats['duplicates'], stats['skipped'], len(stats['errors']),
+    )
+
+    # Nothing stored and every entry was rejected for access: surface the HTTP status
+    access_errors = [e for e in stats['errors'] if 'status' in e]
+    if stats['errors'] and not stats['accepted'] and not stats['duplicates'] and len(access_errors) == stats['received']:
+        return JsonResponse({'error': access_errors[0]['error'], **stats}, status=access_errors[0]['status'])
+
+    return JsonResponse({'status': 'ok', **stats})
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 @cli_api_key_required
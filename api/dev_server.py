@@ -12,6 +12,7 @@ from projects.models import ProjectTicket, TicketLog
 from development.models import Sandbox
 from accounts.models import ExternalServicesAPIKeys, GitHubToken
 from projects.websocket_utils import send_workspace_progress, send_ticket_log_notification
+from factory.dev_server_jobs import get_dev_server_job, submit_dev_server_job, wait_until_listening
 
 logger = logging.getLogger(__name__)
 
@@ -348,6 +349,9 @@ def start_dev_server(request, ticket_id):
     1. Get the Sandbox for the project
     2. Kill any existing npm/node processes and remove lock files
     3. Start 'npm run dev' via SSH in the sandbox workspace
+
+    Steps 2-3 run as a background job; the response carries its job_id
+    (poll dev_server_job_status or listen on the workspace progress socket).
     """
     try:
         # Get the ticket
@@ -374,381 +378,392 @@ def start_dev_server(request, ticket_id):
         if err_resp:
             return err_resp
 
-        # Ensure workspace job is running
-        workspace_id = sandbox.mags_workspace_id or sandbox.workspace_id
-        job_id = sandbox.mags_job_id or sandbox.job_id
+        user = request.user
 
-        # Get stack configuration
-        from factory.stack_configs import get_stack_config
-        stack_config = get_stack_config(project.stack, project)
-        project_dir = stack_config['project_dir']
-        workspace_path = f"{MAGS_WORKING_DIR}/{project_dir}"
+        def work(job):
+            return _start_ticket_dev_server(job, ticket, sandbox, user)
 
-        logger.info(f"[DEV_SERVER] Starting dev server for ticket {ticket_id}")
-        logger.info(f"[DEV_SERVER] Project stack: {project.stack}, project_dir: {project_dir}")
-        logger.info(f"[DEV_SERVER] Job ID: {job_id}")
-        logger.info(f"[DEV_SERVER] Workspace path: {workspace_path}")
+        job = submit_dev_server_job(str(project.project_id), 'start', work, scope=f'ticket:{ticket.id}')
 
-        project_id = str(project.project_id)
+        return JsonResponse({
+            'success': True,
+            'status': 'starting',
+            'job_id': job.job_id,
+            'state': job.state,
+            'workspace_id': sandbox.workspace_id,
+            'message': 'Dev server start queued',
+        }, status=202)
 
-        # If this is the ticket's own workspace (code already built by Claude),
-        # skip the heavy code setup. Only run it for non-ticket workspaces.
-        sandbox_ws_id = sandbox.mags_workspace_id or sandbox.workspace_id
-        is_ticket_workspace = (
-            sandbox.workspace_type == 'ticket' and
-            sandbox_ws_id and str(sandbox_ws_id).startswith(f'{ticket.id}-')
+    except ProjectTicket.DoesNotExist:
+        return JsonResponse(
+            {'error': 'Ticket not found'},
+            status=404
+        )
+    except Exception as e:
+        logger.error(f"Error starting dev server: {e}", exc_info=True)
+        return JsonResponse(
+            {'error': str(e)},
+            status=500
         )
 
-        if not is_ticket_workspace:
-            # Step 0: Ensure code exists in workspace and is on correct branch
-            logger.info(f"[DEV_SERVER] Non-ticket workspace, running code setup...")
-            code_success, code_message = _ensure_code_in_workspace(sandbox, project, request.user, ticket=ticket)
-            logger.info(f"[DEV_SERVER] Code setup result: {code_success}, {code_message}")
-
-            if not code_success:
-                send_workspace_progress(project_id, 'error', f'Failed to set up code: {code_message}', error=code_message)
-                return JsonResponse(
-                    {'error': f'Failed to set up code in workspace: {code_message}'},
-                    status=500
-                )
-
-            # Step 0.5: Run bootstrap script to ensure stack tools are installed
-            bootstrap_script = stack_config.get('bootstrap_script', '')
-            if bootstrap_script and project.stack != 'nextjs':
-                send_workspace_progress(project_id, 'installing_tools', f'Checking/installing {stack_config["name"]} tools...')
-                bootstrap_result = run_command(workspace_id, bootstrap_script, timeout=300)
-                if bootstrap_result.get('exit_code', 0) != 0:
-                    logger.warning(f"[DEV_SERVER] Bootstrap warning: {bootstrap_result.get('stderr', '')[:200]}")
-        else:
-            logger.info(f"[DEV_SERVER] Using ticket's own workspace — skipping code setup")
-
-        # Step 1: Kill existing processes and remove lock files
-        send_workspace_progress(project_id, 'clearing_cache', 'Clearing cache and stopping existing processes...')
-
-        # Build stack-specific cleanup command
-        # Use port 8080 — this is the Mags default proxy port. The URL alias
-        # (*.app.lfg.run) routes to 8080 automatically, so running the dev
-        # server on 8080 means the preview works without custom port mapping.
-        MAGS_PROXY_PORT = 8080
-        default_port = project.custom_default_port or MAGS_PROXY_PORT
-        if project.stack == 'nextjs':
-            cleanup_extras = """
-            npm config set cache {MAGS_WORKING_DIR}/.npm-cache
-            killall -9 node 2>/dev/null || true
-            pkill -9 node 2>/dev/null || true
-            rm -rf .next || true
-            rm -f package-lock.json || true
-            """
-        elif project.stack in ('python-django', 'python-fastapi'):
-            cleanup_extras = """
-            pkill -f 'runserver' 2>/dev/null || true
-            pkill -f 'uvicorn' 2>/dev/null || true
-            rm -rf __pycache__ .pytest_cache || true
-            """
-        elif project.stack == 'go':
-            cleanup_extras = """
-            pkill -f 'go run' 2>/dev/null || true
-            """
-        elif project.stack == 'rust':
-            cleanup_extras = """
-            pkill -f 'cargo run' 2>/dev/null || true
-            """
-        elif project.stack == 'ruby-rails':
-            cleanup_extras = """
-            pkill -f 'rails server' 2>/dev/null || true
-            rm -rf tmp/cache || true
-            """
-        else:
-            cleanup_extras = ""
-
-        cleanup_command = textwrap.dedent(f"""
-            cd {workspace_path}
-
-            echo "Stopping existing processes..."
-            {cleanup_extras}
-
-            # Kill anything on the default port
-            fuser -k -9 {default_port}/tcp 2>/dev/null || true
-
-            # Clean up PID file
-            rm -f .devserver_pid || true
-
-            # Wait for port to be fully released
-            sleep 3
 
-            echo "Cleanup completed"
-        """)
+def _start_ticket_dev_server(job, ticket, sandbox, user):
+    """
+    Background body of start_dev_server; returns the job result payload.
 
-        cleanup_result = run_command(workspace_id, cleanup_command, timeout=60)
-        
-        logger.info(f"[CLEANUP] Result: {cleanup_result}")
-        logger.info(f"[CLEANUP] Exit code: {cleanup_result.get('exit_code')}")
-        logger.info(f"[CLEANUP] Stdout: {cleanup_result.get('stdout', '')[:500]}")
-        logger.info(f"[CLEANUP] Stderr: {cleanup_result.get('stderr', '')[:500]}")
+    Moves the job through installing -> starting and only reports success
+    once the dev server accepts connections on its port.
+    """
+    import threading
+    from tasks.task_definitions import execute_ticket_chat_cli
 
-        if cleanup_result.get('exit_code') != 0:
-            logger.warning(f"Cleanup had non-zero exit code {cleanup_result.get('exit_code')}: {cleanup_result.get('stderr', '')}")
+    project = ticket.project
+    ticket_id = ticket.id
 
-        # Step 2: Start the dev server in background
-        send_workspace_progress(project_id, 'starting_server', 'Starting development server...')
+    # Ensure workspace job is running
+    workspace_id = sandbox.mags_workspace_id or sandbox.workspace_id
+    job_id = sandbox.mags_job_id or sandbox.job_id
 
-        # Get the dev command from stack config
-        dev_cmd = stack_config['dev_cmd']
-        # default_port is already set to MAGS_PROXY_PORT (8080) above
-        pre_dev_cmd = stack_config.get('pre_dev_cmd', '')
+    # Get stack configuration
+    from factory.stack_configs import get_stack_config
+    stack_config = get_stack_config(project.stack, project)
+    project_dir = stack_config['project_dir']
+    workspace_path = f"{MAGS_WORKING_DIR}/{project_dir}"
 
-        # Customize dev command for different stacks
-        if project.stack == 'nextjs':
-            final_dev_cmd = f"npm run dev -- --hostname :: --port {default_port}"
-        elif project.stack == 'astro':
-            final_dev_cmd = f"npx astro dev --host 0.0.0.0 --port {default_port}"
-        elif project.stack in ('python-django', 'python-fastapi'):
-            final_dev_cmd = dev_cmd
-        else:
-            final_dev_cmd = f"PORT={default_port} {dev_cmd}" if dev_cmd else f"echo 'No dev command configured'"
+    logger.info(f"[DEV_SERVER] Starting dev server for ticket {ticket_id}")
+    logger.info(f"[DEV_SERVER] Project stack: {project.stack}, project_dir: {project_dir}")
+    logger.info(f"[DEV_SERVER] Job ID: {job_id}")
+    logger.info(f"[DEV_SERVER] Workspace path: {workspace_path}")
 
-        # Build the full dev command including any pre-setup (e.g., export PATH)
-        if pre_dev_cmd:
-            full_dev_cmd = f"{pre_dev_cmd} && {final_dev_cmd}"
-        else:
-            full_dev_cmd = final_dev_cmd
+    project_id = str(project.project_id)
 
-        start_command = textwrap.dedent(f"""
-            cd {workspace_path}
+    # If this is the ticket's own workspace (code already built by Claude),
+    # skip the heavy code setup. Only run it for non-ticket workspaces.
+    sandbox_ws_id = sandbox.mags_workspace_id or sandbox.workspace_id
+    is_ticket_workspace = (
+        sandbox.workspace_type == 'ticket' and
+        sandbox_ws_id and str(sandbox_ws_id).startswith(f'{ticket.id}-')
+    )
 
-            # Start dev server in background
-            : > {workspace_path}/dev.log
-            nohup sh -c '{full_dev_cmd}' > {workspace_path}/dev.log 2>&1 &
-            pid=$!
-            echo "$pid" > .devserver_pid
-            echo "PID:$pid"
+    if not is_ticket_workspace:
+        # Step 0: Ensure code exists in workspace and is on correct branch
+        logger.info(f"[DEV_SERVER] Non-ticket workspace, running code setup...")
+        job.transition('installing')
+        code_success, code_message = _ensure_code_in_workspace(sandbox, project, user, ticket=ticket)
+        logger.info(f"[DEV_SERVER] Code setup result: {code_success}, {code_message}")
+
+        if not code_success:
+            return {'success': False, 'error': f'Failed to set up code in workspace: {code_message}'}
+
+        # Step 0.5: Run bootstrap script to ensure stack tools are installed
+        bootstrap_script = stack_config.get('bootstrap_script', '')
+        if bootstrap_script and project.stack != 'nextjs':
+            job.progress('installing_tools', f'Checking/installing {stack_config["name"]} tools...')
+            bootstrap_result = run_command(workspace_id, bootstrap_script, timeout=300, cancel_token=job.cancel_token)
+            if bootstrap_result.get('exit_code', 0) != 0:
+                logger.warning(f"[DEV_SERVER] Bootstrap warning: {bootstrap_result.get('stderr', '')[:200]}")
+    else:
+        logger.info(f"[DEV_SERVER] Using ticket's own workspace — skipping code setup")
+
+    # Step 1: Kill existing processes and remove lock files
+    job.transition('starting', 'clearing_cache', 'Clearing cache and stopping existing processes...')
+
+    # Build stack-specific cleanup command
+    # Use port 8080 — this is the Mags default proxy port. The URL alias
+    # (*.app.lfg.run) routes to 8080 automatically, so running the dev
+    # server on 8080 means the preview works without custom port mapping.
+    MAGS_PROXY_PORT = 8080
+    default_port = project.custom_default_port or MAGS_PROXY_PORT
+    if project.stack == 'nextjs':
+        cleanup_extras = """
+        npm config set cache {MAGS_WORKING_DIR}/.npm-cache
+        killall -9 node 2>/dev/null || true
+        pkill -9 node 2>/dev/null || true
+        rm -rf .next || true
+        rm -f package-lock.json || true
+        """
+    elif project.stack in ('python-django', 'python-fastapi'):
+        cleanup_extras = """
+        pkill -f 'runserver' 2>/dev/null || true
+        pkill -f 'uvicorn' 2>/dev/null || true
+        rm -rf __pycache__ .pytest_cache || true
+        """
+    elif project.stack == 'go':
+        cleanup_extras = """
+        pkill -f 'go run' 2>/dev/null || true
+        """
+    elif project.stack == 'rust':
+        cleanup_extras = """
+        pkill -f 'cargo run' 2>/dev/null || true
+        """
+    elif project.stack == 'ruby-rails':
+        cleanup_extras = """
+        pkill -f 'rails server' 2>/dev/null || true
+        rm -rf tmp/cache || true
+        """
+    else:
+        cleanup_extras = ""
+
+    cleanup_command = textwrap.dedent(f"""
+        cd {workspace_path}
+
+        echo "Stopping existing processes..."
+        {cleanup_extras}
+
+        # Kill anything on the default port
+        fuser -k -9 {default_port}/tcp 2>/dev/null || true
+
+        # Clean up PID file
+        rm -f .devserver_pid || true
+
+        # Wait (up to 3s) for the port to be fully released
+        for i in 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15; do
+            fuser {default_port}/tcp >/dev/null 2>&1 || break
+            sleep 0.2
+        done
+
+        echo "Cleanup completed"
+    """)
+
+    cleanup_result = run_command(workspace_id, cleanup_command, timeout=60, cancel_token=job.cancel_token)
+    
+    logger.info(f"[CLEANUP] Result: {cleanup_result}")
+    logger.info(f"[CLEANUP] Exit code: {cleanup_result.get('exit_code')}")
+    logger.info(f"[CLEANUP] Stdout: {cleanup_result.get('stdout', '')[:500]}")
+    logger.info(f"[CLEANUP] Stderr: {cleanup_result.get('stderr', '')[:500]}")
+
+    if cleanup_result.get('exit_code') != 0:
+        logger.warning(f"Cleanup had non-zero exit code {cleanup_result.get('exit_code')}: {cleanup_result.get('stderr', '')}")
+
+    # Step 2: Start the dev server in background
+    job.progress('starting_server', 'Starting development server...')
+
+    # Get the dev command from stack config
+    dev_cmd = stack_config['dev_cmd']
+    # default_port is already set to MAGS_PROXY_PORT (8080) above
+    pre_dev_cmd = stack_config.get('pre_dev_cmd', '')
+
+    # Customize dev command for different stacks
+    if project.stack == 'nextjs':
+        final_dev_cmd = f"npm run dev -- --hostname :: --port {default_port}"
+    elif project.stack == 'astro':
+        final_dev_cmd = f"npx astro dev --host 0.0.0.0 --port {default_port}"
+    elif project.stack in ('python-django', 'python-fastapi'):
+        final_dev_cmd = dev_cmd
+    else:
+        final_dev_cmd = f"PORT={default_port} {dev_cmd}" if dev_cmd else f"echo 'No dev command configured'"
 
-            # Wait for server to start (Go/Rust need time to compile)
-            sleep 10
+    # Build the full dev command including any pre-setup (e.g., export PATH)
+    if pre_dev_cmd:
+        full_dev_cmd = f"{pre_dev_cmd} && {final_dev_cmd}"
+    else:
+        full_dev_cmd = final_dev_cmd
+
+    start_command = textwrap.dedent(f"""
+        cd {workspace_path}
+
+        # Start dev server in background
+        : > {workspace_path}/dev.log
+        nohup sh -c '{full_dev_cmd}' > {workspace_path}/dev.log 2>&1 &
+        pid=$!
+        echo "$pid" > .devserver_pid
+        echo "PID:$pid"
+    """)
+
+    start_result = run_command(workspace_id, start_command, timeout=60, cancel_token=job.cancel_token)
+
+    logger.info(f"[START] Result: {start_result}")
+    logger.info(f"[START] Exit code: {start_result.get('exit_code')}")
+    logger.info(f"[START] Stdout: {start_result.get('stdout', '')}")
+    logger.info(f"[START] Stderr: {start_result.get('stderr', '')}")
+
+    # Wait for the server to accept connections (Go/Rust need time to compile);
+    # an exited process fails fast with the tail of dev.log
+    ready, dev_log_error = False, ''
+    if start_result.get('exit_code') == 0:
+        ready, dev_log_error = wait_until_listening(
+            lambda command, timeout: run_command(workspace_id, command, timeout=timeout),
+            workspace_path,
+            default_port,
+            cancel_token=job.cancel_token,
+        )
 
-            # Check if process is still running
-            if kill -0 "$pid" 2>/dev/null; then
-                echo "Dev server started successfully with PID $pid"
-            else
-                echo "ERROR: Dev server failed to start"
-                echo "=== Last 50 lines of dev.log ==="
-                tail -50 {workspace_path}/dev.log 2>/dev/null || echo "(no log available)"
-                echo "=== End of dev.log ==="
-                exit 1
-            fi
-        """)
-
-        start_result = run_command(workspace_id, start_command, timeout=120)
-
-        logger.info(f"[START] Result: {start_result}")
-        logger.info(f"[START] Exit code: {start_result.get('exit_code')}")
-        logger.info(f"[START] Stdout: {start_result.get('stdout', '')}")
-        logger.info(f"[START] Stderr: {start_result.get('stderr', '')}")
-
-        if start_result.get('exit_code') != 0:
-            stdout = start_result.get('stdout', '')
-            stderr = start_result.get('stderr', '')
-            error_msg = stderr or stdout or 'Unknown error - command exited with non-zero status'
-            logger.error(f"Failed to start dev server (exit {start_result.get('exit_code')}): stdout={stdout}, stderr={stderr}")
-
-            # Extract just the error from dev.log output (between the === markers)
-            dev_log_error = ''
-            if '=== Last' in stdout and '=== End' in stdout:
-                dev_log_error = stdout.split('=== Last')[1].split('===')[1].strip('= \n')
-                if dev_log_error.startswith('of dev.log'):
-                    dev_log_error = dev_log_error[len('of dev.log'):].strip('= \n')
-
-            # Pipe the error to the ticket's chat agent so Claude can fix it
-            fix_message = (
-                f"The dev server failed to start with the following error:\n\n"
-                f"```\n{dev_log_error or error_msg[:500]}\n```\n\n"
-                f"Please fix this error so the dev server can run successfully. "
-                f"The dev command is: `{full_dev_cmd}`"
+    if not ready:
+        stdout = start_result.get('stdout', '')
+        stderr = start_result.get('stderr', '')
+        error_msg = dev_log_error or stderr or stdout or 'Unknown error - command exited with non-zero status'
+        logger.error(f"Failed to start dev server (exit {start_result.get('exit_code')}): stdout={stdout}, stderr={stderr}, log={dev_log_error[-500:]}")
+
+        # Pipe the error to the ticket's chat agent so Claude can fix it
+        fix_message = (
+            f"The dev server failed to start with the following error:\n\n"
+            f"```\n{dev_log_error or error_msg[:500]}\n```\n\n"
+            f"Please fix this error so the dev server can run successfully. "
+            f"The dev command is: `{full_dev_cmd}`"
+        )
+        logger.info(f"[DEV_SERVER] Piping server error to ticket chat agent for auto-fix")
+        job.progress('fixing_error', 'Dev server failed — asking Claude to fix it...')
+
+        try:
+            # Create a system message log entry
+            fix_log = TicketLog.objects.create(
+                ticket=ticket,
+                log_type='user_message',
+                command=fix_message,
+                explanation='Auto-fix request from Preview (dev server failed to start)',
             )
-            logger.info(f"[DEV_SERVER] Piping server error to ticket chat agent for auto-fix")
-            send_workspace_progress(project_id, 'fixing_error', 'Dev server failed — asking Claude to fix it...')
-
-            try:
-                # Create a system message log entry
-                fix_log = TicketLog.objects.create(
-                    ticket=ticket,
-                    log_type='user_message',
-                    command=fix_message,
-                    explanation='Auto-fix request from Preview (dev server failed to start)',
+            send_ticket_log_notification(ticket.id, {
+                'id': fix_log.id,
+                'log_type': 'user_message',
+                'command': fix_message,
+                'explanation': fix_log.explanation,
+                'output': '',
+                'exit_code': None,
+                'created_at': fix_log.created_at.isoformat()
+            })
+
+            # Trigger Claude CLI chat in background thread
+            session_id = sandbox.cli_session_id
+
+            def run_auto_fix():
+                try:
+                    execute_ticket_chat_cli(
+                        ticket_id=ticket.id,
+                        project_id=project.id,
+                        conversation_id=ticket.id,
+                        message=fix_message,
+                        session_id=session_id,
+                    )
+                except Exception as e:
+                    logger.error(f"[DEV_SERVER] Auto-fix chat error: {e}", exc_info=True)
+
+            thread = threading.Thread(target=run_auto_fix, daemon=True)
+            thread.start()
+
+        except Exception as e:
+            logger.error(f"[DEV_SERVER] Failed to trigger auto-fix: {e}", exc_info=True)
+
+        return {
+            'success': False,
+            'auto_fix': True,
+            'message': 'Dev server failed to start. Claude is working on a fix...',
+            'error': error_msg[:200],
+        }
+
+    # Extract PID from output
+    stdout = start_result.get('stdout', '')
+    pid = None
+    for line in stdout.split('\n'):
+        if 'PID:' in line:
+            pid = line.split('PID:')[1].strip()
+            break
+
+    logger.info(f"Dev server started successfully with PID: {pid}")
+
+    # Get preview URL via Mags HTTP access + stable alias
+    job.progress('assigning_proxy', 'Getting preview URL...')
+    preview_url = None
+
+    # Step A: Enable HTTP access on the port. Since we run the dev server
+    # on 8080 (the Mags default), the URL alias routes there automatically.
+    # enable_access is still called to ensure the port is open and to
+    # capture the raw proxy URL as a fallback.
+    mags_job_id = sandbox.mags_job_id or sandbox.job_id
+
+    # Attempt 1: use stored mags_job_id (the original request_id)
+    if mags_job_id:
+        try:
+            logger.info(f"[DEV_SERVER] Enabling HTTP access: mags_job_id={mags_job_id}, port={default_port}")
+            raw_url = get_http_proxy_url(mags_job_id, default_port)
+            if raw_url and not raw_url.startswith('http://localhost'):
+                preview_url = raw_url
+                logger.info(f"[DEV_SERVER] enable_access returned URL: {raw_url}")
+        except Exception as e:
+            logger.warning(f"[DEV_SERVER] enable_access failed for job {mags_job_id}: {e}")
+
+    # Attempt 2: resolve a fresh request_id via find_job (handles stale mags_job_id)
+    if not preview_url:
+        try:
+            from factory.mags import _get_mags_client
+            client = _get_mags_client()
+            mags_job = client.find_job(workspace_id)
+            if mags_job:
+                fresh_id = mags_job.get('request_id') or mags_job.get('id')
+                if fresh_id and fresh_id != mags_job_id:
+                    logger.info(f"[DEV_SERVER] Retrying enable_access with fresh request_id={fresh_id}, port={default_port}")
+                    raw_url = get_http_proxy_url(fresh_id, default_port)
+                    if raw_url and not raw_url.startswith('http://localhost'):
+                        preview_url = raw_url
+                    # Save the fresh request_id regardless of URL response
+                    sandbox.mags_job_id = fresh_id
+                    sandbox.save(update_fields=['mags_job_id', 'updated_at'])
+                    logger.info(f"[DEV_SERVER] Updated mags_job_id to {fresh_id}")
+        except Exception as e:
+            logger.warning(f"[DEV_SERVER] Fallback enable_access also failed: {e}")
+
+    # Step B: Create a stable URL alias (uses workspace_id, not request_id).
+    # This maps <subdomain>.app.lfg.run to the workspace's active job.
+    # Always attempt this — it's the primary way to get a working preview URL.
+    alias_url = create_preview_url_alias(workspace_id, project_id)
+    if alias_url:
+        logger.info(f"[DEV_SERVER] Using stable alias URL: {alias_url}")
+        preview_url = alias_url
+
+    if not preview_url:
+        logger.warning(f"[DEV_SERVER] Could not obtain proxy URL, falling back to localhost:{default_port}")
+        preview_url = f'http://localhost:{default_port}'
+
+    # Save proxy_url on the sandbox for future use
+    if preview_url and not preview_url.startswith('http://localhost'):
+        sandbox.proxy_url = preview_url
+        sandbox.save(update_fields=['proxy_url', 'updated_at'])
+
+    # Step C: Ask Claude to whitelist the proxy URL in the project config
+    # (e.g. Vite allowedHosts, Django ALLOWED_HOSTS, etc.)
+    # Run in background so we don't block the response.
+    if preview_url and not preview_url.startswith('http://localhost'):
+        try:
+            from urllib.parse import urlparse
+            proxy_host = urlparse(preview_url).hostname
+            if proxy_host:
+                whitelist_message = (
+                    f"The dev server preview is being served through a proxy at {preview_url} "
+                    f"(hostname: {proxy_host}). "
+                    f"Please ensure this hostname is whitelisted/allowed in the project configuration "
+                    f"so the server accepts requests from it. For example:\n"
+                    f"- Vite/Astro: add `server.allowedHosts` or `vite.server.allowedHosts` in the config\n"
+                    f"- Django: add to ALLOWED_HOSTS\n"
+                    f"- Next.js: usually no change needed\n\n"
+                    f"Check the project config at {workspace_path} and make the necessary change. "
+                    f"Do NOT restart the server — just update the config file."
                 )
-                send_ticket_log_notification(ticket.id, {
-                    'id': fix_log.id,
-                    'log_type': 'user_message',
-                    'command': fix_message,
-                    'explanation': fix_log.explanation,
-                    'output': '',
-                    'exit_code': None,
-                    'created_at': fix_log.created_at.isoformat()
-                })
-
-                # Trigger Claude CLI chat in background thread
-                import threading
-                from tasks.task_definitions import execute_ticket_chat_cli
-
-                session_id = sandbox.cli_session_id
-
-                def run_auto_fix():
+                whitelist_session_id = sandbox.cli_session_id
+
+                def run_whitelist_fix():
                     try:
                         execute_ticket_chat_cli(
                             ticket_id=ticket.id,
                             project_id=project.id,
                             conversation_id=ticket.id,
-                            message=fix_message,
-                            session_id=session_id,
+                            message=whitelist_message,
+                            session_id=whitelist_session_id,
                         )
                     except Exception as e:
-                        logger.error(f"[DEV_SERVER] Auto-fix chat error: {e}", exc_info=True)
+                        logger.warning(f"[DEV_SERVER] Whitelist fix error: {e}")
 
-                thread = threading.Thread(target=run_auto_fix, daemon=True)
+                thread = threading.Thread(target=run_whitelist_fix, daemon=True)
                 thread.start()
+                logger.info(f"[DEV_SERVER] Started whitelist fix thread for host {proxy_host}")
+        except Exception as e:
+            logger.warning(f"[DEV_SERVER] Could not start whitelist fix: {e}")
 
-            except Exception as e:
-                logger.error(f"[DEV_SERVER] Failed to trigger auto-fix: {e}", exc_info=True)
-
-            return JsonResponse({
-                'success': False,
-                'auto_fix': True,
-                'message': 'Dev server failed to start. Claude is working on a fix...',
-                'error': error_msg[:200],
-            }, status=200)
-
-        # Extract PID from output
-        stdout = start_result.get('stdout', '')
-        pid = None
-        for line in stdout.split('\n'):
-            if 'PID:' in line:
-                pid = line.split('PID:')[1].strip()
-                break
-
-        logger.info(f"Dev server started successfully with PID: {pid}")
-
-        # Get preview URL via Mags HTTP access + stable alias
-        send_workspace_progress(project_id, 'assigning_proxy', 'Getting preview URL...')
-        preview_url = None
-
-        # Step A: Enable HTTP access on the port. Since we run the dev server
-        # on 8080 (the Mags default), the URL alias routes there automatically.
-        # enable_access is still called to ensure the port is open and to
-        # capture the raw proxy URL as a fallback.
-        mags_job_id = sandbox.mags_job_id or sandbox.job_id
-
-        # Attempt 1: use stored mags_job_id (the original request_id)
-        if mags_job_id:
-            try:
-                logger.info(f"[DEV_SERVER] Enabling HTTP access: mags_job_id={mags_job_id}, port={default_port}")
-                raw_url = get_http_proxy_url(mags_job_id, default_port)
-                if raw_url and not raw_url.startswith('http://localhost'):
-                    preview_url = raw_url
-                    logger.info(f"[DEV_SERVER] enable_access returned URL: {raw_url}")
-            except Exception as e:
-                logger.warning(f"[DEV_SERVER] enable_access failed for job {mags_job_id}: {e}")
-
-        # Attempt 2: resolve a fresh request_id via find_job (handles stale mags_job_id)
-        if not preview_url:
-            try:
-                from factory.mags import _get_mags_client
-                client = _get_mags_client()
-                job = client.find_job(workspace_id)
-                if job:
-                    fresh_id = job.get('request_id') or job.get('id')
-                    if fresh_id and fresh_id != mags_job_id:
-                        logger.info(f"[DEV_SERVER] Retrying enable_access with fresh request_id={fresh_id}, port={default_port}")
-                        raw_url = get_http_proxy_url(fresh_id, default_port)
-                        if raw_url and not raw_url.startswith('http://localhost'):
-                            preview_url = raw_url
-                        # Save the fresh request_id regardless of URL response
-                        sandbox.mags_job_id = fresh_id
-                        sandbox.save(update_fields=['mags_job_id', 'updated_at'])
-                        logger.info(f"[DEV_SERVER] Updated mags_job_id to {fresh_id}")
-            except Exception as e:
-                logger.warning(f"[DEV_SERVER] Fallback enable_access also failed: {e}")
-
-        # Step B: Create a stable URL alias (uses workspace_id, not request_id).
-        # This maps <subdomain>.app.lfg.run to the workspace's active job.
-        # Always attempt this — it's the primary way to get a working preview URL.
-        alias_url = create_preview_url_alias(workspace_id, project_id)
-        if alias_url:
-            logger.info(f"[DEV_SERVER] Using stable alias URL: {alias_url}")
-            preview_url = alias_url
-
-        if not preview_url:
-            logger.warning(f"[DEV_SERVER] Could not obtain proxy URL, falling back to localhost:{default_port}")
-            preview_url = f'http://localhost:{default_port}'
-
-        # Save proxy_url on the sandbox for future use
-        if preview_url and not preview_url.startswith('http://localhost'):
-            sandbox.proxy_url = preview_url
-            sandbox.save(update_fields=['proxy_url', 'updated_at'])
-
-        # Step C: Ask Claude to whitelist the proxy URL in the project config
-        # (e.g. Vite allowedHosts, Django ALLOWED_HOSTS, etc.)
-        # Run in background so we don't block the response.
-        if preview_url and not preview_url.startswith('http://localhost'):
-            try:
-                from urllib.parse import urlparse
-                proxy_host = urlparse(preview_url).hostname
-                if proxy_host:
-                    import threading
-                    from tasks.task_definitions import execute_ticket_chat_cli
-
-                    whitelist_message = (
-                        f"The dev server preview is being served through a proxy at {preview_url} "
-                        f"(hostname: {proxy_host}). "
-                        f"Please ensure this hostname is whitelisted/allowed in the project configuration "
-                        f"so the server accepts requests from it. For example:\n"
-                        f"- Vite/Astro: add `server.allowedHosts` or `vite.server.allowedHosts` in the config\n"
-                        f"- Django: add to ALLOWED_HOSTS\n"
-                        f"- Next.js: usually no change needed\n\n"
-                        f"Check the project config at {workspace_path} and make the necessary change. "
-                        f"Do NOT restart the server — just update the config file."
-                    )
-                    whitelist_session_id = sandbox.cli_session_id
-
-                    def run_whitelist_fix():
-                        try:
-                            execute_ticket_chat_cli(
-                                ticket_id=ticket.id,
-                                project_id=project.id,
-                                conversation_id=ticket.id,
-                                message=whitelist_message,
-                                session_id=whitelist_session_id,
-                            )
-                        except Exception as e:
-                            logger.warning(f"[DEV_SERVER] Whitelist fix error: {e}")
-
-                    thread = threading.Thread(target=run_whitelist_fix, daemon=True)
-                    thread.start()
-                    logger.info(f"[DEV_SERVER] Started whitelist fix thread for host {proxy_host}")
-            except Exception as e:
-                logger.warning(f"[DEV_SERVER] Could not start whitelist fix: {e}")
-
-        # Send completion notification
-        send_workspace_progress(project_id, 'complete', 'Dev server is ready!', extra_data={'url': preview_url})
-
-        return JsonResponse({
-            'success': True,
-            'message': 'Dev server started successfully',
-            'pid': pid,
-            'workspace_id': sandbox.workspace_id,
-            'url': preview_url
-        })
-
-    except ProjectTicket.DoesNotExist:
-        return JsonResponse(
-            {'error': 'Ticket not found'},
-            status=404
-        )
-    except Exception as e:
-        logger.error(f"Error starting dev server: {e}", exc_info=True)
-        return JsonResponse(
-            {'error': str(e)},
-            status=500
-        )
+    return {
+        'success': True,
+        'message': 'Dev server is ready!',
+        'pid': pid,
+        'workspace_id': sandbox.workspace_id,
+        'url': preview_url
+    }
 
 
 @csrf_exempt
@@ -756,7 +771,7 @@ def start_dev_server(request, ticket_id):
 @require_http_methods(["POST"])
 def stop_dev_server(request, ticket_id):
     """
-    Stop the development server for the ticket's project.
+    Stop the development server for the ticket's project (as a background job).
     """
     try:
         # Get the ticket
@@ -787,47 +802,18 @@ def stop_dev_server(request, ticket_id):
         if sandbox.status != 'ready':
             logger.warning(f"Stopping dev server on workspace with status '{sandbox.status}'")
 
-        # Get stack configuration
-        from factory.stack_configs import get_stack_config
-        stack_config = get_stack_config(project.stack, project)
-        project_dir = stack_config['project_dir']
-        workspace_path = f"{MAGS_WORKING_DIR}/{project_dir}"
-        workspace_id = sandbox.mags_workspace_id or sandbox.workspace_id
-
-        logger.info(f"Stopping dev server for ticket {ticket_id} in workspace {workspace_id}")
-
-        # Stop dev server
-        stop_command = textwrap.dedent(f"""
-            cd {workspace_path}
-
-            # Kill processes using PID file
-            if [ -f .devserver_pid ]; then
-              old_pid=$(cat .devserver_pid)
-              if [ -n "$old_pid" ] && kill -0 "$old_pid" 2>/dev/null; then
-                kill "$old_pid" || true
-                sleep 2
-                # Force kill if still running
-                kill -9 "$old_pid" 2>/dev/null || true
-              fi
-              rm -f .devserver_pid
-            fi
-
-            # Kill any remaining npm/node processes
-            pkill -f 'npm run dev' || true
-            pkill -f 'next dev' || true
+        def work(job):
+            return _stop_ticket_dev_server(job, ticket, sandbox)
 
-            echo "Dev server stopped"
-        """)
-
-        stop_result = run_command(workspace_id, stop_command, timeout=60)
-
-        if stop_result.get('exit_code') != 0:
-            logger.warning(f"Stop command had non-zero exit code: {stop_result.get('stderr')}")
+        job = submit_dev_server_job(str(project.project_id), 'stop', work, scope=f'ticket:{ticket.id}')
 
         return JsonResponse({
             'success': True,
-            'message': 'Dev server stopped successfully'
-        })
+            'status': 'stopping',
+            'job_id': job.job_id,
+            'state': job.state,
+            'message': 'Dev server stop queued',
+        }, status=202)
 
     except ProjectTicket.DoesNotExist:
         return JsonResponse(
@@ -842,6 +828,81 @@ def stop_dev_server(request, ticket_id):
         )
 
 
+def _stop_ticket_dev_server(job, ticket, sandbox):
+    """Background body of stop_dev_server; returns the job result payload."""
+    project = ticket.project
+    ticket_id = ticket.id
+    job.transition('stopping', 'stopping_server', 'Stopping development server...')
+
+    # Get stack configuration
+    from factory.stack_configs import get_stack_config
+    stack_config = get_stack_config(project.stack, project)
+    project_dir = stack_config['project_dir']
+    workspace_path = f"{MAGS_WORKING_DIR}/{project_dir}"
+    workspace_id = sandbox.mags_workspace_id or sandbox.workspace_id
+
+    logger.info(f"Stopping dev server for ticket {ticket_id} in workspace {workspace_id}")
+
+    # Stop dev server
+    stop_command = textwrap.dedent(f"""
+        cd {workspace_path}
+
+        # Kill processes using PID file
+        if [ -f .devserver_pid ]; then
+          old_pid=$(cat .devserver_pid)
+          if [ -n "$old_pid" ] && kill -0 "$old_pid" 2>/dev/null; then
+            kill "$old_pid" || true
+            # Give it up to 2s to exit, then force kill
+            for i in 1 2 3 4 5 6 7 8 9 10; do
+              kill -0 "$old_pid" 2>/dev/null || break
+              sleep 0.2
+            done
+            kill -9 "$old_pid" 2>/dev/null || true
+          fi
+          rm -f .devserver_pid
+        fi
+
+        # Kill any remaining npm/node processes
+        pkill -f 'npm run dev' || true
+        pkill -f 'next dev' || true
+
+        echo "Dev server stopped"
+    """)
+
+    stop_result = run_command(workspace_id, stop_command, timeout=60)
+
+    if stop_result.get('exit_code') != 0:
+        logger.warning(f"Stop command had non-zero exit code: {stop_result.get('stderr')}")
+
+    return {
+        'success': True,
+        'message': 'Dev server stopped successfully'
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def dev_server_job_status(request, job_id):
+    """
+    State of a dev server start/stop job.
+
+    Returns the job record: state (queued, installing, starting, stopping,
+    ready, stopped, failed), the current step and message, and once done
+    the same result payload the synchronous endpoints used to return.
+    """
+    from projects.models import Project
+
+    job = get_dev_server_job(job_id)
+    if not job:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+
+    project = Project.objects.filter(project_id=job['project_id']).first()
+    if not project or not project.can_user_access(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    return JsonResponse({'success': True, 'job': job})
+
+
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
@@ -1,3 +1,38 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from api.cli_endpoints import _stream_entry_items, build_cli_ticket_log
+from factory.claude_stream import ClaudeStreamParser
+
+
+class StreamJsonEntryTests(SimpleTestCase):
+    def test_typed_entries_pass_through(self):
+        entry = {'type': 'assistant', 'data': {'content': 'hi'}, 'key': 'k1'}
+        self.assertEqual(_stream_entry_items(entry, ClaudeStreamParser()), [('assistant', {'content': 'hi'}, 'k1')])
+
+    def test_stream_json_expands_to_one_item_per_block(self):
+        message = {'type': 'assistant', 'message': {'content': [
+            {'type': 'text', 'text': 'Reading the config'},
+            {'type': 'tool_use', 'name': 'Read', 'input': {'file_path': '/app/settings.py'}},
+        ]}}
+        items = _stream_entry_items({'type': 'stream_json', 'data': message, 'key': 'run1:4'}, ClaudeStreamParser())
+        self.assertEqual(items, [
+            ('assistant', {'content': 'Reading the config'}, 'run1:4:0'),
+            ('tool_use', {'name': 'Read', 'input': {'file_path': '/app/settings.py'}}, 'run1:4:1'),
+        ])
+
+        log = build_cli_ticket_log(1, *items[1][:2], client_key=items[1][2])
+        self.assertEqual((log.command, log.explanation, log.client_key), ('Read', 'Reading file: /app/settings.py', 'run1:4:1'))
+
+    def test_stream_json_tool_result_and_ignored_messages(self):
+        parser = ClaudeStreamParser()
+        result = {'type': 'user', 'message': {'content': [
+            {'type': 'tool_result', 'content': [{'type': 'text', 'text': 'ok'}], 'is_error': True},
+        ]}}
+        (log_type, data, key), = _stream_entry_items({'type': 'stream_json', 'data': result, 'key': 'r:2'}, parser)
+        self.assertEqual((log_type, key, data['is_error']), ('tool_result', 'r:2:0', True))
+        self.assertEqual(json.loads(data['content']), [{'type': 'text', 'text': 'ok'}])
+
+        for message in ({'type': 'system', 'subtype': 'init', 'session_id': 's'}, {'type': 'result', 'result': 'done'}, 'text'):
+            self.assertEqual(_stream_entry_items({'type': 'stream_json', 'data': message}, parser), [])
@@ -38,9 +38,11 @@ urlpatterns = [
     path('project-tickets/<int:ticket_id>/stop-dev-server/', dev_server.stop_dev_server, name='stop_dev_server'),
     path('project-tickets/<int:ticket_id>/dev-server-logs/', dev_server.get_dev_server_logs, name='get_dev_server_logs'),
     path('workspace/<str:workspace_id>/dev-server-logs/', dev_server.get_workspace_dev_server_logs, name='get_workspace_dev_server_logs'),
+    path('dev-server-jobs/<str:job_id>/', dev_server.dev_server_job_status, name='dev_server_job_status'),
 
     # CLI API endpoints (for Claude Code CLI running on VM)
     path('cli/stream/', cli_endpoints.cli_stream_log, name='cli_stream_log'),
+    path('cli/stream/batch/', cli_endpoints.cli_stream_log_batch, name='cli_stream_log_batch'),
     path('cli/task/', cli_endpoints.cli_update_task, name='cli_update_task'),
     path('cli/tasks/bulk/', cli_endpoints.cli_bulk_tasks, name='cli_bulk_tasks'),
     path('cli/status/', cli_endpoints.cli_update_status, name='cli_update_status'),
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.authentication import SessionAuthentication
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth import authenticate
@@ -23,7 +24,7 @@ from .serializers import (
     LLMApiKeysSerializer, ConversationSerializer, MessageSerializer,
     ProjectSerializer, ProjectDocumentSerializer, ProjectTicketSerializer, ProjectTaskSerializer
 )
-from django.db.models import Count, Q
+from django.db.models import Count
 
 
 GOOGLE_AUTH_BASE_URL = 'https://accounts.google.com/o/oauth2/v2/auth'
@@ -456,20 +457,13 @@ class MessageViewSet(viewsets.ModelViewSet):
 class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
+    # Opt-in (?limit=&offset=); without `limit` the full list is returned as before
+    pagination_class = LimitOffsetPagination
     lookup_field = 'project_id'
     http_method_names = ['get', 'post', 'head', 'options']
 
     def get_queryset(self):
-        user = self.request.user
-        accessible_projects = Project.objects.filter(
-            Q(owner=user) | Q(members__user=user, members__status='active')
-        ).distinct()
-
-        return accessible_projects.select_related('owner', 'indexed_repository').annotate(
-            conversations_count=Count('direct_conversations', distinct=True),
-            documents_count=Count('files', filter=Q(files__is_active=True), distinct=True),
-            tickets_count=Count('checklist', distinct=True),
-        ).order_by('-updated_at')
+        return Project.objects.accessible_to(self.request.user).with_summary().order_by('-updated_at')
 
     def perform_create(self, serializer):
         icon = serializer.validated_data.get('icon') or '🚀'
@@ -503,9 +497,7 @@ class ProjectDocumentViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        accessible_projects = Project.objects.filter(
-            Q(owner=user) | Q(members__user=user, members__status='active')
-        ).distinct()
+        accessible_projects = Project.objects.accessible_to(user)
         return ProjectFile.objects.filter(
             project__in=accessible_projects,
             is_active=True
@@ -519,9 +511,7 @@ class ProjectTicketViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        accessible_projects = Project.objects.filter(
-            Q(owner=user) | Q(members__user=user, members__status='active')
-        ).distinct()
+        accessible_projects = Project.objects.accessible_to(user)
         return ProjectTicket.objects.filter(
             project__in=accessible_projects
         ).select_related('project').order_by('created_at')
@@ -585,51 +575,60 @@ class ProjectTicketViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='logs')
     def logs(self, request, pk=None):
-        """Get execution logs for a specific ticket"""
-        from projects.models import TicketLog
-        import logging
-        logger = logging.getLogger(__name__)
-
-        ticket = self.get_object()
-
-        logger.info(f"[LOGS API] Fetching logs for ticket {ticket.id}")
+        """
+        Get execution logs for a specific ticket, one keyset page at a time.
 
-        # Get logs for this specific ticket
-        logs = TicketLog.objects.filter(ticket=ticket).order_by('created_at')
+        Without a cursor the newest `limit` logs are returned. `before_id`
+        pages back through older logs and `after_id` fetches only logs newer
+        than the last one the client has. Long outputs are truncated; see
+        `log_detail` for the full entry.
+        """
+        from projects.utils.ticket_logs import clamp_limit, page_ticket_logs
 
-        logger.info(f"[LOGS API] Found {logs.count()} logs for ticket {ticket.id}")
+        ticket = self.get_object()
 
-        # Log type breakdown for debugging
-        log_types = {}
-        for log in logs:
-            lt = log.log_type or 'command'
-            log_types[lt] = log_types.get(lt, 0) + 1
-        logger.info(f"[LOGS API] Log type breakdown: {log_types}")
+        try:
+            after_id = int(request.query_params['after_id']) if request.query_params.get('after_id') else None
+            before_id = int(request.query_params['before_id']) if request.query_params.get('before_id') else None
+            limit = clamp_limit(request.query_params.get('limit'))
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'after_id, before_id and limit must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Format logs for response
-        commands_data = [{
-            'id': log.id,
-            'log_type': log.log_type or 'command',  # Ensure log_type is always set
-            'command': log.command,
-            'explanation': log.explanation or '',
-            'output': log.output or '',
-            'exit_code': log.exit_code,
-            'created_at': log.created_at.isoformat()
-        } for log in logs]
+        page = page_ticket_logs(ticket.id, after_id=after_id, before_id=before_id, limit=limit)
 
         # Check if there's an active AI task for this ticket
         from django.core.cache import cache
         ai_processing_key = f'ticket_ai_processing_{ticket.id}'
         is_ai_processing = cache.get(ai_processing_key, False)
 
-        return Response({
+        data = {
             'ticket_id': ticket.id,
             'ticket_name': ticket.name,
             'ticket_status': ticket.status,
-            'ticket_notes': ticket.notes or '',
-            'commands': commands_data,
+            'commands': page['logs'],
+            'first_id': page['first_id'],
+            'last_id': page['last_id'],
+            'has_more': page['has_more'],
+            'has_earlier': page['has_earlier'],
             'is_ai_processing': is_ai_processing
-        }, status=status.HTTP_200_OK)
+        }
+        if after_id is None and before_id is None:
+            data['ticket_notes'] = ticket.notes or ''
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path=r'logs/(?P<log_id>\d+)')
+    def log_detail(self, request, pk=None, log_id=None):
+        """Get one log entry with its full (untruncated) command and output"""
+        from django.shortcuts import get_object_or_404
+        from projects.models import TicketLog
+        from projects.utils.ticket_logs import serialize_log
+
+        ticket = self.get_object()
+        log = get_object_or_404(TicketLog, id=log_id, ticket=ticket)
+        return Response(serialize_log(log, full=True), status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['get'], url_path='tasks')
     def tasks(self, request, pk=None):
@@ -5,24 +5,12 @@ from django.utils.deconstruct import deconstructible
 import os
 import uuid
 from datetime import datetime
-import boto3
-from botocore.config import Config
 
 
 def get_s3_client():
-    """Get a properly configured S3 client."""
-    region = getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-1')
-    return boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=region,
-        config=Config(
-            signature_version='s3v4',
-            region_name=region,
-            s3={'addressing_style': 'virtual'}
-        )
-    )
+    """Get the shared, pooled S3 client."""
+    from factory.s3_batch import get_s3_batch
+    return get_s3_batch().client
 
 
 @deconstructible
@@ -75,7 +63,6 @@ class ChatFileStorage(Storage):
         
         if self.file_storage_type == 's3':
             # For S3, upload binary files directly using boto3
-            s3_client = get_s3_client()
             try:
                 # Construct the full S3 key
                 prefix = getattr(settings, 'AWS_S3_PROJECT_PREFIX', 'projects')
@@ -87,13 +74,10 @@ class ChatFileStorage(Storage):
                 if not content_type:
                     content_type = 'application/octet-stream'
                 
-                # Upload to S3
-                s3_client.put_object(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                    Key=s3_key,
-                    Body=content_data,
-                    ContentType=content_type
-                )
+                # Upload to S3 (multipart for large attachments)
+                from factory.s3_batch import get_s3_batch
+                if get_s3_batch().upload(settings.AWS_STORAGE_BUCKET_NAME, s3_key, content_data, content_type) is None:
+                    raise Exception(f"Upload of {s3_key} failed")
                 return name
             except Exception as e:
                 raise Exception(f"Failed to save file to S3: {str(e)}")
@@ -152,18 +136,9 @@ class ChatFileStorage(Storage):
         """Return URL to access the file."""
         if self.file_storage_type == 's3':
             # For S3, generate a presigned URL for temporary access
-            import boto3
             from botocore.exceptions import ClientError
-            from botocore.config import Config
             
-            region = getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-1')
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=region,
-                config=Config(signature_version='s3v4', region_name=region, s3={'addressing_style': 'virtual'})
-            )
+            s3_client = get_s3_client()
             
             try:
                 prefix = getattr(settings, 'AWS_S3_PROJECT_PREFIX', 'projects')
@@ -47,16 +47,7 @@ def project_chat(request, project_id):
     project = get_object_or_404(Project, project_id=project_id, owner=request.user)
 
     # Get all projects for the sidebar dropdown
-    owned_projects = Project.objects.filter(owner=request.user)
-    try:
-        from projects.models import ProjectMember
-        member_projects = Project.objects.filter(
-            members__user=request.user,
-            members__status='active'
-        ).exclude(owner=request.user)
-    except Exception:
-        member_projects = Project.objects.none()
-    all_projects = list(owned_projects) + list(member_projects)
+    all_projects = list(Project.objects.accessible_to(request.user).order_by('-updated_at'))
 
     # Redirect to the chat interface with this conversation open
     context = {
@@ -130,16 +121,7 @@ def show_conversation(request, conversation_id):
             project = conv_projects.first()
 
     # Get all projects for the sidebar dropdown
-    owned_projects = Project.objects.filter(owner=request.user)
-    try:
-        from projects.models import ProjectMember
-        member_projects = Project.objects.filter(
-            members__user=request.user,
-            members__status='active'
-        ).exclude(owner=request.user)
-    except Exception:
-        member_projects = Project.objects.none()
-    all_projects = list(owned_projects) + list(member_projects)
+    all_projects = list(Project.objects.accessible_to(request.user).order_by('-updated_at'))
 
     context = {
         'conversation_id': conversation.id,
@@ -0,0 +1,443 @@
+"""
+Batch provisioning of Kubernetes workspaces.
+
+Creates the workspace resources (namespace, PV/PVC, deployment, service)
+for many projects or conversations at once, e.g. when onboarding a cohort
+or re-provisioning after a node failure. `create_kubernetes_pod` does the
+same for one namespace, but with its own read-check-create round trips and
+sleep loops; N of those take N times as long.
+
+- One API client and one list per resource kind: existing pods,
+  deployments, nodes and services are each listed cluster-wide once.
+- Host directories for hostPath volumes are prepared for every namespace
+  in a single SSH command.
+- Resource creation runs in a bounded thread pool. Creates are
+  idempotent: AlreadyExists (409) counts as success.
+- Readiness is tracked with one pod watch across all namespaces instead of
+  polling each pod.
+- KubernetesPod and KubernetesPortMapping rows are written with bulk
+  create/update in one transaction.
+
+Usage:
+    from development.k8s_manager.batch_provision import ProvisionTarget, provision_pods
+
+    results = provision_pods([ProvisionTarget(project_id=p) for p in project_ids], max_parallel=8)
+    failed = [r for r in results if not r.success]
+"""
+
+import logging
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from ..models import KubernetesPod, KubernetesPortMapping
+from .manage_pods import (
+    build_workspace_deployment_body,
+    build_workspace_pv_body,
+    build_workspace_pvc_body,
+    build_workspace_service_body,
+    create_ssh_client,
+    ensure_namespace_exists,
+    execute_remote_command,
+    generate_namespace,
+    get_k8s_api_client,
+    get_k8s_server_settings,
+    get_kubernetes_access_config,
+    get_namespace_lock,
+    port_mapping_specs,
+    workspace_service_details,
+)
+from .pod_cache import CachedPod, get_pod_informer, select_pod
+from .pod_exec import exec_in_pod
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_IMAGE = "jitin2pillai/lfg-base:v1"
+DEFAULT_RESOURCE_LIMITS = {
+    'memory': '800Mi',
+    'cpu': '500m',
+    'memory_requests': '500Mi',
+    'cpu_requests': '250m'
+}
+MAX_PARALLEL = 8
+READY_TIMEOUT = 300
+
+WORKSPACE_SELECTOR = "component=workspace"
+SERVICE_SELECTOR = "component=ttyd-service"
+VOLUME_ROOT = "/mnt/data/user-volumes"
+MOUNT_CHECK_COMMAND = "df -h | grep /workspace && ls -la /workspace"
+
+
+@dataclass
+class ProvisionTarget:
+    """A project or conversation that should have a running workspace."""
+    project_id: Optional[str] = None
+    conversation_id: Optional[str] = None
+    resource_limits: Optional[dict] = None
+
+    @property
+    def namespace(self) -> str:
+        return generate_namespace(self.project_id, self.conversation_id)
+
+
+@dataclass
+class ProvisionResult:
+    target: ProvisionTarget
+    namespace: str
+    success: bool = False
+    created: bool = False
+    pod_name: Optional[str] = None
+    service_details: Dict = field(default_factory=dict)
+    pod: Optional[KubernetesPod] = None
+    error: Optional[str] = None
+
+
+def _create_ignoring_conflict(create, *args, **kwargs) -> bool:
+    """Call a create_* API; returns False if the object already existed."""
+    try:
+        create(*args, **kwargs)
+        return True
+    except ApiException as e:
+        if e.status == 409:
+            return False
+        raise
+
+
+def _resolve_node_name(nodes, node_host_ip: str) -> str:
+    for node in nodes:
+        for address in node.status.addresses or []:
+            if address.address == node_host_ip:
+                return node.metadata.name
+    logger.warning(f"[K8S_BATCH] Could not find node for IP {node_host_ip}, using IP as node name")
+    return node_host_ip
+
+
+def _node_ip(nodes) -> str:
+    if nodes:
+        for address in nodes[0].status.addresses or []:
+            if address.type == "InternalIP":
+                return address.address
+    return "localhost"
+
+
+def _prepare_host_directories(namespaces: List[str]) -> Optional[str]:
+    """
+    Create the hostPath directories for all namespaces in one SSH command.
+
+    Returns an error message, or None on success.
+    """
+    ssh_settings = get_k8s_server_settings()
+    ssh_client = create_ssh_client(
+        host=ssh_settings.get('node_host'),
+        port=ssh_settings.get('port'),
+        username=ssh_settings.get('username'),
+        key_file=ssh_settings.get('key_file'),
+        key_string=ssh_settings.get('key_string'),
+        key_passphrase=ssh_settings.get('key_passphrase')
+    )
+    if not ssh_client:
+        return "Failed to create SSH connection for directory setup"
+
+    readme = shlex.quote("Welcome to your workspace! This directory is persistent and will retain your files.")
+    steps = []
+    for namespace in namespaces:
+        path = f"{VOLUME_ROOT}/{namespace}"
+        steps.append(
+            f"mkdir -p {path} && chmod 777 {path} && "
+            f"{{ [ -f {path}/README.txt ] || echo {readme} > {path}/README.txt; }} && "
+            f"{{ chown -R 1000:1000 {path} || true; }}"
+        )
+    try:
+        success, _, stderr = execute_remote_command(ssh_client, " && ".join(steps))
+    finally:
+        ssh_client.close()
+    if not success:
+        return f"Failed to prepare volume directories: {stderr}"
+    logger.info(f"[K8S_BATCH] Prepared {len(namespaces)} volume directories")
+    return None
+
+
+def _create_workspace_resources(core_v1_api, apps_v1_api, namespace, resource_limits, storage_class, node_name):
+    """Create (or adopt) every resource of one workspace. Returns True if anything was created."""
+    created = False
+    with get_namespace_lock(namespace):
+        ensure_namespace_exists(core_v1_api, namespace)
+        if storage_class == "manual":
+            created |= _create_ignoring_conflict(
+                core_v1_api.create_persistent_volume,
+                body=build_workspace_pv_body(namespace, node_name)
+            )
+        created |= _create_ignoring_conflict(
+            core_v1_api.create_namespaced_persistent_volume_claim,
+            namespace=namespace,
+            body=build_workspace_pvc_body(namespace, storage_class)
+        )
+        created |= _create_ignoring_conflict(
+            apps_v1_api.create_namespaced_deployment,
+            namespace=namespace,
+            body=build_workspace_deployment_body(namespace, WORKSPACE_IMAGE, resource_limits)
+        )
+        created |= _create_ignoring_conflict(
+            core_v1_api.create_namespaced_service,
+            namespace=namespace,
+            body=build_workspace_service_body(namespace)
+        )
+    return created
+
+
+def _wait_for_ready(core_v1_api, pending: set, resource_version: str, deadline: float) -> Dict[str, str]:
+    """
+    Watch workspace pods in all namespaces until every pending one is ready.
+
+    Returns namespace -> ready pod name for the namespaces that made it.
+    """
+    ready: Dict[str, str] = {}
+    while pending - set(ready) and time.monotonic() < deadline:
+        w = watch.Watch()
+        try:
+            for event in w.stream(
+                core_v1_api.list_pod_for_all_namespaces,
+                label_selector=WORKSPACE_SELECTOR,
+                resource_version=resource_version,
+                timeout_seconds=max(1, int(deadline - time.monotonic())),
+            ):
+                pod = event['object']
+                if event['type'] == 'ERROR':
+                    raise ApiException(status=getattr(pod, 'code', None) or 500, reason=str(pod))
+                resource_version = pod.metadata.resource_version
+                namespace = pod.metadata.namespace
+                if namespace in pending and event['type'] != 'DELETED' and CachedPod.from_v1_pod(pod).running:
+                    ready[namespace] = pod.metadata.name
+                    logger.info(f"[K8S_BATCH] Pod {pod.metadata.name} ready ({len(ready)}/{len(pending)})")
+                if not pending - set(ready) or time.monotonic() >= deadline:
+                    break
+        except ApiException as e:
+            # 410 Gone or a dropped watch: re-list to pick up what we missed
+            logger.debug(f"[K8S_BATCH] Pod watch restarted: {e}")
+            pods = core_v1_api.list_pod_for_all_namespaces(label_selector=WORKSPACE_SELECTOR)
+            resource_version = pods.metadata.resource_version
+            for pod in pods.items:
+                if pod.metadata.namespace in pending and CachedPod.from_v1_pod(pod).running:
+                    ready[pod.metadata.namespace] = pod.metadata.name
+        finally:
+            w.stop()
+    return ready
+
+
+def _verify_mount(core_v1_api, namespace, pod_name) -> Optional[str]:
+    try:
+        result = exec_in_pod(core_v1_api, pod_name, namespace, MOUNT_CHECK_COMMAND, timeout=30)
+    except Exception as e:
+        return f"Failed to verify workspace mount: {e}"
+    if not result.success or "/workspace" not in result.stdout:
+        return f"Workspace mount verification failed: {result.stderr or result.stdout}"
+    return None
+
+
+def _save_rows(results: List[ProvisionResult]):
+    """Upsert KubernetesPod rows and their port mappings for a batch."""
+    project_ids = [r.target.project_id for r in results if r.target.project_id]
+    conversation_ids = [r.target.conversation_id for r in results if not r.target.project_id and r.target.conversation_id]
+    existing = KubernetesPod.objects.filter(
+        Q(project_id__in=project_ids) | Q(conversation_id__in=conversation_ids, project_id__isnull=True)
+    )
+    by_project = {p.project_id: p for p in existing if p.project_id}
+    by_conversation = {p.conversation_id: p for p in existing if not p.project_id}
+
+    access_config = get_kubernetes_access_config()
+    ssh_settings = get_k8s_server_settings()
+    now = timezone.now()
+    to_create, to_update = [], []
+    for result in results:
+        target = result.target
+        if target.project_id:
+            pod = by_project.get(target.project_id)
+        else:
+            pod = by_conversation.get(target.conversation_id)
+        if pod is None:
+            pod = KubernetesPod(
+                project_id=target.project_id,
+                conversation_id=target.conversation_id,
+                image=WORKSPACE_IMAGE,
+            )
+            to_create.append(pod)
+        else:
+            to_update.append(pod)
+
+        pod.namespace = result.namespace
+        pod.resource_limits = target.resource_limits or DEFAULT_RESOURCE_LIMITS
+        pod.ssh_connection_details = ssh_settings
+        pod.cluster_host = access_config.get('cluster_host') or pod.cluster_host
+        pod.kubeconfig = access_config.get('kubeconfig') or pod.kubeconfig
+        pod.token = access_config.get('token') or pod.token
+        if result.success:
+            pod.status = 'running'
+            pod.started_at = now
+            pod.pod_name = result.pod_name
+            pod.service_details = result.service_details
+        else:
+            pod.status = 'error'
+            pod.pod_name = pod.pod_name or f"{result.namespace}-pod"
+        result.pod = pod
+
+    with transaction.atomic():
+        KubernetesPod.objects.bulk_create(to_create)
+        if to_update:
+            KubernetesPod.objects.bulk_update(to_update, [
+                'namespace', 'pod_name', 'status', 'started_at', 'service_details', 'resource_limits',
+                'ssh_connection_details', 'cluster_host', 'kubeconfig', 'token',
+            ])
+
+        mappings = [
+            KubernetesPortMapping(
+                pod=result.pod,
+                container_name=container_name,
+                container_port=container_port,
+                service_name=f"{result.namespace}-service",
+                **defaults
+            )
+            for result in results if result.success
+            for container_name, container_port, defaults in port_mapping_specs(result.service_details)
+        ]
+        if mappings:
+            KubernetesPortMapping.objects.bulk_create(
+                mappings,
+                update_conflicts=True,
+                unique_fields=['pod', 'container_name', 'container_port'],
+                update_fields=['service_port', 'node_port', 'protocol', 'service_name', 'description'],
+            )
+
+
+def provision_pods(
+    targets: List[ProvisionTarget],
+    max_parallel: int = MAX_PARALLEL,
+    ready_timeout: float = READY_TIMEOUT,
+    verify_mount: bool = True,
+) -> List[ProvisionResult]:
+    """
+    Make sure every target has a running workspace pod.
+
+    Workspaces whose deployment already exists are adopted and only waited
+    on; the rest are created. Targets without a project or conversation id
+    are rejected.
+
+    Returns one ProvisionResult per distinct namespace, in target order.
+    """
+    results: Dict[str, ProvisionResult] = {}
+    for target in targets:
+        if not target.project_id and not target.conversation_id:
+            raise ValueError("ProvisionTarget needs a project_id or conversation_id")
+        results.setdefault(target.namespace, ProvisionResult(target=target, namespace=target.namespace))
+    if not results:
+        return []
+
+    api_client, core_v1_api, apps_v1_api = get_k8s_api_client()
+    if not core_v1_api or not apps_v1_api:
+        for result in results.values():
+            result.error = "Failed to get Kubernetes API client"
+        return list(results.values())
+
+    started = time.monotonic()
+    namespaces = set(results)
+
+    # Cluster state with one list per resource kind
+    pods = core_v1_api.list_pod_for_all_namespaces(label_selector=WORKSPACE_SELECTOR)
+    resource_version = pods.metadata.resource_version
+    pods_by_namespace: Dict[str, list] = {}
+    for pod in pods.items:
+        pods_by_namespace.setdefault(pod.metadata.namespace, []).append(pod)
+    deployments = apps_v1_api.list_deployment_for_all_namespaces(label_selector=WORKSPACE_SELECTOR)
+    deployed = {d.metadata.namespace for d in deployments.items}
+    nodes = core_v1_api.list_node().items
+
+    ready: Dict[str, str] = {}
+    for namespace in namespaces:
+        pod = select_pod(pods_by_namespace.get(namespace, []), namespace)
+        if pod is not None and CachedPod.from_v1_pod(pod).running:
+            ready[namespace] = pod.metadata.name
+    to_create = sorted(namespaces - deployed)
+    logger.info(
+        f"[K8S_BATCH] {len(namespaces)} workspaces: {len(ready)} running, "
+        f"{len(deployed & namespaces) - len(ready)} starting, {len(to_create)} to create"
+    )
+
+    storage_class = os.getenv("STORAGE_CLASS_NAME", "manual")
+    node_name = None
+    if to_create and storage_class == "manual":
+        ssh_settings = get_k8s_server_settings()
+        node_name = _resolve_node_name(nodes, ssh_settings.get('node_host', ssh_settings.get('host', 'localhost')))
+        error = _prepare_host_directories(to_create)
+        if error:
+            logger.error(f"[K8S_BATCH] {error}")
+            for namespace in to_create:
+                results[namespace].error = error
+            to_create = []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="k8s-provision") as pool:
+        futures = {
+            namespace: pool.submit(
+                _create_workspace_resources, core_v1_api, apps_v1_api, namespace,
+                results[namespace].target.resource_limits or DEFAULT_RESOURCE_LIMITS,
+                storage_class, node_name,
+            )
+            for namespace in to_create
+        }
+        for namespace, future in futures.items():
+            try:
+                results[namespace].created = future.result()
+            except Exception as e:
+                logger.error(f"[K8S_BATCH] Failed to create resources in {namespace}: {e}")
+                results[namespace].error = f"Failed to create resources: {e}"
+
+        pending = {ns for ns, r in results.items() if not r.error and ns not in ready}
+        if pending:
+            ready.update(_wait_for_ready(core_v1_api, pending, resource_version, started + ready_timeout))
+
+        mount_checks = {}
+        if verify_mount:
+            mount_checks = {
+                namespace: pool.submit(_verify_mount, core_v1_api, namespace, ready[namespace])
+                for namespace in to_create if namespace in ready
+            }
+        for namespace, future in mount_checks.items():
+            results[namespace].error = future.result()
+
+    node_ip = _node_ip(nodes)
+    services = core_v1_api.list_service_for_all_namespaces(label_selector=SERVICE_SELECTOR)
+    services_by_namespace = {s.metadata.namespace: s for s in services.items}
+
+    for namespace, result in results.items():
+        if result.error:
+            continue
+        if namespace not in ready:
+            result.error = f"Pod not ready after {ready_timeout}s"
+            continue
+        service = services_by_namespace.get(namespace)
+        if service is None:
+            result.error = f"Service {namespace}-service not found"
+            continue
+        result.pod_name = ready[namespace]
+        result.service_details = workspace_service_details(service, node_ip)
+        result.success = True
+
+    _save_rows(list(results.values()))
+
+    informer = get_pod_informer()
+    for namespace in to_create:
+        informer.invalidate(namespace)
+
+    succeeded = sum(1 for r in results.values() if r.success)
+    logger.info(
+        f"[K8S_BATCH] Provisioned {succeeded}/{len(results)} workspaces "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return list(results.values())
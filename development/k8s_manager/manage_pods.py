@@ -19,6 +19,9 @@ from kubernetes.stream import stream
 import paramiko
 import io
 
+from .pod_cache import get_pod_informer, select_pod
+from .pod_exec import ExecResult, exec_in_pod, stream_exec_in_pod
+
 # Global lock for namespace operations to prevent race conditions
 namespace_locks = {}
 namespace_locks_lock = threading.Lock()
@@ -79,9 +82,96 @@ def get_k8s_server_settings():
         }
 
 
+# Process-wide Kubernetes client, rebuilt only when the settings change
+_k8s_client_cache = {'signature': None, 'clients': None}
+_k8s_client_lock = threading.Lock()
+
+
 def get_k8s_api_client():
     """
-    Get a configured Kubernetes API client using credentials from settings.
+    Get the shared Kubernetes API client (built once per process).
+
+    The Configuration, CA file and connection check happen only when the
+    client is first built or the K8S_* settings change; later calls return
+    the cached clients. A 401 or a connection failure on any call drops the
+    cached client (reset_k8s_api_client), so the next call rebuilds it.
+
+    Returns:
+        tuple: (api_client, core_v1_api, apps_v1_api) or (None, None, None) if failed
+    """
+    signature = (
+        getattr(settings, 'K8S_API_HOST', None),
+        getattr(settings, 'K8S_API_TOKEN', None),
+        getattr(settings, 'K8S_CA_CERT', None),
+        getattr(settings, 'K8S_VERIFY_SSL', False),
+    )
+    cached = _k8s_client_cache['clients']
+    if cached and _k8s_client_cache['signature'] == signature:
+        return cached
+
+    with _k8s_client_lock:
+        cached = _k8s_client_cache['clients']
+        if cached and _k8s_client_cache['signature'] == signature:
+            return cached
+
+        clients = _build_k8s_api_client()
+        if clients[0] is not None:
+            _k8s_client_cache['signature'] = signature
+            _k8s_client_cache['clients'] = clients
+        return clients
+
+
+def reset_k8s_api_client(api_client=None):
+    """
+    Drop the cached client (e.g. after a token rotation).
+
+    With `api_client`, only drop it if it is still the cached one, so a
+    late error from an old client doesn't discard its replacement.
+    """
+    with _k8s_client_lock:
+        clients = _k8s_client_cache['clients']
+        if api_client is not None and (not clients or clients[0] is not api_client):
+            return
+        _k8s_client_cache['signature'] = None
+        _k8s_client_cache['clients'] = None
+    if clients:
+        try:
+            clients[0].close()
+        except Exception:
+            pass
+
+
+def _reset_on_stale_client(api_client):
+    """
+    Wrap api_client.call_api so auth and connection errors reset the cache.
+
+    401 means the token was rotated or revoked; connection-level errors
+    usually mean the API endpoint moved. 403 is left alone: it is an RBAC
+    answer for one resource, not a broken client.
+    """
+    import urllib3
+
+    call_api = api_client.call_api
+
+    def _call_api(*args, **kwargs):
+        try:
+            return call_api(*args, **kwargs)
+        except ApiException as e:
+            if e.status == 401:
+                logger.warning("[K8S] API returned 401, dropping the cached client")
+                reset_k8s_api_client(api_client)
+            raise
+        except (urllib3.exceptions.HTTPError, ConnectionError) as e:
+            logger.warning(f"[K8S] Connection error ({type(e).__name__}), dropping the cached client")
+            reset_k8s_api_client(api_client)
+            raise
+
+    api_client.call_api = _call_api
+
+
+def _build_k8s_api_client():
+    """
+    Build a configured Kubernetes API client using credentials from settings.
     
     Returns:
         tuple: (api_client, core_v1_api, apps_v1_api) or (None, None, None) if failed
@@ -142,6 +232,7 @@ def get_k8s_api_client():
         
         # Create API client
         api_client = k8s_client.ApiClient(configuration)
+        _reset_on_stale_client(api_client)
         core_v1_api = k8s_client.CoreV1Api(api_client)
         apps_v1_api = k8s_client.AppsV1Api(api_client)
         
@@ -364,23 +455,8 @@ def check_pod_status(client, namespace, pod_name=None):
             logger.error("Failed to get Kubernetes API client")
             return False, False, {}
         
-        # Ensure namespace exists
-        try:
-            core_v1_api.read_namespace(name=namespace)
-            logger.info(f"Namespace {namespace} exists")
-        except ApiException as e:
-            if e.status == 404:
-                logger.info(f"Namespace {namespace} does not exist, creating it")
-                try:
-                    namespace_body = k8s_client.V1Namespace(
-                        metadata=k8s_client.V1ObjectMeta(name=namespace)
-                    )
-                    core_v1_api.create_namespace(body=namespace_body)
-                    logger.info(f"Created namespace {namespace}")
-                except ApiException as create_e:
-                    logger.warning(f"Failed to create namespace {namespace}: {create_e}")
-            else:
-                logger.warning(f"Error checking namespace {namespace}: {e}")
+        # Read-only: namespaces are created at provisioning time
+        # (create_kubernetes_pod), so a missing namespace means "no pod".
         
         # List pods in the namespace
         if pod_name:
@@ -401,38 +477,23 @@ def check_pod_status(client, namespace, pod_name=None):
                 pod_list = core_v1_api.list_namespaced_pod(namespace=namespace)
                 pods = pod_list.items
             except ApiException as e:
-                logger.error(f"Error listing pods in namespace {namespace}: {e}")
+                if e.status == 404:
+                    logger.info(f"Namespace {namespace} does not exist")
+                else:
+                    logger.error(f"Error listing pods in namespace {namespace}: {e}")
                 return False, False, {}
         
         if not pods:
             logger.info(f"No pods found in namespace {namespace}")
             return False, False, {}
         
-        # First try to find pods with the app label
-        labeled_pods = [p for p in pods if p.metadata.labels and p.metadata.labels.get('app') == namespace]
-        
-        # Then try to find the specific pod if requested
-        specific_pod = None
-        if pod_name:
-            specific_pod = next((p for p in pods if p.metadata.name == pod_name), None)
-        
         # Decide which pod to use based on priorities:
         # 1. Specifically requested pod by name
         # 2. Pod with matching app label
         # 3. Any pod in the namespace
-        pod = None
-        if specific_pod:
-            pod = specific_pod
-            actual_pod_name = pod_name
-            logger.info(f"Using specifically requested pod: {pod_name}")
-        elif labeled_pods:
-            pod = labeled_pods[0]
-            actual_pod_name = pod.metadata.name
-            logger.info(f"Found pod with app={namespace} label: {actual_pod_name}")
-        else:
-            pod = pods[0]
-            actual_pod_name = pod.metadata.name
-            logger.info(f"Using first available pod in namespace: {actual_pod_name}")
+        pod = select_pod(pods, namespace, pod_name)
+        actual_pod_name = pod.metadata.name
+        logger.info(f"Using pod {actual_pod_name} in namespace {namespace}")
         
         # Check pod phase
         phase = pod.status.phase
@@ -467,6 +528,239 @@ def check_pod_status(client, namespace, pod_name=None):
         return False, False, {}
 
 
+def build_workspace_pv_body(namespace, node_name):
+    """hostPath PersistentVolume for a workspace, pinned to the node holding its directory."""
+    pv_name = f"{namespace}-pv"
+    return k8s_client.V1PersistentVolume(
+        metadata=k8s_client.V1ObjectMeta(
+            name=pv_name,
+            labels={"type": "local", "pvname": pv_name}
+        ),
+        spec=k8s_client.V1PersistentVolumeSpec(
+            storage_class_name="manual",
+            capacity={"storage": "1Gi"},
+            access_modes=["ReadWriteOnce"],
+            host_path=k8s_client.V1HostPathVolumeSource(
+                path=f"/mnt/data/user-volumes/{namespace}",
+                type="DirectoryOrCreate"
+            ),
+            persistent_volume_reclaim_policy="Retain",
+            # Pin the PV to the specific node where we created the directory
+            node_affinity=k8s_client.V1VolumeNodeAffinity(
+                required=k8s_client.V1NodeSelector(
+                    node_selector_terms=[
+                        k8s_client.V1NodeSelectorTerm(
+                            match_expressions=[
+                                k8s_client.V1NodeSelectorRequirement(
+                                    key="kubernetes.io/hostname",
+                                    operator="In",
+                                    values=[node_name]
+                                )
+                            ]
+                        )
+                    ]
+                )
+            )
+        )
+    )
+
+
+def build_workspace_pvc_body(namespace, storage_class="manual"):
+    """PersistentVolumeClaim for a workspace (static hostPath PV or a dynamic storage class)."""
+    pvc_name = f"{namespace}-pvc"
+    pv_name = f"{namespace}-pv"
+    if storage_class == "manual":
+        # Static PVC for hostPath
+        pvc_body = k8s_client.V1PersistentVolumeClaim(
+            metadata=k8s_client.V1ObjectMeta(name=pvc_name, namespace=namespace),
+            spec=k8s_client.V1PersistentVolumeClaimSpec(
+                storage_class_name="manual",
+                access_modes=["ReadWriteOnce"],
+                resources=k8s_client.V1ResourceRequirements(
+                    requests={"storage": "1Gi"}
+                ),
+                volume_name=pv_name
+            )
+        )
+    else:
+        # Dynamic PVC for real storage class
+        pvc_body = k8s_client.V1PersistentVolumeClaim(
+            metadata=k8s_client.V1ObjectMeta(name=pvc_name, namespace=namespace),
+            spec=k8s_client.V1PersistentVolumeClaimSpec(
+                storage_class_name=storage_class,
+                access_modes=["ReadWriteOnce"],
+                resources=k8s_client.V1ResourceRequirements(
+                    requests={"storage": "1Gi"}
+                )
+            )
+        )
+    return pvc_body
+
+
+def build_workspace_deployment_body(namespace, image, resource_limits):
+    """Deployment running the dev-environment and filebrowser containers for a workspace."""
+    deployment_name = f"{namespace}-dep"
+    pvc_name = f"{namespace}-pvc"
+
+    # Define containers
+    containers = [
+        k8s_client.V1Container(
+            name="dev-environment",
+            image=image,
+            ports=[k8s_client.V1ContainerPort(container_port=7681, name="ttyd", protocol="TCP")],
+            env=[
+                k8s_client.V1EnvVar(name="TTYD_USER", value="user"),
+                k8s_client.V1EnvVar(name="TTYD_PASS", value="password")
+            ],
+            volume_mounts=[
+                k8s_client.V1VolumeMount(name="user-data", mount_path="/workspace")
+            ],
+            resources=k8s_client.V1ResourceRequirements(
+                limits={
+                    "memory": resource_limits.get('memory', '200Mi'),
+                    "cpu": resource_limits.get('cpu', '250m')
+                },
+                requests={
+                    "memory": resource_limits.get('memory_requests', '100Mi'),
+                    "cpu": resource_limits.get('cpu_requests', '100m')
+                }
+            )
+        ),
+        k8s_client.V1Container(
+            name="filebrowser",
+            image="filebrowser/filebrowser:latest",
+            command=["/filebrowser"],
+            args=["--noauth", "--address", "0.0.0.0", "--port", "8080", "--root", "/workspace"],
+            ports=[k8s_client.V1ContainerPort(container_port=8080, name="filebrowser", protocol="TCP")],
+            volume_mounts=[
+                k8s_client.V1VolumeMount(name="user-data", mount_path="/workspace")
+            ]
+        )
+    ]
+
+    # Define volumes
+    volumes = [
+        k8s_client.V1Volume(
+            name="user-data",
+            persistent_volume_claim=k8s_client.V1PersistentVolumeClaimVolumeSource(
+                claim_name=pvc_name
+            )
+        )
+    ]
+
+    # Create deployment body
+    deployment_body = k8s_client.V1Deployment(
+        metadata=k8s_client.V1ObjectMeta(
+            name=deployment_name,
+            namespace=namespace,
+            labels={"app": namespace, "component": "workspace"}
+        ),
+        spec=k8s_client.V1DeploymentSpec(
+            replicas=1,
+            selector=k8s_client.V1LabelSelector(
+                match_labels={"app": namespace}
+            ),
+            template=k8s_client.V1PodTemplateSpec(
+                metadata=k8s_client.V1ObjectMeta(
+                    labels={"app": namespace, "component": "workspace"}
+                ),
+                spec=k8s_client.V1PodSpec(
+                    containers=containers,
+                    volumes=volumes
+                )
+            )
+        )
+    )
+    return deployment_body
+
+
+def build_workspace_service_body(namespace):
+    """NodePort service exposing a workspace's http, ttyd and filebrowser ports."""
+    service_name = f"{namespace}-service"
+    return k8s_client.V1Service(
+        metadata=k8s_client.V1ObjectMeta(
+            name=service_name,
+            namespace=namespace,
+            labels={"app": namespace, "component": "ttyd-service"}
+        ),
+        spec=k8s_client.V1ServiceSpec(
+            type="NodePort",
+            ports=[
+                k8s_client.V1ServicePort(port=8080, target_port=8080, name="http"),
+                k8s_client.V1ServicePort(port=7681, target_port=7681, name="ttyd", protocol="TCP"),
+                k8s_client.V1ServicePort(port=8090, target_port=8080, name="filebrowser", protocol="TCP")
+            ],
+            selector={"app": namespace}
+        )
+    )
+
+
+def get_workspace_node_ip(core_v1_api):
+    """InternalIP of the first cluster node (the address NodePort URLs are built on)."""
+    nodes = core_v1_api.list_node()
+    if nodes.items:
+        for address in nodes.items[0].status.addresses:
+            if address.type == "InternalIP":
+                return address.address
+    return "localhost"
+
+
+def workspace_service_details(service, node_ip):
+    """Node ports and URLs from a workspace's NodePort V1Service."""
+    # Extract port information
+    http_port = None
+    ttyd_port = None
+    filebrowser_port = None
+
+    for port in service.spec.ports:
+        if port.name == "http":
+            http_port = port.node_port
+        elif port.name == "ttyd":
+            ttyd_port = port.node_port
+        elif port.name == "filebrowser":
+            filebrowser_port = port.node_port
+
+    service_details = {
+        "nodePort": http_port,
+        "ttydPort": ttyd_port,
+        "nodeIP": node_ip,
+        "url": f"http://{node_ip}:{http_port}" if http_port else None,
+        "ttydUrl": f"http://{node_ip}:{ttyd_port}" if ttyd_port else None
+    }
+
+    if filebrowser_port:
+        service_details["filebrowserPort"] = filebrowser_port
+        service_details["filebrowserUrl"] = f"http://{node_ip}:{filebrowser_port}"
+
+    return service_details
+
+
+def read_workspace_service_details(core_v1_api, namespace, node_ip=None):
+    """
+    Service details (node ports and URLs) for a workspace's NodePort service.
+
+    Pass node_ip to skip the node lookup (e.g. when reading many services).
+    Returns {} if the service cannot be read.
+    """
+    service_name = f"{namespace}-service"
+    try:
+        service = core_v1_api.read_namespaced_service(
+            name=service_name,
+            namespace=namespace
+        )
+
+        # Get node IP
+        if node_ip is None:
+            node_ip = get_workspace_node_ip(core_v1_api)
+
+        service_details = workspace_service_details(service, node_ip)
+        logger.info(f"Service details: {service_details}")
+        return service_details
+    except ApiException as e:
+        logger.warning(f"Error getting service details: {e}")
+        return {}
+
+
 def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest", resource_limits=None, force_recreate=False):
     """
     Create a Kubernetes pod in the given namespace.
@@ -517,23 +811,8 @@ def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest
     # Use namespace lock to prevent race conditions
     with get_namespace_lock(namespace):
         try:
-            # Ensure namespace exists
-            try:
-                core_v1_api.read_namespace(name=namespace)
-                logger.info(f"Namespace {namespace} exists")
-            except ApiException as e:
-                if e.status == 404:
-                    logger.info(f"Namespace {namespace} does not exist, creating it")
-                    try:
-                        namespace_body = k8s_client.V1Namespace(
-                            metadata=k8s_client.V1ObjectMeta(name=namespace)
-                        )
-                        core_v1_api.create_namespace(body=namespace_body)
-                        logger.info(f"Created namespace {namespace}")
-                    except ApiException as create_e:
-                        logger.warning(f"Failed to create namespace {namespace}: {create_e}")
-                else:
-                    logger.warning(f"Error checking namespace {namespace}: {e}")
+            # Ensure namespace exists (the only place namespaces are created)
+            ensure_namespace_exists(core_v1_api, namespace)
             
             # Only do cleanup if force_recreate is True or if we detect problematic resources
             cleanup_needed = force_recreate
@@ -809,38 +1088,7 @@ def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest
                     ssh_client.close()
                     
                     # Create PersistentVolume with node affinity
-                    pv_body = k8s_client.V1PersistentVolume(
-                        metadata=k8s_client.V1ObjectMeta(
-                            name=pv_name,
-                            labels={"type": "local", "pvname": pv_name}
-                        ),
-                        spec=k8s_client.V1PersistentVolumeSpec(
-                            storage_class_name="manual",
-                            capacity={"storage": "1Gi"},
-                            access_modes=["ReadWriteOnce"],
-                            host_path=k8s_client.V1HostPathVolumeSource(
-                                path=f"/mnt/data/user-volumes/{namespace}",
-                                type="DirectoryOrCreate"
-                            ),
-                            persistent_volume_reclaim_policy="Retain",
-                            # Pin the PV to the specific node where we created the directory
-                            node_affinity=k8s_client.V1VolumeNodeAffinity(
-                                required=k8s_client.V1NodeSelector(
-                                    node_selector_terms=[
-                                        k8s_client.V1NodeSelectorTerm(
-                                            match_expressions=[
-                                                k8s_client.V1NodeSelectorRequirement(
-                                                    key="kubernetes.io/hostname",
-                                                    operator="In",
-                                                    values=[node_name]
-                                                )
-                                            ]
-                                        )
-                                    ]
-                                )
-                            )
-                        )
-                    )
+                    pv_body = build_workspace_pv_body(namespace, node_name)
                     
                     try:
                         core_v1_api.create_persistent_volume(body=pv_body)
@@ -871,31 +1119,7 @@ def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest
                 # Create PersistentVolumeClaim
                 logger.info(f"Creating PersistentVolumeClaim {pvc_name}...")
                 
-                if create_pv:
-                    # Static PVC for hostPath
-                    pvc_body = k8s_client.V1PersistentVolumeClaim(
-                        metadata=k8s_client.V1ObjectMeta(name=pvc_name, namespace=namespace),
-                        spec=k8s_client.V1PersistentVolumeClaimSpec(
-                            storage_class_name="manual",
-                            access_modes=["ReadWriteOnce"],
-                            resources=k8s_client.V1ResourceRequirements(
-                                requests={"storage": "1Gi"}
-                            ),
-                            volume_name=pv_name
-                        )
-                    )
-                else:
-                    # Dynamic PVC for real storage class
-                    pvc_body = k8s_client.V1PersistentVolumeClaim(
-                        metadata=k8s_client.V1ObjectMeta(name=pvc_name, namespace=namespace),
-                        spec=k8s_client.V1PersistentVolumeClaimSpec(
-                            storage_class_name=storage_class,
-                            access_modes=["ReadWriteOnce"],
-                            resources=k8s_client.V1ResourceRequirements(
-                                requests={"storage": "1Gi"}
-                            )
-                        )
-                    )
+                pvc_body = build_workspace_pvc_body(namespace, storage_class)
                 
                 try:
                     core_v1_api.create_namespaced_persistent_volume_claim(
@@ -956,75 +1180,7 @@ def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest
                 # Create Deployment
                 logger.info(f"Creating Deployment {deployment_name}...")
                 
-                # Define containers
-                containers = [
-                    k8s_client.V1Container(
-                        name="dev-environment",
-                        image=image,
-                        ports=[k8s_client.V1ContainerPort(container_port=7681, name="ttyd", protocol="TCP")],
-                        env=[
-                            k8s_client.V1EnvVar(name="TTYD_USER", value="user"),
-                            k8s_client.V1EnvVar(name="TTYD_PASS", value="password")
-                        ],
-                        volume_mounts=[
-                            k8s_client.V1VolumeMount(name="user-data", mount_path="/workspace")
-                        ],
-                        resources=k8s_client.V1ResourceRequirements(
-                            limits={
-                                "memory": resource_limits.get('memory', '200Mi'),
-                                "cpu": resource_limits.get('cpu', '250m')
-                            },
-                            requests={
-                                "memory": resource_limits.get('memory_requests', '100Mi'),
-                                "cpu": resource_limits.get('cpu_requests', '100m')
-                            }
-                        )
-                    ),
-                    k8s_client.V1Container(
-                        name="filebrowser",
-                        image="filebrowser/filebrowser:latest",
-                        command=["/filebrowser"],
-                        args=["--noauth", "--address", "0.0.0.0", "--port", "8080", "--root", "/workspace"],
-                        ports=[k8s_client.V1ContainerPort(container_port=8080, name="filebrowser", protocol="TCP")],
-                        volume_mounts=[
-                            k8s_client.V1VolumeMount(name="user-data", mount_path="/workspace")
-                        ]
-                    )
-                ]
-                
-                # Define volumes
-                volumes = [
-                    k8s_client.V1Volume(
-                        name="user-data",
-                        persistent_volume_claim=k8s_client.V1PersistentVolumeClaimVolumeSource(
-                            claim_name=pvc_name
-                        )
-                    )
-                ]
-                
-                # Create deployment body
-                deployment_body = k8s_client.V1Deployment(
-                    metadata=k8s_client.V1ObjectMeta(
-                        name=deployment_name,
-                        namespace=namespace,
-                        labels={"app": namespace, "component": "workspace"}
-                    ),
-                    spec=k8s_client.V1DeploymentSpec(
-                        replicas=1,
-                        selector=k8s_client.V1LabelSelector(
-                            match_labels={"app": namespace}
-                        ),
-                        template=k8s_client.V1PodTemplateSpec(
-                            metadata=k8s_client.V1ObjectMeta(
-                                labels={"app": namespace, "component": "workspace"}
-                            ),
-                            spec=k8s_client.V1PodSpec(
-                                containers=containers,
-                                volumes=volumes
-                            )
-                        )
-                    )
-                )
+                deployment_body = build_workspace_deployment_body(namespace, image, resource_limits)
                 
                 try:
                     apps_v1_api.create_namespaced_deployment(
@@ -1038,22 +1194,7 @@ def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest
                 
                 # Create Service
                 logger.info(f"Creating Service {service_name}...")
-                service_body = k8s_client.V1Service(
-                    metadata=k8s_client.V1ObjectMeta(
-                        name=service_name,
-                        namespace=namespace,
-                        labels={"app": namespace, "component": "ttyd-service"}
-                    ),
-                    spec=k8s_client.V1ServiceSpec(
-                        type="NodePort",
-                        ports=[
-                            k8s_client.V1ServicePort(port=8080, target_port=8080, name="http"),
-                            k8s_client.V1ServicePort(port=7681, target_port=7681, name="ttyd", protocol="TCP"),
-                            k8s_client.V1ServicePort(port=8090, target_port=8080, name="filebrowser", protocol="TCP")
-                        ],
-                        selector={"app": namespace}
-                    )
-                )
+                service_body = build_workspace_service_body(namespace)
                 
                 try:
                     core_v1_api.create_namespaced_service(
@@ -1139,50 +1280,7 @@ def create_kubernetes_pod(client, namespace, image="gitpod/workspace-full:latest
                                     return False, None, {}
                                 
                                 # Get service details
-                                try:
-                                    service = core_v1_api.read_namespaced_service(
-                                        name=service_name,
-                                        namespace=namespace
-                                    )
-                                    
-                                    # Get node IP
-                                    nodes = core_v1_api.list_node()
-                                    node_ip = "localhost"
-                                    if nodes.items:
-                                        for address in nodes.items[0].status.addresses:
-                                            if address.type == "InternalIP":
-                                                node_ip = address.address
-                                                break
-                                    
-                                    # Extract port information
-                                    http_port = None
-                                    ttyd_port = None
-                                    filebrowser_port = None
-                                    
-                                    for port in service.spec.ports:
-                                        if port.name == "http":
-                                            http_port = port.node_port
-                                        elif port.name == "ttyd":
-                                            ttyd_port = port.node_port
-                                        elif port.name == "filebrowser":
-                                            filebrowser_port = port.node_port
-                                    
-                                    service_details = {
-                                        "nodePort": http_port,
-                                        "ttydPort": ttyd_port,
-                                        "nodeIP": node_ip,
-                                        "url": f"http://{node_ip}:{http_port}" if http_port else None,
-                                        "ttydUrl": f"http://{node_ip}:{ttyd_port}" if ttyd_port else None
-                                    }
-                                    
-                                    if filebrowser_port:
-                                        service_details["filebrowserPort"] = filebrowser_port
-                                        service_details["filebrowserUrl"] = f"http://{node_ip}:{filebrowser_port}"
-                                    
-                                    logger.info(f"Service details: {service_details}")
-                                    
-                                except ApiException as e:
-                                    logger.warning(f"Error getting service details: {e}")
+                                service_details = read_workspace_service_details(core_v1_api, namespace)
                                 
                                 return True, actual_pod_name, service_details
                             
@@ -1620,128 +1718,151 @@ def manage_kubernetes_pod(project_id=None, conversation_id=None, image="gitpod/w
             return False, None, f"Error: {str(e)}"
 
 
-def execute_command_in_pod(project_id=None, conversation_id=None, command=None):
+def _resolve_exec_target(project_id=None, conversation_id=None):
     """
-    Execute a command in a Kubernetes pod.
+    Find the running pod to exec into for a project/conversation.
+
+    Returns:
+        tuple: (core_v1_api, namespace, pod_name, error) - error is None on success
+    """
+    if not (project_id or conversation_id):
+        logger.error("Either project_id or conversation_id must be provided")
+        return None, None, None, "Either project_id or conversation_id must be provided"
+
+    # Get pod details from database
+    pod = None
+    if project_id:
+        pod = KubernetesPod.objects.filter(project_id=project_id).first()
+    elif conversation_id:
+        pod = KubernetesPod.objects.filter(conversation_id=conversation_id).first()
+
+    if not pod:
+        logger.error(f"No pod found for project_id={project_id} or conversation_id={conversation_id}")
+        return None, None, None, "No pod found. You need to create a pod first."
+
+    # Get Kubernetes API client
+    api_client, core_v1_api, apps_v1_api = get_k8s_api_client()
+    if not core_v1_api:
+        logger.error("Failed to get Kubernetes API client")
+        return None, None, None, "Failed to connect to Kubernetes API"
+
+    # Pod state comes from the informer cache (no API round trip);
+    # fall back to a direct read if the cache has nothing usable yet
+    exists, running, cached_pod = get_pod_informer().pod_status(pod.namespace)
+    if exists and running:
+        found_pod_name = cached_pod.name
+    else:
+        exists, running, pod_details = check_pod_status(api_client, pod.namespace)
+        found_pod_name = pod_details.metadata.name if exists and pod_details else None
+
+    # If we found a pod but it's not the one in our database, update our record
+    actual_pod_name = pod.pod_name
+    if exists and found_pod_name:
+        if found_pod_name != pod.pod_name:
+            logger.info(f"Found different pod name in K8s ({found_pod_name}) than in database ({pod.pod_name})")
+            actual_pod_name = found_pod_name
+
+            # Update database record with actual pod name
+            pod.pod_name = actual_pod_name
+            pod.save(update_fields=['pod_name'])
+            logger.info(f"Updated pod name in database to {actual_pod_name}")
+
+    if not exists:
+        logger.error(f"No pod found in namespace {pod.namespace}")
+        return None, None, None, f"No pod found in namespace {pod.namespace}"
+
+    if not running:
+        logger.error(f"Pod exists in namespace {pod.namespace} but is not running")
+        return None, None, None, f"Pod exists in namespace {pod.namespace} but is not running"
+
+    return core_v1_api, pod.namespace, actual_pod_name, None
+
+
+def run_command_in_pod(project_id=None, conversation_id=None, command=None, timeout=600, output_callback=None):
+    """
+    Execute a command in a Kubernetes pod and return the full result.
     
     Args:
         project_id (str): Project ID (optional)
         conversation_id (str): Conversation ID (optional)
         command (str): Command to execute
+        timeout (int): Seconds before the command is abandoned
+        output_callback (callable): Optional callable(kind, text) for live output
         
     Returns:
-        tuple: (success, stdout, stderr)
+        ExecResult: exit_code (real, from the K8s status channel), stdout, stderr
     """
-    if not (project_id or conversation_id):
-        logger.error("Either project_id or conversation_id must be provided")
-        return False, "", "Either project_id or conversation_id must be provided"
-    
     if not command:
         logger.error("Command must be provided")
-        return False, "", "Command must be provided"
+        return ExecResult(exit_code=-1, stdout="", stderr="Command must be provided", error="Command must be provided")
     
     try:
-        # Get pod details from database
-        pod = None
-        if project_id:
-            pod = KubernetesPod.objects.filter(project_id=project_id).first()
-        elif conversation_id:
-            pod = KubernetesPod.objects.filter(conversation_id=conversation_id).first()
-        
-        if not pod:
-            logger.error(f"No pod found for project_id={project_id} or conversation_id={conversation_id}")
-            return False, "", "No pod found. You need to create a pod first."
+        core_v1_api, namespace, pod_name, error = _resolve_exec_target(project_id, conversation_id)
+        if error:
+            return ExecResult(exit_code=-1, stdout="", stderr=error, error=error)
+        
+        # Execute command in pod using the actual pod name (from K8s)
+        logger.info(f"Executing command in pod {pod_name}: {command}")
+        result = exec_in_pod(
+            core_v1_api, pod_name, namespace, command,
+            timeout=timeout, output_callback=output_callback,
+        )
         
-        # Get Kubernetes API client
-        api_client, core_v1_api, apps_v1_api = get_k8s_api_client()
-        if not core_v1_api:
-            logger.error("Failed to get Kubernetes API client")
-            return False, "", "Failed to connect to Kubernetes API"
+        logger.info(f"Command execution completed. exit_code={result.exit_code} truncated={result.truncated}")
+        if result.stdout:
+            logger.debug(f"STDOUT: {result.stdout[:500]}...")  # Log first 500 chars
+        if result.stderr:
+            logger.debug(f"STDERR: {result.stderr[:500]}...")  # Log first 500 chars
+        return result
         
-        try:
-            # Check if pod is running - but don't specify pod name to get any pod with app label
-            exists, running, pod_details = check_pod_status(api_client, pod.namespace)
-            
-            # If we found a pod but it's not the one in our database, update our record
-            actual_pod_name = pod.pod_name
-            if exists and pod_details:
-                found_pod_name = pod_details.metadata.name
-                if found_pod_name and found_pod_name != pod.pod_name:
-                    logger.info(f"Found different pod name in K8s ({found_pod_name}) than in database ({pod.pod_name})")
-                    actual_pod_name = found_pod_name
-                    
-                    # Update database record with actual pod name
-                    pod.pod_name = actual_pod_name
-                    pod.save(update_fields=['pod_name'])
-                    logger.info(f"Updated pod name in database to {actual_pod_name}")
-            
-            if not exists:
-                logger.error(f"No pod found in namespace {pod.namespace}")
-                return False, "", f"No pod found in namespace {pod.namespace}"
-            
-            if not running:
-                logger.error(f"Pod exists in namespace {pod.namespace} but is not running")
-                return False, "", f"Pod exists in namespace {pod.namespace} but is not running"
-            
-            # Execute command in pod using the actual pod name (from K8s)
-            logger.info(f"Executing command in pod {actual_pod_name}: {command}")
-            
-            try:
-                # Use the Kubernetes stream API to execute the command
-                resp = stream(
-                    core_v1_api.connect_get_namespaced_pod_exec,
-                    actual_pod_name,
-                    pod.namespace,
-                    command=['/bin/sh', '-c', command],
-                    container='dev-environment',  # Default to dev-environment container
-                    stderr=True,
-                    stdin=False,
-                    stdout=True,
-                    tty=False,
-                    _preload_content=False
-                )
-                
-                # Read the output
-                stdout_data = ""
-                stderr_data = ""
-                
-                while resp.is_open():
-                    resp.update(timeout=1)
-                    if resp.peek_stdout():
-                        stdout_data += resp.read_stdout()
-                    if resp.peek_stderr():
-                        stderr_data += resp.read_stderr()
-                
-                resp.close()
-                
-                # Check if command was successful (no way to get exit code with current approach)
-                # We'll consider it successful if we got output and no stderr indicating failure
-                success = True
-                if stderr_data and any(error_word in stderr_data.lower() for error_word in ['error', 'failed', 'not found', 'permission denied']):
-                    success = False
-                
-                logger.info(f"Command execution completed. Success: {success}")
-                if stdout_data:
-                    logger.debug(f"STDOUT: {stdout_data[:500]}...")  # Log first 500 chars
-                if stderr_data:
-                    logger.debug(f"STDERR: {stderr_data[:500]}...")  # Log first 500 chars
-                
-                return success, stdout_data, stderr_data
-                
-            except ApiException as e:
-                logger.error(f"Kubernetes API error executing command: {e}")
-                return False, "", f"Kubernetes API error: {str(e)}"
-            except Exception as e:
-                logger.error(f"Error executing command in pod: {e}")
-                return False, "", f"Error executing command: {str(e)}"
-            
-        except Exception as e:
-            logger.error(f"Error in command execution setup: {str(e)}")
-            return False, "", f"Error: {str(e)}"
-            
+    except ApiException as e:
+        logger.error(f"Kubernetes API error executing command: {e}")
+        return ExecResult(exit_code=-1, stdout="", stderr=f"Kubernetes API error: {str(e)}", error=str(e))
     except Exception as e:
         logger.error(f"Error executing command in pod: {str(e)}")
-        return False, "", f"Error: {str(e)}"
+        return ExecResult(exit_code=-1, stdout="", stderr=f"Error executing command: {str(e)}", error=str(e))
+
+
+def execute_command_in_pod(project_id=None, conversation_id=None, command=None):
+    """
+    Execute a command in a Kubernetes pod.
+    
+    Args:
+        project_id (str): Project ID (optional)
+        conversation_id (str): Conversation ID (optional)
+        command (str): Command to execute
+        
+    Returns:
+        tuple: (success, stdout, stderr) - success means exit code 0
+    """
+    result = run_command_in_pod(project_id, conversation_id, command)
+    return result.success, result.stdout, result.stderr
+
+
+async def stream_command_in_pod(project_id=None, conversation_id=None, command=None, timeout=600):
+    """
+    Async streaming variant of run_command_in_pod.
+    
+    Yields ('stdout' | 'stderr', text) chunks as they arrive, then a final
+    ('exit', ExecResult).
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    core_v1_api, namespace, pod_name, error = await loop.run_in_executor(
+        None, _resolve_exec_target, project_id, conversation_id
+    )
+    if error:
+        yield 'exit', ExecResult(exit_code=-1, stdout="", stderr=error, error=error)
+        return
+    
+    logger.info(f"Streaming command in pod {pod_name}: {command}")
+    try:
+        async for item in stream_exec_in_pod(core_v1_api, pod_name, namespace, command, timeout=timeout):
+            yield item
+    except Exception as e:
+        logger.error(f"Error streaming command in pod: {str(e)}")
+        yield 'exit', ExecResult(exit_code=-1, stdout="", stderr=f"Error executing command: {str(e)}", error=str(e))
 
 
 def get_ssh_client_for_project(project_id):
@@ -2580,6 +2701,30 @@ def test_workspace_mount(project_id=None, conversation_id=None):
         return False, {}, f"Error: {str(e)}"
 
 
+def port_mapping_specs(service_details):
+    """
+    (container_name, container_port, defaults) for each exposed workspace port.
+
+    Ports missing from service_details are skipped.
+    """
+    specs = []
+    if service_details.get('ttydPort'):
+        specs.append(('ttyd', 7681, {
+            'service_port': 7681,
+            'node_port': service_details.get('ttydPort'),
+            'protocol': 'TCP',
+            'description': 'Terminal access via ttyd'
+        }))
+    if service_details.get('filebrowserPort'):
+        specs.append(('filebrowser', 8080, {
+            'service_port': 8090,
+            'node_port': service_details.get('filebrowserPort'),
+            'protocol': 'TCP',
+            'description': 'File browser for workspace'
+        }))
+    return specs
+
+
 def create_port_mappings(pod, service_details, service_name=None):
     """
     Create port mapping records for a pod.
@@ -2593,32 +2738,11 @@ def create_port_mappings(pod, service_details, service_name=None):
     if service_name is None and pod and pod.namespace:
         service_name = f"{pod.namespace}-service"
     
-    # Create port mapping for ttyd
-    if service_details.get('ttydPort'):
-        KubernetesPortMapping.objects.update_or_create(
-            pod=pod,
-            container_name='ttyd',
-            container_port=7681,
-            defaults={
-                'service_port': 7681,
-                'node_port': service_details.get('ttydPort'),
-                'protocol': 'TCP',
-                'service_name': service_name,
-                'description': 'Terminal access via ttyd'
-            }
-        )
-    
-    # Create port mapping for filebrowser
-    if service_details.get('filebrowserPort'):
+    # Create port mappings for ttyd and filebrowser
+    for container_name, container_port, defaults in port_mapping_specs(service_details):
         KubernetesPortMapping.objects.update_or_create(
             pod=pod,
-            container_name='filebrowser',
-            container_port=8080,
-            defaults={
-                'service_port': 8090,
-                'node_port': service_details.get('filebrowserPort'),
-                'protocol': 'TCP',
-                'service_name': service_name,
-                'description': 'File browser for workspace'
-            }
+            container_name=container_name,
+            container_port=container_port,
+            defaults={**defaults, 'service_name': service_name}
         )
\ No newline at end of file
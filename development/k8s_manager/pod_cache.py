@@ -0,0 +1,244 @@
+"""
+Informer-style cache of pod state per namespace.
+
+A watch thread per namespace keeps pod names, phases and readiness in
+memory so the command-execution hot path can pick its target pod without
+extra API calls. A namespace is listed once, then kept current by a
+Kubernetes watch (re-listing on 410 Gone or errors). Watches for
+namespaces that nobody has asked about for `idle_timeout` seconds stop
+on their own.
+
+Usage:
+    from development.k8s_manager.pod_cache import get_pod_informer
+
+    exists, running, pod = get_pod_informer().pod_status(namespace)
+    if running:
+        exec_in(pod.name)
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedPod:
+    """The parts of a V1Pod the exec path needs."""
+    name: str
+    phase: str
+    ready: bool
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def running(self) -> bool:
+        return (self.phase or '').lower() == 'running' and self.ready
+
+    @classmethod
+    def from_v1_pod(cls, pod) -> 'CachedPod':
+        statuses = (pod.status.container_statuses or []) if pod.status else []
+        return cls(
+            name=pod.metadata.name,
+            phase=(pod.status.phase if pod.status else None) or 'Unknown',
+            ready=all(c.ready for c in statuses),
+            labels=dict(pod.metadata.labels or {}),
+        )
+
+
+def select_pod(pods, namespace: str, pod_name: str = None):
+    """
+    Pick the pod to use from a namespace's pods.
+
+    Priority: the requested pod name, then a pod labelled app=<namespace>,
+    then any pod. Works on V1Pod and CachedPod objects alike.
+    """
+    def _name(p):
+        return p.name if isinstance(p, CachedPod) else p.metadata.name
+
+    def _labels(p):
+        return p.labels if isinstance(p, CachedPod) else (p.metadata.labels or {})
+
+    pods = list(pods)
+    if not pods:
+        return None
+    if pod_name:
+        specific = next((p for p in pods if _name(p) == pod_name), None)
+        if specific is not None:
+            return specific
+    labeled = [p for p in pods if _labels(p).get('app') == namespace]
+    if labeled:
+        return labeled[0]
+    return pods[0]
+
+
+class _NamespaceWatch:
+    """List + watch loop for one namespace."""
+
+    def __init__(self, informer: 'PodInformer', namespace: str):
+        self.informer = informer
+        self.namespace = namespace
+        self.pods: Dict[str, CachedPod] = {}
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.last_access = time.monotonic()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name=f'pod-informer-{namespace}', daemon=True
+        )
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self.last_access > self.informer.idle_timeout
+
+    def _list(self, core_v1_api) -> str:
+        pod_list = core_v1_api.list_namespaced_pod(namespace=self.namespace)
+        pods = {p.metadata.name: CachedPod.from_v1_pod(p) for p in pod_list.items}
+        with self.lock:
+            self.pods = pods
+        self.synced.set()
+        return pod_list.metadata.resource_version
+
+    def _apply(self, event_type: str, pod):
+        name = pod.metadata.name
+        with self.lock:
+            if event_type == 'DELETED' or pod.metadata.deletion_timestamp:
+                self.pods.pop(name, None)
+            else:
+                self.pods[name] = CachedPod.from_v1_pod(pod)
+
+    def _run(self):
+        from development.k8s_manager.manage_pods import get_k8s_api_client
+
+        backoff = 1.0
+        try:
+            while not self.stopped.is_set() and not self._idle():
+                _, core_v1_api, _ = get_k8s_api_client()
+                if not core_v1_api:
+                    self.stopped.wait(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                try:
+                    resource_version = self._list(core_v1_api)
+                    backoff = 1.0
+                    w = watch.Watch()
+                    for event in w.stream(
+                        core_v1_api.list_namespaced_pod,
+                        namespace=self.namespace,
+                        resource_version=resource_version,
+                        timeout_seconds=self.informer.watch_timeout,
+                    ):
+                        if event.get('type') == 'ERROR':
+                            # Typically 410 Gone: fall through to a fresh list
+                            break
+                        self._apply(event['type'], event['object'])
+                        if self.stopped.is_set() or self._idle():
+                            w.stop()
+                            break
+                except ApiException as e:
+                    if e.status == 404:
+                        # Namespace gone (or not provisioned yet)
+                        with self.lock:
+                            self.pods = {}
+                        self.synced.set()
+                    elif e.status != 410:
+                        logger.warning(f"[POD_CACHE] Watch error in {self.namespace}: {e.status} {e.reason}")
+                    self.stopped.wait(backoff)
+                    backoff = min(backoff * 2, 30)
+                except Exception as e:
+                    logger.warning(f"[POD_CACHE] Watch failed in {self.namespace}: {e}")
+                    self.synced.clear()
+                    self.stopped.wait(backoff)
+                    backoff = min(backoff * 2, 30)
+        finally:
+            self.synced.clear()
+            self.informer._remove(self)
+            logger.info(f"[POD_CACHE] Stopped watching namespace {self.namespace}")
+
+
+class PodInformer:
+    """Process-wide pod cache with one lazily started watch per namespace."""
+
+    def __init__(self, idle_timeout: float = 600, watch_timeout: int = 300, sync_timeout: float = 3.0):
+        self.idle_timeout = idle_timeout
+        self.watch_timeout = watch_timeout
+        self.sync_timeout = sync_timeout
+        self._watches: Dict[str, _NamespaceWatch] = {}
+        self._lock = threading.Lock()
+
+    def _watch_for(self, namespace: str) -> _NamespaceWatch:
+        with self._lock:
+            ns_watch = self._watches.get(namespace)
+            if ns_watch is None or ns_watch.stopped.is_set():
+                ns_watch = _NamespaceWatch(self, namespace)
+                self._watches[namespace] = ns_watch
+                ns_watch.thread.start()
+                logger.info(f"[POD_CACHE] Watching pods in namespace {namespace}")
+        ns_watch.touch()
+        return ns_watch
+
+    def _remove(self, ns_watch: _NamespaceWatch):
+        ns_watch.stopped.set()
+        with self._lock:
+            if self._watches.get(ns_watch.namespace) is ns_watch:
+                del self._watches[ns_watch.namespace]
+
+    def pod_status(self, namespace: str, pod_name: str = None) -> Tuple[bool, bool, Optional[CachedPod]]:
+        """
+        Return (exists, running, pod) from the cache.
+
+        Returns (False, False, None) when the namespace cache has not synced
+        within sync_timeout, or holds no pods; callers should then fall back
+        to a direct API read.
+        """
+        ns_watch = self._watch_for(namespace)
+        if not ns_watch.synced.wait(self.sync_timeout):
+            return False, False, None
+        with ns_watch.lock:
+            pod = select_pod(ns_watch.pods.values(), namespace, pod_name)
+        if pod is None:
+            return False, False, None
+        return True, pod.running, pod
+
+    def invalidate(self, namespace: str):
+        """Stop the namespace watch; the next lookup re-lists."""
+        with self._lock:
+            ns_watch = self._watches.pop(namespace, None)
+        if ns_watch:
+            ns_watch.stopped.set()
+
+    def stop_all(self):
+        with self._lock:
+            watches = list(self._watches.values())
+            self._watches.clear()
+        for ns_watch in watches:
+            ns_watch.stopped.set()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'namespaces': len(self._watches),
+                'synced': sum(1 for w in self._watches.values() if w.synced.is_set()),
+                'pods': sum(len(w.pods) for w in self._watches.values()),
+            }
+
+
+_pod_informer: Optional[PodInformer] = None
+_pod_informer_lock = threading.Lock()
+
+
+def get_pod_informer() -> PodInformer:
+    """Get the process-wide pod informer."""
+    global _pod_informer
+    if _pod_informer is None:
+        with _pod_informer_lock:
+            if _pod_informer is None:
+                _pod_informer = PodInformer()
+    return _pod_informer
@@ -0,0 +1,233 @@
+"""
+Exec engine for commands run inside Kubernetes pods.
+
+Reads the exec websocket's channels as frames arrive (select-driven, no
+fixed polling delay) into bounded head/tail buffers. Huge outputs keep
+their beginning and end with a truncation note in the middle. The command's
+real exit status is read from the Kubernetes status channel (channel 3)
+instead of guessing from stderr text.
+
+Usage:
+    from development.k8s_manager.pod_exec import exec_in_pod, stream_exec_in_pod
+
+    result = exec_in_pod(core_v1_api, pod_name, namespace, "npm test")
+    result.exit_code, result.stdout, result.stderr
+
+    async for kind, data in stream_exec_in_pod(core_v1_api, pod_name, namespace, "npm test"):
+        if kind in ('stdout', 'stderr'):
+            await push(data)
+        else:  # 'exit'
+            result = data
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from kubernetes.stream import stream
+
+from factory.claude_stream import BoundedText
+
+logger = logging.getLogger(__name__)
+
+# Kubernetes exec websocket channels
+STDOUT_CHANNEL = 1
+STDERR_CHANNEL = 2
+ERROR_CHANNEL = 3
+
+DEFAULT_CONTAINER = 'dev-environment'
+
+# Retained output per stream (head + tail)
+HEAD_CHARS = 64 * 1024
+TAIL_CHARS = 192 * 1024
+
+# Chunks buffered between the exec thread and a streaming consumer; when
+# full, the exec thread waits (and stops reading the websocket)
+STREAM_QUEUE_SIZE = 256
+
+# Fallback when the API server sends no status frame (very old clusters)
+_ERROR_WORDS = ('error', 'failed', 'not found', 'permission denied')
+
+
+@dataclass
+class ExecResult:
+    """Outcome of a command run in a pod."""
+    exit_code: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    truncated: bool = False
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.exit_code == 0
+
+
+def parse_exit_status(raw: str) -> Optional[int]:
+    """
+    Exit code from a status-channel payload.
+
+    Success -> 0; NonZeroExitCode -> the code in details.causes; any other
+    failure -> -1. Returns None if there was no status frame.
+    """
+    if not raw:
+        return None
+    try:
+        status = json.loads(raw)
+    except ValueError:
+        logger.debug(f"[POD_EXEC] Unparseable status frame: {raw[:200]}")
+        return -1
+    if status.get('status') == 'Success':
+        return 0
+    for cause in (status.get('details') or {}).get('causes') or []:
+        if cause.get('reason') == 'ExitCode':
+            try:
+                return int(cause.get('message'))
+            except (TypeError, ValueError):
+                break
+    return -1
+
+
+def exec_in_pod(
+    core_v1_api,
+    pod_name: str,
+    namespace: str,
+    command: str,
+    container: str = DEFAULT_CONTAINER,
+    timeout: float = 600,
+    output_callback: Callable[[str, str], None] = None,
+    head_chars: int = HEAD_CHARS,
+    tail_chars: int = TAIL_CHARS,
+) -> ExecResult:
+    """
+    Run `command` with /bin/sh -c in a pod and wait for it to finish.
+
+    Args:
+        output_callback: Optional callable(kind, text) invoked from this
+                         thread for every chunk; kind is 'stdout' or 'stderr'
+        timeout: Seconds before the exec stream is closed (exit_code -1)
+    """
+    stdout_buf = BoundedText(head_chars, tail_chars)
+    stderr_buf = BoundedText(head_chars, tail_chars)
+    status_raw = ''
+    timed_out = False
+
+    resp = stream(
+        core_v1_api.connect_get_namespaced_pod_exec,
+        pod_name,
+        namespace,
+        command=['/bin/sh', '-c', command],
+        container=container,
+        stderr=True,
+        stdin=False,
+        stdout=True,
+        tty=False,
+        _preload_content=False,
+    )
+
+    def _drain():
+        nonlocal status_raw
+        for channel, buf, kind in ((STDOUT_CHANNEL, stdout_buf, 'stdout'), (STDERR_CHANNEL, stderr_buf, 'stderr')):
+            if resp.peek_channel(channel):
+                chunk = resp.read_channel(channel)
+                buf.append(chunk)
+                if output_callback and chunk:
+                    try:
+                        output_callback(kind, chunk)
+                    except Exception as e:
+                        logger.warning(f"[POD_EXEC] Output callback error: {e}")
+        if resp.peek_channel(ERROR_CHANNEL):
+            status_raw += resp.read_channel(ERROR_CHANNEL)
+
+    deadline = time.monotonic() + timeout
+    try:
+        while resp.is_open():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                logger.warning(f"[POD_EXEC] Command timed out after {timeout}s in {namespace}/{pod_name}")
+                break
+            # Blocks in select() until a frame arrives (or the slice elapses)
+            resp.update(timeout=min(remaining, 5))
+            _drain()
+        _drain()
+    finally:
+        resp.close()
+
+    exit_code = parse_exit_status(status_raw)
+    stderr_text = stderr_buf.getvalue()
+    if timed_out:
+        exit_code = -1
+    elif exit_code is None:
+        lowered = stderr_text.lower()
+        exit_code = 1 if stderr_text and any(w in lowered for w in _ERROR_WORDS) else 0
+
+    return ExecResult(
+        exit_code=exit_code,
+        stdout=stdout_buf.getvalue(),
+        stderr=stderr_text,
+        timed_out=timed_out,
+        truncated=bool(stdout_buf.dropped_chars or stderr_buf.dropped_chars),
+        error=f"Timed out after {timeout}s" if timed_out else None,
+    )
+
+
+async def stream_exec_in_pod(
+    core_v1_api,
+    pod_name: str,
+    namespace: str,
+    command: str,
+    container: str = DEFAULT_CONTAINER,
+    timeout: float = 600,
+) -> AsyncIterator[Tuple[str, object]]:
+    """
+    Async variant of exec_in_pod that yields output as it arrives.
+
+    Yields ('stdout', text) / ('stderr', text) chunks, then a final
+    ('exit', ExecResult). The blocking websocket read runs in a worker
+    thread and hands chunks to the event loop through a bounded queue: a
+    slow consumer makes the worker wait instead of buffering without limit.
+    If the consumer stops early, remaining chunks are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    consumer_gone = threading.Event()
+
+    def _on_output(kind, text):
+        # Worker thread: block until the loop has room for the chunk
+        if consumer_gone.is_set():
+            return
+        put = asyncio.run_coroutine_threadsafe(queue.put((kind, text)), loop)
+        while True:
+            try:
+                put.result(timeout=1)
+                return
+            except concurrent.futures.TimeoutError:
+                if consumer_gone.is_set():
+                    put.cancel()
+                    return
+
+    future = loop.run_in_executor(None, functools.partial(
+        exec_in_pod, core_v1_api, pod_name, namespace, command,
+        container=container, timeout=timeout, output_callback=_on_output,
+    ))
+    # Every chunk was queued before the worker returned, so the sentinel comes last
+    future.add_done_callback(lambda _: loop.create_task(queue.put(None)))
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        consumer_gone.set()
+
+    yield 'exit', await future
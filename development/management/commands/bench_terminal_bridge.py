@@ -0,0 +1,203 @@
+"""
+Django management command to benchmark the terminal bridge.
+
+Simulates N open terminals on one event loop. Each terminal is a pipe-backed
+fake SSH channel fed by a writer thread at a fixed output rate, bridged to
+a no-op WebSocket send. Reports event-loop lag and CPU per terminal, and
+the largest terminal count that stays within the lag budget.
+
+Usage:
+    python manage.py bench_terminal_bridge
+
+Options:
+    --terminals: Comma-separated terminal counts to try (default: 50,100,200,400,800)
+    --duration: Seconds per run (default: 5)
+    --rate: Output bytes per second per terminal (default: 20000)
+    --chunk: Bytes per write (default: 512)
+    --lag-budget-ms: p99 event-loop lag allowed (default: 50)
+    --binary: Send binary frames (skips decoding and filtering)
+
+Examples:
+    # Busy terminals (e.g. builds streaming logs)
+    python manage.py bench_terminal_bridge --rate 100000 --chunk 4096
+"""
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from development.terminal_bridge import TerminalBridge, TerminalOutputFilter, attach_ssh_channel
+
+
+class PipeChannel:
+    """The subset of paramiko.Channel the bridge uses, backed by a pipe."""
+
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        os.set_blocking(self._write_fd, False)
+        self._pending = b''
+        self.closed = False
+        self.eof_received = False
+
+    def fileno(self):
+        return self._read_fd
+
+    def recv_ready(self):
+        if not self._pending and not self.eof_received:
+            try:
+                self._pending = os.read(self._read_fd, 65536)
+            except BlockingIOError:
+                return False
+            if not self._pending:
+                self.eof_received = True
+        return bool(self._pending)
+
+    def recv(self, size):
+        self.recv_ready()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def recv_stderr_ready(self):
+        return False
+
+    def write(self, data):
+        os.write(self._write_fd, data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self._write_fd)
+
+    def release(self):
+        os.close(self._read_fd)
+
+
+def _writer(channels, rate, chunk, stop):
+    """Feed every channel `rate` bytes/s in `chunk`-sized writes."""
+    line = b'npm WARN deprecated package@1.0.0: \x1b[33mupgrade\x1b[0m\r\n'
+    interval = chunk / rate
+    next_tick = time.monotonic()
+    seq = 0
+    while not stop.is_set():
+        # Vary the output so the text filter's duplicate suppression doesn't skip it
+        seq += 1
+        payload = (b'%d ' % seq + line * (chunk // len(line) + 1))[:chunk]
+        for channel in channels:
+            try:
+                channel.write(payload)
+            except (BlockingIOError, OSError):
+                pass  # pipe full: the loop is falling behind
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+async def _run(terminals, duration, rate, chunk, binary):
+    channels = [PipeChannel() for _ in range(terminals)]
+    frames = 0
+
+    async def send(_data):
+        nonlocal frames
+        frames += 1
+
+    bridges, detaches, tasks = [], [], []
+    for channel in channels:
+        bridge = TerminalBridge(
+            send_text=send,
+            send_bytes=send,
+            binary=binary,
+            output_filter=TerminalOutputFilter(drop_literals=('Terminal Ready',)),
+        )
+        bridges.append(bridge)
+        detaches.append(attach_ssh_channel(bridge, channel))
+        tasks.append(asyncio.create_task(bridge.run()))
+
+    lags = []
+
+    async def measure_lag():
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(0.01)
+            lags.append(time.monotonic() - start - 0.01)
+
+    lag_task = asyncio.create_task(measure_lag())
+    stop = threading.Event()
+    writer = threading.Thread(target=_writer, args=(channels, rate, chunk, stop), daemon=True)
+
+    cpu_start = time.process_time()
+    writer.start()
+    await asyncio.sleep(duration)
+    stop.set()
+    writer.join()
+    cpu = time.process_time() - cpu_start
+
+    lag_task.cancel()
+    for channel in channels:
+        channel.close()
+    await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=10)
+    for detach, channel in zip(detaches, channels):
+        detach()
+        channel.release()
+
+    lags.sort()
+    return {
+        'terminals': terminals,
+        'bytes': sum(b.bytes_in for b in bridges),
+        'frames': frames,
+        'lag_p50_ms': statistics.median(lags) * 1000 if lags else 0.0,
+        'lag_p99_ms': lags[int(len(lags) * 0.99) - 1] * 1000 if lags else 0.0,
+        'cpu_ms_per_terminal_s': cpu * 1000 / terminals / duration,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark how many terminals one worker event loop can bridge'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminals', type=str, default='50,100,200,400,800',
+                            help='Comma-separated terminal counts to try')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per run')
+        parser.add_argument('--rate', type=int, default=20000, help='Output bytes/s per terminal')
+        parser.add_argument('--chunk', type=int, default=512, help='Bytes per write')
+        parser.add_argument('--lag-budget-ms', type=float, default=50, help='p99 event-loop lag allowed')
+        parser.add_argument('--binary', action='store_true', help='Send binary frames')
+
+    def handle(self, *args, **options):
+        counts = [int(c) for c in options['terminals'].split(',') if c.strip()]
+        budget = options['lag_budget_ms']
+        best = 0
+
+        self.stdout.write(
+            f"{'terminals':>9} {'MB/s':>8} {'frames/s':>9} {'lag p50':>8} {'lag p99':>8} {'cpu ms/term/s':>14}"
+        )
+        for count in counts:
+            result = asyncio.run(_run(
+                count, options['duration'], options['rate'], options['chunk'], options['binary'],
+            ))
+            duration = options['duration']
+            self.stdout.write(
+                f"{result['terminals']:>9} "
+                f"{result['bytes'] / duration / 1e6:>8.2f} "
+                f"{result['frames'] / duration:>9.0f} "
+                f"{result['lag_p50_ms']:>7.1f}ms "
+                f"{result['lag_p99_ms']:>7.1f}ms "
+                f"{result['cpu_ms_per_terminal_s']:>14.2f}"
+            )
+            if result['lag_p99_ms'] <= budget:
+                best = count
+            else:
+                break
+
+        if best:
+            self.stdout.write(self.style.SUCCESS(
+                f"Terminals per worker within {budget:.0f}ms p99 lag: >= {best}"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Even {counts[0]} terminals exceeded the {budget:.0f}ms p99 lag budget"
+            ))
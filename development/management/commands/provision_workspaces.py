@@ -0,0 +1,60 @@
+"""
+Django management command to provision Kubernetes workspaces in bulk.
+
+Creates (or adopts) the workspace for each given project or conversation
+concurrently and waits until all of them are running.
+
+Usage:
+    python manage.py provision_workspaces --projects <id> <id> ...
+
+Options:
+    --projects: Project ids to provision
+    --conversations: Conversation ids to provision
+    --parallel: Workspaces created at once (default: 8)
+    --timeout: Seconds to wait for pods to become ready (default: 300)
+    --skip-mount-check: Don't verify the /workspace mount in new pods
+
+Examples:
+    # Re-provision every workspace that was on a failed node
+    python manage.py provision_workspaces --projects 12 15 31 --parallel 16
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from development.k8s_manager.batch_provision import MAX_PARALLEL, READY_TIMEOUT, ProvisionTarget, provision_pods
+
+
+class Command(BaseCommand):
+    help = 'Provision Kubernetes workspaces for many projects or conversations at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', nargs='*', default=[], help='Project ids to provision')
+        parser.add_argument('--conversations', nargs='*', default=[], help='Conversation ids to provision')
+        parser.add_argument('--parallel', type=int, default=MAX_PARALLEL, help='Workspaces created at once')
+        parser.add_argument('--timeout', type=float, default=READY_TIMEOUT, help='Seconds to wait for readiness')
+        parser.add_argument('--skip-mount-check', action='store_true', help='Skip the /workspace mount check')
+
+    def handle(self, *args, **options):
+        targets = [ProvisionTarget(project_id=p) for p in options['projects']]
+        targets += [ProvisionTarget(conversation_id=c) for c in options['conversations']]
+        if not targets:
+            raise CommandError('Pass --projects and/or --conversations')
+
+        results = provision_pods(
+            targets,
+            max_parallel=options['parallel'],
+            ready_timeout=options['timeout'],
+            verify_mount=not options['skip_mount_check'],
+        )
+
+        for result in results:
+            if result.success:
+                state = 'created' if result.created else 'running'
+                url = result.service_details.get('ttydUrl') or ''
+                self.stdout.write(self.style.SUCCESS(f"{result.namespace}: {state} {result.pod_name} {url}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{result.namespace}: {result.error}"))
+
+        failed = sum(1 for r in results if not r.success)
+        self.stdout.write(f"{len(results) - failed}/{len(results)} workspaces ready")
+        if failed:
+            raise CommandError(f"{failed} workspaces failed to provision")
@@ -0,0 +1,268 @@
+"""
+Terminal Bridge
+
+Moves terminal output from an SSH shell channel or a Kubernetes exec
+websocket to a browser WebSocket without polling.
+
+- SSH: the paramiko channel's fileno() is registered with the event loop
+  (loop.add_reader), so the loop only wakes when bytes are buffered. On
+  platforms where that is unavailable, a dedicated reader thread is used.
+- K8s: a receive task awaits the exec websocket directly.
+
+Both producers push into an asyncio.Queue. The pump drains everything
+queued at each wakeup and emits it as one WebSocket frame, so a burst
+such as `cat bigfile` becomes a few large frames instead of thousands
+of 4 KB ones. Frames go out as binary (raw bytes, for xterm.js) or as
+text (UTF-8 decoded incrementally, optionally passed through a
+precompiled control-sequence filter).
+
+Usage:
+    from development.terminal_bridge import TerminalBridge, TerminalOutputFilter, attach_ssh_channel
+
+    bridge = TerminalBridge(send_text, send_bytes, binary=False, output_filter=TerminalOutputFilter())
+    detach = attach_ssh_channel(bridge, shell_channel)
+    try:
+        await bridge.run()   # returns when the channel closes
+    finally:
+        detach()
+"""
+
+import asyncio
+import codecs
+import logging
+import re
+import socket
+import threading
+from typing import Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 32 * 1024
+MAX_FRAME_BYTES = 64 * 1024
+
+# Escape sequences (and their bare "[?2004h" remnants) plus the pod prompt
+CONTROL_SEQUENCE_PATTERN = r'\x1b\[[0-9;?]*[a-zA-Z]|\[[\?0-9]*[a-zA-Z]'
+PROMPT_PATTERN = r'gitpod\s+/workspace\s+\$\s*'
+_LEADING_BLANK_RE = re.compile(r'^\s*\n')
+
+# K8s exec websocket channels
+K8S_STDOUT = 1
+K8S_STDERR = 2
+K8S_ERROR = 3
+
+
+class TerminalOutputFilter:
+    """
+    Cleans shell output for the plain-text terminal view.
+
+    All patterns are compiled once into a single alternation, so each frame
+    costs one substitution pass plus a leading-blank-line strip.
+    """
+
+    def __init__(self, drop_literals: Iterable[str] = (), strip_prompts: bool = True, dedupe: bool = True):
+        patterns = [CONTROL_SEQUENCE_PATTERN]
+        if strip_prompts:
+            patterns.append(PROMPT_PATTERN)
+        patterns.extend(re.escape(literal) for literal in drop_literals)
+        self._strip_re = re.compile('|'.join(patterns))
+        self.dedupe = dedupe
+        self._last_sent = ''
+
+    def __call__(self, text: str) -> str:
+        """Return the cleaned text, or '' if nothing should be sent."""
+        cleaned = _LEADING_BLANK_RE.sub('', self._strip_re.sub('', text))
+        stripped = cleaned.strip()
+        if not stripped:
+            return ''
+        # Don't send duplicate frames (e.g. the echo of a command)
+        if self.dedupe and stripped == self._last_sent:
+            return ''
+        self._last_sent = stripped
+        return cleaned
+
+
+class TerminalBridge:
+    """Batches terminal output from a producer into WebSocket frames."""
+
+    def __init__(
+        self,
+        send_text: Callable[[str], Awaitable[None]],
+        send_bytes: Callable[[bytes], Awaitable[None]],
+        binary: bool = False,
+        output_filter: Optional[TerminalOutputFilter] = None,
+        idle_timeout: Optional[float] = None,
+        on_idle: Optional[Callable[[bool], Awaitable[None]]] = None,
+        max_frame_bytes: int = MAX_FRAME_BYTES,
+    ):
+        self.send_text = send_text
+        self.send_bytes = send_bytes
+        self.binary = binary
+        self.output_filter = None if binary else output_filter
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle
+        self.max_frame_bytes = max_frame_bytes
+
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        self.received_any = False
+        self.bytes_in = 0
+        self.frames_out = 0
+
+    # Producer side (call on the event loop thread)
+
+    def feed(self, data: bytes):
+        if data:
+            self.queue.put_nowait(('out', data))
+
+    def feed_error(self, message: str):
+        self.queue.put_nowait(('error', message))
+
+    def feed_eof(self):
+        self.queue.put_nowait(('eof', None))
+
+    # Consumer side
+
+    async def run(self):
+        """Forward output until the producer signals EOF."""
+        while True:
+            try:
+                if self.idle_timeout:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=self.idle_timeout)
+                else:
+                    item = await self.queue.get()
+            except asyncio.TimeoutError:
+                if self.on_idle:
+                    await self.on_idle(self.received_any)
+                continue
+
+            # Everything that arrived since the last wakeup goes out in one frame
+            items = [item]
+            while not self.queue.empty():
+                items.append(self.queue.get_nowait())
+
+            pending = bytearray()
+            eof = False
+            for kind, payload in items:
+                if kind == 'out':
+                    pending += payload
+                    continue
+                if pending:
+                    await self._emit(bytes(pending))
+                    pending.clear()
+                if kind == 'error':
+                    await self.send_text(payload)
+                elif kind == 'eof':
+                    eof = True
+                    break
+            if pending:
+                await self._emit(bytes(pending))
+            if eof:
+                return
+
+    async def _emit(self, data: bytes):
+        self.received_any = True
+        self.bytes_in += len(data)
+        for start in range(0, len(data), self.max_frame_bytes):
+            piece = data[start:start + self.max_frame_bytes]
+            if self.binary:
+                await self.send_bytes(piece)
+                self.frames_out += 1
+                continue
+            text = self._decoder.decode(piece)
+            if self.output_filter:
+                text = self.output_filter(text)
+            if text:
+                await self.send_text(text)
+                self.frames_out += 1
+
+
+def attach_ssh_channel(bridge: TerminalBridge, channel, read_size: int = READ_SIZE) -> Callable[[], None]:
+    """
+    Feed a paramiko channel's output into the bridge.
+
+    Returns a detach callable; call it before closing the channel.
+    """
+    loop = asyncio.get_running_loop()
+    done = threading.Event()
+    fd = None
+
+    def _drain() -> bool:
+        """Read everything buffered; returns False once the channel is finished."""
+        while channel.recv_ready():
+            data = channel.recv(read_size)
+            if not data:
+                return False
+            bridge.feed(data)
+        while channel.recv_stderr_ready():
+            bridge.feed(channel.recv_stderr(read_size))
+        return not (channel.closed or channel.eof_received)
+
+    def _on_readable():
+        if done.is_set():
+            return
+        try:
+            alive = _drain()
+        except Exception as e:
+            logger.warning(f"[TERMINAL] SSH channel read failed: {e}")
+            alive = False
+        if not alive:
+            _detach()
+            bridge.feed_eof()
+
+    def _reader_thread():
+        # Fallback for event loops without add_reader (e.g. Windows proactor)
+        channel.settimeout(1.0)
+        while not done.is_set():
+            try:
+                data = channel.recv(read_size)
+            except socket.timeout:
+                continue
+            except Exception as e:
+                logger.warning(f"[TERMINAL] SSH channel read failed: {e}")
+                data = b''
+            if not data:
+                break
+            loop.call_soon_threadsafe(bridge.feed, data)
+        if not done.is_set():
+            done.set()
+            loop.call_soon_threadsafe(bridge.feed_eof)
+
+    def _detach():
+        if done.is_set():
+            return
+        done.set()
+        if fd is not None:
+            try:
+                loop.remove_reader(fd)
+            except Exception:
+                pass
+
+    try:
+        fd = channel.fileno()
+        loop.add_reader(fd, _on_readable)
+    except (AttributeError, NotImplementedError, OSError, ValueError):
+        fd = None
+        threading.Thread(target=_reader_thread, name='ssh-terminal-reader', daemon=True).start()
+        logger.debug("[TERMINAL] Using reader thread for SSH channel")
+
+    return _detach
+
+
+async def pump_k8s_ws(bridge: TerminalBridge, ws):
+    """Feed a K8s exec websocket (channel-prefixed frames) into the bridge."""
+    try:
+        async for message in ws:
+            if not message:
+                continue
+            # First byte is the channel (0: stdin, 1: stdout, 2: stderr, 3: error)
+            if isinstance(message, str):
+                channel, data = ord(message[0]), message[1:].encode('utf-8')
+            else:
+                channel, data = message[0], message[1:]
+            if channel in (K8S_STDOUT, K8S_STDERR):
+                bridge.feed(data)
+            elif channel == K8S_ERROR:
+                bridge.feed_error(f"Error from pod: {data.decode('utf-8', errors='replace')}\n")
+    finally:
+        bridge.feed_eof()
@@ -1,3 +1,436 @@
-from django.test import TestCase
+import asyncio
+import json
+import queue
+import select
+import socket
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from kubernetes.client.rest import ApiException
+
+from development.k8s_manager import batch_provision
+from development.k8s_manager.batch_provision import ProvisionTarget, provision_pods
+from development.k8s_manager.pod_cache import CachedPod, PodInformer, select_pod
+from development.k8s_manager.pod_exec import ExecResult, exec_in_pod, parse_exit_status, stream_exec_in_pod
+from development.models import KubernetesPod, KubernetesPortMapping
+from development.terminal_bridge import TerminalBridge, TerminalOutputFilter, attach_ssh_channel, pump_k8s_ws
+
+
+def _v1_pod(name, phase='Running', ready=True, labels=None, deleted=False, namespace=None):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, labels=labels, deletion_timestamp='now' if deleted else None,
+                                 namespace=namespace, resource_version='2'),
+        status=SimpleNamespace(phase=phase, container_statuses=[SimpleNamespace(ready=ready)]),
+    )
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.01)
+
+
+class _QueueWatch:
+    """kubernetes.watch.Watch stand-in that streams events pushed by the test."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def stream(self, *args, **kwargs):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            yield event
+
+    def stop(self):
+        pass
+
+
+class PodSelectionTests(SimpleTestCase):
+    def test_cached_pod_from_v1_pod(self):
+        pod = CachedPod.from_v1_pod(_v1_pod('web-1', labels={'app': 'proj-1'}))
+        self.assertEqual((pod.name, pod.phase, pod.labels), ('web-1', 'Running', {'app': 'proj-1'}))
+        self.assertTrue(pod.running)
+        self.assertFalse(CachedPod.from_v1_pod(_v1_pod('web-1', ready=False)).running)
+        self.assertFalse(CachedPod.from_v1_pod(_v1_pod('web-1', phase='Pending')).running)
+
+    def test_select_pod_priority(self):
+        pods = [CachedPod('other', 'Running', True), CachedPod('app', 'Running', True, {'app': 'ns'}), CachedPod('named', 'Running', True)]
+        self.assertEqual(select_pod(pods, 'ns', 'named').name, 'named')
+        self.assertEqual(select_pod(pods, 'ns', 'missing').name, 'app')
+        self.assertEqual(select_pod(pods[:1], 'ns').name, 'other')
+        self.assertIsNone(select_pod([], 'ns'))
+        # V1Pod objects work too
+        self.assertEqual(select_pod([_v1_pod('a'), _v1_pod('b', labels={'app': 'ns'})], 'ns').metadata.name, 'b')
+
+
+class PodInformerTests(SimpleTestCase):
+    def setUp(self):
+        self.core_api = mock.Mock()
+        self.events = queue.Queue()
+        self.informer = PodInformer(sync_timeout=5)
+        mock.patch('development.k8s_manager.manage_pods.get_k8s_api_client', return_value=(None, self.core_api, None)).start()
+        mock.patch('development.k8s_manager.pod_cache.watch.Watch', side_effect=lambda: _QueueWatch(self.events)).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(self.events.put, None)
+        self.addCleanup(self.informer.stop_all)
+
+    def _list(self, *pods):
+        self.core_api.list_namespaced_pod.return_value = SimpleNamespace(items=list(pods), metadata=SimpleNamespace(resource_version='1'))
+
+    def test_watch_keeps_the_cache_current(self):
+        self._list(_v1_pod('web-1'))
+        exists, running, pod = self.informer.pod_status('proj-1')
+        self.assertEqual((exists, running, pod.name), (True, True, 'web-1'))
+
+        def status():
+            exists, running, pod = self.informer.pod_status('proj-1')
+            return exists, running, pod and pod.name
+
+        self.events.put({'type': 'MODIFIED', 'object': _v1_pod('web-1', phase='Pending')})
+        _wait_until(lambda: status() == (True, False, 'web-1'))
+        self.events.put({'type': 'ADDED', 'object': _v1_pod('web-2', labels={'app': 'proj-1'})})
+        _wait_until(lambda: status() == (True, True, 'web-2'))
+        self.events.put({'type': 'MODIFIED', 'object': _v1_pod('web-2', deleted=True)})
+        self.events.put({'type': 'DELETED', 'object': _v1_pod('web-1')})
+        _wait_until(lambda: status() == (False, False, None))
+
+        # One list for the whole sequence; lookups never hit the API
+        self.assertEqual(self.core_api.list_namespaced_pod.call_count, 1)
+        self.assertEqual(self.informer.get_stats()['namespaces'], 1)
+
+    def test_watch_error_relists(self):
+        self._list(_v1_pod('web-1'))
+        self.informer.pod_status('proj-1')
+        self._list(_v1_pod('web-2'))
+        self.events.put({'type': 'ERROR', 'object': SimpleNamespace(code=410)})
+        _wait_until(lambda: self.informer.pod_status('proj-1')[2].name == 'web-2')
+
+    def test_missing_namespace_has_no_pods(self):
+        self.core_api.list_namespaced_pod.side_effect = ApiException(status=404, reason='Not Found')
+        self.assertEqual(self.informer.pod_status('gone'), (False, False, None))
+
+    def test_unsynced_cache_returns_not_found(self):
+        self.informer.sync_timeout = 0.05
+        with mock.patch('development.k8s_manager.manage_pods.get_k8s_api_client', return_value=(None, None, None)):
+            self.assertEqual(self.informer.pod_status('proj-1'), (False, False, None))
+            self.informer.stop_all()
+        self.core_api.list_namespaced_pod.assert_not_called()
+
+
+def _exit_status(code):
+    if code == 0:
+        return json.dumps({'status': 'Success'})
+    return json.dumps({'status': 'Failure', 'reason': 'NonZeroExitCode',
+                       'details': {'causes': [{'reason': 'ExitCode', 'message': str(code)}]}})
+
+
+class _ExecStream:
+    """WSClient stand-in: each update() delivers the next frame."""
+
+    def __init__(self, frames, stay_open=False):
+        self.frames = list(frames)
+        self.stay_open = stay_open
+        self.pending = {}
+        self.closed = False
+
+    def is_open(self):
+        return self.stay_open or bool(self.frames)
+
+    def update(self, timeout=0):
+        if self.frames:
+            channel, text = self.frames.pop(0)
+            self.pending[channel] = self.pending.get(channel, '') + text
+        elif self.stay_open:
+            time.sleep(min(timeout, 0.01))
+
+    def peek_channel(self, channel):
+        return bool(self.pending.get(channel))
+
+    def read_channel(self, channel):
+        return self.pending.pop(channel, '')
+
+    def close(self):
+        self.closed = True
+
+
+class PodExecTests(SimpleTestCase):
+    def _exec(self, frames, stay_open=False, **kwargs):
+        resp = _ExecStream(frames, stay_open)
+        with mock.patch('development.k8s_manager.pod_exec.stream', return_value=resp) as stream:
+            result = exec_in_pod(mock.Mock(), 'web-1', 'proj-1', 'npm test', **kwargs)
+        self.assertTrue(resp.closed)
+        self.assertEqual(stream.call_args.kwargs['command'], ['/bin/sh', '-c', 'npm test'])
+        return result
+
+    def test_parse_exit_status(self):
+        self.assertEqual(parse_exit_status(_exit_status(0)), 0)
+        self.assertEqual(parse_exit_status(_exit_status(2)), 2)
+        self.assertEqual(parse_exit_status(json.dumps({'status': 'Failure', 'reason': 'InternalError'})), -1)
+        self.assertEqual(parse_exit_status('not json'), -1)
+        self.assertIsNone(parse_exit_status(''))
+
+    def test_exit_code_comes_from_the_status_channel(self):
+        chunks = []
+        result = self._exec(
+            [(1, 'PASS a\n'), (2, 'warning: error-prone config\n'), (1, 'FAIL b\n'), (3, _exit_status(2))],
+            output_callback=lambda kind, text: chunks.append(kind),
+        )
+        self.assertEqual((result.exit_code, result.success), (2, False))
+        self.assertEqual((result.stdout, result.stderr), ('PASS a\nFAIL b\n', 'warning: error-prone config\n'))
+        self.assertEqual(chunks, ['stdout', 'stderr', 'stdout'])
+
+        # stderr text alone does not fail a command that exited 0
+        self.assertEqual(self._exec([(2, 'npm ERR! peer dep warning'), (3, _exit_status(0))]).exit_code, 0)
+
+    def test_missing_status_frame_falls_back_to_stderr(self):
+        self.assertEqual(self._exec([(2, 'sh: foo: not found')]).exit_code, 1)
+        self.assertEqual(self._exec([(1, 'ok')]).exit_code, 0)
+
+    def test_large_output_is_truncated(self):
+        result = self._exec([(1, f'line {n}\n') for n in range(100)] + [(3, _exit_status(0))], head_chars=14, tail_chars=16)
+        self.assertTrue(result.truncated)
+        self.assertTrue(result.stdout.startswith('line 0\nline 1\n'))
+        self.assertTrue(result.stdout.endswith('line 98\nline 99\n'))
+        self.assertIn('chars truncated', result.stdout)
+
+    def test_timeout(self):
+        result = self._exec([(1, 'starting\n')], stay_open=True, timeout=0.1)
+        self.assertEqual((result.exit_code, result.timed_out, result.stdout), (-1, True, 'starting\n'))
+        self.assertIn('Timed out', result.error)
+
+    def test_stream_exec_yields_chunks_then_result(self):
+        resp = _ExecStream([(1, 'a'), (2, 'b'), (1, 'c'), (3, _exit_status(0))])
+
+        async def collect():
+            return [item async for item in stream_exec_in_pod(mock.Mock(), 'web-1', 'proj-1', 'ls')]
+
+        with mock.patch('development.k8s_manager.pod_exec.stream', return_value=resp):
+            items = asyncio.run(collect())
+        self.assertEqual(items[:-1], [('stdout', 'a'), ('stderr', 'b'), ('stdout', 'c')])
+        kind, result = items[-1]
+        self.assertEqual((kind, result.exit_code, result.stdout), ('exit', 0, 'ac'))
+
+
+class _SocketChannel:
+    """Paramiko channel stand-in backed by one end of a socket pair."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+        self.eof_received = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_ready(self):
+        return not self.eof_received and bool(select.select([self.sock], [], [], 0)[0])
+
+    def recv(self, size):
+        data = self.sock.recv(size)
+        if not data:
+            self.eof_received = True
+        return data
+
+    def recv_stderr_ready(self):
+        return False
+
+
+class TerminalBridgeTests(SimpleTestCase):
+    def _bridge(self, **kwargs):
+        sent = []
+
+        async def send(data):
+            sent.append(data)
+
+        return TerminalBridge(send, send, **kwargs), sent
+
+    def test_output_filter(self):
+        output_filter = TerminalOutputFilter(drop_literals=['$ ls'])
+        self.assertEqual(output_filter('\x1b[?2004h\x1b[32mgitpod /workspace $ \n\nfile.txt\n'), 'file.txt\n')
+        self.assertEqual(output_filter('file.txt\n'), '')
+        self.assertEqual(output_filter('[?2004l$ ls'), '')
+        self.assertEqual(output_filter('done\n'), 'done\n')
+
+    def test_queued_output_goes_out_as_one_frame(self):
+        async def scenario():
+            bridge, sent = self._bridge(max_frame_bytes=8)
+            for chunk in (b'abc', 'd\u00e9'.encode('utf-8')[:2], 'd\u00e9'.encode('utf-8')[2:], b'fghijk'):
+                bridge.feed(chunk)
+            bridge.feed_error('Error from pod: boom\n')
+            bridge.feed(b'tail')
+            bridge.feed_eof()
+            bridge.feed(b'ignored')
+            await bridge.run()
+            return bridge, sent
+
+        bridge, sent = asyncio.run(scenario())
+        # 12 bytes split at max_frame_bytes; the split UTF-8 character survives
+        self.assertEqual(sent, ['abcd\u00e9fg', 'hijk', 'Error from pod: boom\n', 'tail'])
+        self.assertEqual((bridge.bytes_in, bridge.frames_out), (16, 3))
+
+    def test_binary_frames_and_idle_callback(self):
+        idle_calls = []
+
+        async def on_idle(received_any):
+            idle_calls.append(received_any)
+            bridge.feed(b'\x1b[1mx')
+            bridge.feed_eof()
+
+        bridge, sent = self._bridge(binary=True, output_filter=TerminalOutputFilter(), idle_timeout=0.01, on_idle=on_idle)
+        asyncio.run(bridge.run())
+        self.assertEqual((idle_calls, sent), ([False], [b'\x1b[1mx']))
+
+    def test_ssh_channel_is_read_when_readable(self):
+        local, remote = socket.socketpair()
+        self.addCleanup(local.close)
+        self.addCleanup(remote.close)
+
+        async def scenario():
+            bridge, sent = self._bridge()
+            detach = attach_ssh_channel(bridge, _SocketChannel(local))
+            remote.sendall(b'hello ')
+            await asyncio.sleep(0.05)
+            remote.sendall(b'world\n')
+            remote.shutdown(socket.SHUT_WR)
+            await asyncio.wait_for(bridge.run(), timeout=5)
+            detach()
+            return sent
+
+        self.assertEqual(''.join(asyncio.run(scenario())), 'hello world\n')
+
+    def test_k8s_frames_are_demultiplexed(self):
+        async def frames():
+            for message in (b'\x01out ', '\x02err ', b'\x00stdin', b'', b'\x03denied'):
+                yield message
+
+        async def scenario():
+            bridge, sent = self._bridge()
+            await pump_k8s_ws(bridge, frames())
+            await bridge.run()
+            return sent
+
+        self.assertEqual(asyncio.run(scenario()), ['out err ', 'Error from pod: denied\n'])
+
+
+def _items(*items):
+    return SimpleNamespace(items=list(items), metadata=SimpleNamespace(resource_version='1'))
+
+
+def _workspace_service(namespace, ttyd_port):
+    ports = [SimpleNamespace(name='http', node_port=ttyd_port + 1), SimpleNamespace(name='ttyd', node_port=ttyd_port)]
+    return SimpleNamespace(metadata=SimpleNamespace(namespace=namespace), spec=SimpleNamespace(ports=ports))
+
+
+class _ListWatch:
+    """kubernetes.watch.Watch stand-in replaying a fixed list of events."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def stream(self, *args, **kwargs):
+        return iter(self.events)
+
+    def stop(self):
+        pass
+
+
+class BatchProvisionTests(TestCase):
+    def setUp(self):
+        self.core_api = mock.Mock()
+        self.apps_api = mock.Mock()
+        node = SimpleNamespace(
+            metadata=SimpleNamespace(name='node-a'),
+            status=SimpleNamespace(addresses=[SimpleNamespace(type='InternalIP', address='10.0.0.5')]),
+        )
+        self.core_api.list_node.return_value = _items(node)
+        self.core_api.list_pod_for_all_namespaces.return_value = _items(_v1_pod('proj-1-pod', namespace='proj-1'))
+        self.apps_api.list_deployment_for_all_namespaces.return_value = _items(
+            SimpleNamespace(metadata=SimpleNamespace(namespace='proj-1'))
+        )
+        self.core_api.list_service_for_all_namespaces.return_value = _items(
+            _workspace_service('proj-1', 30001), _workspace_service('proj-2', 30011)
+        )
+        self.events = [
+            {'type': 'ADDED', 'object': _v1_pod('proj-2-pod', phase='Pending', namespace='proj-2')},
+            {'type': 'MODIFIED', 'object': _v1_pod('proj-2-pod', namespace='proj-2')},
+        ]
+
+        def patch(name, **kwargs):
+            return mock.patch.object(batch_provision, name, **kwargs).start()
+
+        patch('get_k8s_api_client', return_value=(mock.Mock(), self.core_api, self.apps_api))
+        patch('get_k8s_server_settings', return_value={'node_host': '10.0.0.5'})
+        patch('get_kubernetes_access_config', return_value={'cluster_host': 'https://k8s.test'})
+        self.prepare = patch('_prepare_host_directories', return_value=None)
+        self.ensure_namespace = patch('ensure_namespace_exists')
+        self.exec_in_pod = patch('exec_in_pod', return_value=ExecResult(0, '/dev/sda 1G /workspace', ''))
+        self.informer = patch('get_pod_informer').return_value
+        mock.patch('development.k8s_manager.batch_provision.watch.Watch', side_effect=lambda: _ListWatch(self.events)).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_provision_creates_adopts_and_saves_in_bulk(self):
+        KubernetesPod.objects.create(project_id='1', namespace='proj-1', pod_name='old', image='old', status='stopped')
+
+        def create_deployment(namespace, body):
+            if namespace == 'conv-x':
+                raise ApiException(status=500, reason='Internal Server Error')
+
+        self.apps_api.create_namespaced_deployment.side_effect = create_deployment
+        self.core_api.create_persistent_volume.side_effect = ApiException(status=409, reason='AlreadyExists')
+
+        results = provision_pods([
+            ProvisionTarget(project_id='1'), ProvisionTarget(project_id='2'),
+            ProvisionTarget(conversation_id='x'), ProvisionTarget(project_id='2'),
+        ])
+
+        self.assertEqual([(r.namespace, r.success, r.created) for r in results], [
+            ('proj-1', True, False), ('proj-2', True, True), ('conv-x', False, False),
+        ])
+        self.assertIn('Internal Server Error', results[2].error)
+        self.assertEqual(results[1].service_details['ttydUrl'], 'http://10.0.0.5:30011')
+
+        # One list per resource kind and one directory-prep call for everything created
+        self.core_api.list_pod_for_all_namespaces.assert_called_once()
+        self.apps_api.list_deployment_for_all_namespaces.assert_called_once()
+        self.core_api.list_service_for_all_namespaces.assert_called_once()
+        self.prepare.assert_called_once_with(['conv-x', 'proj-2'])
+        self.assertEqual(sorted(c.args[1] for c in self.ensure_namespace.call_args_list), ['conv-x', 'proj-2'])
+        self.exec_in_pod.assert_called_once_with(self.core_api, 'proj-2-pod', 'proj-2', batch_provision.MOUNT_CHECK_COMMAND, timeout=30)
+        self.assertEqual(sorted(c.args[0] for c in self.informer.invalidate.call_args_list), ['conv-x', 'proj-2'])
+
+        pods = {p.namespace: p for p in KubernetesPod.objects.all()}
+        self.assertEqual(len(pods), 3)
+        self.assertEqual((pods['proj-1'].pod_name, pods['proj-1'].status), ('proj-1-pod', 'running'))
+        self.assertEqual((pods['proj-2'].status, pods['proj-2'].cluster_host), ('running', 'https://k8s.test'))
+        self.assertEqual((pods['conv-x'].status, pods['conv-x'].pod_name), ('error', 'conv-x-pod'))
+        self.assertEqual(
+            sorted(KubernetesPortMapping.objects.values_list('pod__namespace', 'node_port')),
+            [('proj-1', 30001), ('proj-2', 30011)],
+        )
+
+    def test_pods_that_never_become_ready_fail(self):
+        self.events = [{'type': 'ADDED', 'object': _v1_pod('proj-2-pod', phase='Pending', namespace='proj-2')}]
+        self.core_api.list_pod_for_all_namespaces.return_value = _items()
+
+        result, = provision_pods([ProvisionTarget(project_id='2')], ready_timeout=0.2)
+        self.assertFalse(result.success)
+        self.assertIn('not ready', result.error)
+        self.exec_in_pod.assert_not_called()
+        self.assertEqual(KubernetesPod.objects.get(namespace='proj-2').status, 'error')
+
+    def test_wait_for_ready_relists_after_a_watch_error(self):
+        self.events = [{'type': 'ERROR', 'object': SimpleNamespace(code=410)}]
+        self.core_api.list_pod_for_all_namespaces.return_value = _items(_v1_pod('proj-3-pod', namespace='proj-3'))
+
+        ready = batch_provision._wait_for_ready(self.core_api, {'proj-3'}, '1', time.monotonic() + 5)
+        self.assertEqual(ready, {'proj-3': 'proj-3-pod'})
+
+    def test_targets_need_an_id(self):
+        with self.assertRaises(ValueError):
+            provision_pods([ProvisionTarget()])
@@ -19,7 +19,8 @@ import os
 from django.conf import settings
 import tempfile
 import urllib.parse
-import re
+
+from development.terminal_bridge import TerminalBridge, TerminalOutputFilter, attach_ssh_channel, pump_k8s_ws
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +45,11 @@ class TerminalConsumer(AsyncWebsocketConsumer):
             # Extract required parameters
             project_id = query_params.get('project_id')
             conversation_id = query_params.get('conversation_id')
+
+            # Output options: binary=1 sends raw bytes (for xterm.js),
+            # filter=0 turns off control-sequence/prompt stripping in text mode
+            self.binary_frames = query_params.get('binary') == '1'
+            self.filter_output = query_params.get('filter', '1') != '0'
             
             if not project_id and not conversation_id:
                 await self.send(text_data="Error: Missing project_id or conversation_id parameter\n")
@@ -85,6 +91,11 @@ class TerminalConsumer(AsyncWebsocketConsumer):
             except Exception as e:
                 logger.error(f"Error closing K8s WebSocket: {str(e)}")
 
+        # Stop watching the SSH channel before it is closed
+        if getattr(self, 'ssh_detach', None):
+            self.ssh_detach()
+            self.ssh_detach = None
+
         # Close SSH connections if in SSH mode
         if hasattr(self, 'ssh_mode') and self.ssh_mode:
             if hasattr(self, 'shell_channel') and self.shell_channel:
@@ -104,6 +115,9 @@ class TerminalConsumer(AsyncWebsocketConsumer):
     
     async def receive(self, text_data=None, bytes_data=None):
         """Handle data received from WebSocket client."""
+        if bytes_data:
+            await self.receive_bytes(bytes_data)
+            return
         if not text_data:
             return
 
@@ -140,47 +154,40 @@ class TerminalConsumer(AsyncWebsocketConsumer):
             logger.exception("Error sending data to terminal")
             await self.send(text_data=f"\x1b[1;31mError sending command: {str(e)}\x1b[0m\n")
     
+    async def receive_bytes(self, bytes_data):
+        """Forward raw keystrokes (binary frames) to the terminal unchanged."""
+        try:
+            if getattr(self, 'ssh_mode', False) and getattr(self, 'shell_channel', None):
+                self.shell_channel.send(bytes_data)
+            elif getattr(self, 'k8s_ws', None):
+                # Channel 0 (stdin)
+                await self.k8s_ws.send(b'\x00' + bytes_data)
+        except Exception as e:
+            logger.exception("Error sending binary data to terminal")
+            await self.send(text_data=f"\x1b[1;31mError sending command: {str(e)}\x1b[0m\n")
+
+    def _make_bridge(self, drop_literals=(), **kwargs):
+        """Bridge from the terminal source to this WebSocket, per the connect() options."""
+        output_filter = None
+        if getattr(self, 'filter_output', True):
+            output_filter = TerminalOutputFilter(drop_literals=drop_literals)
+        return TerminalBridge(
+            send_text=lambda text: self.send(text_data=text),
+            send_bytes=lambda data: self.send(bytes_data=data),
+            binary=getattr(self, 'binary_frames', False),
+            output_filter=output_filter,
+            **kwargs,
+        )
+
     async def read_from_k8s_ws(self):
         """Background task to read data from K8s WebSocket and send to WebSocket client."""
         try:
-            # Regular expressions to match unwanted terminal control sequences and prompts
-            control_code_regex = re.compile(r'\x1b\[[0-9;]*[a-zA-Z]|\[[\?0-9]*[a-zA-Z]')
-            prompt_regex = re.compile(r'\[[\?0-9]*[a-zA-Z]|gitpod\s+/workspace\s+\$\s*')
-            
-            last_sent = ""
-            buffer = ""
-            
-            while True:
-                if hasattr(self, 'k8s_ws') and self.k8s_ws and not self.k8s_ws.closed:
-                    message = await self.k8s_ws.recv()
-                    if message:
-                        # K8s WebSocket protocol: first byte is channel (0: stdin, 1: stdout, 2: stderr, 3: error)
-                        channel = ord(message[0])
-                        data = message[1:]
-                        
-                        if channel == 1 or channel == 2:  # stdout or stderr
-                            # Clean up control sequences
-                            cleaned_data = control_code_regex.sub('', data)
-                            # Remove prompt lines
-                            cleaned_data = prompt_regex.sub('', cleaned_data)
-                            # Remove empty lines
-                            cleaned_data = re.sub(r'^\s*\n', '', cleaned_data)
-                            
-                            # If we have actual content, send it
-                            if cleaned_data.strip():
-                                # Don't send duplicate lines (e.g., echo of commands)
-                                if cleaned_data.strip() != last_sent.strip():
-                                    await self.send(text_data=cleaned_data)
-                                    last_sent = cleaned_data
-                        elif channel == 3:  # error
-                            error_data = f"Error from pod: {data}\n"
-                            await self.send(text_data=error_data)
-                else:
-                    # Connection closed, exit loop
-                    break
-                
-                # Small sleep to prevent CPU hogging
-                await asyncio.sleep(0.01)
+            bridge = self._make_bridge()
+            receiver = asyncio.create_task(pump_k8s_ws(bridge, self.k8s_ws))
+            try:
+                await bridge.run()
+            finally:
+                receiver.cancel()
         
         except asyncio.CancelledError:
             # Task was cancelled, exit gracefully
@@ -631,107 +638,54 @@ class TerminalConsumer(AsyncWebsocketConsumer):
     async def read_from_ssh(self):
         """Background task to read data from SSH shell and send to WebSocket."""
         try:
-            # Regular expressions to match unwanted terminal control sequences and prompts
-            control_code_regex = re.compile(r'\x1b\[[0-9;]*[a-zA-Z]|\[[\?0-9]*[a-zA-Z]')
-            prompt_regex = re.compile(r'\[[\?0-9]*[a-zA-Z]|gitpod\s+/workspace\s+\$\s*')
-            
             # Send a simplified feedback message
             await self.send(text_data="Using SSH fallback mode for terminal connection.\n")
             
             # Give the connection a moment to stabilize
             await asyncio.sleep(0.5)
             
-            # Send an initial command to wake up the shell
-            if hasattr(self, 'shell_channel') and self.shell_channel:
-                logger.info("Sending initial command to wake up shell")
-                self.shell_channel.send("echo 'Terminal Ready'\n")
-            
-            # Flag to detect if we've received any data at all
-            received_data = False
+            if not (hasattr(self, 'shell_channel') and self.shell_channel):
+                logger.warning("Shell channel no longer exists")
+                await self.send(text_data="Terminal connection lost.\n")
+                return
+
             connection_timeout = 20  # seconds
-            start_time = asyncio.get_event_loop().time()
-            last_activity_time = start_time
             keep_alive_interval = 30  # seconds
-            
-            last_sent = ""
-            buffer = ""
-            
-            while True:
-                current_time = asyncio.get_event_loop().time()
-                
-                if hasattr(self, 'shell_channel') and self.shell_channel:
-                    is_ready = False
-                    try:
-                        is_ready = self.shell_channel.recv_ready()
-                    except Exception as e:
-                        logger.warning(f"Error checking recv_ready: {str(e)}")
-                    
-                    if is_ready:
-                        try:
-                            data = self.shell_channel.recv(4096).decode('utf-8', errors='replace')
-                            if data:
-                                received_data = True
-                                last_activity_time = current_time
-                                
-                                # Clean up control sequences
-                                cleaned_data = control_code_regex.sub('', data)
-                                # Remove prompt lines
-                                cleaned_data = prompt_regex.sub('', cleaned_data)
-                                # Remove empty lines and Terminal Ready message
-                                cleaned_data = re.sub(r'^\s*\n|Terminal Ready', '', cleaned_data)
-                                
-                                # If we have actual content, send it
-                                if cleaned_data.strip():
-                                    # Don't send duplicate lines (e.g., echo of commands)
-                                    if cleaned_data.strip() != last_sent.strip():
-                                        await self.send(text_data=cleaned_data)
-                                        last_sent = cleaned_data
-                                
-                                logger.debug(f"Received {len(data)} bytes from SSH shell")
-                        except Exception as recv_error:
-                            logger.error(f"Error receiving data from shell: {str(recv_error)}")
-                            await self.send(text_data=f"Error reading from terminal: {str(recv_error)}\n")
-                    
-                    # Check for initial timeout
-                    if not received_data and current_time - start_time > connection_timeout:
+            warned_no_data = False
+
+            async def on_idle(received_data):
+                nonlocal warned_no_data
+                # After the first-response window, idle wakeups are keep-alives
+                bridge.idle_timeout = keep_alive_interval
+                if not received_data:
+                    if not warned_no_data:
                         logger.warning("SSH connection timeout - no data received")
                         await self.send(text_data="Warning: No response from terminal. The connection might be working but not showing output.\n")
                         await self.send(text_data="Try typing some commands to see if the terminal responds.\n")
-                        received_data = True  # Prevent further timeout messages
-                    
-                    # Send keep-alive if needed
-                    if received_data and current_time - last_activity_time > keep_alive_interval:
-                        try:
-                            logger.info("Sending keep-alive command")
-                            self.shell_channel.send("\n")  # Send just a newline as a gentle keep-alive
-                            last_activity_time = current_time
-                        except Exception as ka_error:
-                            logger.warning(f"Error sending keep-alive: {str(ka_error)}")
-                
-                    # Check if the connection is still active
-                    if self.shell_channel.closed:
-                        logger.warning("SSH channel was closed")
-                        await self.send(text_data="SSH connection was closed by the server.\n")
-                        break
-                        
-                    # Sometimes the channel can appear open but actually be disconnected
-                    if received_data and (current_time - last_activity_time > 60):  # 1 minute of no activity is suspicious
-                        try:
-                            logger.warning("Long period of inactivity detected, sending test command")
-                            self.shell_channel.send("echo ${RANDOM}\n")  # Send a test command that should produce output
-                            last_activity_time = current_time
-                            # We'll check for a response in the next loop iteration
-                        except Exception as test_error:
-                            logger.error(f"Error sending test command: {str(test_error)}")
-                            await self.send(text_data="Connection appears to be unresponsive.\n")
-                            break
-                else:
-                    logger.warning("Shell channel no longer exists")
-                    await self.send(text_data="Terminal connection lost.\n")
-                    break
-                
-                # Small sleep to prevent CPU hogging
-                await asyncio.sleep(0.01)
+                        warned_no_data = True
+                    return
+                try:
+                    logger.info("Sending keep-alive command")
+                    self.shell_channel.send("\n")  # Send just a newline as a gentle keep-alive
+                except Exception as ka_error:
+                    logger.warning(f"Error sending keep-alive: {str(ka_error)}")
+
+            # Output is pushed by the event loop when the channel is readable;
+            # the bridge only wakes up on data or after an idle interval
+            bridge = self._make_bridge(
+                drop_literals=('Terminal Ready',),
+                idle_timeout=connection_timeout,
+                on_idle=on_idle,
+            )
+            self.ssh_detach = attach_ssh_channel(bridge, self.shell_channel)
+
+            # Send an initial command to wake up the shell
+            logger.info("Sending initial command to wake up shell")
+            self.shell_channel.send("echo 'Terminal Ready'\n")
+
+            await bridge.run()
+            logger.warning("SSH channel was closed")
+            await self.send(text_data="SSH connection was closed by the server.\n")
         
         except asyncio.CancelledError:
             # Task was cancelled, exit gracefully
@@ -744,4 +698,8 @@ class TerminalConsumer(AsyncWebsocketConsumer):
             try:
                 await self.close(code=1011)
             except:
-                pass
\ No newline at end of file
+                pass
+        finally:
+            if getattr(self, 'ssh_detach', None):
+                self.ssh_detach()
+                self.ssh_detach = None
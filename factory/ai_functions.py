@@ -18,8 +18,7 @@ from projects.websocket_utils import async_send_ticket_log_notification
 from development.models import ServerConfig, Sandbox
 
 from django.conf import settings
-from django.core.cache import cache
-from development.k8s_manager.manage_pods import execute_command_in_pod
+from development.k8s_manager.manage_pods import stream_command_in_pod
 
 from development.models import KubernetesPod
 from accounts.models import GitHubToken, ExternalServicesAPIKeys
@@ -29,10 +28,19 @@ from projects.linear_sync import LinearSyncService
 from django.utils import timezone
 from tasks.task_manager import TaskManager
 from factory.stack_configs import get_stack_config
+from factory.command_cache import (
+    get_cache_stats, get_cached_result, get_workspace_epoch, is_read_only_command, store_result,
+)
+from factory.stream_accumulator import get_stream_accumulator
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Live output for K8s commands: refresh the TicketLog row at most this often,
+# keeping only the tail while the command is still running
+K8S_LOG_FLUSH_INTERVAL = 1.0
+K8S_LIVE_OUTPUT_CHARS = 20000
+
 # Mags API imports
 try:
     from factory.mags import (
@@ -239,6 +247,9 @@ def get_project_env_exports(project_id) -> list[str]:
     """
     Get project environment variables formatted as shell export statements.
 
+    Served from the versioned bundle cache in factory.env_bundle, so the
+    variables are only re-read and decrypted after they change.
+
     Args:
         project_id: The project database ID (int) or project_id string
 
@@ -246,34 +257,10 @@ def get_project_env_exports(project_id) -> list[str]:
         List of export statements like ['export KEY=value', ...]
     """
     try:
-        from projects.models import ProjectEnvironmentVariable, Project
-
-        project = None
-
-        # Try to convert to int for database id lookup
-        try:
-            int_id = int(project_id)
-            project = Project.objects.filter(id=int_id).first()
-        except (ValueError, TypeError):
-            pass
-
-        # If not found, try by project_id string
-        if not project and project_id:
-            project = Project.objects.filter(project_id=str(project_id)).first()
+        from factory.env_bundle import get_env_bundle
 
-        if not project:
-            logger.debug(f"[ENV] No project found for project_id={project_id}")
-            return []
-
-        env_vars = ProjectEnvironmentVariable.get_project_env_dict(project)
-        if env_vars:
-            logger.info(f"[ENV] Found {len(env_vars)} env vars for project {project.project_id}")
-        exports = []
-        for key, value in env_vars.items():
-            # Escape single quotes in value for shell safety
-            escaped_value = value.replace("'", "'\\''")
-            exports.append(f"export {key}='{escaped_value}'")
-        return exports
+        bundle = get_env_bundle(project_id)
+        return list(bundle.exports) if bundle else []
     except Exception as e:
         logger.warning(f"[ENV] Failed to get project env vars: {e}", exc_info=True)
         return []
@@ -1018,7 +1005,8 @@ async def app_functions(function_name, function_args, project_id, conversation_i
         case "get_file_list":
             file_type = function_args.get('file_type', 'all')
             limit = function_args.get('limit', 10)
-            return await get_file_list(project_id, file_type, limit)
+            search = function_args.get('search')
+            return await get_file_list(project_id, file_type, limit, search)
         
         case "get_file_content":
             file_ids = function_args.get('file_ids') or function_args.get('file_id')  # Support both for backwards compatibility
@@ -1643,21 +1631,17 @@ async def stream_prd_content(function_args, project_id):
     # Create cache key for this project and PRD name
     cache_key = f"streaming_prd_content_{project_id}_{prd_name.replace(' ', '_')}"
     
-    # Get existing content from cache or initialize
-    existing_content = cache.get(cache_key, "")
-    if not existing_content:
-        logger.info(f"Initialized PRD content storage for project {project_id}")
-    
-    # Accumulate content
+    # Store only the delta; the document is assembled once at completion
+    accumulator = get_stream_accumulator()
+    sequence = function_args.get('sequence')
+    added = True
     if content_chunk:
-        existing_content += content_chunk
-        # Store updated content in cache with 1 hour timeout
-        cache.set(cache_key, existing_content, timeout=3600)
-        logger.info(f"Accumulated PRD content length: {len(existing_content)}")
+        sequence, added, accumulated_length = accumulator.append(cache_key, content_chunk, seq=sequence)
+        logger.info(f"Accumulated PRD content length: {accumulated_length} (chunk {sequence}{'' if added else ', duplicate'})")
     
     # If streaming is complete, save the PRD to database
     if is_complete:
-        full_prd_content = cache.get(cache_key, "")
+        full_prd_content = accumulator.assemble(cache_key)
         logger.info(f"Streaming complete. Saving PRD with total length: {len(full_prd_content)}")
         
         # CONSOLE OUTPUT FOR COMPLETION
@@ -1705,8 +1689,8 @@ async def stream_prd_content(function_args, project_id):
                 except Exception as e:
                     logger.error(f"Error saving PRD to ProjectFile: {str(e)}")
                 
-                # Clear the cache
-                cache.delete(cache_key)
+                # Drop the accumulated chunks
+                accumulator.discard(cache_key)
                 
                 # Also save features and personas
                 # await save_features(project_id)
@@ -1726,7 +1710,9 @@ async def stream_prd_content(function_args, project_id):
     result = {
         "is_notification": False,
         "notification_type": "prd_stream",
-        "content_chunk": content_chunk,
+        # A retried chunk was already streamed to the frontend
+        "content_chunk": content_chunk if added else "",
+        "sequence": sequence,
         "is_complete": is_complete,
         "prd_name": prd_name,
         "message_to_agent": f"PRD '{prd_name}' content chunk streamed" if not is_complete else f"PRD '{prd_name}' streaming complete and saved"
@@ -1980,21 +1966,17 @@ async def stream_implementation_content(function_args, project_id):
     # Create cache key for this project
     cache_key = f"streaming_implementation_content_{project_id}"
     
-    # Get existing content from cache or initialize
-    existing_content = cache.get(cache_key, "")
-    if not existing_content:
-        logger.info(f"Initialized Implementation content storage for project {project_id}")
-    
-    # Accumulate content
+    # Store only the delta; the document is assembled once at completion
+    accumulator = get_stream_accumulator()
+    sequence = function_args.get('sequence')
+    added = True
     if content_chunk:
-        existing_content += content_chunk
-        # Store updated content in cache with 1 hour timeout
-        cache.set(cache_key, existing_content, timeout=3600)
-        logger.info(f"Accumulated Implementation content length: {len(existing_content)}")
+        sequence, added, accumulated_length = accumulator.append(cache_key, content_chunk, seq=sequence)
+        logger.info(f"Accumulated Implementation content length: {accumulated_length} (chunk {sequence}{'' if added else ', duplicate'})")
     
     # If streaming is complete, save the Implementation to database
     if is_complete:
-        full_implementation_content = cache.get(cache_key, "")
+        full_implementation_content = accumulator.assemble(cache_key)
         logger.info(f"Streaming complete. Saving Implementation with total length: {len(full_implementation_content)}")
         
         # CONSOLE OUTPUT FOR COMPLETION
@@ -2038,8 +2020,8 @@ async def stream_implementation_content(function_args, project_id):
                 except Exception as e:
                     logger.error(f"Error saving Implementation to ProjectFile: {str(e)}")
                 
-                # Clear the cache
-                cache.delete(cache_key)
+                # Drop the accumulated chunks
+                accumulator.discard(cache_key)
                 
             except Exception as e:
                 logger.error(f"Error saving streamed Implementation: {str(e)}")
@@ -2055,7 +2037,9 @@ async def stream_implementation_content(function_args, project_id):
     result = {
         "is_notification": False,
         "notification_type": "implementation_stream",
-        "content_chunk": content_chunk,
+        # A retried chunk was already streamed to the frontend
+        "content_chunk": content_chunk if added else "",
+        "sequence": sequence,
         "is_complete": is_complete,
         "message_to_agent": "Implementation content chunk streamed" if not is_complete else "Implementation streaming complete and saved"
     }
@@ -2121,22 +2105,18 @@ async def stream_document_content(function_args, project_id):
     # Create cache key for this project and document
     cache_key = f"streaming_document_content_{project_id}_{document_type}_{document_name.replace(' ', '_')}"
     
-    # Get existing content from cache or initialize
-    existing_content = cache.get(cache_key, "")
-    if not existing_content:
-        logger.info(f"Initialized document content storage for project {project_id}, type: {document_type}")
-    
-    # Accumulate content
+    # Store only the delta; the document is assembled once at completion
+    accumulator = get_stream_accumulator()
+    sequence = function_args.get('sequence')
+    added = True
     if content_chunk:
-        existing_content += content_chunk
-        # Store updated content in cache with 1 hour timeout
-        cache.set(cache_key, existing_content, timeout=3600)
-        logger.info(f"Accumulated document content length: {len(existing_content)}")
+        sequence, added, accumulated_length = accumulator.append(cache_key, content_chunk, seq=sequence)
+        logger.info(f"Accumulated document content length: {accumulated_length} (chunk {sequence}{'' if added else ', duplicate'})")
     
     # If streaming is complete, save the document to database
     file_id = None
     if is_complete:
-        full_document_content = cache.get(cache_key, "")
+        full_document_content = accumulator.assemble(cache_key)
         logger.info(f"Streaming complete. Saving document with total length: {len(full_document_content)}")
         
         # CONSOLE OUTPUT FOR COMPLETION
@@ -2197,9 +2177,9 @@ async def stream_document_content(function_args, project_id):
                     except Exception as e:
                         logger.warning(f"Could not save to ProjectPRD: {e}")
 
-                # Clear the cache
-                cache.delete(cache_key)
-                logger.info(f"Cleared cache for document stream: {cache_key}")
+                # Drop the accumulated chunks
+                accumulator.discard(cache_key)
+                logger.info(f"Discarded accumulated chunks for document stream: {cache_key}")
 
             except Exception as e:
                 logger.error(f"Error saving document to database: {str(e)}", exc_info=True)
@@ -2209,7 +2189,9 @@ async def stream_document_content(function_args, project_id):
     result = {
         "is_notification": True,
         "notification_type": "file_stream",
-        "content_chunk": content_chunk,
+        # A retried chunk was already streamed to the frontend
+        "content_chunk": content_chunk if added else "",
+        "sequence": sequence,
         "is_complete": is_complete,
         "file_type": document_type,
         "file_name": document_name,
@@ -2584,6 +2566,7 @@ async def run_command_in_k8s(command: str, project_id: int | str = None, convers
         except Exception as e:
             logger.debug(f"[RUN_COMMAND_K8S] Could not get ticket_id from context: {e}")
 
+    pod = None
     if project_id:
         pod = await sync_to_async(
             lambda: KubernetesPod.objects.filter(project_id=project_id).first()
@@ -2612,34 +2595,48 @@ async def run_command_in_k8s(command: str, project_id: int | str = None, convers
     stdout = ""
     stderr = ""
 
-    if pod:
-        # Execute the command using the Kubernetes API function in thread pool
-        success, stdout, stderr = await asyncio.get_event_loop().run_in_executor(
-            None, execute_command_in_pod, project_id, conversation_id, command_to_run
+    async def _push_log():
+        await sync_to_async(cmd_record.save)(update_fields=['output', 'exit_code'])
+        await async_send_ticket_log_notification(
+            ticket_id=ticket_id,
+            log_data={
+                'id': cmd_record.id,
+                'command': cmd_record.command,
+                'explanation': cmd_record.explanation,
+                'output': cmd_record.output,
+                'exit_code': cmd_record.exit_code,
+                'created_at': cmd_record.created_at.isoformat()
+            }
         )
 
+    if pod:
+        # Stream output as it arrives; the log row is refreshed at most once per
+        # K8S_LOG_FLUSH_INTERVAL so long-running commands show progress
+        # Only the tail is shown live, so only the tail is kept
+        live_tail = ''
+        last_flush = time.monotonic()
+        result = None
+        async for kind, data in stream_command_in_pod(project_id, conversation_id, command_to_run):
+            if kind == 'exit':
+                result = data
+                break
+            live_tail = (live_tail + data)[-K8S_LIVE_OUTPUT_CHARS:]
+            if cmd_record and time.monotonic() - last_flush >= K8S_LOG_FLUSH_INTERVAL:
+                last_flush = time.monotonic()
+                cmd_record.output = live_tail
+                try:
+                    await _push_log()
+                except Exception as e:
+                    logger.debug(f"[RUN_COMMAND_K8S] Live log update failed: {e}")
+
+        success, stdout, stderr = result.success, result.stdout, result.stderr
         logger.debug(f"Command output: {stdout}")
 
-        # Update command record with output
+        # Update command record with the final output and real exit code
         if cmd_record:
-            await sync_to_async(lambda: (
-                setattr(cmd_record, 'output', stdout if success else stderr),
-                setattr(cmd_record, 'exit_code', 0 if success else 1),
-                cmd_record.save()
-            )[2])()
-
-            # Send WebSocket notification for the updated log
-            await async_send_ticket_log_notification(
-                ticket_id=ticket_id,
-                log_data={
-                    'id': cmd_record.id,
-                    'command': cmd_record.command,
-                    'explanation': cmd_record.explanation,
-                    'output': cmd_record.output,
-                    'exit_code': cmd_record.exit_code,
-                    'created_at': cmd_record.created_at.isoformat()
-                }
-            )
+            cmd_record.output = stdout if success else (stderr or stdout)
+            cmd_record.exit_code = result.exit_code
+            await _push_log()
 
     if not success or not pod:
         # If no pod is found, update the command record
@@ -3036,18 +3033,47 @@ async def ssh_command_tool(function_args, project_id, conversation_id, ticket_id
 
     ws_id = workspace.mags_workspace_id or workspace.workspace_id
 
+    from tasks.cancellation import get_cancel_token, TicketCancelledError
+    cancel_token = get_cancel_token(ticket_id)
+
+    # Read-only inspections can be answered from the workspace's command cache
+    read_only = is_read_only_command(command)
+    use_cache = bool(function_args.get('use_cache')) and read_only
+    cache_epoch = get_workspace_epoch(ws_id) if use_cache else None
+    cached = get_cached_result(ws_id, command) if use_cache else None
+
     try:
-        result = await asyncio.to_thread(
-            mags_run_command,
-            ws_id,
-            command,
-            timeout,
-        )
+        if cached is not None:
+            result = cached
+        else:
+            command_call = asyncio.to_thread(
+                mags_run_command,
+                ws_id,
+                command,
+                timeout,
+                cancel_token=cancel_token,
+            )
+            if cancel_token is not None:
+                # Return as soon as the ticket is cancelled; the token also kills
+                # the remote command, so the exec thread finishes promptly
+                result = await cancel_token.run_or_cancel(command_call)
+            else:
+                result = await command_call
+            if use_cache:
+                store_result(ws_id, command, result, epoch=cache_epoch)
         logger.info(
-            "[SSH COMMAND] workspace=%s exit_code=%s",
+            "[SSH COMMAND] workspace=%s exit_code=%s cached=%s",
             workspace.workspace_id,
-            result.get('exit_code')
+            result.get('exit_code'),
+            cached is not None,
         )
+    except TicketCancelledError:
+        logger.info(f"[SSH_COMMAND_TOOL] Ticket #{ticket_id} cancelled while command was running")
+        return {
+            "is_notification": False,
+            "status": "cancelled",
+            "message_to_agent": "Command interrupted: the ticket execution was cancelled by the user. Stop working on this ticket."
+        }
     except Exception as exc:
         logger.exception("SSH command failed")
         await sync_to_async(workspace.mark_error, thread_sensitive=True)(metadata={"last_error": str(exc)})
@@ -3151,6 +3177,17 @@ async def ssh_command_tool(function_args, project_id, conversation_id, ticket_id
         """
     ).strip()
 
+    command_cache = None
+    if use_cache:
+        command_cache = {'hit': cached is not None, **get_cache_stats(ws_id)}
+        if cached is not None:
+            age = max(0, int(time.time() - cached.get('cached_at', time.time())))
+            command_cache['age_seconds'] = age
+            message = (
+                f"[Cached result from {age}s ago - no workspace changes since. "
+                f"Run without use_cache to force a fresh run.]\n{message}"
+            )
+
     log_entries = [{
         "title": "SSH command",
         "command": command,
@@ -3168,6 +3205,7 @@ async def ssh_command_tool(function_args, project_id, conversation_id, ticket_id
         "status": status_value,
         "command": command,
         "log_entries": log_entries,
+        "command_cache": command_cache,
         "message_to_agent": message
     }
 
@@ -4956,6 +4994,24 @@ async def implement_ticket(ticket_id, project_id, conversation_id, ticket_detail
             "error": str(e)
         }
 
+async def _mirror_file_to_workspace(project, file_type, file_name, file_content):
+    """Copy a saved project document into the project's running workspace, if any."""
+    if not _mags_available:
+        return
+    workspace = await _fetch_workspace(project=project)
+    if not workspace or workspace.status != 'ready':
+        return
+    workspace_ref = workspace.mags_workspace_id or workspace.workspace_id
+
+    from factory.workspace_sync import WorkspaceFile, doc_path, sync_files
+
+    files = [WorkspaceFile(doc_path(file_type, file_name), file_content)]
+    # Fire and forget: the notification shouldn't wait on the workspace
+    asyncio.get_event_loop().run_in_executor(
+        None, lambda: sync_files(workspace_ref, files, base_dir=MAGS_WORKING_DIR)
+    )
+
+
 async def save_file_from_stream(file_content, project_id, file_type, file_name):
     """
     Save file content that was captured from the streaming response.
@@ -5049,6 +5105,11 @@ async def save_file_from_stream(file_content, project_id, file_type, file_name):
             logger.info(f"[SAVE_FILE_FROM_STREAM] Created new {file_type} file '{file_name}' for project {project_id}")
         
         action = "created" if created else "updated"
+
+        try:
+            await _mirror_file_to_workspace(project, file_type, file_name, file_content)
+        except Exception as sync_err:
+            logger.warning(f"[SAVE_FILE_FROM_STREAM] Could not mirror file into workspace: {sync_err}")
         
         # Get display name for notification
         file_type_display = {
@@ -5125,92 +5186,33 @@ async def edit_file_content(file_id, edit_operations, project_id):
             "message_to_agent": f"File with ID {file_id} not found in project {project_id}"
         }
     
-    # Get current content and split into lines
-    current_content = file_obj.content
-    lines = current_content.split('\n')
-    original_line_count = len(lines)
-    logger.info(f"[edit_file_content] Current file has {original_line_count} lines")
-    
-    # Sort operations by type and position to apply them in order
-    # Apply replacements first, then insertions
-    replace_ops = [op for op in edit_operations if op.get('type') == 'replace_lines']
-    insert_ops = [op for op in edit_operations if op.get('type') == 'insert_after']
-    pattern_ops = [op for op in edit_operations if op.get('type') == 'pattern_replace']
-    
-    # Sort replace operations by start line (descending) to avoid index shifting
-    replace_ops.sort(key=lambda x: x.get('start', 0), reverse=True)
-    # Sort insert operations by line number (descending) to avoid index shifting
-    insert_ops.sort(key=lambda x: x.get('line', 0), reverse=True)
-    
-    # Apply replace operations
-    logger.info(f"[edit_file_content] Applying {len(replace_ops)} replace operations")
-    for i, operation in enumerate(replace_ops):
-        try:
-            start = operation['start'] - 1  # Convert to 0-based index
-            end = operation['end']  # End is inclusive in 1-based, exclusive in slice
-            new_lines = operation['content'].split('\n')
-            
-            logger.info(f"[edit_file_content] Replace op {i+1}: lines {start+1}-{end} with {len(new_lines)} new lines")
-            
-            # Validate line numbers
-            if start < 0 or end > len(lines):
-                logger.warning(f"[edit_file_content] Invalid line range: {start+1}-{end} for file with {len(lines)} lines")
-                continue
-                
-            lines[start:end] = new_lines
-            logger.info(f"[edit_file_content] Successfully replaced lines {start+1}-{end} with {len(new_lines)} new lines")
-        except Exception as e:
-            logger.error(f"[edit_file_content] Error applying replace operation: {str(e)}", exc_info=True)
-    
-    # Apply insert operations
-    logger.info(f"[edit_file_content] Applying {len(insert_ops)} insert operations")
-    for i, operation in enumerate(insert_ops):
-        try:
-            line_num = operation['line']  # Insert after this line
-            new_lines = operation['content'].split('\n')
-            
-            logger.info(f"[edit_file_content] Insert op {i+1}: {len(new_lines)} lines after line {line_num}")
-            
-            # Validate line number
-            if line_num < 0 or line_num > len(lines):
-                logger.warning(f"[edit_file_content] Invalid insert position: after line {line_num} for file with {len(lines)} lines")
-                continue
-            
-            # Insert after the specified line (Python slice insert at position inserts BEFORE that position)
-            # So to insert after line N, we insert at position N+1
-            insert_position = line_num + 1 if line_num < len(lines) else len(lines)
-            lines[insert_position:insert_position] = new_lines
-            logger.info(f"[edit_file_content] Successfully inserted {len(new_lines)} lines after line {line_num} (at position {insert_position})")
-        except Exception as e:
-            logger.error(f"[edit_file_content] Error applying insert operation: {str(e)}", exc_info=True)
-    
-    # Apply pattern replacements
-    logger.info(f"[edit_file_content] Applying {len(pattern_ops)} pattern operations")
-    for i, operation in enumerate(pattern_ops):
-        try:
-            pattern = operation['pattern']
-            content = operation['content']
-            
-            logger.info(f"[edit_file_content] Pattern op {i+1}: replacing '{pattern[:30]}...' with '{content[:30]}...'")
-            
-            # Join lines, replace pattern, split again
-            full_content = '\n'.join(lines)
-            occurrences = full_content.count(pattern)
-            full_content = full_content.replace(pattern, content)
-            lines = full_content.split('\n')
-            
-            logger.info(f"[edit_file_content] Replaced {occurrences} occurrences of pattern '{pattern[:30]}...'")
-        except Exception as e:
-            logger.error(f"[edit_file_content] Error applying pattern operation: {str(e)}", exc_info=True)
-    
-    # Save the edited content
-    new_content = '\n'.join(lines)
-    new_line_count = len(lines)
-    
-    logger.info(f"[edit_file_content] Saving edited content. New line count: {new_line_count}")
-    
+    from projects.utils.file_edits import DIFF_MAX_CHARS, EditConflict, apply_edits
+
+    # Content may live in S3; all operations address this original text
+    current_content = await sync_to_async(lambda: file_obj.file_content)() or ''
+
+    try:
+        edit_result = apply_edits(current_content, edit_operations)
+    except EditConflict as e:
+        logger.warning(f"[edit_file_content] Rejected {len(edit_operations)} operations: {e}")
+        return {
+            "is_notification": False,
+            "message_to_agent": "Error: no changes were applied. " + "; ".join(e.problems)
+                + ". Line numbers refer to the file before the edit."
+        }
+
+    original_line_count = edit_result.line_count_before
+    new_line_count = edit_result.line_count_after
+    for index, count in edit_result.pattern_counts.items():
+        logger.info(f"[edit_file_content] Pattern op {index + 1}: {count} occurrences")
+
+    change_description = edit_result.summary()
+    logger.info(f"[edit_file_content] {change_description}. New line count: {new_line_count}")
+
     # Update the file
-    await sync_to_async(file_obj.save_content)(new_content)
+    await sync_to_async(file_obj.save_content)(
+        edit_result.text, change_description=change_description, edit_result=edit_result
+    )
     await sync_to_async(file_obj.save)()
     
     logger.info(f"[edit_file_content] File '{file_obj.name}' edited successfully. Lines changed from {original_line_count} to {new_line_count}")
@@ -5218,13 +5220,15 @@ async def edit_file_content(file_id, edit_operations, project_id):
     result = {
         "is_notification": True,  # Fixed: Must be True for notification to be sent
         "notification_type": "file_edited",
-        "message_to_agent": f"File '{file_obj.name}' edited successfully. Applied {len(edit_operations)} operations. Lines: {original_line_count} → {new_line_count}",
+        "message_to_agent": f"File '{file_obj.name}' edited successfully. Applied {len(edit_operations)} operations. Lines: {original_line_count} → {new_line_count}\n\n{edit_result.unified_diff(name=file_obj.name, max_chars=DIFF_MAX_CHARS)}",
         "file_id": file_id,
         "file_name": file_obj.name,
         "file_type": file_obj.file_type,
         "operations_applied": len(edit_operations),
         "line_count_before": original_line_count,
         "line_count_after": new_line_count,
+        "pattern_occurrences": {str(index + 1): count for index, count in edit_result.pattern_counts.items()},
+        "change_description": change_description,
         "notification_marker": "__NOTIFICATION__"  # Important for UI processing
     }
     
@@ -5624,7 +5628,7 @@ async def set_project_stack(function_args, project_id, conversation_id=None):
     }
 
 
-async def get_file_list(project_id, file_type="all", limit=10):
+async def get_file_list(project_id, file_type="all", limit=10, search=None):
     """
     Get the list of files in the project
 
@@ -5632,6 +5636,7 @@ async def get_file_list(project_id, file_type="all", limit=10):
         project_id: The project ID
         file_type: Type of files to retrieve ("prd", "implementation", "design", "all")
         limit: Number of files to return (default: 10)
+        search: Optional full-text query over file names and bodies
         
     Returns:
         Dict with list of files or error message
@@ -5655,28 +5660,40 @@ async def get_file_list(project_id, file_type="all", limit=10):
         if file_type != "all":
             query_kwargs["file_type"] = file_type
         
-        # Get files from ProjectFile model
-        files = await sync_to_async(
-            lambda: list(ProjectFile.objects.filter(**query_kwargs).order_by("-updated_at")[:limit])
-        )()
+        # Get files from ProjectFile model, best matches first when searching
+        def fetch_files():
+            from projects.utils.file_search import search_files, uses_search_index
+
+            files = ProjectFile.objects.filter(**query_kwargs)
+            if search:
+                files = search_files(files, search)
+                if uses_search_index():
+                    return list(files.order_by("-search_rank", "-updated_at")[:limit])
+            return list(files.order_by("-updated_at")[:limit])
+
+        files = await sync_to_async(fetch_files)()
         
         if not files:
             return {
                 "is_notification": False,
                 "notification_type": "file_list",
-                "message_to_agent": f"No {file_type} files found for this project"
+                "message_to_agent": f"No {file_type} files found for this project" + (f" matching '{search}'" if search else "")
             }
         
         # Format file list
         file_list = []
         for file in files:
-            file_list.append({
+            entry = {
                 "file_id": file.id,
                 "name": file.name,
                 "file_type": file.file_type,
                 "created_at": file.created_at.strftime("%Y-%m-%d %H:%M:%S"),
                 "updated_at": file.updated_at.strftime("%Y-%m-%d %H:%M:%S")
-            })
+            }
+            if search:
+                from projects.utils.file_search import snippet_for
+                entry["snippet"] = snippet_for(file, search)
+            file_list.append(entry)
         
         return {
             "is_notification": False,
@@ -5754,6 +5771,9 @@ async def get_file_content(project_id, file_ids):
         found_ids = {file.id for file in files}
         missing_ids = set(file_ids) - found_ids
         
+        # Fetch S3-backed bodies concurrently (and through the content cache)
+        contents = await sync_to_async(ProjectFile.get_contents)(files)
+        
         # Format file contents
         file_contents = []
         for file_obj in files:
@@ -5761,7 +5781,7 @@ async def get_file_content(project_id, file_ids):
                 "file_id": file_obj.id,
                 "name": file_obj.name,
                 "file_type": file_obj.file_type,
-                "content": file_obj.file_content,
+                "content": contents.get(file_obj.id),
                 "created_at": file_obj.created_at.strftime("%Y-%m-%d %H:%M:%S"),
                 "updated_at": file_obj.updated_at.strftime("%Y-%m-%d %H:%M:%S")
             })
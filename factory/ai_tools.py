@@ -44,6 +44,10 @@ stream_prd_content = {
                 "is_complete": {
                     "type": "boolean",
                     "description": "Whether this is the final chunk of the PRD"
+                },
+                "sequence": {
+                    "type": "integer",
+                    "description": "Optional 1-based position of this chunk in the stream. Re-sending a chunk with the same sequence number (e.g. on retry) does not duplicate it"
                 }
             },
             "required": ["content_chunk", "is_complete"],
@@ -66,6 +70,10 @@ stream_implementation_content = {
                 "is_complete": {
                     "type": "boolean",
                     "description": "Whether this is the final chunk of the implementation"
+                },
+                "sequence": {
+                    "type": "integer",
+                    "description": "Optional 1-based position of this chunk in the stream. Re-sending a chunk with the same sequence number (e.g. on retry) does not duplicate it"
                 }
             },
             "required": ["content_chunk", "is_complete"],
@@ -89,6 +97,10 @@ stream_document_content = {
                     "type": "boolean",
                     "description": "Whether this is the final chunk of the document"
                 },
+                "sequence": {
+                    "type": "integer",
+                    "description": "Optional 1-based position of this chunk in the stream. Re-sending a chunk with the same sequence number (e.g. on retry) does not duplicate it"
+                },
                 "document_type": {
                     "type": "string",
                     "description": "The type of document being streamed (e.g., 'competitor_analysis', 'market_research', 'design_doc', 'api_spec', etc.). Default to 'document' if unsure."
@@ -758,6 +770,10 @@ ssh_command = {
                 "with_node_env": {
                     "type": "boolean",
                     "description": "Whether to load the Node.js environment helpers before running the command. Defaults to true."
+                },
+                "use_cache": {
+                    "type": "boolean",
+                    "description": "For read-only inspection commands (ls, cat, tree, git status/log/diff, ...): reuse the previous output if nothing in the workspace changed since. Results served from cache are marked as such. Defaults to false."
                 }
             },
             "required": ["command", "explanation"],
@@ -1070,7 +1086,8 @@ get_file_list = {
             "type": "object",
             "properties": {
                 "file_type": {"type": "string", "enum": ["prd", "implementation", "design", "all"]},
-                "limit": {"type": "integer", "description": "The number of files to return", "default": 10}
+                "limit": {"type": "integer", "description": "The number of files to return", "default": 10},
+                "search": {"type": "string", "description": "Optional full-text search over file names and contents; best matches are returned first with a highlighted snippet"}
             },
             "required": ["file_type", "limit"]
         }
@@ -4,7 +4,7 @@ Claude Code CLI Utilities
 Provides functions for:
 - Claude Code CLI authentication in Mags workspaces
 - Running Claude CLI commands with streaming output via paramiko
-- Parsing Claude CLI JSON stream output
+- Parsing Claude CLI JSON stream output (incrementally, see factory.claude_stream)
 
 Note: S3 backup/restore is no longer needed — Mags workspace overlays
 auto-persist .claude/ credentials across sessions.
@@ -15,13 +15,18 @@ import logging
 import re
 import time
 from typing import Dict, Any, Optional, List, Callable
-from datetime import datetime
 
 from factory.mags import (
     run_command,
+    run_ssh_streaming,
+    enable_ssh_access,
+    _find_existing_workspace_job,
     MAGS_WORKING_DIR,
     MAGS_PROJECT_DIR,
 )
+from factory.claude_stream import ClaudeStreamParser
+from factory.cli_log_shipper import SHIPPER_SCRIPT, can_ship_logs, shipper_args
+from factory.command_cache import bump_workspace_epoch
 
 logger = logging.getLogger(__name__)
 
@@ -587,13 +592,17 @@ def run_claude_cli(
     project_id: str = None,
     poll_callback: Callable = None,
     lfg_env: Dict[str, str] = None,
+    cancel_token=None,
+    event_callback: Callable = None,
+    ship_logs: bool = False,
 ) -> Dict[str, Any]:
     """
     Run Claude Code CLI with a prompt using Mags SDK native execution.
 
     Claude CLI runs in the background with output redirected to a JSONL file.
-    A shell polling loop reads new content every ~5 seconds and echoes it to
-    stdout, which is captured by the Mags SDK log polling.
+    The file is followed over a single SSH channel (tail -f) and fed to a
+    ClaudeStreamParser as bytes arrive; if SSH streaming is unavailable it
+    falls back to reading new bytes via exec() every ~5 seconds.
 
     Args:
         workspace_id: Mags workspace overlay name (e.g. "ticket-147-p13")
@@ -602,11 +611,22 @@ def run_claude_cli(
         timeout: Command timeout in seconds
         working_dir: Working directory for Claude (defaults to MAGS_WORKING_DIR)
         project_id: Optional project ID for environment variables
-        poll_callback: Optional callback for progress updates (receives output lines)
+        poll_callback: Optional callback for progress updates (receives raw output chunks)
         lfg_env: Dict of LFG environment variables
+        cancel_token: Optional tasks.cancellation.CancelToken; cancelling it
+                      kills the background Claude process and returns at once
+        event_callback: Optional callback receiving a list of ClaudeStreamEvents
+                        per chunk (e.g. a factory.claude_stream.TicketLogStreamWriter)
+        ship_logs: Also pipe the CLI output through the workspace log shipper
+                   (factory.cli_log_shipper), which posts it to
+                   /api/v1/cli/stream/batch/ in short batches. Needs
+                   LFG_API_URL, LFG_API_KEY and LFG_TICKET_ID in lfg_env.
 
     Returns:
-        Dict with status, output, session_id, and parsed messages
+        Dict with status, output, session_id, and parsed messages. stdout is
+        bounded (head + tail of the transcript) and messages holds the most
+        recent parsed messages only. logs_shipped / logs_dropped count the
+        shipper's entries (None when the shipper did not run).
     """
     import base64
 
@@ -641,6 +661,13 @@ def run_claude_cli(
         env_file = f"/tmp/claude_env_{timestamp}.sh"
         runner_script = f"/tmp/claude_runner_{timestamp}.sh"
         output_file = f"/tmp/claude_output_{timestamp}.jsonl"
+        shipper_script = f"/tmp/claude_log_shipper_{timestamp}.sh"
+        shipper_summary = f"/tmp/claude_log_shipped_{timestamp}"
+        temp_files = f"{prompt_file} {env_file} {runner_script} {output_file} {shipper_script} {shipper_summary}"
+
+        if ship_logs and not can_ship_logs(lfg_env):
+            logger.warning("[CLAUDE_CLI] Log shipping requested without LFG API env, streaming from the server only")
+            ship_logs = False
 
         # Known claude binary location (installed in base workspace)
         claude_bin_path = "/usr/local/bin/claude"
@@ -653,6 +680,19 @@ def run_claude_cli(
         # background, then poll the output file via exec() for streaming.
         # This avoids relying on Mags logs() API (which only returns platform
         # logs, not script stdout).
+        #
+        # With ship_logs the output is also tee'd into the log shipper, which
+        # posts it to the batch endpoint from inside the workspace.
+        if ship_logs:
+            run_claude = f"""{claude_bin_path} -p "$(cat {prompt_file})" {claude_args_str} 2>&1 | tee {output_file} | bash {shipper_script} {shipper_args(f"run{timestamp}")} > {shipper_summary} 2>/dev/null
+CLAUDE_EXIT=${{PIPESTATUS[0]}}
+echo "" >> {output_file}
+echo "___CLAUDE_LOGS_SHIPPED=$(cat {shipper_summary} 2>/dev/null)" >> {output_file}"""
+        else:
+            run_claude = f"""{claude_bin_path} -p "$(cat {prompt_file})" {claude_args_str} > {output_file} 2>&1
+CLAUDE_EXIT=$?
+echo "" >> {output_file}"""
+
         runner_content = f"""#!/bin/bash
 export HOME=/home/claudeuser
 export PATH=/root/node/current/bin:/root/.npm-global/bin:$PATH
@@ -661,12 +701,11 @@ export npm_config_cache=/home/claudeuser/.npm
 umask 000
 source {env_file}
 cd {working_dir}
-{claude_bin_path} -p "$(cat {prompt_file})" {claude_args_str} > {output_file} 2>&1
-CLAUDE_EXIT=$?
-echo "" >> {output_file}
+{run_claude}
 echo "___CLAUDE_EXIT_CODE=$CLAUDE_EXIT" >> {output_file}
 """
         runner_b64 = base64.b64encode(runner_content.encode('utf-8')).decode('ascii')
+        shipper_b64 = base64.b64encode(SHIPPER_SCRIPT.encode('utf-8')).decode('ascii') if ship_logs else ""
         prompt_b64 = base64.b64encode(prompt.encode('utf-8')).decode('ascii')
         env_b64 = base64.b64encode(lfg_env_exports.encode('utf-8')).decode('ascii') if lfg_env_exports else ""
 
@@ -722,6 +761,10 @@ touch {output_file}
 chmod 666 {output_file}
 echo '{runner_b64}' | base64 -d > {runner_script}
 chmod 755 {runner_script}
+if [ -n '{shipper_b64}' ]; then
+    echo '{shipper_b64}' | base64 -d > {shipper_script}
+    chmod 755 {shipper_script}
+fi
 
 # Start Claude CLI in background
 nohup su -s /bin/bash $CLAUDE_USER -c "bash {runner_script}" > /dev/null 2>&1 &
@@ -776,18 +819,102 @@ echo "CLAUDE_STARTED"
         except Exception as probe_err:
             logger.warning(f"[CLAUDE_CLI] Probe error: {probe_err}")
 
-        # Step 4: Poll output file via exec() — real-time streaming to callback
-        # The runner writes Claude's stream-json output to output_file.
-        # We periodically exec() into the VM to read new bytes and feed them
-        # to the callback, which creates TicketLog entries + WebSocket broadcasts.
+        # Step 4: Stream the output file into the incremental parser.
+        # The runner writes Claude's stream-json output to output_file; every
+        # chunk is parsed as it arrives and handed to event_callback (which
+        # creates TicketLog entries + WebSocket broadcasts). Only a bounded
+        # head/tail of the raw output is kept in memory.
+        parser = ClaudeStreamParser()
         offset = 0
-        all_output = ""
         poll_start = time.time()
+
+        def _consume(text: str):
+            nonlocal offset
+            if not text:
+                return
+            offset += len(text.encode('utf-8'))
+            events = parser.feed(text)
+            if event_callback and events:
+                try:
+                    event_callback(events)
+                except Exception as cb_err:
+                    logger.warning(f"[CLAUDE_CLI] Event callback error: {cb_err}")
+            if poll_callback:
+                try:
+                    poll_callback(text)
+                except Exception as cb_err:
+                    logger.warning(f"[CLAUDE_CLI] Callback error: {cb_err}")
+
+        def _cancelled_result():
+            logger.info(f"[CLAUDE_CLI] Cancelled, killing background process PID={bg_pid}")
+            kill_cmd = f"kill {bg_pid} 2>/dev/null; pkill -f {runner_script} 2>/dev/null; " if bg_pid else ""
+            if ship_logs:
+                kill_cmd += f"pkill -f {shipper_script} 2>/dev/null; "
+            try:
+                run_command(
+                    workspace_id,
+                    f"{kill_cmd}rm -f {temp_files}",
+                    timeout=30, with_node_env=False,
+                )
+            except Exception:
+                pass
+            return {
+                'status': 'cancelled',
+                'exit_code': -1,
+                'stdout': parser.output,
+                'stderr': '',
+                'session_id': parser.session_id,
+                'messages': list(parser.messages),
+                'final_result': parser.final_result,
+                'logs_shipped': parser.logs_shipped,
+                'logs_dropped': parser.logs_dropped,
+                'error': 'Cancelled by user'
+            }
+
+        # Primary path: follow the file over one SSH channel. tail -f is
+        # stopped once the runner has written its exit marker (or died).
+        pid_alive = f"kill -0 {bg_pid} 2>/dev/null && " if bg_pid else ""
+        stream_cmd = f"""tail -c +{offset + 1} -f {output_file} &
+TAIL_PID=$!
+while {pid_alive}! tail -n 3 {output_file} 2>/dev/null | grep -q '^___CLAUDE_EXIT_CODE='; do
+    sleep 1
+done
+sleep 2
+kill $TAIL_PID 2>/dev/null || true
+"""
+        try:
+            job = _find_existing_workspace_job(workspace_id)
+            job_id = job.get('request_id') or job.get('id')
+            ssh_credentials = enable_ssh_access(job_id, keep_polling=False)
+            stream_result = run_ssh_streaming(
+                job_id, stream_cmd,
+                timeout=timeout,
+                output_callback=_consume,
+                ssh_credentials=ssh_credentials,
+                with_node_env=False,
+                poll_interval=0.5,
+                cancel_token=cancel_token,
+                capture_output=False,
+            )
+            if stream_result.get('cancelled'):
+                return _cancelled_result()
+            logger.info(
+                f"[CLAUDE_CLI] SSH stream ended: exit={stream_result.get('exit_code')} "
+                f"offset={offset} exit_marker={parser.exit_code is not None}"
+            )
+        except Exception as stream_err:
+            logger.warning(f"[CLAUDE_CLI] SSH streaming unavailable, falling back to exec polling: {stream_err}")
+
+        # Fallback: poll new bytes via exec() until the exit marker shows up
         consecutive_ssh_failures = 0
         MAX_SSH_FAILURES = 5
 
-        while time.time() - poll_start < timeout:
-            time.sleep(5)
+        while parser.exit_code is None and time.time() - poll_start < timeout:
+            if cancel_token is not None:
+                if cancel_token.wait(5):
+                    return _cancelled_result()
+            else:
+                time.sleep(5)
 
             # Read new bytes from output file + check process status
             pid_check = f'kill -0 {bg_pid} 2>/dev/null && echo "yes" || echo "no"' if bg_pid else 'echo "unknown"'
@@ -826,7 +953,10 @@ printf '\\n__MAGS_POLL_BOUNDARY__\\nSIZE=%s ALIVE=%s\\n' "$CURSIZE" "$ALIVE"
 
                 if POLL_BOUNDARY in poll_stdout:
                     boundary_idx = poll_stdout.rfind(POLL_BOUNDARY)
-                    new_content = poll_stdout[:boundary_idx].rstrip('\n')
+                    # Drop only the newline printf put in front of the boundary
+                    new_content = poll_stdout[:boundary_idx]
+                    if new_content.endswith('\n'):
+                        new_content = new_content[:-1]
                     meta_str = poll_stdout[boundary_idx + len(POLL_BOUNDARY):]
 
                     size_match = re.search(r'SIZE=(\d+)', meta_str)
@@ -836,26 +966,14 @@ printf '\\n__MAGS_POLL_BOUNDARY__\\nSIZE=%s ALIVE=%s\\n' "$CURSIZE" "$ALIVE"
                     if alive_match:
                         process_alive = alive_match.group(1) == 'yes'
 
-                if new_content:
-                    offset = poll_size
-                    all_output += new_content + '\n'
-                    if poll_callback:
-                        try:
-                            poll_callback(new_content + '\n')
-                        except Exception as cb_err:
-                            logger.warning(f"[CLAUDE_CLI] Callback error: {cb_err}")
-                else:
-                    offset = poll_size
+                _consume(new_content)
+                offset = max(offset, poll_size)
 
                 logger.debug(
                     f"[CLAUDE_CLI] Poll: offset={offset}, new={len(new_content)}, "
-                    f"total={len(all_output)}, alive={process_alive}"
+                    f"total={parser.transcript.total_chars}, alive={process_alive}"
                 )
 
-                # Check completion
-                if '___CLAUDE_EXIT_CODE=' in all_output:
-                    break
-
                 if not process_alive:
                     # Process finished — wait for final writes then exit
                     time.sleep(2)
@@ -865,81 +983,58 @@ printf '\\n__MAGS_POLL_BOUNDARY__\\nSIZE=%s ALIVE=%s\\n' "$CURSIZE" "$ALIVE"
                 logger.debug(f"[CLAUDE_CLI] Poll error: {poll_err}")
 
         # Final read to catch any remaining output after loop exit
-        try:
-            final_cmd = f"""CURSIZE=$(wc -c < {output_file} 2>/dev/null || echo 0)
+        if parser.exit_code is None:
+            try:
+                final_cmd = f"""CURSIZE=$(wc -c < {output_file} 2>/dev/null || echo 0)
 if [ "$CURSIZE" -gt {offset} ]; then
     tail -c +{offset + 1} {output_file}
 fi
 """
-            fr = run_command(workspace_id, final_cmd, timeout=30, with_node_env=False)
-            fc = fr.get('stdout', '').rstrip('\n')
-            if fc:
-                all_output += fc + '\n'
-                if poll_callback:
-                    try:
-                        poll_callback(fc + '\n')
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+                fr = run_command(workspace_id, final_cmd, timeout=30, with_node_env=False)
+                _consume(fr.get('stdout', ''))
+            except Exception:
+                pass
 
-        # Extract exit code from output marker
-        exit_code = -1
-        for line in reversed(all_output.split('\n')):
-            line_s = line.strip()
-            if line_s.startswith('___CLAUDE_EXIT_CODE='):
-                try:
-                    exit_code = int(line_s.split('=', 1)[1])
-                except (ValueError, IndexError):
-                    pass
-                break
+        events = parser.close()
+        if event_callback and events:
+            try:
+                event_callback(events)
+            except Exception as cb_err:
+                logger.warning(f"[CLAUDE_CLI] Event callback error: {cb_err}")
+
+        # Exit code comes from the runner's ___CLAUDE_EXIT_CODE= marker
+        exit_code = parser.exit_code if parser.exit_code is not None else -1
 
         # If we never got the exit code marker (SSH died mid-execution) but
         # collected substantial output, check if Claude produced a final result.
         # A {"type":"result"} JSON line indicates Claude completed normally.
-        if exit_code == -1 and len(all_output) > 1000:
-            import json as _json
-            for line in reversed(all_output.split('\n')):
-                line_s = line.strip()
-                if not line_s:
-                    continue
-                try:
-                    obj = _json.loads(line_s)
-                    if obj.get('type') == 'result':
-                        logger.info("[CLAUDE_CLI] Found result object in output — treating as success despite missing exit code")
-                        exit_code = 0
-                        break
-                except (ValueError, _json.JSONDecodeError):
-                    continue
-
-        logger.info(f"[CLAUDE_CLI] Completed: exit_code={exit_code}, output_len={len(all_output)}")
+        if exit_code == -1 and parser.transcript.total_chars > 1000 and parser.saw_result:
+            logger.info("[CLAUDE_CLI] Found result object in output — treating as success despite missing exit code")
+            exit_code = 0
+
+        logger.info(
+            f"[CLAUDE_CLI] Completed: exit_code={exit_code}, output_len={parser.transcript.total_chars}, "
+            f"lines={parser.lines_parsed}, json_objects={parser.json_objects}, "
+            f"logs_shipped={parser.logs_shipped}, logs_dropped={parser.logs_dropped}"
+        )
 
         # Cleanup temp files (including the output JSONL file)
-        cleanup_cmd = f"rm -f {prompt_file} {env_file} {runner_script} {output_file}"
+        cleanup_cmd = f"rm -f {temp_files}"
         try:
             run_command(workspace_id, cleanup_cmd, timeout=30, with_node_env=False)
         except Exception:
             pass  # Cleanup failure is non-fatal
 
-        # Filter wrapper control markers before parsing JSON stream
-        filtered_lines = []
-        for line in all_output.split('\n'):
-            if line.strip().startswith('___CLAUDE_'):
-                continue
-            filtered_lines.append(line)
-        filtered_output = '\n'.join(filtered_lines)
-
-        # Parse the JSON stream output
-        parsed = parse_claude_json_stream(filtered_output)
-
         return {
             'status': 'success' if exit_code == 0 else 'error',
             'exit_code': exit_code,
-            'stdout': all_output,
+            'stdout': parser.output,
             'stderr': '',
-            'session_id': parsed.get('session_id'),
-            'messages': parsed.get('messages', []),
-            'final_result': parsed.get('final_result'),
+            'session_id': parser.session_id,
+            'messages': list(parser.messages),
+            'final_result': parser.final_result,
+            'logs_shipped': parser.logs_shipped,
+            'logs_dropped': parser.logs_dropped,
             'error': None if exit_code == 0 else f"Claude exited with code {exit_code}"
         }
 
@@ -949,18 +1044,18 @@ fi
             'status': 'error',
             'error': str(e)
         }
+    finally:
+        # The CLI edits files in the background for the whole run, beyond the
+        # commands that start and follow it
+        bump_workspace_epoch(workspace_id)
 
 
 def parse_claude_json_stream(output: str) -> Dict[str, Any]:
     """
     Parse Claude CLI JSON stream output.
 
-    JSON message structure (Claude Code CLI):
-    - {"type":"system","subtype":"init","session_id":"..."} - Session init
-    - {"type":"assistant","message":{"content":[{"type":"text","text":"..."}]}} - AI text response
-    - {"type":"assistant","message":{"content":[{"type":"tool_use","name":"...","input":{}}]}} - Tool use
-    - {"type":"user","message":{"content":[{"type":"tool_result","content":"..."}]}} - Tool result
-    - {"type":"result","result":"..."} - Final result
+    Convenience wrapper around ClaudeStreamParser for output that is already
+    fully buffered; see factory.claude_stream for the message structure.
 
     Args:
         output: Raw stdout from Claude CLI
@@ -968,102 +1063,10 @@ def parse_claude_json_stream(output: str) -> Dict[str, Any]:
     Returns:
         Dict with session_id, messages list, and final_result
     """
-    result = {
-        'session_id': None,
-        'messages': [],
-        'final_result': None
-    }
-
-    for line in output.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-
-        try:
-            msg = json.loads(line)
-            msg_type = msg.get('type')
-
-            if msg_type == 'system' and msg.get('subtype') == 'init':
-                result['session_id'] = msg.get('session_id')
-                result['messages'].append({
-                    'type': 'system_init',
-                    'session_id': msg.get('session_id'),
-                    'timestamp': datetime.now().isoformat()
-                })
-
-            elif msg_type == 'assistant':
-                content_blocks = msg.get('message', {}).get('content', [])
-                if not isinstance(content_blocks, list):
-                    content_blocks = [content_blocks] if content_blocks else []
-
-                text_parts = []
-                for block in content_blocks:
-                    if isinstance(block, dict):
-                        block_type = block.get('type')
-
-                        if block_type == 'text':
-                            text = block.get('text', '')
-                            if text:
-                                text_parts.append(text)
-
-                        elif block_type == 'tool_use':
-                            tool_name = block.get('name', 'unknown')
-                            tool_input = block.get('input', {})
-                            result['messages'].append({
-                                'type': 'tool_use',
-                                'name': tool_name,
-                                'input': tool_input,
-                                'timestamp': datetime.now().isoformat()
-                            })
-
-                    elif isinstance(block, str):
-                        text_parts.append(block)
-
-                if text_parts:
-                    content = '\n'.join(text_parts)
-                    result['messages'].append({
-                        'type': 'assistant',
-                        'content': content,
-                        'timestamp': datetime.now().isoformat()
-                    })
-
-            elif msg_type == 'user':
-                content_blocks = msg.get('message', {}).get('content', [])
-                if not isinstance(content_blocks, list):
-                    content_blocks = [content_blocks] if content_blocks else []
-
-                for block in content_blocks:
-                    if isinstance(block, dict):
-                        block_type = block.get('type')
-
-                        if block_type == 'tool_result':
-                            tool_content = block.get('content', '')
-                            if isinstance(tool_content, (list, dict)):
-                                tool_content = json.dumps(tool_content, indent=2)
-                            result['messages'].append({
-                                'type': 'tool_result',
-                                'content': str(tool_content)[:5000],
-                                'is_error': block.get('is_error', False),
-                                'timestamp': datetime.now().isoformat()
-                            })
-
-            elif msg_type == 'result':
-                result['final_result'] = msg.get('result')
-                result['messages'].append({
-                    'type': 'result',
-                    'result': msg.get('result'),
-                    'timestamp': datetime.now().isoformat()
-                })
-
-        except json.JSONDecodeError:
-            if line and not line.startswith('{'):
-                result['messages'].append({
-                    'type': 'raw_output',
-                    'content': line,
-                    'timestamp': datetime.now().isoformat()
-                })
-
-    return result
+    parser = ClaudeStreamParser(max_messages=None)
+    parser.feed(output)
+    parser.close()
+    return parser.result()
 
 
 def create_ticket_logs_from_claude_output(
@@ -0,0 +1,607 @@
+"""
+Claude CLI Stream Parsing
+
+Incremental parser for Claude Code CLI ``--output-format stream-json``
+output (NDJSON) and a batched TicketLog writer fed by it.
+
+- ClaudeStreamParser: feed() arbitrary chunks as they arrive from
+  run_ssh_streaming / run_command_streaming; it reassembles lines, decodes
+  JSON and returns typed ClaudeStreamEvent objects. Memory stays bounded:
+  partial lines are capped, the retained transcript is head + tail only,
+  and the message history is a fixed-size deque.
+- TicketLogStreamWriter: turns events into TicketLog rows, written with
+  one bulk_create per chunk and broadcast to the ticket's WebSocket group
+  as a single batched message.
+
+Usage:
+    from factory.claude_stream import ClaudeStreamParser, TicketLogStreamWriter
+
+    parser = ClaudeStreamParser()
+    writer = TicketLogStreamWriter(ticket_id)
+
+    for chunk in chunks:
+        writer(parser.feed(chunk))
+    writer(parser.close())
+
+    parser.session_id, parser.final_result, parser.exit_code, parser.output
+"""
+
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Wrapper control lines written by the run_claude_cli runner script
+CONTROL_PREFIX = "___CLAUDE_"
+EXIT_CODE_PREFIX = "___CLAUDE_EXIT_CODE="
+LOGS_SHIPPED_PREFIX = "___CLAUDE_LOGS_SHIPPED="
+
+# Substrings callers check for in the CLI output. They are remembered even
+# when the line they appeared on is dropped from the bounded transcript.
+DEFAULT_MARKERS = (
+    "IMPLEMENTATION_STATUS: COMPLETE",
+    "IMPLEMENTATION_STATUS: FAILED",
+    "No conversation found with session ID",
+)
+
+# Event kinds
+EVENT_SYSTEM_INIT = "system_init"
+EVENT_TEXT = "assistant"
+EVENT_TOOL_USE = "tool_use"
+EVENT_TOOL_RESULT = "tool_result"
+EVENT_RESULT = "result"
+EVENT_RAW = "raw_output"
+
+
+@dataclass
+class ClaudeStreamEvent:
+    """A single parsed item from the Claude CLI stream."""
+    kind: str
+    text: str = ""
+    name: str = ""
+    input: Dict[str, Any] = field(default_factory=dict)
+    is_error: bool = False
+    session_id: Optional[str] = None
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def to_message(self) -> Dict[str, Any]:
+        """Legacy message dict, as returned by parse_claude_json_stream()."""
+        if self.kind == EVENT_SYSTEM_INIT:
+            return {'type': self.kind, 'session_id': self.session_id, 'timestamp': self.timestamp}
+        if self.kind == EVENT_TOOL_USE:
+            return {'type': self.kind, 'name': self.name, 'input': self.input, 'timestamp': self.timestamp}
+        if self.kind == EVENT_TOOL_RESULT:
+            return {'type': self.kind, 'content': self.text[:5000], 'is_error': self.is_error, 'timestamp': self.timestamp}
+        if self.kind == EVENT_RESULT:
+            return {'type': self.kind, 'result': self.text, 'timestamp': self.timestamp}
+        return {'type': self.kind, 'content': self.text, 'timestamp': self.timestamp}
+
+
+class BoundedText:
+    """Keeps the first `head_chars` and last `tail_chars` of a growing text."""
+
+    def __init__(self, head_chars: int = 64_000, tail_chars: int = 256_000):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self._head: List[str] = []
+        self._head_len = 0
+        self._tail: Deque[str] = deque()
+        self._tail_len = 0
+        self.total_chars = 0
+
+    def append(self, text: str):
+        if not text:
+            return
+        self.total_chars += len(text)
+
+        if self._head_len < self.head_chars:
+            take = text[:self.head_chars - self._head_len]
+            self._head.append(take)
+            self._head_len += len(take)
+            text = text[len(take):]
+            if not text:
+                return
+
+        self._tail.append(text)
+        self._tail_len += len(text)
+        while self._tail and self._tail_len - len(self._tail[0]) >= self.tail_chars:
+            self._tail_len -= len(self._tail.popleft())
+
+    @property
+    def dropped_chars(self) -> int:
+        return max(0, self.total_chars - self._head_len - self._tail_len)
+
+    def getvalue(self, elided_note: str = "") -> str:
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if self.dropped_chars and len(tail) > self.tail_chars:
+            # Trim the oldest chunk down to the exact budget
+            tail = tail[-self.tail_chars:]
+        if not self.dropped_chars:
+            return head + tail
+        return f"{head}\n...[{self.dropped_chars} chars truncated]{elided_note}...\n{tail}"
+
+
+class ClaudeStreamParser:
+    """
+    Incremental NDJSON parser for Claude CLI stream-json output.
+
+    JSON message structure (Claude Code CLI):
+    - {"type":"system","subtype":"init","session_id":"..."} - Session init
+    - {"type":"assistant","message":{"content":[{"type":"text","text":"..."}]}} - AI text response
+    - {"type":"assistant","message":{"content":[{"type":"tool_use","name":"...","input":{}}]}} - Tool use
+    - {"type":"user","message":{"content":[{"type":"tool_result","content":"..."}]}} - Tool result
+    - {"type":"result","result":"..."} - Final result
+    """
+
+    def __init__(
+        self,
+        max_line_chars: int = 4_000_000,
+        max_messages: Optional[int] = 200,
+        head_chars: int = 64_000,
+        tail_chars: int = 256_000,
+        markers: Iterable[str] = DEFAULT_MARKERS,
+    ):
+        """
+        Args:
+            max_line_chars: Longest single line kept; longer lines are discarded
+            max_messages: Recent messages retained for result() (None = unbounded)
+            head_chars / tail_chars: Size of the retained raw transcript
+            markers: Substrings to remember even if their line is truncated away
+        """
+        self.max_line_chars = max_line_chars
+        self._partial: List[str] = []
+        self._partial_len = 0
+        self._discarding = False
+        self._decoder = json.JSONDecoder()
+
+        self.messages: Deque[Dict[str, Any]] = deque(maxlen=max_messages)
+        self.transcript = BoundedText(head_chars, tail_chars)
+        self.markers = tuple(markers)
+        self.markers_seen: List[str] = []
+
+        self.session_id: Optional[str] = None
+        self.final_result: Optional[str] = None
+        self.exit_code: Optional[int] = None
+        self.logs_shipped: Optional[int] = None
+        self.logs_dropped: Optional[int] = None
+        self.saw_result = False
+        self.lines_parsed = 0
+        self.json_objects = 0
+
+    # ------------------------------------------------------------------
+    # Feeding
+    # ------------------------------------------------------------------
+
+    def feed(self, chunk: str) -> List[ClaudeStreamEvent]:
+        """Consume a chunk of output and return events for completed lines."""
+        if not chunk:
+            return []
+        self.transcript.append(chunk)
+
+        events: List[ClaudeStreamEvent] = []
+        pieces = chunk.split('\n')
+
+        for piece in pieces[:-1]:
+            line = self._take_line(piece)
+            if line is not None:
+                events.extend(self._handle_line(line))
+
+        self._buffer(pieces[-1])
+        return events
+
+    def close(self) -> List[ClaudeStreamEvent]:
+        """Flush a trailing line that had no newline."""
+        line = self._take_line('')
+        if line is None or not line.strip():
+            return []
+        return self._handle_line(line)
+
+    def _buffer(self, piece: str):
+        if not piece or self._discarding:
+            return
+        if self._partial_len + len(piece) > self.max_line_chars:
+            logger.warning(
+                f"[CLAUDE_STREAM] Discarding line over {self.max_line_chars} chars"
+            )
+            self._partial = []
+            self._partial_len = 0
+            self._discarding = True
+            return
+        self._partial.append(piece)
+        self._partial_len += len(piece)
+
+    def _take_line(self, piece: str) -> Optional[str]:
+        """Complete the buffered partial line with `piece`."""
+        if self._discarding:
+            self._discarding = False
+            return None
+        if self._partial:
+            self._buffer(piece)
+            if self._discarding:
+                self._discarding = False
+                return None
+            line = "".join(self._partial)
+            self._partial = []
+            self._partial_len = 0
+            return line
+        return piece
+
+    # ------------------------------------------------------------------
+    # Line handling
+    # ------------------------------------------------------------------
+
+    def _handle_line(self, line: str) -> List[ClaudeStreamEvent]:
+        line = line.strip()
+        if not line:
+            return []
+        self.lines_parsed += 1
+
+        for marker in self.markers:
+            if marker not in self.markers_seen and marker in line:
+                self.markers_seen.append(marker)
+
+        if line.startswith(CONTROL_PREFIX):
+            if line.startswith(EXIT_CODE_PREFIX):
+                try:
+                    self.exit_code = int(line[len(EXIT_CODE_PREFIX):])
+                except ValueError:
+                    pass
+            elif line.startswith(LOGS_SHIPPED_PREFIX):
+                # "<sent> <dropped>" from factory.cli_log_shipper
+                try:
+                    sent, dropped = line[len(LOGS_SHIPPED_PREFIX):].split()
+                    self.logs_shipped, self.logs_dropped = int(sent), int(dropped)
+                except ValueError:
+                    pass
+            return []
+
+        objects = self._decode_objects(line)
+        if not objects:
+            if line.startswith('{'):
+                logger.debug(f"[CLAUDE_STREAM] Could not parse JSON from line: {line[:100]}...")
+                return []
+            return self._emit([ClaudeStreamEvent(kind=EVENT_RAW, text=line)])
+
+        events: List[ClaudeStreamEvent] = []
+        for msg in objects:
+            if isinstance(msg, dict):
+                self.json_objects += 1
+                events.extend(self._events_from_message(msg))
+        return self._emit(events)
+
+    def _decode_objects(self, text: str) -> List[Any]:
+        """Decode one or more concatenated JSON values from a line."""
+        objects = []
+        idx = 0
+        length = len(text)
+        while idx < length:
+            while idx < length and text[idx] in ' \t\r':
+                idx += 1
+            if idx >= length:
+                break
+            try:
+                obj, idx = self._decoder.raw_decode(text, idx)
+            except json.JSONDecodeError:
+                break
+            objects.append(obj)
+        return objects
+
+    def _events_from_message(self, msg: Dict[str, Any]) -> List[ClaudeStreamEvent]:
+        msg_type = msg.get('type')
+        events: List[ClaudeStreamEvent] = []
+
+        if msg_type == 'system' and msg.get('subtype') == 'init':
+            self.session_id = msg.get('session_id')
+            events.append(ClaudeStreamEvent(kind=EVENT_SYSTEM_INIT, session_id=self.session_id))
+
+        elif msg_type == 'assistant':
+            for block in _content_blocks(msg):
+                if isinstance(block, str):
+                    if block:
+                        events.append(ClaudeStreamEvent(kind=EVENT_TEXT, text=block))
+                    continue
+                if not isinstance(block, dict):
+                    continue
+                block_type = block.get('type')
+                if block_type == 'text':
+                    text = block.get('text', '')
+                    if text:
+                        events.append(ClaudeStreamEvent(kind=EVENT_TEXT, text=text))
+                elif block_type == 'tool_use':
+                    tool_input = block.get('input', {})
+                    events.append(ClaudeStreamEvent(
+                        kind=EVENT_TOOL_USE,
+                        name=block.get('name', 'unknown'),
+                        input=tool_input if isinstance(tool_input, dict) else {'value': tool_input},
+                    ))
+
+        elif msg_type == 'user':
+            for block in _content_blocks(msg):
+                if isinstance(block, dict) and block.get('type') == 'tool_result':
+                    content = block.get('content', '')
+                    if isinstance(content, (list, dict)):
+                        content = json.dumps(content, indent=2)
+                    events.append(ClaudeStreamEvent(
+                        kind=EVENT_TOOL_RESULT,
+                        text=str(content),
+                        is_error=bool(block.get('is_error', False)),
+                    ))
+
+        elif msg_type == 'result':
+            self.final_result = msg.get('result')
+            self.saw_result = True
+            events.append(ClaudeStreamEvent(kind=EVENT_RESULT, text=self.final_result or ''))
+
+        return events
+
+    def _emit(self, events: List[ClaudeStreamEvent]) -> List[ClaudeStreamEvent]:
+        for event in events:
+            self.messages.append(event.to_message())
+        return events
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+
+    @property
+    def output(self) -> str:
+        """Bounded raw transcript (head + tail), keeping any markers seen."""
+        note = ""
+        if self.transcript.dropped_chars and self.markers_seen:
+            note = "; markers: " + " | ".join(self.markers_seen)
+        return self.transcript.getvalue(elided_note=note)
+
+    def result(self) -> Dict[str, Any]:
+        """Summary in the shape returned by parse_claude_json_stream()."""
+        return {
+            'session_id': self.session_id,
+            'messages': list(self.messages),
+            'final_result': self.final_result,
+        }
+
+
+def _content_blocks(msg: Dict[str, Any]) -> List[Any]:
+    content_blocks = (msg.get('message') or {}).get('content', [])
+    if not isinstance(content_blocks, list):
+        content_blocks = [content_blocks] if content_blocks else []
+    return content_blocks
+
+
+# ============================================================================
+# TicketLog writer
+# ============================================================================
+
+def _format_tool_use(name: str, tool_input: Dict[str, Any]):
+    """Return (output, explanation) for a tool_use log row."""
+    if name == 'Bash':
+        cmd = tool_input.get('command', '')
+        desc = tool_input.get('description', '')
+        return (f"{desc}\n{cmd}" if desc else cmd), (desc if desc else f"Running command: {cmd[:80]}")
+    if name in ('Read', 'Write', 'Edit'):
+        file_path = tool_input.get('file_path', '')
+        verb = {'Read': 'Reading', 'Write': 'Writing', 'Edit': 'Editing'}[name]
+        return f"File: {file_path}", f"{verb} file: {file_path.split('/')[-1] if file_path else 'unknown'}"
+    if name == 'Glob':
+        pattern = tool_input.get('pattern', '')
+        return f"Pattern: {pattern}", f"Searching for files: {pattern}"
+    if name == 'Grep':
+        pattern = tool_input.get('pattern', '')
+        path = tool_input.get('path', 'codebase')
+        return f"Search: {pattern} in {path}", f"Searching for: {pattern}"
+    if name == 'TodoWrite':
+        return str(tool_input)[:1000], "Updating task list"
+    if name == 'Task':
+        return str(tool_input)[:1000], tool_input.get('description', 'Running subtask')
+    return str(tool_input)[:1000], f"Using tool: {name}"
+
+
+class TicketLogStreamWriter:
+    """
+    Persists ClaudeStreamEvents as TicketLog rows in small batches.
+
+    Call it with the events from each parsed chunk; rows are written with
+    a single bulk_create per call and then broadcast to the ticket's
+    WebSocket group. TodoWrite tool calls are synced to ProjectTodoList.
+
+    With structured_logs=False the text/tool rows are left to the workspace
+    log shipper (factory.cli_log_shipper); raw output rows and the TodoWrite
+    sync are still handled here.
+    """
+
+    def __init__(
+        self,
+        ticket_id: int,
+        min_text_chars: int = 10,
+        min_result_chars: int = 50,
+        raw_interval: float = 3.0,
+        raw_command: str = 'CLI output',
+        raw_label: str = 'Agent output',
+        sync_todos: bool = True,
+        structured_logs: bool = True,
+        log_prefix: str = '[CLI CALLBACK]',
+    ):
+        self.ticket_id = ticket_id
+        self.min_text_chars = min_text_chars
+        self.min_result_chars = min_result_chars
+        self.raw_interval = raw_interval
+        self.raw_command = raw_command
+        self.raw_label = raw_label
+        self.sync_todos = sync_todos
+        self.structured_logs = structured_logs
+        self.log_prefix = log_prefix
+
+        self.logs_written = 0
+        self._pending: List[Any] = []
+        self._last_raw_time = 0.0
+        self._last_raw_line = ''
+
+    def __call__(self, events: Iterable[ClaudeStreamEvent]):
+        for event in events:
+            try:
+                self._handle(event)
+            except Exception as e:
+                logger.warning(f"{self.log_prefix} Failed to handle {event.kind} event: {e}")
+        self.flush()
+
+    def _queue(self, log_type: str, command: str, output: str, explanation: str = None):
+        from projects.models import TicketLog
+
+        self._pending.append(TicketLog(
+            ticket_id=self.ticket_id,
+            log_type=log_type,
+            command=command,
+            explanation=explanation,
+            output=output,
+        ))
+
+    def _handle(self, event: ClaudeStreamEvent):
+        if event.kind == EVENT_TOOL_USE and event.name == 'TodoWrite' and self.sync_todos:
+            self._sync_todos(event.input.get('todos', []))
+
+        if event.kind in (EVENT_TEXT, EVENT_TOOL_USE, EVENT_TOOL_RESULT) and not self.structured_logs:
+            return
+
+        if event.kind == EVENT_TEXT:
+            if event.text and len(event.text) > self.min_text_chars:
+                self._queue('ai_response', 'Claude CLI Response', event.text[:4000])
+
+        elif event.kind == EVENT_TOOL_USE:
+            output_str, explanation = _format_tool_use(event.name, event.input)
+            self._queue('command', event.name, output_str[:4000], explanation)
+
+        elif event.kind == EVENT_TOOL_RESULT:
+            content = event.text[:4000]
+            if content and len(content) > self.min_result_chars:
+                snippet = content.replace('\n', ' ').strip()[:100]
+                label = 'Error' if event.is_error else 'Result'
+                self._queue(
+                    'command',
+                    'Result' + (' (Error)' if event.is_error else ''),
+                    content,
+                    f"{label}: {snippet}",
+                )
+
+        elif event.kind == EVENT_RAW and self.raw_interval is not None:
+            # Non-JSON output (progress, errors): at most one row per interval, no repeats
+            now = time.time()
+            if (now - self._last_raw_time) >= self.raw_interval and event.text != self._last_raw_line:
+                snippet = event.text[:120].replace('\r', ' ')
+                self._queue('command', self.raw_command, event.text[:4000], f"{self.raw_label}: {snippet}")
+                self._last_raw_time = now
+                self._last_raw_line = event.text
+
+    def flush(self):
+        """Write pending rows and broadcast them."""
+        if not self._pending:
+            return
+        from django.db import connection
+        from projects.models import TicketLog
+
+        pending, self._pending = self._pending, []
+        try:
+            if connection.features.can_return_rows_from_bulk_insert:
+                created = TicketLog.objects.bulk_create(pending)
+            else:
+                created = []
+                for log in pending:
+                    log.save()
+                    created.append(log)
+        except Exception as e:
+            logger.warning(f"{self.log_prefix} Failed to write {len(pending)} ticket logs: {e}")
+            return
+
+        self.logs_written += len(created)
+        logger.info(f"{self.log_prefix} Wrote {len(created)} ticket logs (total {self.logs_written})")
+        self._broadcast(created)
+
+    def close(self):
+        """Flush anything still pending."""
+        self.flush()
+
+    def _broadcast(self, logs: List[Any]):
+        """One WebSocket group message for the whole batch."""
+        from asgiref.sync import async_to_sync
+        from projects.websocket_utils import async_send_ticket_logs_notification
+
+        try:
+            async_to_sync(async_send_ticket_logs_notification)(self.ticket_id, [
+                {
+                    'id': log.id,
+                    'log_type': log.log_type,
+                    'command': log.command,
+                    'explanation': log.explanation or '',
+                    'output': log.output or '',
+                    'created_at': log.created_at.isoformat() if log.created_at else datetime.now().isoformat(),
+                }
+                for log in logs
+            ])
+        except Exception as e:
+            logger.warning(f"{self.log_prefix} Broadcast error: {e}")
+
+    def _sync_todos(self, todos: List[Dict[str, Any]]):
+        """Mirror the CLI's TodoWrite list into ProjectTodoList and broadcast updates."""
+        if not todos or not isinstance(todos, list):
+            return
+
+        from asgiref.sync import async_to_sync
+        from projects.models import ProjectTodoList
+        from projects.websocket_utils import async_send_ticket_log_notification
+
+        # Status mapping: Claude CLI -> ProjectTodoList
+        status_map = {
+            'completed': 'success',
+            'in_progress': 'in_progress',
+            'pending': 'pending'
+        }
+
+        try:
+            existing_tasks = {
+                t.cli_task_id: t for t in
+                ProjectTodoList.objects.filter(ticket_id=self.ticket_id)
+                if t.cli_task_id
+            }
+
+            for idx, todo in enumerate(todos):
+                cli_id = todo.get('id', str(idx))
+                content = todo.get('content', '')
+                status = status_map.get(todo.get('status', 'pending'), 'pending')
+
+                if cli_id in existing_tasks:
+                    task = existing_tasks[cli_id]
+                    task.description = content
+                    task.status = status
+                    task.order = idx
+                    task.save(update_fields=['description', 'status', 'order', 'updated_at'])
+                else:
+                    task = ProjectTodoList.objects.create(
+                        ticket_id=self.ticket_id,
+                        description=content,
+                        status=status,
+                        order=idx,
+                        cli_task_id=cli_id
+                    )
+
+                try:
+                    async_to_sync(async_send_ticket_log_notification)(self.ticket_id, {
+                        'is_notification': True,
+                        'notification_type': 'task_update',
+                        'ticket_id': self.ticket_id,
+                        'task': {
+                            'id': task.id,
+                            'content': task.description,
+                            'status': task.status,
+                            'order': task.order
+                        }
+                    })
+                except Exception:
+                    pass
+
+            logger.info(f"{self.log_prefix} Synced {len(todos)} tasks to ProjectTodoList")
+        except Exception as e:
+            logger.warning(f"{self.log_prefix} Failed to sync todos: {e}")
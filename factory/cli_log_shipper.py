@@ -0,0 +1,117 @@
+"""
+Workspace-side CLI Log Shipper
+
+A bash + curl script that runs next to the Claude CLI inside the workspace
+and posts its stream-json output to /api/v1/cli/stream/batch/ as short
+NDJSON requests. A batch is flushed every FLUSH_LINES lines, FLUSH_BYTES
+bytes or FLUSH_SECONDS seconds, whichever comes first. Each line is sent
+as a ``stream_json`` entry keyed ``<run_id>:<line number>``, so a retried
+POST never creates the same TicketLog twice.
+
+It is a shell script because every workspace image has bash and curl
+(see factory.mags), while python3 is only installed on Python stacks.
+
+When its input closes the shipper flushes what is left and prints
+"<sent> <dropped>". The runner appends that to the CLI output file as a
+___CLAUDE_LOGS_SHIPPED= control line, which ClaudeStreamParser reads back.
+
+Usage:
+    from factory.cli_log_shipper import SHIPPER_SCRIPT, can_ship_logs, shipper_args
+
+    if can_ship_logs(lfg_env):
+        # write SHIPPER_SCRIPT to the workspace, then in the runner:
+        # claude ... 2>&1 | tee out.jsonl | bash shipper.sh {shipper_args(run_id)} > summary
+"""
+
+FLUSH_LINES = 50
+FLUSH_BYTES = 256 * 1024
+FLUSH_SECONDS = 2
+
+# lfg_env keys the script reads
+REQUIRED_ENV = ('LFG_API_URL', 'LFG_API_KEY', 'LFG_TICKET_ID')
+
+SHIPPER_SCRIPT = r"""#!/bin/bash
+# Usage: bash shipper.sh <run_id> <flush_lines> <flush_bytes> <flush_seconds>
+# Reads Claude CLI stream-json on stdin, needs LFG_API_URL, LFG_API_KEY, LFG_TICKET_ID.
+RUN_ID="$1"
+FLUSH_LINES="${2:-50}"
+FLUSH_BYTES="${3:-262144}"
+FLUSH_SECONDS="${4:-2}"
+URL="${LFG_API_URL%/}/api/v1/cli/stream/batch/?ticket_id=${LFG_TICKET_ID}"
+
+BATCH=$(mktemp)
+trap 'rm -f "$BATCH"' EXIT
+SEQ=0
+COUNT=0
+BYTES=0
+SENT=0
+DROPPED=0
+PARTIAL=""
+LAST_FLUSH=$SECONDS
+
+flush() {
+    [ "$COUNT" -gt 0 ] || return 0
+    local attempt code=000
+    for attempt in 1 2 3; do
+        code=$(curl -s -o /dev/null -w '%{http_code}' --max-time 15 -X POST "$URL" \
+            -H "X-CLI-API-Key: $LFG_API_KEY" \
+            -H "Content-Type: application/x-ndjson" \
+            --data-binary @"$BATCH")
+        case "$code" in
+            2??) break ;;
+            000|429|5??) sleep "$attempt" ;;
+            *) break ;;
+        esac
+    done
+    case "$code" in
+        2??) SENT=$((SENT + COUNT)) ;;
+        *) DROPPED=$((DROPPED + COUNT)) ;;
+    esac
+    : > "$BATCH"
+    COUNT=0
+    BYTES=0
+    LAST_FLUSH=$SECONDS
+}
+
+add_line() {
+    local line="${1%$'\r'}"
+    SEQ=$((SEQ + 1))
+    # Only whole JSON objects are shipped; anything else stays in the output file
+    case "$line" in
+        '{'*'}') ;;
+        *) return 0 ;;
+    esac
+    printf '{"type":"stream_json","key":"%s:%d","data":%s}\n' "$RUN_ID" "$SEQ" "$line" >> "$BATCH"
+    COUNT=$((COUNT + 1))
+    BYTES=$((BYTES + ${#line}))
+}
+
+while :; do
+    if IFS= read -r -t 1 chunk; then
+        add_line "$PARTIAL$chunk"
+        PARTIAL=""
+    elif [ $? -gt 128 ]; then
+        # Timed out mid-line: read already consumed the partial text
+        PARTIAL="$PARTIAL$chunk"
+    else
+        [ -n "$PARTIAL$chunk" ] && add_line "$PARTIAL$chunk"
+        break
+    fi
+    if [ "$COUNT" -ge "$FLUSH_LINES" ] || [ "$BYTES" -ge "$FLUSH_BYTES" ] \
+        || { [ "$COUNT" -gt 0 ] && [ $((SECONDS - LAST_FLUSH)) -ge "$FLUSH_SECONDS" ]; }; then
+        flush
+    fi
+done
+flush
+echo "$SENT $DROPPED"
+"""
+
+
+def can_ship_logs(lfg_env):
+    """True if lfg_env has everything the shipper needs to reach the API."""
+    return bool(lfg_env) and all(lfg_env.get(key) for key in REQUIRED_ENV)
+
+
+def shipper_args(run_id, flush_lines=FLUSH_LINES, flush_bytes=FLUSH_BYTES, flush_seconds=FLUSH_SECONDS):
+    """Command-line arguments for SHIPPER_SCRIPT."""
+    return f"{run_id} {int(flush_lines)} {int(flush_bytes)} {int(flush_seconds)}"
@@ -0,0 +1,214 @@
+"""
+Workspace Command Result Cache
+
+Memoizes the output of read-only inspection commands (`ls`, `cat
+package.json`, `git status`, ...) run in a workspace, so an agent that
+re-runs them while nothing has changed gets the answer without a round
+trip.
+
+- Caching is opt-in per call (the ssh_command tool's `use_cache` flag) and
+  only applies to commands classified as read-only: every pipeline segment
+  must be an allowlisted inspection command, and redirections, command
+  substitution and in-place edits disqualify the whole command.
+- Each workspace has a mutation epoch, a counter in the Django cache.
+  factory.mags bumps it after every command that is not read-only
+  (run_command, run_ssh and the streaming variants, whatever the caller),
+  and Claude CLI runs and file syncs bump it too. Entries are keyed by
+  epoch, so one bump makes every cached result for that workspace
+  unreachable.
+- Hits and lookups are counted per workspace for reporting.
+
+Usage:
+    from factory.command_cache import get_cached_result, store_result, bump_workspace_epoch
+
+    cached = get_cached_result(workspace_id, command)
+    if cached is None:
+        result = run(command)
+        store_result(workspace_id, command, result)
+"""
+
+import hashlib
+import logging
+import re
+import shlex
+import time
+from typing import Optional
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+RESULT_TTL = 300
+STATS_TTL = 24 * 3600
+MAX_CACHED_OUTPUT = 256 * 1024
+
+EPOCH_KEY = 'workspace_cmd_epoch:{}'
+RESULT_KEY = 'workspace_cmd:{}:{}:{}'
+STATS_KEY = 'workspace_cmd_stats:{}:{}'
+
+# Commands that never modify the workspace, whatever their arguments
+READ_ONLY_COMMANDS = {
+    'ls', 'cat', 'head', 'tail', 'wc', 'tree', 'pwd', 'stat', 'file', 'du', 'df',
+    'grep', 'egrep', 'fgrep', 'rg', 'which', 'whoami', 'uname', 'echo', 'printf',
+    'basename', 'dirname', 'realpath', 'readlink', 'sort', 'uniq', 'cut', 'tr',
+    'jq', 'diff', 'cmp', 'md5sum', 'sha256sum', 'true', 'test', '[',
+}
+
+# Flags that make an otherwise read-only command write a file
+_WRITE_FLAGS = {
+    'find': ('-exec', '-execdir', '-delete', '-ok', '-okdir', '-fprint', '-fprintf', '-fls'),
+    'sort': ('-o', '--output'),
+    'tree': ('-o',),
+}
+
+# git subcommands that only read the repository
+READ_ONLY_GIT = {
+    'status', 'log', 'diff', 'show', 'ls-files', 'rev-parse', 'blame',
+    'describe', 'shortlog', 'grep', 'cat-file', 'ls-tree',
+}
+
+# Discarding or merging stderr is fine; any other redirection is a write
+_HARMLESS_REDIRECT_RE = re.compile(r'\d?>\s*/dev/null|2>&1')
+# Unsafe anywhere in the command: redirection, substitution, backgrounding
+_UNSAFE_RE = re.compile(r'[<>`]|\$\(|(?<!&)&(?!&)|\bsudo\b')
+_SEGMENT_SPLIT_RE = re.compile(r'\|\||&&|[|;\n]')
+
+
+def _segment_is_read_only(segment: str) -> bool:
+    try:
+        words = shlex.split(segment)
+    except ValueError:
+        return False
+    if not words:
+        return True
+    name = words[0]
+    if name == 'cd':
+        return len(words) <= 2
+    if name in READ_ONLY_COMMANDS or name == 'find':
+        write_flags = _WRITE_FLAGS.get(name, ())
+        if any(w.startswith(flag) for w in words[1:] for flag in write_flags):
+            return False
+        # `uniq in out` writes its second operand
+        if name == 'uniq' and len([w for w in words[1:] if not w.startswith('-')]) > 1:
+            return False
+        return True
+    if name == 'git':
+        args = [w for w in words[1:] if not w.startswith('-')]
+        if not args:
+            return False
+        if args[0] in READ_ONLY_GIT:
+            return True
+        # `git branch` / `git remote` only list when given no names
+        if args[0] in ('branch', 'remote') and len(args) == 1:
+            return True
+        return False
+    return False
+
+
+def is_read_only_command(command: str) -> bool:
+    """True if the command is classified as a side-effect-free inspection."""
+    if not command or not command.strip():
+        return False
+    command = _HARMLESS_REDIRECT_RE.sub(' ', command)
+    if _UNSAFE_RE.search(command):
+        return False
+    return all(_segment_is_read_only(segment) for segment in _SEGMENT_SPLIT_RE.split(command))
+
+
+def get_workspace_epoch(workspace_id: str) -> int:
+    try:
+        return int(cache.get(EPOCH_KEY.format(workspace_id)) or 0)
+    except Exception:
+        return 0
+
+
+def bump_workspace_epoch(workspace_id: str):
+    """Invalidate every cached command result for a workspace."""
+    if not workspace_id:
+        return
+    key = EPOCH_KEY.format(workspace_id)
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as e:
+        logger.warning(f"[CMD_CACHE] Failed to bump epoch for {workspace_id}: {e}")
+
+
+def _result_key(workspace_id: str, command: str, epoch: int) -> str:
+    digest = hashlib.sha256(command.encode('utf-8')).hexdigest()[:32]
+    return RESULT_KEY.format(workspace_id, epoch, digest)
+
+
+def _count(workspace_id: str, name: str):
+    key = STATS_KEY.format(workspace_id, name)
+    try:
+        cache.add(key, 0, timeout=STATS_TTL)
+        cache.incr(key)
+    except Exception:
+        pass
+
+
+def get_cached_result(workspace_id: str, command: str) -> Optional[dict]:
+    """
+    Cached result for a read-only command at the workspace's current epoch.
+
+    Returns the stored result dict (with `cached_at`) or None. Commands that
+    aren't read-only always miss and aren't counted.
+    """
+    if not is_read_only_command(command):
+        return None
+    _count(workspace_id, 'lookups')
+    try:
+        entry = cache.get(_result_key(workspace_id, command, get_workspace_epoch(workspace_id)))
+    except Exception:
+        entry = None
+    if entry:
+        _count(workspace_id, 'hits')
+        logger.info(f"[CMD_CACHE] Hit in {workspace_id}: {command[:80]}")
+    return entry
+
+
+def store_result(workspace_id: str, command: str, result: dict, epoch: int = None):
+    """
+    Remember a read-only command's result.
+
+    Pass the epoch read before the command ran; if a write bumped it in the
+    meantime the entry lands under the stale epoch and is never served.
+    Transport failures (exit -1/255) and oversized outputs are not cached.
+    """
+    if not is_read_only_command(command):
+        return
+    if result.get('exit_code') in (-1, 255, None):
+        return
+    stdout = result.get('stdout') or ''
+    stderr = result.get('stderr') or ''
+    if len(stdout) + len(stderr) > MAX_CACHED_OUTPUT:
+        return
+    if epoch is None:
+        epoch = get_workspace_epoch(workspace_id)
+    entry = {
+        'exit_code': result.get('exit_code'),
+        'stdout': stdout,
+        'stderr': stderr,
+        'cached_at': time.time(),
+    }
+    try:
+        cache.set(_result_key(workspace_id, command, epoch), entry, timeout=RESULT_TTL)
+    except Exception as e:
+        logger.debug(f"[CMD_CACHE] Failed to store result for {workspace_id}: {e}")
+
+
+def get_cache_stats(workspace_id: str) -> dict:
+    """Hit/lookup counters for a workspace."""
+    try:
+        counts = cache.get_many([STATS_KEY.format(workspace_id, n) for n in ('hits', 'lookups')])
+    except Exception:
+        counts = {}
+    hits = int(counts.get(STATS_KEY.format(workspace_id, 'hits')) or 0)
+    lookups = int(counts.get(STATS_KEY.format(workspace_id, 'lookups')) or 0)
+    return {
+        'hits': hits,
+        'lookups': lookups,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+        'epoch': get_workspace_epoch(workspace_id),
+    }
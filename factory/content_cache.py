@@ -0,0 +1,307 @@
+"""
+S3 Content Cache
+
+Read-through cache for text bodies stored in S3 (ProjectFile bodies,
+S3FileStorage and ProjectS3Storage objects), so a document read several
+times in one conversation is downloaded once.
+
+- Tier 1 is a process-local LRU bounded by total bytes
+  (S3_CONTENT_CACHE_BYTES). Tier 2 is the shared Django cache, which is
+  Redis when USE_REDIS_CHANNELS is on. Tier 2 is skipped otherwise: the
+  LocMem cache is per process, the same as tier 1.
+- Entries are keyed by S3 key and carry the object's ETag. A cached copy
+  is only served when it is known to be current:
+  - if the caller passes the ETag it expects (ProjectFile rows store the
+    ETag of their last save in `s3_etag`), a copy with that ETag is served
+    and any other is refetched, however recently it was checked;
+  - otherwise, with the shared tier on, a local copy is served only while
+    its ETag matches the shared tier's small per-key ETag record, which
+    every process's `put()` updates;
+  - otherwise (no shared tier, or the record expired), a copy checked
+    against S3 within the last REVALIDATE_AFTER seconds is served.
+  Anything else is revalidated with a conditional GET (If-None-Match), so
+  an unchanged object costs a 304 rather than a download.
+- Writers go through `put()` with the ETag S3 returned, so our own saves
+  are never stale. Deletes go through `invalidate()`.
+- `get_many()` fetches several keys, downloading the misses concurrently.
+
+Usage:
+    from factory.content_cache import get_content_cache
+
+    content_cache = get_content_cache()
+    text = content_cache.get(s3_client, bucket, key)            # None if the key doesn't exist
+    text = content_cache.get(s3_client, bucket, key, etag=file.s3_etag)
+    response = s3_client.put_object(Bucket=bucket, Key=key, Body=body)
+    content_cache.put(key, text, response.get('ETag'))
+    texts = content_cache.get_many(s3_client, bucket, [key1, key2])
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MAX_BYTES = int(os.getenv('S3_CONTENT_CACHE_BYTES', str(64 * 1024 * 1024)))
+# Larger bodies are kept out of the shared tier
+SHARED_MAX_BYTES = 2 * 1024 * 1024
+SHARED_TTL = 24 * 3600
+REVALIDATE_AFTER = int(os.getenv('S3_CONTENT_REVALIDATE_SECONDS', '300'))
+
+SHARED_KEY = 's3_content:{}'
+SHARED_ETAG_KEY = 's3_content_etag:{}'
+
+# entry: (etag, content, checked_at)
+Entry = Tuple[Optional[str], str, float]
+
+
+def _shared_key(s3_key: str) -> str:
+    return SHARED_KEY.format(hashlib.sha1(s3_key.encode('utf-8')).hexdigest())
+
+
+def _shared_etag_key(s3_key: str) -> str:
+    return SHARED_ETAG_KEY.format(hashlib.sha1(s3_key.encode('utf-8')).hexdigest())
+
+
+def _is_not_modified(error) -> bool:
+    response = getattr(error, 'response', None) or {}
+    code = str(response.get('Error', {}).get('Code', ''))
+    status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in ('304', 'NotModified') or status == 304
+
+
+def _is_missing(error) -> bool:
+    response = getattr(error, 'response', None) or {}
+    return str(response.get('Error', {}).get('Code', '')) in ('NoSuchKey', '404')
+
+
+class S3ContentCache:
+    """Two-tier (process LRU + shared cache) text cache keyed by S3 key and ETag."""
+
+    def __init__(self, max_bytes: int = LOCAL_MAX_BYTES, use_shared: bool = None):
+        self.max_bytes = max_bytes
+        self.use_shared = getattr(settings, 'USE_REDIS_CHANNELS', False) if use_shared is None else use_shared
+        self._entries: 'OrderedDict[str, Entry]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'shared_hits': 0, 'revalidated': 0, 'downloads': 0}
+
+    # ------------------------------------------------------------------
+    # Tiers
+    # ------------------------------------------------------------------
+
+    def _local_get(self, s3_key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(s3_key)
+            if entry is not None:
+                self._entries.move_to_end(s3_key)
+            return entry
+
+    def _local_set(self, s3_key: str, entry: Entry):
+        size = len(entry[1].encode('utf-8'))
+        with self._lock:
+            if s3_key in self._entries:
+                self._bytes -= self._sizes.pop(s3_key)
+                del self._entries[s3_key]
+            if size > self.max_bytes:
+                return
+            self._entries[s3_key] = entry
+            self._sizes[s3_key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+
+    def _local_delete(self, s3_key: str):
+        with self._lock:
+            if s3_key in self._entries:
+                del self._entries[s3_key]
+                self._bytes -= self._sizes.pop(s3_key)
+
+    def _shared_get_many(self, s3_keys: Iterable[str]) -> Dict[str, Entry]:
+        if not self.use_shared:
+            return {}
+        from django.core.cache import cache
+
+        keys = {_shared_key(k): k for k in s3_keys}
+        try:
+            found = cache.get_many(list(keys))
+        except Exception as e:
+            logger.warning(f"[S3_CACHE] Shared cache read failed: {e}")
+            return {}
+        return {keys[k]: tuple(v) for k, v in found.items()}
+
+    def _shared_etags(self, s3_keys: Iterable[str]) -> Dict[str, str]:
+        """Current ETag per key as last recorded by any process (missing if unknown)."""
+        if not self.use_shared:
+            return {}
+        from django.core.cache import cache
+
+        keys = {_shared_etag_key(k): k for k in s3_keys}
+        try:
+            found = cache.get_many(list(keys))
+        except Exception as e:
+            logger.warning(f"[S3_CACHE] Shared ETag read failed: {e}")
+            return {}
+        return {keys[k]: v for k, v in found.items() if v}
+
+    def _shared_set(self, s3_key: str, entry: Entry):
+        if not self.use_shared:
+            return
+        from django.core.cache import cache
+
+        values = {}
+        if entry[0]:
+            # Recorded even for bodies too large for the shared tier
+            values[_shared_etag_key(s3_key)] = entry[0]
+        if len(entry[1]) <= SHARED_MAX_BYTES:
+            values[_shared_key(s3_key)] = list(entry)
+        try:
+            cache.set_many(values, timeout=SHARED_TTL)
+        except Exception as e:
+            logger.warning(f"[S3_CACHE] Shared cache write failed: {e}")
+
+    def _store(self, s3_key: str, entry: Entry, shared: bool = True):
+        self._local_set(s3_key, entry)
+        if shared:
+            self._shared_set(s3_key, entry)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _fetch(self, s3_client, bucket: str, s3_key: str, cached: Optional[Entry]) -> Optional[str]:
+        """GET (conditional when we hold an ETag); None if the key doesn't exist."""
+        kwargs = {'Bucket': bucket, 'Key': s3_key}
+        if cached and cached[0]:
+            kwargs['IfNoneMatch'] = cached[0]
+        try:
+            response = s3_client.get_object(**kwargs)
+        except Exception as e:
+            if cached and _is_not_modified(e):
+                self.stats['revalidated'] += 1
+                self._store(s3_key, (cached[0], cached[1], time.time()))
+                return cached[1]
+            if _is_missing(e):
+                self.invalidate(s3_key)
+                return None
+            raise
+
+        content = response['Body'].read().decode('utf-8')
+        self.stats['downloads'] += 1
+        self._store(s3_key, (response.get('ETag'), content, time.time()))
+        return content
+
+    def _current(self, entry: Optional[Entry], etag: Optional[str]) -> bool:
+        """Whether a cached copy can be served without asking S3."""
+        if entry is None:
+            return False
+        if etag:
+            return entry[0] == etag
+        return time.time() - entry[2] < REVALIDATE_AFTER
+
+    def get(self, s3_client, bucket: str, s3_key: str, etag: Optional[str] = None) -> Optional[str]:
+        """
+        Body of `s3_key` as text, or None if it doesn't exist.
+
+        `etag` is the ETag the caller knows to be current (e.g.
+        ProjectFile.s3_etag); without one the shared tier's record is used.
+        """
+        etag = etag or self._shared_etags([s3_key]).get(s3_key)
+        entry = self._local_get(s3_key)
+        if self._current(entry, etag):
+            self.stats['hits'] += 1
+            return entry[1]
+
+        shared = self._shared_get_many([s3_key]).get(s3_key)
+        if self._current(shared, etag):
+            self.stats['shared_hits'] += 1
+            self._local_set(s3_key, shared)
+            return shared[1]
+
+        # Revalidate whichever copy is newer
+        candidates = [e for e in (entry, shared) if e is not None]
+        cached = max(candidates, key=lambda e: e[2]) if candidates else None
+        return self._fetch(s3_client, bucket, s3_key, cached)
+
+    def get_many(self, s3_client, bucket: str, s3_keys: Iterable[str],
+                 etags: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Optional[str]]:
+        """{s3_key: text or None}, downloading misses concurrently. `etags` as for get()."""
+        s3_keys = list(dict.fromkeys(s3_keys))
+        etags = {k: v for k, v in (etags or {}).items() if v}
+        unknown = [k for k in s3_keys if k not in etags]
+        if unknown:
+            etags.update(self._shared_etags(unknown))
+        results: Dict[str, Optional[str]] = {}
+        stale: Dict[str, Optional[Entry]] = {}
+
+        for s3_key in s3_keys:
+            entry = self._local_get(s3_key)
+            if self._current(entry, etags.get(s3_key)):
+                self.stats['hits'] += 1
+                results[s3_key] = entry[1]
+            else:
+                stale[s3_key] = entry
+
+        for s3_key, shared in self._shared_get_many(stale).items():
+            if self._current(shared, etags.get(s3_key)):
+                self.stats['shared_hits'] += 1
+                self._local_set(s3_key, shared)
+                results[s3_key] = shared[1]
+                del stale[s3_key]
+            elif stale[s3_key] is None or shared[2] > stale[s3_key][2]:
+                stale[s3_key] = shared
+
+        if stale:
+            def fetch(s3_key):
+                try:
+                    return s3_key, self._fetch(s3_client, bucket, s3_key, stale[s3_key])
+                except Exception as e:
+                    logger.error(f"[S3_CACHE] Error fetching {s3_key}: {e}")
+                    return s3_key, None
+
+            # On the shared S3 worker pool, so concurrent callers stay bounded together
+            from factory.s3_batch import get_s3_batch
+            results.update(get_s3_batch().map(fetch, list(stale)))
+
+        return {k: results.get(k) for k in s3_keys}
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def put(self, s3_key: str, content: str, etag: Optional[str] = None):
+        """Write-through after a successful put_object."""
+        self._store(s3_key, (etag, content, time.time()))
+
+    def invalidate(self, s3_key: str):
+        """Forget `s3_key` in both tiers (after a delete or a failed write)."""
+        self._local_delete(s3_key)
+        if self.use_shared:
+            from django.core.cache import cache
+
+            try:
+                cache.delete_many([_shared_key(s3_key), _shared_etag_key(s3_key)])
+            except Exception as e:
+                logger.warning(f"[S3_CACHE] Shared cache delete failed: {e}")
+
+
+_content_cache: Optional[S3ContentCache] = None
+_content_cache_lock = threading.Lock()
+
+
+def get_content_cache() -> S3ContentCache:
+    """Process-wide content cache."""
+    global _content_cache
+    if _content_cache is None:
+        with _content_cache_lock:
+            if _content_cache is None:
+                _content_cache = S3ContentCache()
+    return _content_cache
@@ -0,0 +1,398 @@
+"""
+Dev Server Jobs
+
+Runs dev-server start/stop work in a background thread pool. The HTTP
+request that triggers the work returns immediately with a job id instead of
+holding a worker for the whole install/start sequence.
+
+- Each job moves through a small state machine:
+      start: queued -> [installing ->] starting -> ready | failed
+      stop:  queued -> stopping -> stopped | failed
+  An illegal transition raises ValueError.
+- The job record lives in the Django cache, so any web worker can answer a
+  status request. Each transition and progress step is also pushed over the
+  project's workspace progress channel (WorkspaceProgressConsumer). The job
+  id and state are included in extra_data.
+- Jobs for the same scope (one workspace) run one at a time. A start request
+  for a scope that already has a start job in flight gets that job back.
+- A running job heartbeats every HEARTBEAT_INTERVAL seconds, refreshing its
+  record and its short-lived in-flight marker. A job whose worker died stops
+  heartbeating: after STALE_AFTER seconds it reads as failed and no longer
+  blocks new requests for its scope.
+- A stop request cancels the scope's in-flight start (through the cache, so
+  from any worker). The start's current workspace command is killed and its
+  next progress step raises DevServerJobCancelled, so the stop only waits
+  for the start to unwind, not for the whole install sequence.
+- `wait_until_listening()` replaces the fixed sleeps after launching a
+  server. It probes the port with exponential backoff and fails fast when
+  the server process has exited.
+
+Usage:
+    from factory.dev_server_jobs import submit_dev_server_job, get_dev_server_job
+
+    def work(job):
+        job.transition('starting', 'starting_server', 'Starting development server...')
+        ...
+        return {'success': True, 'url': url}
+
+    job = submit_dev_server_job(project_id, 'start', work, scope=f'project:{project_id}')
+    return JsonResponse({'success': True, 'job_id': job.job_id, 'state': job.state}, status=202)
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from tasks.cancellation import CancelToken
+
+logger = logging.getLogger(__name__)
+
+JOB_TTL = 3600
+JOB_KEY = 'dev_server_job:{}'
+ACTIVE_KEY = 'dev_server_job_active:{}'
+CANCEL_KEY = 'dev_server_job_cancel:{}'
+HEARTBEAT_INTERVAL = 5
+# A job not refreshed for this long is treated as dead
+STALE_AFTER = 30
+MAX_WORKERS = int(os.getenv('DEV_SERVER_JOB_WORKERS', '8'))
+
+# Readiness probing
+READY_TIMEOUT = 300
+PROBE_INITIAL_DELAY = 0.5
+PROBE_MAX_DELAY = 8.0
+READY_MARKER = 'LFG_DEV_SERVER_READY'
+EXITED_MARKER = 'LFG_DEV_SERVER_EXITED'
+
+TERMINAL_STATES = {'ready', 'stopped', 'failed'}
+_TRANSITIONS = {
+    'queued': {'installing', 'starting', 'stopping', 'failed'},
+    'installing': {'starting', 'failed'},
+    # starting -> installing: retry on a reprovisioned workspace
+    'starting': {'installing', 'ready', 'failed'},
+    'stopping': {'stopped', 'failed'},
+}
+_DONE_STATE = {'start': 'ready', 'stop': 'stopped'}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_scope_locks = {}
+_scope_locks_lock = threading.Lock()
+_live_jobs: Dict[str, 'DevServerJob'] = {}
+_live_jobs_lock = threading.Lock()
+_heartbeat_thread: Optional[threading.Thread] = None
+
+
+class DevServerJobCancelled(Exception):
+    """Raised at a progress step of a job cancelled by a stop request."""
+
+
+class DevServerJob:
+    """Handle passed to a job's work function; persists every change."""
+
+    def __init__(self, project_id: str, action: str, scope: str, job_id: str = None):
+        if action not in _DONE_STATE:
+            raise ValueError(f"Unknown dev server action: {action}")
+        self.job_id = job_id or uuid.uuid4().hex
+        self.project_id = str(project_id)
+        self.action = action
+        self.scope = scope
+        self.state = 'queued'
+        self.step = None
+        self.message = None
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        # Pass to workspace commands so a cancellation kills them
+        self.cancel_token = CancelToken(self.job_id)
+        self._finishing = False
+
+    @property
+    def active_key(self) -> str:
+        return ACTIVE_KEY.format(f"{self.scope}:{self.action}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token.cancelled
+
+    def checkpoint(self):
+        """Raise DevServerJobCancelled if a stop request cancelled this job."""
+        if self.cancelled and not self._finishing:
+            raise DevServerJobCancelled(f"Dev server job {self.job_id} was cancelled")
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'project_id': self.project_id,
+            'action': self.action,
+            'state': self.state,
+            'step': self.step,
+            'message': self.message,
+            'error': self.error,
+            'result': self.result,
+            'done': self.state in TERMINAL_STATES,
+            'created_at': self.created_at,
+            'updated_at': time.time(),
+        }
+
+    def _save(self):
+        try:
+            cache.set(JOB_KEY.format(self.job_id), self.to_dict(), timeout=JOB_TTL)
+        except Exception as e:
+            logger.warning(f"[DEV_SERVER_JOB] Failed to persist job {self.job_id}: {e}")
+
+    def progress(self, step: str, message: str = None, error: str = None, **extra):
+        """Record a progress step and push it to the project's progress channel."""
+        from projects.websocket_utils import send_workspace_progress
+
+        self.checkpoint()
+        self.step = step
+        self.message = message
+        self._save()
+        send_workspace_progress(
+            self.project_id, step, message, error=error,
+            extra_data={'job_id': self.job_id, 'state': self.state, **extra},
+        )
+
+    def transition(self, state: str, step: str = None, message: str = None, **extra):
+        """Move to a new state, optionally announcing a progress step."""
+        self.checkpoint()
+        if state == self.state:
+            if step:
+                self.progress(step, message, **extra)
+            return
+        if state not in _TRANSITIONS.get(self.state, ()):
+            raise ValueError(f"Illegal dev server job transition {self.state} -> {state}")
+        logger.info(f"[DEV_SERVER_JOB] {self.job_id} ({self.action}) {self.state} -> {state}")
+        self.state = state
+        if step:
+            self.progress(step, message, **extra)
+        else:
+            self._save()
+
+    def _heartbeat(self):
+        self._save()
+        try:
+            if cache.get(self.active_key) == self.job_id:
+                cache.set(self.active_key, self.job_id, timeout=STALE_AFTER)
+            if cache.get(CANCEL_KEY.format(self.job_id)):
+                self.cancel_token.cancel()
+        except Exception as e:
+            logger.debug(f"[DEV_SERVER_JOB] Heartbeat failed for {self.job_id}: {e}")
+
+    def _finish(self, result: dict):
+        self._finishing = True
+        done_state = _DONE_STATE[self.action]
+        if result.get('success') and self.state != done_state and done_state not in _TRANSITIONS.get(self.state, ()):
+            # The work skipped a state (e.g. stop never reached 'stopping')
+            result = {**result, 'success': False,
+                      'error': f"Illegal dev server job transition {self.state} -> {done_state}"}
+        self.result = result
+        if result.get('success'):
+            extra = {k: result[k] for k in ('url', 'branch') if result.get(k)}
+            self.transition(_DONE_STATE[self.action], 'complete', result.get('message'), **extra)
+        else:
+            self.error = result.get('error') or result.get('message') or 'Dev server job failed'
+            self.transition('failed')
+            self.progress('error', result.get('message'), error=self.error)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='dev-server-job')
+    return _executor
+
+
+def _scope_lock(scope: str) -> threading.Lock:
+    with _scope_locks_lock:
+        return _scope_locks.setdefault(scope, threading.Lock())
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with _live_jobs_lock:
+            jobs = list(_live_jobs.values())
+        for job in jobs:
+            job._heartbeat()
+
+
+def _track(job: DevServerJob):
+    global _heartbeat_thread
+    with _live_jobs_lock:
+        _live_jobs[job.job_id] = job
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(
+                target=_heartbeat_loop, name='dev-server-job-heartbeat', daemon=True,
+            )
+            _heartbeat_thread.start()
+
+
+def _untrack(job: DevServerJob):
+    with _live_jobs_lock:
+        _live_jobs.pop(job.job_id, None)
+
+
+def _is_stale(record: dict) -> bool:
+    return not record.get('done') and time.time() - record.get('updated_at', 0) > STALE_AFTER
+
+
+def get_dev_server_job(job_id: str) -> Optional[dict]:
+    """Current record of a job, or None if unknown or expired."""
+    try:
+        record = cache.get(JOB_KEY.format(job_id))
+    except Exception:
+        return None
+    if record and _is_stale(record):
+        # The worker running it died; report what the job will never say itself
+        return {**record, 'state': 'failed', 'done': True, 'error': 'Dev server job stopped responding'}
+    return record
+
+
+def cancel_dev_server_job(job_id: str):
+    """Ask a job to stop at its next step, whichever worker runs it."""
+    try:
+        cache.set(CANCEL_KEY.format(job_id), 1, timeout=JOB_TTL)
+    except Exception as e:
+        logger.warning(f"[DEV_SERVER_JOB] Failed to flag job {job_id} for cancellation: {e}")
+    with _live_jobs_lock:
+        job = _live_jobs.get(job_id)
+    if job is not None:
+        job.cancel_token.cancel()
+
+
+def _run(job: DevServerJob, work: Callable[[DevServerJob], dict]):
+    close_old_connections()
+    try:
+        with _scope_lock(job.scope):
+            try:
+                result = work(job) if not job.cancelled else None
+            except DevServerJobCancelled:
+                result = None
+            except Exception as e:
+                logger.error(f"[DEV_SERVER_JOB] {job.job_id} ({job.action}) crashed: {e}", exc_info=True)
+                result = {'success': False, 'error': str(e)}
+            if job.cancelled:
+                logger.info(f"[DEV_SERVER_JOB] {job.job_id} ({job.action}) cancelled by a stop request")
+                result = {'success': False, 'message': 'Cancelled by a stop request', 'error': 'Cancelled'}
+            job._finish(result or {'success': False})
+    finally:
+        _untrack(job)
+        try:
+            if cache.get(job.active_key) == job.job_id:
+                cache.delete(job.active_key)
+        except Exception:
+            pass
+        close_old_connections()
+
+
+def submit_dev_server_job(project_id, action: str, work: Callable[[DevServerJob], dict], scope: str) -> DevServerJob:
+    """
+    Queue `work(job)` in the background and return its job.
+
+    `work` returns the result payload; {'success': True, ...} ends the job
+    in its done state ('ready' / 'stopped'), anything else in 'failed'.
+    If the same action is already in flight for `scope`, that job is
+    returned instead. A stop cancels the scope's in-flight start.
+    """
+    job = DevServerJob(project_id, action, scope)
+    if action == 'stop':
+        try:
+            start_job_id = cache.get(ACTIVE_KEY.format(f"{scope}:start"))
+        except Exception:
+            start_job_id = None
+        if start_job_id:
+            logger.info(f"[DEV_SERVER_JOB] Stop for {scope} cancels start job {start_job_id}")
+            cancel_dev_server_job(start_job_id)
+
+    try:
+        claimed = cache.add(job.active_key, job.job_id, timeout=STALE_AFTER)
+    except Exception:
+        claimed = True
+    if not claimed:
+        existing = get_dev_server_job(cache.get(job.active_key) or '')
+        if existing and not existing.get('done'):
+            logger.info(f"[DEV_SERVER_JOB] Reusing in-flight {action} job {existing['job_id']} for {scope}")
+            job.job_id = existing['job_id']
+            job.state = existing['state']
+            return job
+        cache.set(job.active_key, job.job_id, timeout=STALE_AFTER)
+
+    job._save()
+    _track(job)
+    _get_executor().submit(_run, job, work)
+    logger.info(f"[DEV_SERVER_JOB] Queued {action} job {job.job_id} for {scope}")
+    return job
+
+
+def _probe_command(workspace_path: str, port) -> str:
+    # Listening socket first (cheap, and a Next.js first request may take
+    # longer than the probe), then an HTTP request where netstat is missing
+    return f"""
+cd {workspace_path} 2>/dev/null
+pid=$(cat .devserver_pid 2>/dev/null)
+if [ -n "$pid" ] && ! kill -0 "$pid" 2>/dev/null; then
+  echo {EXITED_MARKER}
+  tail -50 dev.log 2>/dev/null
+  exit 0
+fi
+if netstat -ltn 2>/dev/null | grep -Eq "[:.]{port}[[:space:]]"; then
+  echo {READY_MARKER}
+elif command -v curl >/dev/null 2>&1 && curl -s -o /dev/null -m 3 http://localhost:{port}/; then
+  echo {READY_MARKER}
+fi
+"""
+
+
+def wait_until_listening(
+    run: Callable[[str, int], dict],
+    workspace_path: str,
+    port,
+    timeout: float = READY_TIMEOUT,
+    cancel_token=None,
+) -> Tuple[bool, str]:
+    """
+    Probe a freshly started dev server until it accepts connections.
+
+    Args:
+        run: callable(command, timeout) -> result dict, executing in the workspace
+        cancel_token: Optional CancelToken (e.g. DevServerJob.cancel_token)
+                      that ends the wait early
+
+    Returns:
+        (ready, detail) - detail holds the dev.log tail if the process
+        exited, or a timeout message.
+    """
+    command = _probe_command(workspace_path, port)
+    deadline = time.monotonic() + timeout
+    delay = PROBE_INITIAL_DELAY
+    probes = 0
+    while True:
+        probes += 1
+        try:
+            stdout = run(command, 30).get('stdout', '') or ''
+        except Exception as e:
+            logger.debug(f"[DEV_SERVER_JOB] Readiness probe failed: {e}")
+            stdout = ''
+        if READY_MARKER in stdout:
+            logger.info(f"[DEV_SERVER_JOB] Port {port} ready after {probes} probes")
+            return True, ''
+        if EXITED_MARKER in stdout:
+            return False, stdout.split(EXITED_MARKER, 1)[1].strip()
+        if time.monotonic() + delay > deadline:
+            return False, f"Dev server did not start listening on port {port} within {int(timeout)}s"
+        if cancel_token is not None:
+            if cancel_token.wait(delay):
+                return False, 'Cancelled'
+        else:
+            time.sleep(delay)
+        delay = min(delay * 2, PROBE_MAX_DELAY)
@@ -0,0 +1,281 @@
+"""
+Project Environment Bundles
+
+Caches each project's decrypted environment as a pre-rendered block of
+`export` statements, so workspace commands stop re-querying and
+re-decrypting every ProjectEnvironmentVariable on each call.
+
+- Bundles live in process memory for BUNDLE_TTL seconds.
+- Every bundle records the project's env version. The version is a counter
+  in the Django cache, bumped whenever a variable is saved or deleted. A
+  bundle whose version no longer matches is rebuilt on its next use.
+- A bundle can also be installed into a workspace as a file
+  (ENV_BUNDLE_DIR/<digest>.sh). Later commands in that workspace only
+  source the file. If the file has gone missing (workspace recreated), the
+  prelude exits with ENV_MISSING_EXIT and prints ENV_MISSING_MARKER to
+  stderr before the command runs. The caller can then reinstall the bundle
+  and retry.
+
+Usage:
+    from factory.env_bundle import get_env_bundle, env_setup_lines
+
+    bundle = get_env_bundle(project_id)
+    bundle.exports  # ["export KEY='value'", ...]
+
+    lines, install = env_setup_lines(project_id, workspace_key=job_id)
+    ...run "\\n".join(lines + [command])...
+    if install:
+        mark_installed(job_id, install)
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_TTL = 60
+VERSION_KEY = 'project_env_version:{}'
+
+ENV_BUNDLE_DIR = '/root/.lfg/env'
+ENV_MISSING_EXIT = 86
+ENV_MISSING_MARKER = '__LFG_ENV_BUNDLE_MISSING__'
+
+# How long a workspace is trusted to still hold an installed bundle
+INSTALLED_TTL = 1800
+_MAX_ENTRIES = 1024
+
+
+@dataclass(frozen=True)
+class EnvBundle:
+    """Rendered export block for one project at one env version."""
+    project_pk: int
+    version: int
+    exports: Tuple[str, ...]
+    digest: str
+
+    @property
+    def path(self) -> str:
+        return f"{ENV_BUNDLE_DIR}/{self.digest}.sh"
+
+    def install_lines(self) -> List[str]:
+        """Shell lines that write the bundle file (mode 600) and source it."""
+        delimiter = f"LFG_ENV_{self.digest}"
+        return [
+            f"mkdir -p {ENV_BUNDLE_DIR} && chmod 700 {ENV_BUNDLE_DIR}",
+            f"(umask 077 && cat > {self.path}.tmp <<'{delimiter}'",
+            *self.exports,
+            delimiter,
+            ")",
+            f"mv -f {self.path}.tmp {self.path}",
+            f"find {ENV_BUNDLE_DIR} -name '*.sh' ! -name '{self.digest}.sh' -delete 2>/dev/null || true",
+            f". {self.path}",
+        ]
+
+    def source_lines(self) -> List[str]:
+        """Shell lines that source an already installed bundle file."""
+        return [
+            f"if [ ! -f {self.path} ]; then echo {ENV_MISSING_MARKER} >&2; exit {ENV_MISSING_EXIT}; fi",
+            f". {self.path}",
+        ]
+
+
+def get_env_version(project_pk: int) -> int:
+    """Current env version for a project (0 if never bumped or evicted)."""
+    try:
+        return int(cache.get(VERSION_KEY.format(project_pk)) or 0)
+    except Exception:
+        return 0
+
+
+def bump_env_version(project_pk: int):
+    """Invalidate every cached bundle for a project, in all processes."""
+    key = VERSION_KEY.format(project_pk)
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as e:
+        logger.warning(f"[ENV] Failed to bump env version for project {project_pk}: {e}")
+    _bundle_cache.drop(project_pk)
+
+
+def _render_exports(env_vars: Dict[str, str]) -> Tuple[str, ...]:
+    exports = []
+    for key, value in sorted(env_vars.items()):
+        # Escape single quotes in value for shell safety
+        escaped_value = value.replace("'", "'\\''")
+        exports.append(f"export {key}='{escaped_value}'")
+    return tuple(exports)
+
+
+class EnvBundleCache:
+    """Process-local bundle cache plus the per-workspace install markers."""
+
+    def __init__(self, ttl: float = BUNDLE_TTL, installed_ttl: float = INSTALLED_TTL):
+        self.ttl = ttl
+        self.installed_ttl = installed_ttl
+        self._lock = threading.Lock()
+        # raw project_id argument -> project pk
+        self._project_pks: Dict[str, int] = {}
+        # project pk -> (bundle, built_at)
+        self._bundles: Dict[int, Tuple[EnvBundle, float]] = {}
+        # workspace key -> (digest, installed_at)
+        self._installed: Dict[str, Tuple[str, float]] = {}
+
+        self.hits = 0
+        self.builds = 0
+
+    def _resolve_project_pk(self, project_id) -> Optional[int]:
+        raw = str(project_id)
+        with self._lock:
+            pk = self._project_pks.get(raw)
+        if pk is not None:
+            return pk
+
+        from projects.models import Project
+
+        project = None
+        # Try to convert to int for database id lookup
+        try:
+            project = Project.objects.filter(id=int(project_id)).only('id').first()
+        except (ValueError, TypeError):
+            pass
+        # If not found, try by project_id string
+        if not project and project_id:
+            project = Project.objects.filter(project_id=raw).only('id').first()
+
+        pk = project.id if project else None
+        if pk:
+            # Only positive lookups are remembered; a project may be created later
+            with self._lock:
+                if len(self._project_pks) >= _MAX_ENTRIES:
+                    self._project_pks.clear()
+                self._project_pks[raw] = pk
+        return pk
+
+    def get(self, project_id) -> Optional[EnvBundle]:
+        if not project_id:
+            return None
+        project_pk = self._resolve_project_pk(project_id)
+        if not project_pk:
+            logger.debug(f"[ENV] No project found for project_id={project_id}")
+            return None
+
+        version = get_env_version(project_pk)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._bundles.get(project_pk)
+        if entry:
+            bundle, built_at = entry
+            if bundle.version == version and now - built_at < self.ttl:
+                self.hits += 1
+                return bundle
+
+        bundle = self._build(project_pk, version)
+        with self._lock:
+            if len(self._bundles) >= _MAX_ENTRIES:
+                self._bundles.clear()
+            self._bundles[project_pk] = (bundle, now)
+        return bundle
+
+    def _build(self, project_pk: int, version: int) -> EnvBundle:
+        from projects.models import ProjectEnvironmentVariable
+
+        env_vars = ProjectEnvironmentVariable.get_project_env_dict(project_pk)
+        exports = _render_exports(env_vars)
+        digest = hashlib.sha256('\n'.join(exports).encode('utf-8')).hexdigest()[:16]
+        self.builds += 1
+        if exports:
+            logger.info(f"[ENV] Built env bundle for project {project_pk}: {len(exports)} vars, version {version}")
+        return EnvBundle(project_pk=project_pk, version=version, exports=exports, digest=digest)
+
+    def drop(self, project_pk: int):
+        with self._lock:
+            self._bundles.pop(project_pk, None)
+
+    def is_installed(self, workspace_key: str, bundle: EnvBundle) -> bool:
+        with self._lock:
+            entry = self._installed.get(workspace_key)
+        if not entry:
+            return False
+        digest, installed_at = entry
+        return digest == bundle.digest and time.monotonic() - installed_at < self.installed_ttl
+
+    def mark_installed(self, workspace_key: str, bundle: EnvBundle):
+        with self._lock:
+            if len(self._installed) >= _MAX_ENTRIES:
+                self._installed.clear()
+            self._installed[workspace_key] = (bundle.digest, time.monotonic())
+
+    def forget_installed(self, workspace_key: str):
+        with self._lock:
+            self._installed.pop(workspace_key, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'bundles': len(self._bundles),
+                'installed_workspaces': len(self._installed),
+                'hits': self.hits,
+                'builds': self.builds,
+            }
+
+
+_bundle_cache = EnvBundleCache()
+
+
+def get_env_bundle(project_id) -> Optional[EnvBundle]:
+    """Cached export bundle for a project (DB id or project_id string)."""
+    return _bundle_cache.get(project_id)
+
+
+def env_setup_lines(project_id, workspace_key: str = None) -> Tuple[List[str], Optional[EnvBundle]]:
+    """
+    Shell lines that put a project's env vars into a command's environment.
+
+    Without a workspace_key the exports are inlined. With one, the first
+    command installs the bundle file and later commands only source it.
+
+    Returns:
+        (lines, bundle_to_mark) - bundle_to_mark is set when these lines
+        install the file; pass it to mark_installed() once the command
+        has run.
+    """
+    try:
+        bundle = get_env_bundle(project_id)
+    except Exception as e:
+        logger.warning(f"[ENV] Failed to get project env vars: {e}", exc_info=True)
+        return [], None
+    if not bundle or not bundle.exports:
+        return [], None
+    if not workspace_key:
+        return list(bundle.exports), None
+    if _bundle_cache.is_installed(workspace_key, bundle):
+        return bundle.source_lines(), None
+    return bundle.install_lines(), bundle
+
+
+def mark_installed(workspace_key: str, bundle: EnvBundle):
+    """Record that a workspace now holds the bundle file."""
+    _bundle_cache.mark_installed(workspace_key, bundle)
+
+
+def is_missing_bundle(result: dict) -> bool:
+    """True if a command result means the sourced bundle file was missing."""
+    if result.get('exit_code') != ENV_MISSING_EXIT:
+        return False
+    return ENV_MISSING_MARKER in f"{result.get('stderr') or ''}{result.get('stdout') or ''}"
+
+
+def forget_installed(workspace_key: str):
+    """Drop a workspace's install marker so the next command reinstalls."""
+    _bundle_cache.forget_installed(workspace_key)
+
+
+def get_env_bundle_stats() -> dict:
+    return _bundle_cache.get_stats()
@@ -1,11 +1,13 @@
 import os
-import boto3
 from django.conf import settings
 from pathlib import Path
 from typing import Optional, Union
 from botocore.exceptions import ClientError
 import logging
 
+from factory.content_cache import get_content_cache
+from factory.s3_batch import get_s3_batch
+
 logger = logging.getLogger(__name__)
 
 
@@ -81,12 +83,14 @@ class FileStorage:
         """
         raise NotImplementedError
     
-    def get_project_structure(self, project_name: str) -> dict:
+    def get_project_structure(self, project_name: str, include_content: bool = False) -> dict:
         """
         Get the complete project structure as a nested dictionary.
         
         Args:
             project_name: Name of the project (root folder)
+            include_content: If True, file leaves hold the file content
+                             (None if unreadable) instead of "file"
             
         Returns:
             Dict representing the file structure
@@ -194,7 +198,7 @@ class LocalFileStorage(FileStorage):
             logger.error(f"Error listing files: {e}")
             return []
     
-    def get_project_structure(self, project_name: str) -> dict:
+    def get_project_structure(self, project_name: str, include_content: bool = False) -> dict:
         try:
             base_dir = self._get_full_path(project_name, "")
             
@@ -205,7 +209,10 @@ class LocalFileStorage(FileStorage):
                 tree = {}
                 for item in sorted(path.iterdir()):
                     if item.is_file():
-                        tree[item.name] = "file"
+                        if include_content:
+                            tree[item.name] = self.get_file(project_name, str(item.relative_to(base_dir)))
+                        else:
+                            tree[item.name] = "file"
                     elif item.is_dir():
                         tree[item.name] = build_tree(item)
                 return tree
@@ -224,12 +231,8 @@ class S3FileStorage(FileStorage):
     
     def __init__(self, bucket_name: Optional[str] = None):
         self.bucket_name = bucket_name or settings.AWS_STORAGE_BUCKET_NAME
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-1')
-        )
+        # Shared pooled client (see factory.s3_batch)
+        self.s3_client = get_s3_batch().client
         self.prefix = getattr(settings, 'AWS_S3_PROJECT_PREFIX', 'projects')
     
     def _get_s3_key(self, project_name: str, file_path: str) -> str:
@@ -237,46 +240,53 @@ class S3FileStorage(FileStorage):
         return f"{self.prefix}/{project_name}/{file_path}"
     
     def save_file(self, project_name: str, file_path: str, content: str, create_new: bool = True) -> bool:
+        s3_key = self._get_s3_key(project_name, file_path)
         try:
-            s3_key = self._get_s3_key(project_name, file_path)
-            
             if create_new and self.file_exists(project_name, file_path):
                 logger.warning(f"File already exists: {s3_key}")
                 return False
             
             # Upload to S3
-            self.s3_client.put_object(
+            response = self.s3_client.put_object(
                 Bucket=self.bucket_name,
                 Key=s3_key,
                 Body=content.encode('utf-8'),
                 ContentType='text/plain',
                 ContentEncoding='utf-8'
             )
+            get_content_cache().put(s3_key, content, response.get('ETag'))
             
             logger.info(f"Saved file to S3: {s3_key}")
             return True
             
         except ClientError as e:
             logger.error(f"Error saving to S3: {e}")
+            get_content_cache().invalidate(s3_key)
             return False
     
     def get_file(self, project_name: str, file_path: str) -> Optional[str]:
         try:
             s3_key = self._get_s3_key(project_name, file_path)
-            
-            response = self.s3_client.get_object(
-                Bucket=self.bucket_name,
-                Key=s3_key
-            )
-            
-            return response['Body'].read().decode('utf-8')
+            return get_content_cache().get(self.s3_client, self.bucket_name, s3_key)
             
         except ClientError as e:
-            if e.response['Error']['Code'] == 'NoSuchKey':
-                return None
             logger.error(f"Error reading from S3: {e}")
             return None
     
+    def save_multiple_files(self, project_name: str, files: dict) -> dict:
+        """Upload all files concurrently (bounded by the shared S3 worker pool)."""
+        keys = {file_path: self._get_s3_key(project_name, file_path) for file_path in files}
+        etags = get_s3_batch().put_many(self.bucket_name, {keys[path]: content for path, content in files.items()})
+        results = {}
+        for file_path, content in files.items():
+            s3_key = keys[file_path]
+            if etags.get(s3_key):
+                get_content_cache().put(s3_key, content, etags[s3_key])
+            else:
+                get_content_cache().invalidate(s3_key)
+            results[file_path] = bool(etags.get(s3_key))
+        return results
+    
     def file_exists(self, project_name: str, file_path: str) -> bool:
         try:
             s3_key = self._get_s3_key(project_name, file_path)
@@ -298,6 +308,7 @@ class S3FileStorage(FileStorage):
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
+            get_content_cache().invalidate(s3_key)
             
             logger.info(f"Deleted file from S3: {s3_key}")
             return True
@@ -330,13 +341,18 @@ class S3FileStorage(FileStorage):
             logger.error(f"Error listing S3 files: {e}")
             return []
     
-    def get_project_structure(self, project_name: str) -> dict:
+    def get_project_structure(self, project_name: str, include_content: bool = False) -> dict:
         try:
-            prefix = self._get_s3_key(project_name, "")
-            
             # Get all files
             files = self.list_files(project_name)
             
+            contents = {}
+            if include_content:
+                # Uncached bodies are downloaded concurrently
+                keys = {file_path: self._get_s3_key(project_name, file_path) for file_path in files}
+                bodies = get_content_cache().get_many(self.s3_client, self.bucket_name, keys.values())
+                contents = {file_path: bodies.get(s3_key) for file_path, s3_key in keys.items()}
+            
             # Build tree structure
             tree = {}
             for file_path in files:
@@ -346,7 +362,7 @@ class S3FileStorage(FileStorage):
                 for i, part in enumerate(parts):
                     if i == len(parts) - 1:
                         # It's a file
-                        current[part] = "file"
+                        current[part] = contents.get(file_path) if include_content else "file"
                     else:
                         # It's a directory
                         if part not in current:
@@ -360,6 +376,9 @@ class S3FileStorage(FileStorage):
             return {}
 
 
+_s3_storage: Optional[S3FileStorage] = None
+
+
 def get_file_storage() -> FileStorage:
     """
     Factory function to get the appropriate file storage instance based on settings.
@@ -367,10 +386,14 @@ def get_file_storage() -> FileStorage:
     Returns:
         FileStorage instance (LocalFileStorage or S3FileStorage)
     """
+    global _s3_storage
     storage_type = getattr(settings, 'FILE_STORAGE_TYPE', 'local').lower()
     
     if storage_type == 's3':
-        return S3FileStorage()
+        # boto3 clients are thread-safe; reuse one instead of reconnecting per call
+        if _s3_storage is None:
+            _s3_storage = S3FileStorage()
+        return _s3_storage
     else:
         return LocalFileStorage()
 
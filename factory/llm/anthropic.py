@@ -14,6 +14,7 @@ from factory.streaming_handlers import StreamingTagHandler, format_notification
 
 # Import cancellation check function
 from tasks.dispatch import is_ticket_cancelled
+from tasks.cancellation import get_cancel_token
 
 logger = logging.getLogger(__name__)
 
@@ -171,6 +172,9 @@ class AnthropicProvider(BaseLLMProvider):
         max_tool_rounds = 80  # Maximum number of tool-use iterations
         current_tool_round = 0
 
+        # Cancel token for in-flight stream interruption (None outside the executor)
+        cancel_token = get_cancel_token(ticket_id)
+
         while True: # Loop to handle potential multi-turn tool calls
             current_tool_round += 1
 
@@ -281,6 +285,12 @@ class AnthropicProvider(BaseLLMProvider):
                 # --- Process the stream from the API --- 
                 async with self.client.messages.stream(**params) as stream:
                     async for event in stream:
+                        # Abort mid-stream on cancellation; leaving the context closes the HTTP stream
+                        if cancel_token is not None and cancel_token.cancelled:
+                            logger.info(f"[ANTHROPIC] Ticket #{ticket_id} was cancelled mid-stream at tool round {current_tool_round}")
+                            yield "__CANCELLED__"
+                            return
+
                         if event.type == "content_block_start":
                             if event.content_block.type == "text":
                                 # Text content block started
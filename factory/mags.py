@@ -6,17 +6,23 @@ This module keeps the existing function-level API used across the codebase.
 """
 
 import base64
-import io
+import codecs
 import json
 import logging
 import os
+import threading
 import time
 import re
 import uuid
+from contextlib import ExitStack
 from typing import Any, Callable, Optional
 
 import paramiko
 
+from factory.mags_watcher import get_workspace_watcher
+from factory.env_bundle import env_setup_lines, forget_installed, is_missing_bundle, mark_installed
+from factory.ssh_pool import get_ssh_pool, load_private_key
+
 try:
     from mags import Mags  # type: ignore
 except Exception:  # pragma: no cover - validated at runtime
@@ -48,9 +54,9 @@ MAGS_NODE_ENV_LINES = [
 
 # Fat base script for claude-auth workspaces.
 # Installs system packages, Node.js, Claude CLI, and creates non-root user.
-CLAUDE_AUTH_SETUP_SCRIPT = f"""#!/bin/sh
-set -eux
-
+# The steps are also run on warm pool workspaces, which are created with
+# new() and so never run a job script.
+CLAUDE_AUTH_SETUP_STEPS = f"""
 # Install system packages
 apk update && apk add --no-cache curl xz git expect bash openssh-client
 
@@ -77,7 +83,11 @@ npm install -g @anthropic-ai/claude-code
 adduser -D -h /home/claudeuser -s /bin/bash claudeuser 2>/dev/null || true
 
 echo "CLAUDE_AUTH_SETUP_COMPLETE"
+"""
 
+CLAUDE_AUTH_SETUP_SCRIPT = f"""#!/bin/sh
+set -eux
+{CLAUDE_AUTH_SETUP_STEPS}
 # Keep the job running so SSH stays open
 while :; do sleep 3600 & wait $!; done
 """
@@ -361,12 +371,15 @@ def force_sync_workspace(workspace_ref: str) -> dict:
 
 def poll_until_running(job_id: str, timeout: int = 60, poll_interval: float = 0.5) -> dict:
     """
-    Poll a Mags job until its status is 'running'.
+    Wait for a Mags job to reach status 'running'.
+
+    The status is tracked by the shared workspace watcher, which batches
+    the status checks of every job being waited on in this process.
 
     Args:
         job_id: The job request_id
         timeout: Maximum seconds to wait
-        poll_interval: Seconds between polls
+        poll_interval: Unused; the watcher's poll interval applies
 
     Returns:
         Final job status dict
@@ -375,28 +388,14 @@ def poll_until_running(job_id: str, timeout: int = 60, poll_interval: float = 0.
         MagsAPIError: If timeout exceeded or job enters error state
     """
     start = time.time()
-    last_status = None
-
-    while time.time() - start < timeout:
-        status_resp = get_job_status(job_id)
-        status = status_resp.get("status", "unknown")
-        last_status = status
-
-        if status == "running":
-            logger.info("[MAGS] Job %s is running (%.1fs)", job_id, time.time() - start)
-            return status_resp
-
-        if status in ("failed", "error", "terminated"):
-            raise MagsAPIError(
-                f"Job {job_id} entered terminal state: {status}",
-                response_body=str(status_resp),
-            )
-
-        time.sleep(poll_interval)
-
-    raise MagsAPIError(
-        f"Timeout waiting for job {job_id} to be running (last status: {last_status}, waited {timeout}s)"
+    status_resp = get_workspace_watcher().wait_for(
+        job_id,
+        lambda st: st.get("status") == "running",
+        timeout=timeout,
+        fail_on=("failed", "error", "terminated"),
     )
+    logger.info("[MAGS] Job %s is running (%.1fs)", job_id, time.time() - start)
+    return status_resp
 
 
 def enable_ssh_access(
@@ -501,21 +500,17 @@ def enable_http_access(job_id: str, port: int) -> dict:
 # ============================================================================
 
 def _get_ssh_client(host: str, port: int, private_key: str, connect_timeout: int = 30) -> paramiko.SSHClient:
-    """Create a paramiko SSHClient connected to the given host."""
+    """
+    Create a dedicated paramiko SSHClient connected to the given host.
+
+    Commands should use get_ssh_pool().session() instead, which reuses a
+    shared transport; this is for callers that need a client of their own.
+    """
     client = paramiko.SSHClient()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-    # Load private key from string
-    key_file = io.StringIO(private_key)
-    try:
-        pkey = paramiko.RSAKey.from_private_key(key_file)
-    except paramiko.ssh_exception.SSHException:
-        key_file.seek(0)
-        try:
-            pkey = paramiko.Ed25519Key.from_private_key(key_file)
-        except Exception:
-            key_file.seek(0)
-            pkey = paramiko.ECDSAKey.from_private_key(key_file)
+    # Parsed keys are cached by fingerprint
+    pkey = load_private_key(private_key)
 
     client.connect(
         hostname=host,
@@ -529,6 +524,51 @@ def _get_ssh_client(host: str, port: int, private_key: str, connect_timeout: int
     return client
 
 
+def _cancelled_ssh_result(stdout: str, stderr: str, ssh_credentials: dict) -> dict:
+    """Result dict for a command interrupted by ticket cancellation."""
+    logger.info("[MAGS][SSH] Command interrupted by ticket cancellation")
+    return {
+        "exit_code": -1,
+        "stdout": stdout,
+        "stderr": f"{stderr}\nCancelled" if stderr else "Cancelled",
+        "ssh_credentials": ssh_credentials,
+        "cancelled": True,
+    }
+
+
+def _invalidate_command_cache(workspace_key: str, command: str):
+    """Bump the workspace's command-cache epoch unless `command` is read-only."""
+    from factory.command_cache import bump_workspace_epoch, is_read_only_command
+
+    if not is_read_only_command(command):
+        bump_workspace_epoch(workspace_key)
+
+
+def _run_with_project_env(workspace_key: str, project_id, run_once: Callable[[list], dict]) -> dict:
+    """
+    Run a command with the project's env bundle sourced from a workspace file.
+
+    The first command in a workspace installs the bundle file; later ones
+    only source it. If the file turns out to be missing (workspace was
+    recreated), the command is retried once with a fresh install.
+    """
+    if not project_id:
+        return run_once([])
+
+    env_lines, install = env_setup_lines(project_id, workspace_key=workspace_key)
+    result = run_once(env_lines)
+    if is_missing_bundle(result):
+        logger.info("[MAGS][ENV] Env bundle missing in %s, reinstalling", workspace_key)
+        forget_installed(workspace_key)
+        env_lines, install = env_setup_lines(project_id, workspace_key=workspace_key)
+        result = run_once(env_lines)
+
+    # -1 / 255: the command never reached the workspace shell
+    if install and result.get("exit_code") not in (-1, 255, None):
+        mark_installed(workspace_key, install)
+    return result
+
+
 def run_ssh(
     job_id: str,
     command: str,
@@ -536,6 +576,7 @@ def run_ssh(
     ssh_credentials: dict = None,
     with_node_env: bool = True,
     project_id=None,
+    cancel_token=None,
 ) -> dict:
     """
     Execute a command via SSH on a Mags job.
@@ -548,10 +589,36 @@ def run_ssh(
                         If None, will call enable_ssh_access() to get them.
         with_node_env: Whether to prepend Node.js environment setup
         project_id: Optional project ID for environment variables
+        cancel_token: Optional tasks.cancellation.CancelToken; cancelling it
+                      closes the SSH connection and interrupts the command
 
     Returns:
         Dict with exit_code, stdout, stderr, ssh_credentials
     """
+    try:
+        return _run_with_project_env(
+            job_id,
+            project_id,
+            lambda project_env_lines: _run_ssh_once(
+                job_id, command, timeout, ssh_credentials, with_node_env,
+                project_id, cancel_token, project_env_lines,
+            ),
+        )
+    finally:
+        # Finished, failed or cancelled, a write may have landed
+        _invalidate_command_cache(job_id, command)
+
+
+def _run_ssh_once(
+    job_id: str,
+    command: str,
+    timeout: int,
+    ssh_credentials: dict,
+    with_node_env: bool,
+    project_id,
+    cancel_token,
+    project_env_lines: list,
+) -> dict:
     # Get or reuse SSH credentials
     if not ssh_credentials:
         try:
@@ -570,6 +637,7 @@ def run_ssh(
                 timeout=timeout,
                 with_node_env=with_node_env,
                 project_id=project_id,
+                cancel_token=cancel_token,
             )
             # Add empty ssh_credentials to match expected return shape
             result["ssh_credentials"] = None
@@ -584,15 +652,8 @@ def run_ssh(
     if with_node_env:
         env_lines.extend(MAGS_NODE_ENV_LINES)
 
-    # Add project-specific environment variables
-    if project_id:
-        try:
-            from factory.ai_functions import get_project_env_exports
-            project_env_exports = get_project_env_exports(project_id)
-            if project_env_exports:
-                env_lines.extend(project_env_exports)
-        except Exception:
-            pass
+    # Project-specific environment variables (sourced from the workspace bundle file)
+    env_lines.extend(project_env_lines)
 
     wrapped_command = "\n".join(env_lines + [command])
 
@@ -604,18 +665,22 @@ def run_ssh(
         job_id, connect_timeout, timeout, command.split('\n')[0][:120]
     )
 
-    ssh_client = None
+    remove_cancel_callback = None
     try:
-        ssh_client = _get_ssh_client(host, port, private_key, connect_timeout=connect_timeout)
-        stdin, stdout_ch, stderr_ch = ssh_client.exec_command(
-            wrapped_command,
-            timeout=timeout,
-        )
+        # One channel on a pooled transport (connects only on first use)
+        with get_ssh_pool().session(host, port, private_key, connect_timeout=connect_timeout) as channel:
+            if cancel_token is not None:
+                remove_cancel_callback = cancel_token.add_callback(channel.close)
+            channel.settimeout(timeout)
+            channel.exec_command(wrapped_command)
 
-        # Read output
-        stdout_str = stdout_ch.read().decode("utf-8", errors="replace")
-        stderr_str = stderr_ch.read().decode("utf-8", errors="replace")
-        exit_code = stdout_ch.channel.recv_exit_status()
+            # Read output
+            stdout_str = channel.makefile("rb").read().decode("utf-8", errors="replace")
+            stderr_str = channel.makefile_stderr("rb").read().decode("utf-8", errors="replace")
+            exit_code = channel.recv_exit_status()
+
+        if cancel_token is not None and cancel_token.cancelled:
+            return _cancelled_ssh_result(stdout_str, stderr_str, ssh_credentials)
 
         logger.debug(
             "[MAGS][SSH RESULT] job_id=%s exit_code=%s stdout_len=%s stderr_len=%s",
@@ -630,6 +695,8 @@ def run_ssh(
         }
 
     except paramiko.ssh_exception.SSHException as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            return _cancelled_ssh_result("", "", ssh_credentials)
         logger.error("[MAGS][SSH] SSH error for job %s: %s", job_id, e)
         return {
             "exit_code": -1,
@@ -638,6 +705,8 @@ def run_ssh(
             "ssh_credentials": ssh_credentials,
         }
     except Exception as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            return _cancelled_ssh_result("", "", ssh_credentials)
         logger.error("[MAGS][SSH] Error for job %s: %s", job_id, e, exc_info=True)
         return {
             "exit_code": -1,
@@ -646,11 +715,8 @@ def run_ssh(
             "ssh_credentials": ssh_credentials,
         }
     finally:
-        if ssh_client:
-            try:
-                ssh_client.close()
-            except Exception:
-                pass
+        if remove_cancel_callback:
+            remove_cancel_callback()
 
 
 def run_ssh_streaming(
@@ -662,6 +728,8 @@ def run_ssh_streaming(
     with_node_env: bool = True,
     project_id=None,
     poll_interval: float = 2.0,
+    cancel_token=None,
+    capture_output: bool = True,
 ) -> dict:
     """
     Execute a long-running command via SSH with streaming output.
@@ -676,6 +744,11 @@ def run_ssh_streaming(
         with_node_env: Whether to set up Node.js environment
         project_id: Optional project ID for env vars
         poll_interval: Seconds between output polls
+        cancel_token: Optional tasks.cancellation.CancelToken; cancelling it
+                      closes the channel and returns immediately
+        capture_output: Accumulate output into the returned stdout. Pass False
+                        when output_callback consumes the stream, so long
+                        runs don't hold the whole output in memory.
 
     Returns:
         Dict with exit_code, stdout, stderr, ssh_credentials
@@ -711,19 +784,40 @@ def run_ssh_streaming(
         job_id, timeout, command.split('\n')[0][:120]
     )
 
-    ssh_client = None
+    remove_cancel_callback = None
     all_output = ""
     all_stderr = ""
+    session_stack = ExitStack()
 
     try:
-        ssh_client = _get_ssh_client(host, port, private_key, connect_timeout=connect_timeout)
-        transport = ssh_client.get_transport()
-        channel = transport.open_session()
+        # Dedicated channel on a pooled transport
+        channel = session_stack.enter_context(
+            get_ssh_pool().session(host, port, private_key, connect_timeout=connect_timeout)
+        )
         channel.settimeout(timeout)
+        if cancel_token is not None:
+            remove_cancel_callback = cancel_token.add_callback(channel.close)
         channel.exec_command(wrapped_command)
 
         start_time = time.time()
-        buffer = b""
+        # Incremental decoders keep multi-byte characters split across
+        # recv() boundaries intact
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        err_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        output_len = 0
+
+        def _emit(text: str):
+            nonlocal all_output, output_len
+            if not text:
+                return
+            output_len += len(text)
+            if capture_output:
+                all_output += text
+            if output_callback:
+                try:
+                    output_callback(text)
+                except Exception as e:
+                    logger.warning("[MAGS][SSH_STREAM] Callback error: %s", e)
 
         while True:
             # Check timeout
@@ -734,33 +828,22 @@ def run_ssh_streaming(
                 break
 
             # Read available data
-            if channel.recv_ready():
+            # Drain everything available before sleeping again
+            while channel.recv_ready():
                 chunk = channel.recv(65536)
-                if chunk:
-                    buffer += chunk
-                    decoded = buffer.decode("utf-8", errors="replace")
-                    buffer = b""  # Reset buffer after successful decode
-                    all_output += decoded
-
-                    if output_callback:
-                        try:
-                            output_callback(decoded)
-                        except Exception as e:
-                            logger.warning("[MAGS][SSH_STREAM] Callback error: %s", e)
+                if not chunk:
+                    break
+                _emit(decoder.decode(chunk))
 
             # Read stderr
             if channel.recv_stderr_ready():
                 stderr_chunk = channel.recv_stderr(65536)
                 if stderr_chunk:
-                    decoded_err = stderr_chunk.decode("utf-8", errors="replace")
-                    all_stderr += decoded_err
-                    all_output += decoded_err
+                    decoded_err = err_decoder.decode(stderr_chunk)
+                    if len(all_stderr) < 65536:
+                        all_stderr += decoded_err
                     logger.debug("[MAGS][SSH_STREAM] stderr: %s", decoded_err[:200])
-                    if output_callback:
-                        try:
-                            output_callback(decoded_err)
-                        except Exception as e:
-                            logger.warning("[MAGS][SSH_STREAM] Callback error (stderr): %s", e)
+                    _emit(decoded_err)
 
             # Check if channel is closed
             if channel.exit_status_ready():
@@ -768,21 +851,20 @@ def run_ssh_streaming(
                 while channel.recv_ready():
                     chunk = channel.recv(65536)
                     if chunk:
-                        decoded = chunk.decode("utf-8", errors="replace")
-                        all_output += decoded
-                        if output_callback:
-                            try:
-                                output_callback(decoded)
-                            except Exception:
-                                pass
+                        _emit(decoder.decode(chunk))
+                _emit(decoder.decode(b"", final=True))
                 break
 
-            time.sleep(poll_interval)
+            if cancel_token is not None:
+                if cancel_token.wait(poll_interval):
+                    return _cancelled_ssh_result(all_output, all_stderr, ssh_credentials)
+            else:
+                time.sleep(poll_interval)
 
         exit_code = channel.recv_exit_status()
         logger.info(
             "[MAGS][SSH_STREAM] Completed: exit_code=%s, output_len=%d, elapsed=%.1fs",
-            exit_code, len(all_output), time.time() - start_time,
+            exit_code, output_len, time.time() - start_time,
         )
 
         return {
@@ -793,6 +875,8 @@ def run_ssh_streaming(
         }
 
     except Exception as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            return _cancelled_ssh_result(all_output, all_stderr, ssh_credentials)
         logger.error("[MAGS][SSH_STREAM] Error: %s", e, exc_info=True)
         return {
             "exit_code": -1,
@@ -801,11 +885,13 @@ def run_ssh_streaming(
             "ssh_credentials": ssh_credentials,
         }
     finally:
-        if ssh_client:
-            try:
-                ssh_client.close()
-            except Exception:
-                pass
+        if remove_cancel_callback:
+            remove_cancel_callback()
+        try:
+            session_stack.close()
+        except Exception:
+            pass
+        _invalidate_command_cache(job_id, command)
 
 
 # ============================================================================
@@ -1006,19 +1092,18 @@ def _stop_workspace_job(client, workspace_id: str, max_wait: int = 15) -> bool:
         client.stop(request_id)
         logger.info("[MAGS][STOP] Stop requested for job %s", request_id)
 
-        # Poll until the job is no longer running
-        for _ in range(max_wait):
-            time.sleep(1)
-            try:
-                st = client.status(request_id)
-                status = st.get("status", "unknown")
-                if status not in ("running", "sleeping"):
-                    logger.info("[MAGS][STOP] Job %s now %s", request_id, status)
-                    return True
-            except Exception:
-                return True  # Job gone — that's fine
-        logger.warning("[MAGS][STOP] Job %s still running after %ds", request_id, max_wait)
-        return False
+        # Wait until the job is no longer running (an unknown/gone job counts as stopped)
+        try:
+            st = get_workspace_watcher().wait_for(
+                request_id,
+                lambda st: st.get("status", "unknown") not in ("running", "sleeping"),
+                timeout=max_wait,
+            )
+            logger.info("[MAGS][STOP] Job %s now %s", request_id, st.get("status", "unknown"))
+            return True
+        except MagsAPIError:
+            logger.warning("[MAGS][STOP] Job %s still running after %ds", request_id, max_wait)
+            return False
     except Exception as e:
         logger.warning("[MAGS][STOP] Failed to stop workspace %s: %s", workspace_id, e)
         return False
@@ -1032,6 +1117,7 @@ def run_command(
     project_id=None,
     base_workspace_id: str = None,
     max_retries: int = 10,
+    cancel_token=None,
 ) -> dict:
     """
     Execute a command on a Mags workspace using the SDK.
@@ -1049,31 +1135,69 @@ def run_command(
         with_node_env: Whether to prepend Node.js environment setup
         project_id: Optional project ID for environment variables
         base_workspace_id: Base workspace to fork from (triggers workspace creation)
+        cancel_token: Optional tasks.cancellation.CancelToken; cancelling it
+                      kills the remote command, so the exec returns at once
 
     Returns:
         Dict with exit_code, stdout, stderr
     """
+    try:
+        return _run_with_project_env(
+            workspace_id,
+            project_id,
+            lambda project_env_lines: _run_command_once(
+                workspace_id, command, timeout, with_node_env,
+                base_workspace_id, max_retries, project_env_lines, cancel_token,
+            ),
+        )
+    finally:
+        # Finished, failed or cancelled, a write may have landed
+        _invalidate_command_cache(workspace_id, command)
+
+
+def _kill_remote_command(workspace_id: str, marker: str):
+    """Kill the shell started for `marker` (and its children) on the workspace."""
+    # [s]h keeps the pattern from matching the shell running pkill itself
+    pattern = f"[s]h -s {marker}"
+    kill_command = (
+        f"for pid in $(pgrep -f '{pattern}'); do pkill -TERM -P $pid; kill -TERM $pid; done; true"
+    )
+    try:
+        _get_mags_client(timeout=30).exec(workspace_id, kill_command, timeout=15)
+        logger.info("[MAGS][CMD] Killed cancelled command %s on %s", marker, workspace_id)
+    except Exception as e:
+        logger.warning("[MAGS][CMD] Could not kill cancelled command on %s: %s", workspace_id, e)
+
+
+def _run_command_once(
+    workspace_id: str,
+    command: str,
+    timeout: int,
+    with_node_env: bool,
+    base_workspace_id: str,
+    max_retries: int,
+    project_env_lines: list,
+    cancel_token=None,
+) -> dict:
+    if cancel_token is not None and cancel_token.cancelled:
+        return _cancelled_ssh_result("", "", None)
+
     # Build command with environment
     env_lines = [f"cd {MAGS_WORKING_DIR}"]
     if with_node_env:
         env_lines.extend(MAGS_NODE_ENV_LINES)
 
-    if project_id:
-        try:
-            from factory.ai_functions import get_project_env_exports
-            project_env_exports = get_project_env_exports(project_id)
-            if project_env_exports:
-                env_lines.extend(project_env_exports)
-        except Exception:
-            pass
+    env_lines.extend(project_env_lines)
 
     full_command = "\n".join(env_lines) + "\n" + command
 
     # The SDK's exec() wraps commands with chroot/overlay shell escaping that
     # breaks multi-line scripts.  Encode as base64 and pipe to sh so exec()
     # only sees a simple single-line command.
+    # The marker names this run's shell, so a cancellation can kill just it.
     cmd_b64 = base64.b64encode(full_command.encode("utf-8")).decode("ascii")
-    exec_command = f"echo {cmd_b64} | base64 -d | sh"
+    marker = f"lfg-{uuid.uuid4().hex[:12]}"
+    exec_command = f"echo {cmd_b64} | base64 -d | sh -s {marker}"
 
     logger.info(
         "[MAGS][CMD] workspace=%s timeout=%s base=%s command=%s",
@@ -1089,12 +1213,20 @@ def run_command(
     if base_workspace_id:
         # Validate base workspace exists before forking
         try:
-            workspaces_resp = client.list_workspaces()
+            def _base_listed(resp):
+                return any(
+                    w.get("workspace_id") == base_workspace_id or w.get("id") == base_workspace_id
+                    for w in resp.get("workspaces", [])
+                )
+
+            # Listing is cached briefly; re-fetch before concluding the base is missing
+            watcher = get_workspace_watcher()
+            workspaces_resp = watcher.list_workspaces()
+            base_exists = _base_listed(workspaces_resp)
+            if not base_exists:
+                workspaces_resp = watcher.list_workspaces(force=True)
+                base_exists = _base_listed(workspaces_resp)
             ws_list = workspaces_resp.get("workspaces", [])
-            base_exists = any(
-                w.get("workspace_id") == base_workspace_id or w.get("id") == base_workspace_id
-                for w in ws_list
-            )
             logger.info(
                 "[MAGS][CMD] Base workspace '%s' exists=%s (checked %d workspaces)",
                 base_workspace_id, base_exists, len(ws_list),
@@ -1147,80 +1279,103 @@ def run_command(
     # exec() runs the command on the running/sleeping VM via SSH (handled internally by SDK).
     # After new(), the VM may need a few seconds to fully boot — retry on transient errors.
     # Use more retries with longer delay for "no VM" since provisioning can be slow.
-    max_exec_attempts = max_retries
-    for attempt in range(1, max_exec_attempts + 1):
-        try:
-            resp = client.exec(workspace_id, exec_command, timeout=timeout)
-            stdout = resp.get("output", "")
-            stderr = resp.get("stderr", "")
-            exit_code = resp.get("exit_code", -1)
-            logger.info(
-                "[MAGS][CMD] exec() completed: workspace=%s exit_code=%s stdout_len=%d stderr_len=%d",
-                workspace_id, exit_code, len(stdout), len(stderr),
-            )
-            # exit_code 255 = SSH connection failure (not the remote command).
-            # Treat as transient and retry — the VM's SSH may need a moment.
-            # Limit to 2 retries (not all 6) to avoid long delays in polling loops.
-            if exit_code == 255 and attempt <= 2:
-                logger.warning(
-                    "[MAGS][CMD] SSH failure (exit_code=255) for %s attempt %d/%d: %s — retrying in 5s",
-                    workspace_id, attempt, max_exec_attempts, stderr[:200],
+    def _sleep(seconds):
+        if cancel_token is not None:
+            cancel_token.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    remove_cancel_callback = None
+    if cancel_token is not None:
+        remove_cancel_callback = cancel_token.add_callback(
+            lambda: threading.Thread(
+                target=_kill_remote_command, args=(workspace_id, marker), daemon=True,
+            ).start()
+        )
+
+    try:
+        max_exec_attempts = max_retries
+        for attempt in range(1, max_exec_attempts + 1):
+            if cancel_token is not None and cancel_token.cancelled:
+                return _cancelled_ssh_result("", "", None)
+            try:
+                resp = client.exec(workspace_id, exec_command, timeout=timeout)
+                stdout = resp.get("output", "")
+                stderr = resp.get("stderr", "")
+                exit_code = resp.get("exit_code", -1)
+                logger.info(
+                    "[MAGS][CMD] exec() completed: workspace=%s exit_code=%s stdout_len=%d stderr_len=%d",
+                    workspace_id, exit_code, len(stdout), len(stderr),
                 )
-                time.sleep(5)
-                continue
-            return {"exit_code": exit_code, "stdout": stdout, "stderr": stderr}
-        except Exception as exec_err:
-            err_str = str(exec_err).lower()
-            # "no vm_id" on a sleeping VM — wake it via enable_access then retry
-            if "no vm_id" in err_str and attempt == 1:
-                try:
-                    job = client.find_job(workspace_id)
-                    if job and job.get("status") == "sleeping":
-                        request_id = job.get("request_id") or job.get("id")
-                        logger.info("[MAGS][CMD] Waking sleeping VM %s (job %s)...", workspace_id, request_id)
-                        client.enable_access(request_id, port=22)
-                        # Wait for VM to boot after wake
-                        for _ in range(20):
-                            time.sleep(1)
-                            st = client.status(request_id)
-                            if st.get("vm_id"):
-                                logger.info("[MAGS][CMD] VM %s awake (vm_id=%s)", workspace_id, st["vm_id"])
-                                break
-                        else:
-                            logger.warning("[MAGS][CMD] VM %s still no vm_id after wake attempt", workspace_id)
-                        continue  # retry exec
-                except Exception as wake_err:
-                    logger.warning("[MAGS][CMD] Failed to wake VM %s: %s", workspace_id, wake_err)
-
-            # "no vm associated" / "not found" are transient — VM still booting
-            is_transient = "no vm" in err_str or "not found" in err_str or "not running" in err_str
-            if is_transient and attempt < max_exec_attempts:
-                # Check job status to detect dead jobs early
-                if new_request_id and attempt % 3 == 0:
+                # exit_code 255 = SSH connection failure (not the remote command).
+                # Treat as transient and retry — the VM's SSH may need a moment.
+                # Limit to 2 retries (not all 6) to avoid long delays in polling loops.
+                if exit_code == 255 and attempt <= 2:
+                    logger.warning(
+                        "[MAGS][CMD] SSH failure (exit_code=255) for %s attempt %d/%d: %s — retrying in 5s",
+                        workspace_id, attempt, max_exec_attempts, stderr[:200],
+                    )
+                    _sleep(5)
+                    continue
+                if cancel_token is not None and cancel_token.cancelled:
+                    return _cancelled_ssh_result(stdout, stderr, None)
+                return {"exit_code": exit_code, "stdout": stdout, "stderr": stderr}
+            except Exception as exec_err:
+                if cancel_token is not None and cancel_token.cancelled:
+                    return _cancelled_ssh_result("", str(exec_err), None)
+                err_str = str(exec_err).lower()
+                # "no vm_id" on a sleeping VM — wake it via enable_access then retry
+                if "no vm_id" in err_str and attempt == 1:
                     try:
-                        st = client.status(new_request_id)
-                        job_st = st.get("status", "unknown")
-                        logger.info(
-                            "[MAGS][CMD] Job status check for %s: %s",
-                            workspace_id, job_st,
-                        )
-                        if job_st in ("completed", "error", "stopped"):
-                            logger.error(
-                                "[MAGS][CMD] Job %s has died (status=%s), aborting retries",
+                        job = client.find_job(workspace_id)
+                        if job and job.get("status") == "sleeping":
+                            request_id = job.get("request_id") or job.get("id")
+                            logger.info("[MAGS][CMD] Waking sleeping VM %s (job %s)...", workspace_id, request_id)
+                            client.enable_access(request_id, port=22)
+                            # Wait for VM to boot after wake
+                            try:
+                                st = get_workspace_watcher().wait_for(
+                                    request_id, lambda st: bool(st.get("vm_id")), timeout=20,
+                                )
+                                logger.info("[MAGS][CMD] VM %s awake (vm_id=%s)", workspace_id, st["vm_id"])
+                            except MagsAPIError:
+                                logger.warning("[MAGS][CMD] VM %s still no vm_id after wake attempt", workspace_id)
+                            continue  # retry exec
+                    except Exception as wake_err:
+                        logger.warning("[MAGS][CMD] Failed to wake VM %s: %s", workspace_id, wake_err)
+
+                # "no vm associated" / "not found" are transient — VM still booting
+                is_transient = "no vm" in err_str or "not found" in err_str or "not running" in err_str
+                if is_transient and attempt < max_exec_attempts:
+                    # Check job status to detect dead jobs early
+                    if new_request_id and attempt % 3 == 0:
+                        try:
+                            st = get_workspace_watcher().get_status(new_request_id) or get_job_status(new_request_id)
+                            job_st = st.get("status", "unknown")
+                            logger.info(
+                                "[MAGS][CMD] Job status check for %s: %s",
                                 workspace_id, job_st,
                             )
-                            return {"exit_code": -1, "stdout": "", "stderr": f"Job died: {job_st}. {exec_err}"}
-                    except Exception:
-                        pass
-                retry_delay = 5
-                logger.info(
-                    "[MAGS][CMD] exec() attempt %d/%d for %s: %s — retrying in %ds",
-                    attempt, max_exec_attempts, workspace_id, exec_err, retry_delay,
-                )
-                time.sleep(retry_delay)
-                continue
-            logger.error("[MAGS][CMD] exec() failed for %s after %d attempts: %s", workspace_id, attempt, exec_err)
-            return {"exit_code": -1, "stdout": "", "stderr": str(exec_err)}
+                            if job_st in ("completed", "error", "stopped"):
+                                logger.error(
+                                    "[MAGS][CMD] Job %s has died (status=%s), aborting retries",
+                                    workspace_id, job_st,
+                                )
+                                return {"exit_code": -1, "stdout": "", "stderr": f"Job died: {job_st}. {exec_err}"}
+                        except Exception:
+                            pass
+                    retry_delay = 5
+                    logger.info(
+                        "[MAGS][CMD] exec() attempt %d/%d for %s: %s — retrying in %ds",
+                        attempt, max_exec_attempts, workspace_id, exec_err, retry_delay,
+                    )
+                    _sleep(retry_delay)
+                    continue
+                logger.error("[MAGS][CMD] exec() failed for %s after %d attempts: %s", workspace_id, attempt, exec_err)
+                return {"exit_code": -1, "stdout": "", "stderr": str(exec_err)}
+    finally:
+        if remove_cancel_callback:
+            remove_cancel_callback()
 
 
 def run_command_streaming(
@@ -1232,6 +1387,8 @@ def run_command_streaming(
     project_id=None,
     base_workspace_id: str = None,
     poll_interval: float = 5.0,
+    cancel_token=None,
+    capture_output: bool = True,
 ) -> dict:
     """
     Execute a long-running command with streaming output via SDK log polling.
@@ -1249,6 +1406,10 @@ def run_command_streaming(
         project_id: Optional project ID for environment variables
         base_workspace_id: Base workspace to fork from (only needed for first run)
         poll_interval: Seconds between log polls
+        cancel_token: Optional tasks.cancellation.CancelToken; cancelling it
+                      stops the job and returns immediately
+        capture_output: Accumulate output into the returned stdout (pass
+                        False when output_callback consumes the stream)
 
     Returns:
         Dict with exit_code, stdout, stderr
@@ -1276,6 +1437,7 @@ def run_command_streaming(
 
     client = _get_mags_client(timeout=timeout + 60)
     all_output = ""
+    output_len = 0
     last_log_len = 0
 
     try:
@@ -1298,7 +1460,16 @@ def run_command_streaming(
         start_time = time.time()
 
         while time.time() - start_time < timeout:
-            time.sleep(poll_interval)
+            if cancel_token is not None:
+                if cancel_token.wait(poll_interval):
+                    logger.info("[MAGS][STREAM] Cancelled, stopping job %s", request_id)
+                    try:
+                        client.stop(request_id)
+                    except Exception as stop_err:
+                        logger.warning("[MAGS][STREAM] Failed to stop cancelled job %s: %s", request_id, stop_err)
+                    return {"exit_code": -1, "stdout": all_output, "stderr": "Cancelled", "cancelled": True}
+            else:
+                time.sleep(poll_interval)
 
             # Poll logs for new output
             try:
@@ -1324,7 +1495,9 @@ def run_command_streaming(
                             lines.append(str(entry))
                     new_text = "\n".join(lines)
                     if new_text:
-                        all_output += new_text + "\n"
+                        output_len += len(new_text) + 1
+                        if capture_output:
+                            all_output += new_text + "\n"
                         if output_callback:
                             try:
                                 output_callback(new_text + "\n")
@@ -1355,7 +1528,9 @@ def run_command_streaming(
                                     rem_lines.append(str(entry))
                             remaining_text = "\n".join(rem_lines)
                             if remaining_text:
-                                all_output += remaining_text + "\n"
+                                output_len += len(remaining_text) + 1
+                                if capture_output:
+                                    all_output += remaining_text + "\n"
                                 if output_callback:
                                     try:
                                         output_callback(remaining_text + "\n")
@@ -1371,7 +1546,7 @@ def run_command_streaming(
                     elapsed = time.time() - start_time
                     logger.info(
                         "[MAGS][STREAM] Completed: status=%s exit_code=%s output_len=%d elapsed=%.1fs",
-                        status, exit_code, len(all_output), elapsed,
+                        status, exit_code, output_len, elapsed,
                     )
                     return {"exit_code": exit_code, "stdout": all_output, "stderr": ""}
             except Exception as status_err:
@@ -1384,6 +1559,8 @@ def run_command_streaming(
     except Exception as e:
         logger.error("[MAGS][STREAM] Error: %s", e, exc_info=True)
         return {"exit_code": -1, "stdout": all_output, "stderr": str(e)}
+    finally:
+        _invalidate_command_cache(workspace_id, command)
 
 
 def get_http_proxy_url(job_id: str, port: int) -> str:
@@ -0,0 +1,320 @@
+"""
+Mags Workspace State Watcher
+
+One background poller per process tracks the status of every Mags job
+that some caller is waiting on. Callers register a condition and get a
+future back, instead of each running its own `status()` + `sleep()` loop.
+
+- Each tick fetches all tracked jobs with a single `list_jobs()` call
+  when the SDK supports it. Jobs missing from the listing, or every job
+  if listing is unsupported, fall back to one `status()` call each.
+  N tickets starting at once therefore cost one request per tick, not N.
+- The latest status of each job is cached, so `get_status()` can answer
+  without an API call when the data is fresh enough.
+- The poller thread starts on demand and exits after sitting idle.
+- `list_workspaces()` responses are cached for a short TTL.
+
+Usage:
+    from factory.mags_watcher import get_workspace_watcher
+
+    watcher = get_workspace_watcher()
+    status = watcher.wait_for(job_id, lambda st: st.get("status") == "running", timeout=60)
+
+    future = watcher.watch(job_id, lambda st: st.get("vm_id"))
+    status = await asyncio.wrap_future(future)
+
+    workspaces = watcher.list_workspaces()
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+StatusPredicate = Callable[[dict], bool]
+
+POLL_INTERVAL = 0.5
+IDLE_EXIT_SECONDS = 30
+WORKSPACE_LIST_TTL = 10
+STATUS_CACHE_MAX = 1000
+
+# list_jobs() only pays off once more than one job is tracked
+BATCH_MIN_JOBS = 2
+
+
+@dataclass
+class _Waiter:
+    predicate: StatusPredicate
+    future: Future
+    fail_on: frozenset = frozenset()
+
+
+@dataclass
+class _TrackedJob:
+    job_id: str
+    waiters: List[_Waiter] = field(default_factory=list)
+
+
+class WorkspaceStateWatcher:
+    """Batched status poller for Mags jobs with future-based waits."""
+
+    def __init__(
+        self,
+        poll_interval: float = POLL_INTERVAL,
+        idle_exit: float = IDLE_EXIT_SECONDS,
+        workspace_list_ttl: float = WORKSPACE_LIST_TTL,
+    ):
+        self.poll_interval = poll_interval
+        self.idle_exit = idle_exit
+        self.workspace_list_ttl = workspace_list_ttl
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._jobs: Dict[str, _TrackedJob] = {}
+        self._statuses: Dict[str, tuple] = {}  # job_id -> (status dict, fetched_at)
+        self._thread: Optional[threading.Thread] = None
+        self._batch_supported = True
+
+        self._workspaces: Optional[dict] = None
+        self._workspaces_at = 0.0
+        self._workspaces_lock = threading.Lock()
+
+        self.ticks = 0
+        self.batch_calls = 0
+        self.single_calls = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def watch(self, job_id: str, predicate: StatusPredicate, fail_on=()) -> Future:
+        """
+        Future resolved with the job's status dict once predicate(status) is true.
+
+        If the status string enters one of `fail_on` first, the future fails
+        with MagsAPIError. So does a failed status lookup (reported as
+        "unknown", e.g. a deleted job) that the predicate does not accept,
+        rather than leaving the caller to wait out its timeout.
+        """
+        waiter = _Waiter(predicate=predicate, future=Future(), fail_on=frozenset(fail_on))
+        with self._lock:
+            self._jobs.setdefault(job_id, _TrackedJob(job_id)).waiters.append(waiter)
+            cached = self._statuses.get(job_id)
+        # A fresh cached status may already satisfy the waiter
+        if cached and time.monotonic() - cached[1] < self.poll_interval:
+            self._resolve(job_id, cached[0])
+        self._ensure_thread()
+        self._wakeup.set()
+        return waiter.future
+
+    def wait_for(self, job_id: str, predicate: StatusPredicate, timeout: float, fail_on=()) -> dict:
+        """Blocking form of watch(); raises MagsAPIError on timeout."""
+        from factory.mags import MagsAPIError
+
+        future = self.watch(job_id, predicate, fail_on=fail_on)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.cancel(job_id, future)
+            last = (self.get_status(job_id, max_age=None) or {}).get("status", "unknown")
+            raise MagsAPIError(
+                f"Timeout waiting for job {job_id} (last status: {last}, waited {timeout}s)"
+            )
+
+    def cancel(self, job_id: str, future: Future):
+        """Stop tracking a waiter (e.g. its caller gave up)."""
+        with self._lock:
+            tracked = self._jobs.get(job_id)
+            if tracked:
+                tracked.waiters = [w for w in tracked.waiters if w.future is not future]
+                if not tracked.waiters:
+                    del self._jobs[job_id]
+        future.cancel()
+
+    def get_status(self, job_id: str, max_age: Optional[float] = 2.0) -> Optional[dict]:
+        """Last known status for a job, or None if unknown or older than max_age."""
+        with self._lock:
+            cached = self._statuses.get(job_id)
+        if not cached:
+            return None
+        status, fetched_at = cached
+        if max_age is not None and time.monotonic() - fetched_at > max_age:
+            return None
+        return status
+
+    def list_workspaces(self, force: bool = False) -> dict:
+        """`client.list_workspaces()` cached for workspace_list_ttl seconds."""
+        from factory.mags import _get_mags_client
+
+        with self._workspaces_lock:
+            fresh = time.monotonic() - self._workspaces_at < self.workspace_list_ttl
+            if self._workspaces is not None and fresh and not force:
+                return self._workspaces
+            resp = _get_mags_client().list_workspaces()
+            self._workspaces = resp if isinstance(resp, dict) else {"workspaces": resp or []}
+            self._workspaces_at = time.monotonic()
+            return self._workspaces
+
+    def invalidate_workspaces(self):
+        with self._workspaces_lock:
+            self._workspaces = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked_jobs": len(self._jobs),
+                "waiters": sum(len(j.waiters) for j in self._jobs.values()),
+                "cached_statuses": len(self._statuses),
+                "ticks": self.ticks,
+                "batch_calls": self.batch_calls,
+                "single_calls": self.single_calls,
+                "batch_supported": self._batch_supported,
+            }
+
+    # ------------------------------------------------------------------
+    # Poller
+    # ------------------------------------------------------------------
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="mags-state-watcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        idle_since = None
+        while True:
+            with self._lock:
+                job_ids = list(self._jobs)
+            if not job_ids:
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > self.idle_exit:
+                    with self._lock:
+                        # Re-check under the lock so a concurrent watch() restarts us
+                        if not self._jobs:
+                            self._thread = None
+                            return
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            idle_since = None
+
+            try:
+                statuses = self._fetch(job_ids)
+            except Exception as e:
+                logger.warning("[MAGS][WATCH] Status fetch failed: %s", e)
+                statuses = {}
+
+            now = time.monotonic()
+            with self._lock:
+                for job_id, status in statuses.items():
+                    self._statuses[job_id] = (status, now)
+                if len(self._statuses) > STATUS_CACHE_MAX:
+                    for job_id in [j for j, (_, at) in self._statuses.items() if now - at > self.idle_exit]:
+                        del self._statuses[job_id]
+            for job_id, status in statuses.items():
+                self._resolve(job_id, status)
+            self.ticks += 1
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _fetch(self, job_ids: List[str]) -> Dict[str, dict]:
+        """Statuses for the given jobs, batched through list_jobs() when possible."""
+        from factory.mags import MagsAPIError, get_job_status, list_jobs
+
+        statuses: Dict[str, dict] = {}
+        wanted = set(job_ids)
+        if self._batch_supported and len(job_ids) >= BATCH_MIN_JOBS:
+            try:
+                jobs = list_jobs().get("jobs") or []
+                self.batch_calls += 1
+                for job in jobs:
+                    job_id = job.get("request_id") or job.get("id")
+                    if job_id in wanted:
+                        statuses[job_id] = job
+            except MagsAPIError as e:
+                if e.status_code is None and "does not expose" in str(e):
+                    logger.info("[MAGS][WATCH] SDK has no job listing; polling jobs individually")
+                    self._batch_supported = False
+                else:
+                    logger.debug("[MAGS][WATCH] list_jobs failed: %s", e)
+
+        for job_id in wanted - set(statuses):
+            try:
+                statuses[job_id] = get_job_status(job_id)
+            except MagsAPIError as e:
+                # Unknown / deleted job: report it so "wait until gone" callers
+                # resolve; other waiters fail with the lookup error
+                statuses[job_id] = {
+                    "request_id": job_id,
+                    "status": "unknown",
+                    "error": str(e),
+                    "error_status_code": e.status_code,
+                    "lookup_failed": True,
+                }
+            self.single_calls += 1
+        return statuses
+
+    def _resolve(self, job_id: str, status: dict):
+        from factory.mags import MagsAPIError
+
+        done = []
+        with self._lock:
+            tracked = self._jobs.get(job_id)
+            if not tracked:
+                return
+            remaining = []
+            for waiter in tracked.waiters:
+                if waiter.future.done():
+                    continue
+                state = status.get("status", "unknown")
+                try:
+                    matched = waiter.predicate(status)
+                except Exception:
+                    matched = False
+                if matched:
+                    done.append((waiter, status, None))
+                elif state in waiter.fail_on:
+                    done.append((waiter, None, MagsAPIError(
+                        f"Job {job_id} entered terminal state: {state}", response_body=str(status),
+                    )))
+                elif status.get("lookup_failed"):
+                    done.append((waiter, None, MagsAPIError(
+                        f"Status check for job {job_id} failed: {status.get('error')}",
+                        status_code=status.get("error_status_code"), response_body=str(status),
+                    )))
+                else:
+                    remaining.append(waiter)
+            tracked.waiters = remaining
+            if not remaining:
+                del self._jobs[job_id]
+
+        # Complete futures outside the lock; callbacks may call watch() again
+        for waiter, result, error in done:
+            try:
+                if error is not None:
+                    waiter.future.set_exception(error)
+                else:
+                    waiter.future.set_result(result)
+            except InvalidStateError:
+                pass  # Cancelled by its caller in the meantime
+
+
+_watcher: Optional[WorkspaceStateWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_workspace_watcher() -> WorkspaceStateWatcher:
+    """Get the process-wide workspace state watcher."""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = WorkspaceStateWatcher()
+    return _watcher
@@ -0,0 +1,176 @@
+"""
+S3 Batch Operations
+
+Concurrent multi-object S3 operations over one shared, thread-safe boto3
+client, for storage code that used to handle objects one at a time.
+
+- A single client per process with a connection pool sized for the
+  worker pool (S3_BATCH_WORKERS, default 16). Work is spread over a
+  shared ThreadPoolExecutor, so parallelism stays bounded however many
+  callers are active.
+- `put_many` uploads many objects concurrently (S3FileStorage
+  save_multiple_files). `delete_many` removes many keys per call with
+  DeleteObjects, up to 1000 keys per request (ProjectFile bodies when
+  their rows are deleted).
+- `map` runs other per-key work on the same bounded pool; the content
+  cache downloads the misses of its get_many() through it.
+- Bodies above MULTIPART_THRESHOLD are uploaded with the managed transfer
+  (multipart, parts uploaded concurrently).
+- AWS_S3_ENDPOINT_URL points the client at a local S3 stand-in (moto
+  server, MinIO) for testing.
+
+Usage:
+    from factory.s3_batch import get_s3_batch
+
+    s3 = get_s3_batch()
+    etags = s3.put_many(bucket, {'a/1.txt': 'one', 'a/2.txt': 'two'})
+    deleted = s3.delete_many(bucket, list(etags))
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv('S3_BATCH_WORKERS', '16'))
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+DELETE_BATCH_SIZE = 1000  # DeleteObjects limit
+
+Body = Union[str, bytes]
+
+
+def build_s3_client(max_pool_connections: int = MAX_WORKERS * 2):
+    """S3 client configured like the rest of the app, with a larger connection pool."""
+    import boto3
+    from botocore.config import Config
+
+    region = getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-1')
+    return boto3.client(
+        's3',
+        aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
+        aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
+        region_name=region,
+        endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None) or None,
+        config=Config(
+            signature_version='s3v4',
+            region_name=region,
+            s3={'addressing_style': 'virtual'},
+            max_pool_connections=max_pool_connections,
+            retries={'max_attempts': 5, 'mode': 'adaptive'},
+        ),
+    )
+
+
+class S3Batch:
+    """Bounded-concurrency uploads and deletes over many S3 keys."""
+
+    def __init__(self, client=None, max_workers: int = MAX_WORKERS):
+        self.client = client or build_s3_client(max_pool_connections=max_workers * 2)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='s3-batch')
+
+    def map(self, fn, items: Iterable) -> List:
+        """[fn(item)] for every item, run on the shared worker pool."""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
+
+    # ------------------------------------------------------------------
+    # Uploads
+    # ------------------------------------------------------------------
+
+    def upload(self, bucket: str, key: str, body: Union[Body, io.IOBase], content_type: str = 'text/plain',
+               **extra) -> Optional[str]:
+        """
+        Upload one object, multipart when it is larger than MULTIPART_THRESHOLD.
+
+        Returns:
+            The object's ETag, or None if the upload failed
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+            extra.setdefault('ContentEncoding', 'utf-8')
+
+        size = len(body) if isinstance(body, (bytes, bytearray)) else None
+        try:
+            if size is not None and size <= MULTIPART_THRESHOLD:
+                response = self.client.put_object(
+                    Bucket=bucket, Key=key, Body=body, ContentType=content_type, **extra
+                )
+                return response.get('ETag')
+
+            from boto3.s3.transfer import TransferConfig
+
+            fileobj = io.BytesIO(body) if size is not None else body
+            self.client.upload_fileobj(
+                fileobj, bucket, key,
+                ExtraArgs={'ContentType': content_type, **extra},
+                Config=TransferConfig(
+                    multipart_threshold=MULTIPART_THRESHOLD,
+                    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+                    max_concurrency=min(self.max_workers, 8),
+                ),
+            )
+            logger.info(f"[S3_BATCH] Multipart upload of {key} ({size if size is not None else 'stream'} bytes)")
+            return self.client.head_object(Bucket=bucket, Key=key).get('ETag')
+        except Exception as e:
+            logger.error(f"[S3_BATCH] Upload of {key} failed: {e}")
+            return None
+
+    def put_many(self, bucket: str, objects: Dict[str, Body], content_type: str = 'text/plain') -> Dict[str, Optional[str]]:
+        """Upload {key: body} concurrently. Returns {key: ETag or None on failure}."""
+        items = list(objects.items())
+        results = self.map(lambda item: (item[0], self.upload(bucket, item[0], item[1], content_type)), items)
+        failed = sum(1 for _, etag in results if etag is None)
+        logger.info(f"[S3_BATCH] Put {len(items) - failed}/{len(items)} objects to {bucket}")
+        return dict(results)
+
+    # ------------------------------------------------------------------
+    # Deletes
+    # ------------------------------------------------------------------
+
+    def delete_many(self, bucket: str, keys: Iterable[str]) -> Dict[str, bool]:
+        """Delete keys with batched DeleteObjects calls. Returns {key: deleted}."""
+        keys = list(dict.fromkeys(keys))
+        batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+
+        def delete_batch(batch):
+            try:
+                response = self.client.delete_objects(
+                    Bucket=bucket,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+                )
+            except Exception as e:
+                logger.error(f"[S3_BATCH] DeleteObjects for {len(batch)} keys failed: {e}")
+                return {key: False for key in batch}
+            errors = {err['Key'] for err in response.get('Errors', [])}
+            for err in response.get('Errors', []):
+                logger.warning(f"[S3_BATCH] Could not delete {err['Key']}: {err.get('Message')}")
+            return {key: key not in errors for key in batch}
+
+        results: Dict[str, bool] = {}
+        for outcome in self.map(delete_batch, batches):
+            results.update(outcome)
+        return results
+
+
+_s3_batch: Optional[S3Batch] = None
+_s3_batch_lock = threading.Lock()
+
+
+def get_s3_batch() -> S3Batch:
+    """Process-wide batch client (and its shared S3 connection pool)."""
+    global _s3_batch
+    if _s3_batch is None:
+        with _s3_batch_lock:
+            if _s3_batch is None:
+                _s3_batch = S3Batch()
+    return _s3_batch
@@ -0,0 +1,336 @@
+"""
+SSH Connection Pool
+
+Shares authenticated paramiko transports between SSH commands run against
+Mags workspaces. Connections are keyed by (host, port, key fingerprint).
+Each command opens a channel on a pooled transport, so after the first
+command to a workspace the per-command cost is one channel open instead of
+TCP connect + key parse + SSH handshake.
+
+- Parsed private keys (PKey) are cached by fingerprint.
+- Transports send keepalives and are evicted after sitting idle.
+- Dead transports are detected on checkout (and on channel-open failure)
+  and transparently replaced.
+- A transport carries at most `max_sessions` concurrent channels (sshd's
+  MaxSessions defaults to 10); beyond that a second transport is opened.
+
+Settings (environment):
+    MAGS_SSH_POOL_ENABLED        default "true"
+    MAGS_SSH_POOL_IDLE_SECONDS   default 300
+    MAGS_SSH_POOL_KEEPALIVE      default 30
+    MAGS_SSH_POOL_MAX_SESSIONS   default 8
+
+Usage:
+    from factory.ssh_pool import get_ssh_pool
+
+    with get_ssh_pool().session(host, port, private_key) as channel:
+        channel.exec_command("uname -a")
+        output = channel.makefile('rb').read()
+        exit_code = channel.recv_exit_status()
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Key type parse order (most Mags keys are RSA)
+_KEY_CLASSES = (paramiko.RSAKey, paramiko.Ed25519Key, paramiko.ECDSAKey)
+
+_pkey_cache: Dict[str, paramiko.PKey] = {}
+_pkey_lock = threading.Lock()
+_PKEY_CACHE_MAX = 256
+
+
+def key_fingerprint(private_key: str) -> str:
+    """Stable identifier for a private key string (never logged in full)."""
+    return hashlib.sha256(private_key.encode('utf-8')).hexdigest()[:32]
+
+
+def load_private_key(private_key: str) -> paramiko.PKey:
+    """Parse a private key string, caching the result by fingerprint."""
+    fingerprint = key_fingerprint(private_key)
+    with _pkey_lock:
+        pkey = _pkey_cache.get(fingerprint)
+    if pkey is not None:
+        return pkey
+
+    last_error = None
+    for key_class in _KEY_CLASSES:
+        try:
+            pkey = key_class.from_private_key(io.StringIO(private_key))
+            break
+        except Exception as e:
+            last_error = e
+    else:
+        raise paramiko.ssh_exception.SSHException(f"Unsupported private key: {last_error}")
+
+    with _pkey_lock:
+        if len(_pkey_cache) >= _PKEY_CACHE_MAX:
+            _pkey_cache.pop(next(iter(_pkey_cache)))
+        _pkey_cache[fingerprint] = pkey
+    return pkey
+
+
+class PooledConnection:
+    """One authenticated SSH transport shared by several channels."""
+
+    def __init__(self, key: Tuple[str, int, str], client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.transport = client.get_transport()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.active_channels = 0
+        self.commands = 0
+
+    def is_healthy(self) -> bool:
+        transport = self.transport
+        return bool(transport and transport.is_active() and transport.is_authenticated())
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """Pool of SSH transports keyed by (host, port, key fingerprint)."""
+
+    def __init__(
+        self,
+        idle_timeout: float = 300,
+        keepalive: int = 30,
+        max_sessions: int = 8,
+        enabled: bool = True,
+        reap_interval: float = 30,
+    ):
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.max_sessions = max_sessions
+        self.enabled = enabled
+        self.reap_interval = reap_interval
+
+        self._lock = threading.Lock()
+        self._connections: Dict[Tuple[str, int, str], List[PooledConnection]] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.connects = 0
+        self.reuses = 0
+        self.reconnects = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def session(self, host: str, port: int, private_key: str, connect_timeout: float = 30):
+        """
+        Yield a fresh session channel on a pooled transport.
+
+        The channel is closed on exit; the transport stays in the pool.
+        """
+        if not self.enabled:
+            client = _connect(host, port, private_key, connect_timeout, keepalive=0)
+            try:
+                yield client.get_transport().open_session(timeout=connect_timeout)
+            finally:
+                client.close()
+            return
+
+        conn, channel = self._open_channel(host, int(port), private_key, connect_timeout)
+        try:
+            yield channel
+        finally:
+            try:
+                channel.close()
+            except Exception:
+                pass
+            with self._lock:
+                conn.active_channels -= 1
+                conn.last_used = time.monotonic()
+
+    def invalidate(self, host: str, port: int, private_key: str = None):
+        """Close pooled transports for a host (e.g. after credentials rotate)."""
+        with self._lock:
+            keys = [
+                k for k in self._connections
+                if k[0] == host and k[1] == int(port)
+                and (private_key is None or k[2] == key_fingerprint(private_key))
+            ]
+            dropped = [c for k in keys for c in self._connections.pop(k)]
+        for conn in dropped:
+            conn.close()
+
+    def reap_idle(self) -> int:
+        """Close transports idle longer than idle_timeout or no longer alive."""
+        now = time.monotonic()
+        dropped = []
+        with self._lock:
+            for key in list(self._connections):
+                keep = []
+                for conn in self._connections[key]:
+                    idle = now - conn.last_used
+                    if conn.active_channels == 0 and (idle > self.idle_timeout or not conn.is_healthy()):
+                        dropped.append(conn)
+                    else:
+                        keep.append(conn)
+                if keep:
+                    self._connections[key] = keep
+                else:
+                    del self._connections[key]
+        for conn in dropped:
+            conn.close()
+        if dropped:
+            logger.info(f"[SSH_POOL] Evicted {len(dropped)} idle SSH connections")
+        return len(dropped)
+
+    def close_all(self):
+        """Close every pooled transport and stop the reaper."""
+        self._stop.set()
+        with self._lock:
+            dropped = [c for conns in self._connections.values() for c in conns]
+            self._connections.clear()
+        for conn in dropped:
+            conn.close()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            conns = [c for cs in self._connections.values() for c in cs]
+            return {
+                'enabled': self.enabled,
+                'hosts': len(self._connections),
+                'connections': len(conns),
+                'active_channels': sum(c.active_channels for c in conns),
+                'connects': self.connects,
+                'reuses': self.reuses,
+                'reconnects': self.reconnects,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _open_channel(self, host: str, port: int, private_key: str, connect_timeout: float):
+        key = (host, port, key_fingerprint(private_key))
+
+        for attempt in range(2):
+            conn = self._checkout(key, host, port, private_key, connect_timeout)
+            try:
+                channel = conn.transport.open_session(timeout=connect_timeout)
+                return conn, channel
+            except Exception as e:
+                # Transport died between health check and use: drop it and retry once
+                with self._lock:
+                    conn.active_channels -= 1
+                self._discard(conn)
+                if attempt:
+                    raise
+                self.reconnects += 1
+                logger.info(f"[SSH_POOL] Channel open failed on {host}:{port} ({e}), reconnecting")
+
+    def _checkout(self, key, host, port, private_key, connect_timeout) -> PooledConnection:
+        """Reserve a channel slot on a healthy transport, connecting if needed."""
+        stale = []
+        with self._lock:
+            conns = self._connections.get(key, [])
+            for conn in list(conns):
+                if not conn.is_healthy():
+                    conns.remove(conn)
+                    stale.append(conn)
+                    continue
+                if conn.active_channels < self.max_sessions:
+                    conn.active_channels += 1
+                    conn.commands += 1
+                    conn.last_used = time.monotonic()
+                    self.reuses += 1
+                    break
+            else:
+                conn = None
+        for dead in stale:
+            dead.close()
+        if conn is not None:
+            return conn
+
+        # Connect outside the lock; handshakes to different hosts run in parallel
+        client = _connect(host, port, private_key, connect_timeout, keepalive=self.keepalive)
+        conn = PooledConnection(key, client)
+        conn.active_channels = 1
+        conn.commands = 1
+        with self._lock:
+            self._connections.setdefault(key, []).append(conn)
+            self.connects += 1
+        self._ensure_reaper()
+        logger.info(f"[SSH_POOL] Opened SSH connection to {host}:{port}")
+        return conn
+
+    def _discard(self, conn: PooledConnection):
+        with self._lock:
+            conns = self._connections.get(conn.key)
+            if conns and conn in conns:
+                conns.remove(conn)
+                if not conns:
+                    del self._connections[conn.key]
+        conn.close()
+
+    def _ensure_reaper(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, name='ssh-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap_idle()
+            except Exception as e:
+                logger.warning(f"[SSH_POOL] Reap failed: {e}")
+
+
+def _connect(host: str, port: int, private_key: str, connect_timeout: float, keepalive: int) -> paramiko.SSHClient:
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        hostname=host,
+        port=port,
+        username="root",
+        pkey=load_private_key(private_key),
+        timeout=connect_timeout,
+        banner_timeout=connect_timeout,
+        auth_timeout=connect_timeout,
+        allow_agent=False,
+        look_for_keys=False,
+    )
+    if keepalive:
+        client.get_transport().set_keepalive(keepalive)
+    return client
+
+
+_ssh_pool: Optional[SSHConnectionPool] = None
+_ssh_pool_lock = threading.Lock()
+
+
+def get_ssh_pool() -> SSHConnectionPool:
+    """Get the process-wide SSH connection pool."""
+    global _ssh_pool
+    if _ssh_pool is None:
+        with _ssh_pool_lock:
+            if _ssh_pool is None:
+                _ssh_pool = SSHConnectionPool(
+                    idle_timeout=float(os.getenv('MAGS_SSH_POOL_IDLE_SECONDS', '300')),
+                    keepalive=int(os.getenv('MAGS_SSH_POOL_KEEPALIVE', '30')),
+                    max_sessions=int(os.getenv('MAGS_SSH_POOL_MAX_SESSIONS', '8')),
+                    enabled=os.getenv('MAGS_SSH_POOL_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+                )
+    return _ssh_pool
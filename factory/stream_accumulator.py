@@ -0,0 +1,190 @@
+"""
+Stream Accumulator
+
+Collects the chunks of a streamed document (stream_prd_content,
+stream_implementation_content, stream_document_content) without
+rewriting the whole document on every chunk.
+
+- Each chunk is stored once, as a delta under its sequence number. Nothing
+  reads the accumulated text until the stream completes, when
+  `assemble()` joins the chunks in sequence order.
+- Sequence numbers come from the caller (the tool's optional `sequence`
+  argument) or are allocated in arrival order. Re-sending a sequence
+  number that is already stored is a no-op, so a retried tool call does
+  not duplicate text.
+- With USE_REDIS_CHANNELS the chunks live in a Redis hash (one HSETNX per
+  chunk, done atomically with the length/sequence bookkeeping), so every
+  worker sees the same stream. Otherwise an in-process store is used,
+  which is enough for single-process development.
+- Streams expire STREAM_TTL seconds after their last chunk.
+
+Usage:
+    from factory.stream_accumulator import get_stream_accumulator
+
+    accumulator = get_stream_accumulator()
+    seq, added, length = accumulator.append(stream_key, chunk, seq=function_args.get('sequence'))
+    if is_complete:
+        content = accumulator.assemble(stream_key)
+        ...save content...
+        accumulator.discard(stream_key)
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STREAM_TTL = 3600
+CHUNKS_KEY = 'lfg:stream:{}:chunks'
+META_KEY = 'lfg:stream:{}:meta'
+
+# KEYS: chunks hash, meta hash. ARGV: seq ('' to allocate), chunk, chunk length, ttl
+_APPEND_SCRIPT = """
+local seq = ARGV[1]
+if seq == '' then
+  seq = tostring(redis.call('HINCRBY', KEYS[2], 'next', 1))
+end
+local added = redis.call('HSETNX', KEYS[1], seq, ARGV[2])
+if added == 1 then
+  redis.call('HINCRBY', KEYS[2], 'length', tonumber(ARGV[3]))
+  if tonumber(seq) > tonumber(redis.call('HGET', KEYS[2], 'next') or '0') then
+    redis.call('HSET', KEYS[2], 'next', seq)
+  end
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[4]))
+return {seq, added, redis.call('HGET', KEYS[2], 'length') or '0'}
+"""
+
+
+class _MemoryStreams:
+    """In-process store: stream key -> {'chunks': {seq: chunk}, 'next', 'length', 'touched'}."""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._streams: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        stale = [k for k, s in self._streams.items() if now - s['touched'] > self.ttl]
+        for key in stale:
+            del self._streams[key]
+
+    def append(self, stream_key: str, chunk: str, seq: Optional[int]) -> Tuple[int, bool, int]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            stream = self._streams.setdefault(stream_key, {'chunks': {}, 'next': 0, 'length': 0, 'touched': now})
+            if seq is None:
+                seq = stream['next'] + 1
+            added = seq not in stream['chunks']
+            if added:
+                stream['chunks'][seq] = chunk
+                stream['length'] += len(chunk)
+                stream['next'] = max(stream['next'], seq)
+            stream['touched'] = now
+            return seq, added, stream['length']
+
+    def assemble(self, stream_key: str) -> str:
+        with self._lock:
+            stream = self._streams.get(stream_key)
+            if not stream:
+                return ''
+            return ''.join(stream['chunks'][seq] for seq in sorted(stream['chunks']))
+
+    def discard(self, stream_key: str):
+        with self._lock:
+            self._streams.pop(stream_key, None)
+
+
+class _RedisStreams:
+    """Redis store: chunks in a hash keyed by sequence number, bookkeeping in a second hash."""
+
+    def __init__(self, ttl: int):
+        from tasks.dispatch import get_redis_client
+
+        self.ttl = ttl
+        self._client = get_redis_client()
+        self._append = self._client.register_script(_APPEND_SCRIPT)
+
+    def append(self, stream_key: str, chunk: str, seq: Optional[int]) -> Tuple[int, bool, int]:
+        keys = [CHUNKS_KEY.format(stream_key), META_KEY.format(stream_key)]
+        args = ['' if seq is None else str(seq), chunk, len(chunk), self.ttl]
+        stored_seq, added, length = self._append(keys=keys, args=args)
+        return int(stored_seq), bool(int(added)), int(length)
+
+    def assemble(self, stream_key: str) -> str:
+        chunks = self._client.hgetall(CHUNKS_KEY.format(stream_key)) or {}
+        return ''.join(chunks[seq] for seq in sorted(chunks, key=int))
+
+    def discard(self, stream_key: str):
+        self._client.delete(CHUNKS_KEY.format(stream_key), META_KEY.format(stream_key))
+
+
+class StreamAccumulator:
+    """Append-only chunk store for streamed documents."""
+
+    def __init__(self, ttl: int = STREAM_TTL, use_redis: bool = None):
+        if use_redis is None:
+            use_redis = getattr(settings, 'USE_REDIS_CHANNELS', False)
+        self._store = None
+        if use_redis:
+            try:
+                self._store = _RedisStreams(ttl)
+            except Exception as e:
+                logger.warning(f"[STREAM] Redis unavailable, accumulating streams in memory: {e}")
+        if self._store is None:
+            self._store = _MemoryStreams(ttl)
+
+    @property
+    def backend(self) -> str:
+        return 'redis' if isinstance(self._store, _RedisStreams) else 'memory'
+
+    def append(self, stream_key: str, chunk: str, seq: Optional[int] = None) -> Tuple[int, bool, int]:
+        """
+        Store one chunk.
+
+        Args:
+            stream_key: Identifies the document being streamed
+            chunk: The text delta
+            seq: Sequence number of the chunk; allocated in arrival order if None
+
+        Returns:
+            (seq, added, length) - added is False when `seq` was already
+            stored (a retry); length is the accumulated size so far.
+        """
+        if seq is not None:
+            seq = int(seq)
+            if seq < 1:
+                raise ValueError(f"Stream sequence numbers start at 1, got {seq}")
+        seq, added, length = self._store.append(stream_key, chunk, seq)
+        if not added:
+            logger.info(f"[STREAM] Ignoring duplicate chunk {seq} for {stream_key}")
+        return seq, added, length
+
+    def assemble(self, stream_key: str) -> str:
+        """Join every stored chunk in sequence order."""
+        return self._store.assemble(stream_key)
+
+    def discard(self, stream_key: str):
+        """Drop a stream once its document has been saved."""
+        self._store.discard(stream_key)
+
+
+_accumulator: Optional[StreamAccumulator] = None
+_accumulator_lock = threading.Lock()
+
+
+def get_stream_accumulator() -> StreamAccumulator:
+    """Process-wide accumulator."""
+    global _accumulator
+    if _accumulator is None:
+        with _accumulator_lock:
+            if _accumulator is None:
+                _accumulator = StreamAccumulator()
+                logger.info(f"[STREAM] Accumulating streamed documents in {_accumulator.backend}")
+    return _accumulator
@@ -0,0 +1,917 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, override_settings
+
+from factory import dev_server_jobs, env_bundle, workspace_sync
+from factory.claude_stream import BoundedText, ClaudeStreamParser, TicketLogStreamWriter
+from factory.cli_log_shipper import SHIPPER_SCRIPT, can_ship_logs, shipper_args
+from factory.command_cache import (
+    bump_workspace_epoch,
+    get_cache_stats,
+    get_cached_result,
+    get_workspace_epoch,
+    is_read_only_command,
+    store_result,
+)
+from factory.content_cache import REVALIDATE_AFTER, S3ContentCache
+from factory.dev_server_jobs import get_dev_server_job, submit_dev_server_job, wait_until_listening
+from factory.env_bundle import EnvBundleCache, env_setup_lines, is_missing_bundle, mark_installed
+from factory.mags_watcher import WorkspaceStateWatcher
+from factory.s3_batch import S3Batch
+from factory.ssh_pool import SSHConnectionPool
+from factory.stream_accumulator import StreamAccumulator
+from factory.workspace_sync import WorkspaceFile, diff_manifest, directory_files, parse_sha256sum, sync_files
+from tasks.cancellation import CancelToken
+
+try:
+    from moto import mock_s3
+except ImportError:  # test-only dependency
+    mock_s3 = None
+
+
+def _redis_reachable():
+    try:
+        from tasks.dispatch import get_redis_client
+        return get_redis_client().ping()
+    except Exception:
+        return False
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'factory-tests'}}
+
+
+class ReadOnlyCommandTests(SimpleTestCase):
+    def test_inspection_commands_are_read_only(self):
+        for command in [
+            'ls -la',
+            'cat package.json',
+            'git status',
+            'git log --oneline -5',
+            'cd /app && ls',
+            'grep -rn TODO src | head -20',
+            'find . -name "*.py"',
+            'ls missing 2>/dev/null',
+            'git branch',
+        ]:
+            with self.subTest(command=command):
+                self.assertTrue(is_read_only_command(command))
+
+    def test_writes_are_not_read_only(self):
+        for command in [
+            '',
+            'npm install',
+            'echo hi > out.txt',
+            'cat $(which node)',
+            'ls; rm -rf build',
+            'find . -name "*.pyc" -delete',
+            'sort -o sorted.txt input.txt',
+            'uniq in.txt out.txt',
+            'git checkout main',
+            'git branch feature',
+            'sudo ls',
+            'sleep 10 &',
+        ]:
+            with self.subTest(command=command):
+                self.assertFalse(is_read_only_command(command))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CommandResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_store_and_hit(self):
+        store_result('ws-1', 'ls', {'exit_code': 0, 'stdout': 'a\nb\n', 'stderr': ''})
+        cached = get_cached_result('ws-1', 'ls')
+        self.assertEqual(cached['stdout'], 'a\nb\n')
+        self.assertIn('cached_at', cached)
+        self.assertIsNone(get_cached_result('ws-2', 'ls'))
+
+    def test_bump_invalidates_workspace(self):
+        store_result('ws-1', 'ls', {'exit_code': 0, 'stdout': 'a', 'stderr': ''})
+        bump_workspace_epoch('ws-1')
+        self.assertEqual(get_workspace_epoch('ws-1'), 1)
+        self.assertIsNone(get_cached_result('ws-1', 'ls'))
+
+    def test_result_stored_under_stale_epoch_is_never_served(self):
+        epoch = get_workspace_epoch('ws-1')
+        bump_workspace_epoch('ws-1')
+        store_result('ws-1', 'ls', {'exit_code': 0, 'stdout': 'a', 'stderr': ''}, epoch=epoch)
+        self.assertIsNone(get_cached_result('ws-1', 'ls'))
+
+    def test_writes_and_failures_are_not_cached(self):
+        store_result('ws-1', 'npm install', {'exit_code': 0, 'stdout': 'ok', 'stderr': ''})
+        store_result('ws-1', 'ls', {'exit_code': -1, 'stdout': '', 'stderr': 'timeout'})
+        self.assertIsNone(get_cached_result('ws-1', 'npm install'))
+        self.assertIsNone(get_cached_result('ws-1', 'ls'))
+
+    def test_stats(self):
+        store_result('ws-1', 'pwd', {'exit_code': 0, 'stdout': '/app', 'stderr': ''})
+        get_cached_result('ws-1', 'pwd')
+        get_cached_result('ws-1', 'git status')
+        stats = get_cache_stats('ws-1')
+        self.assertEqual((stats['hits'], stats['lookups'], stats['hit_rate']), (1, 2, 0.5))
+
+    def test_mags_invalidates_after_non_read_only_commands(self):
+        from factory.mags import _invalidate_command_cache
+
+        _invalidate_command_cache('ws-1', 'cat README.md')
+        self.assertEqual(get_workspace_epoch('ws-1'), 0)
+        _invalidate_command_cache('ws-1', 'npm install')
+        self.assertEqual(get_workspace_epoch('ws-1'), 1)
+
+
+@skipUnless(mock_s3, 'moto is not installed')
+@override_settings(FILE_STORAGE_TYPE='s3', AWS_STORAGE_BUCKET_NAME='lfg-test', AWS_S3_PROJECT_PREFIX='projects')
+class S3BatchStorageTests(SimpleTestCase):
+    BUCKET = 'lfg-test'
+
+    def setUp(self):
+        import boto3
+
+        s3_mock = mock_s3()
+        s3_mock.start()
+        self.addCleanup(s3_mock.stop)
+        client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test')
+        client.create_bucket(Bucket=self.BUCKET)
+
+        self.batch = S3Batch(client=client, max_workers=4)
+        self.addCleanup(self.batch._executor.shutdown)
+        self.content_cache = S3ContentCache(use_shared=False)
+        for target, value in [
+            ('factory.s3_batch._s3_batch', self.batch),
+            ('factory.content_cache._content_cache', self.content_cache),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _forget_cached_bodies(self):
+        for s3_key in list(self.content_cache._entries):
+            self.content_cache.invalidate(s3_key)
+
+    def _body(self, key):
+        return self.batch.client.get_object(Bucket=self.BUCKET, Key=key)['Body'].read().decode('utf-8')
+
+    def test_put_many_and_delete_many(self):
+        objects = {f'batch/{n}.txt': f'body {n}' for n in range(10)}
+        etags = self.batch.put_many(self.BUCKET, objects)
+        self.assertEqual(set(etags), set(objects))
+        self.assertTrue(all(etags.values()))
+        self.assertEqual(self._body('batch/3.txt'), 'body 3')
+
+        deleted = self.batch.delete_many(self.BUCKET, list(objects) + ['batch/3.txt'])
+        self.assertEqual(deleted, {key: True for key in objects})
+        listed = self.batch.client.list_objects_v2(Bucket=self.BUCKET, Prefix='batch/')
+        self.assertEqual(listed.get('KeyCount'), 0)
+
+    def test_save_multiple_files_and_structure_with_content(self):
+        from factory.file_storage import S3FileStorage
+
+        storage = S3FileStorage()
+        files = {'README.md': '# App', 'src/main.py': 'print(1)', 'src/lib/util.py': 'X = 1'}
+        with mock.patch.object(self.batch, 'put_many', wraps=self.batch.put_many) as put_many:
+            self.assertEqual(storage.save_multiple_files('demo', files), {path: True for path in files})
+        put_many.assert_called_once()
+        self.assertEqual(self._body('projects/demo/src/main.py'), 'print(1)')
+
+        self.assertEqual(storage.get_project_structure('demo'), {
+            'README.md': 'file', 'src': {'main.py': 'file', 'lib': {'util.py': 'file'}},
+        })
+
+        # Cold cache: every body is downloaded, on the shared pool
+        self._forget_cached_bodies()
+        with mock.patch.object(self.batch, 'map', wraps=self.batch.map) as batch_map:
+            tree = storage.get_project_structure('demo', include_content=True)
+        batch_map.assert_called_once()
+        self.assertEqual(tree, {'README.md': '# App', 'src': {'main.py': 'print(1)', 'lib': {'util.py': 'X = 1'}}})
+        self.assertEqual(self.content_cache.stats['downloads'], 3)
+
+    def test_list_project_files_with_content(self):
+        from projects.utils.s3_storage import ProjectS3Storage
+
+        storage = ProjectS3Storage()
+        for name in ('a', 'b'):
+            success, _, error = storage.save_file('p1', 'prd', f'PRD {name}', file_name=name)
+            self.assertTrue(success, error)
+
+        self.assertEqual(storage.list_project_files('p1', 'prd'), ['p1/prd/a.json', 'p1/prd/b.json'])
+        self._forget_cached_bodies()
+        self.assertEqual(
+            storage.list_project_files('p1', 'prd', include_content=True),
+            {'p1/prd/a.json': 'PRD a', 'p1/prd/b.json': 'PRD b'},
+        )
+
+
+class _FakeS3Bodies:
+    """get_object over a dict, answering If-None-Match like S3."""
+
+    def __init__(self):
+        self.objects = {}
+        self.requests = []
+
+    def upload(self, key, body):
+        etag = '"{}"'.format(hashlib.md5(body.encode('utf-8')).hexdigest())
+        self.objects[key] = (etag, body)
+        return etag
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        from botocore.exceptions import ClientError
+
+        self.requests.append((Key, IfNoneMatch))
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        etag, body = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304'}, 'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+        return {'ETag': etag, 'Body': io.BytesIO(body.encode('utf-8'))}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class S3ContentCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.s3 = _FakeS3Bodies()
+
+    def _get(self, content_cache, key, etag=None):
+        return content_cache.get(self.s3, 'bucket', key, etag=etag)
+
+    def test_reads_are_served_locally_until_revalidation(self):
+        content_cache = S3ContentCache(use_shared=False)
+        etag = self.s3.upload('doc', 'v1')
+        self.assertEqual(self._get(content_cache, 'doc'), 'v1')
+        self.assertEqual(self._get(content_cache, 'doc'), 'v1')
+        self.assertEqual(self.s3.requests, [('doc', None)])
+
+        # An old copy is revalidated with a conditional GET, which costs a 304
+        with mock.patch('factory.content_cache.time.time', return_value=time.time() + REVALIDATE_AFTER + 1):
+            self.assertEqual(self._get(content_cache, 'doc'), 'v1')
+        self.assertEqual(self.s3.requests[-1], ('doc', etag))
+        self.assertEqual((content_cache.stats['downloads'], content_cache.stats['revalidated']), (1, 1))
+
+    def test_expected_etag_refetches_a_stale_copy(self):
+        content_cache = S3ContentCache(use_shared=False)
+        self.s3.upload('doc', 'v1')
+        self._get(content_cache, 'doc')
+        etag = self.s3.upload('doc', 'v2')
+        self.assertEqual(self._get(content_cache, 'doc', etag=etag), 'v2')
+        self.assertEqual(self._get(content_cache, 'doc', etag=etag), 'v2')
+        self.assertEqual(content_cache.stats['downloads'], 2)
+
+    def test_missing_keys_and_put(self):
+        content_cache = S3ContentCache(use_shared=False)
+        self.assertIsNone(self._get(content_cache, 'gone'))
+
+        etag = self.s3.upload('doc', 'saved')
+        content_cache.put('doc', 'saved', etag)
+        self.assertEqual(self._get(content_cache, 'doc', etag=etag), 'saved')
+        self.assertEqual(self.s3.requests, [('gone', None)])
+
+    def test_local_tier_is_bounded_by_bytes(self):
+        content_cache = S3ContentCache(max_bytes=10, use_shared=False)
+        content_cache.put('a', 'aaaa', 'ea')
+        content_cache.put('b', 'bbbb', 'eb')
+        self.assertEqual(self._get(content_cache, 'a', etag='ea'), 'aaaa')
+        content_cache.put('c', 'cccc', 'ec')
+        self.assertEqual(list(content_cache._entries), ['a', 'c'])
+        content_cache.put('huge', 'x' * 11, 'eh')
+        self.assertNotIn('huge', content_cache._entries)
+        self.assertEqual(content_cache._bytes, 8)
+
+    def test_shared_tier_between_processes(self):
+        writer, reader = S3ContentCache(use_shared=True), S3ContentCache(use_shared=True)
+        etag = self.s3.upload('doc', 'v1')
+        writer.put('doc', 'v1', etag)
+        self.assertEqual(self._get(reader, 'doc'), 'v1')
+        self.assertEqual((reader.stats['shared_hits'], self.s3.requests), (1, []))
+
+        # Another process's save makes the reader's local copy stale at once
+        etag = self.s3.upload('doc', 'v2')
+        writer.put('doc', 'v2', etag)
+        self.assertEqual(self._get(reader, 'doc'), 'v2')
+
+        writer.invalidate('doc')
+        reader.invalidate('doc')
+        self.assertEqual(self._get(reader, 'doc'), 'v2')
+        self.assertEqual(self.s3.requests, [('doc', None)])
+
+    def test_get_many_downloads_misses_concurrently(self):
+        content_cache = S3ContentCache(use_shared=False)
+        batch = S3Batch(client=self.s3, max_workers=4)
+        self.addCleanup(batch._executor.shutdown)
+        etags = {key: self.s3.upload(key, f'body {key}') for key in ('a', 'b', 'c')}
+        content_cache.put('a', 'body a', etags['a'])
+
+        with mock.patch('factory.s3_batch._s3_batch', batch), \
+                mock.patch.object(batch, 'map', wraps=batch.map) as batch_map:
+            bodies = content_cache.get_many(self.s3, 'bucket', ['a', 'b', 'c', 'missing', 'b'], etags=etags)
+        self.assertEqual(bodies, {'a': 'body a', 'b': 'body b', 'c': 'body c', 'missing': None})
+        self.assertEqual(sorted(batch_map.call_args[0][1]), ['b', 'c', 'missing'])
+        self.assertEqual(content_cache.stats['hits'], 1)
+
+
+class ClaudeStreamParserTests(SimpleTestCase):
+    def test_lines_split_across_chunks(self):
+        parser = ClaudeStreamParser()
+        line = json.dumps({'type': 'assistant', 'message': {'content': [
+            {'type': 'text', 'text': 'Reading the config'},
+            {'type': 'tool_use', 'name': 'Read', 'input': {'file_path': '/app/settings.py'}},
+        ]}})
+        events = []
+        for i in range(0, len(line), 7):
+            events.extend(parser.feed(line[i:i + 7]))
+        self.assertEqual(events, [])
+
+        events = parser.feed('\n{"type":"result","result":"done"}')
+        self.assertEqual([(e.kind, e.text or e.name) for e in events], [('assistant', 'Reading the config'), ('tool_use', 'Read')])
+        self.assertEqual([e.kind for e in parser.close()], ['result'])
+        self.assertEqual((parser.final_result, parser.saw_result, parser.lines_parsed), ('done', True, 2))
+
+    def test_session_raw_output_and_concatenated_objects(self):
+        parser = ClaudeStreamParser()
+        events = parser.feed(
+            '{"type":"system","subtype":"init","session_id":"s1"}{"type":"assistant","message":{"content":"hi"}}\n'
+            'npm WARN deprecated\n'
+            '{"type":"broken\n'
+            '___CLAUDE_EXIT_CODE=3\n'
+        )
+        self.assertEqual([e.kind for e in events], ['system_init', 'assistant', 'raw_output'])
+        self.assertEqual((parser.session_id, parser.exit_code, parser.json_objects), ('s1', 3, 2))
+        self.assertEqual([m['type'] for m in parser.result()['messages']], ['system_init', 'assistant', 'raw_output'])
+
+    def test_overlong_lines_are_discarded(self):
+        parser = ClaudeStreamParser(max_line_chars=20)
+        events = parser.feed('{"type":"result",' + 'x' * 10)
+        events += parser.feed('y' * 30 + '"}\nshort line\n')
+        self.assertEqual([(e.kind, e.text) for e in events], [('raw_output', 'short line')])
+
+    def test_retained_state_is_bounded_but_keeps_markers(self):
+        parser = ClaudeStreamParser(max_messages=3, head_chars=20, tail_chars=40)
+        parser.feed('IMPLEMENTATION_STATUS: COMPLETE\n')
+        for n in range(50):
+            parser.feed(f'line {n}\n')
+
+        self.assertEqual(len(parser.messages), 3)
+        self.assertEqual(parser.markers_seen, ['IMPLEMENTATION_STATUS: COMPLETE'])
+        output = parser.output
+        self.assertTrue(output.startswith('IMPLEMENTATION_STATU'))
+        self.assertIn('chars truncated]; markers: IMPLEMENTATION_STATUS: COMPLETE...', output)
+        self.assertTrue(output.endswith('line 49\n'))
+        self.assertLess(len(output), 150)
+
+    def test_bounded_text(self):
+        text = BoundedText(head_chars=4, tail_chars=6)
+        text.append('abc')
+        self.assertEqual(text.getvalue(), 'abc')
+        for chunk in ('def', 'ghi', 'jkl', 'mno'):
+            text.append(chunk)
+        self.assertEqual((text.total_chars, text.dropped_chars), (15, 5))
+        self.assertEqual(text.getvalue(), 'abcd\n...[5 chars truncated]...\njklmno')
+
+
+class _BatchEndpoint(BaseHTTPRequestHandler):
+    """Records NDJSON posts; answers with the next queued status code."""
+    statuses = []
+    posts = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        type(self).posts.append((self.path, self.headers['X-CLI-API-Key'], [json.loads(line) for line in body.splitlines()]))
+        self.send_response(type(self).statuses.pop(0) if type(self).statuses else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class CliLogShipperTests(SimpleTestCase):
+    def test_can_ship_logs_needs_api_env(self):
+        env = {'LFG_API_URL': 'https://lfg.test', 'LFG_API_KEY': 'key', 'LFG_TICKET_ID': '7'}
+        self.assertTrue(can_ship_logs(env))
+        self.assertFalse(can_ship_logs({**env, 'LFG_API_KEY': ''}))
+        self.assertFalse(can_ship_logs(None))
+
+    def test_parser_reads_shipped_summary(self):
+        parser = ClaudeStreamParser()
+        parser.feed('{"type":"system","subtype":"init","session_id":"s1"}\n___CLAUDE_LOGS_SHIPPED=12 3\n___CLAUDE_EXIT_CODE=0\n')
+        self.assertEqual((parser.logs_shipped, parser.logs_dropped, parser.exit_code), (12, 3, 0))
+        self.assertNotIn('LOGS_SHIPPED', json.dumps(parser.result()))
+
+    def test_writer_leaves_structured_rows_to_the_shipper(self):
+        parser = ClaudeStreamParser()
+        events = parser.feed(
+            '{"type":"assistant","message":{"content":[{"type":"text","text":"Looking at the project"},'
+            '{"type":"tool_use","name":"TodoWrite","input":{"todos":[{"content":"a"}]}}]}}\n'
+            'npm WARN deprecated something\n'
+        )
+        writer = TicketLogStreamWriter(7, structured_logs=False)
+        with mock.patch.object(writer, '_sync_todos') as sync_todos, mock.patch.object(writer, 'flush'):
+            writer(events)
+        sync_todos.assert_called_once_with([{'content': 'a'}])
+        self.assertEqual([log.command for log in writer._pending], ['CLI output'])
+
+    @skipUnless(shutil.which('bash') and shutil.which('curl'), 'bash and curl are required')
+    def test_script_batches_retries_and_reports(self):
+        server = HTTPServer(('127.0.0.1', 0), _BatchEndpoint)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        _BatchEndpoint.statuses, _BatchEndpoint.posts = [503], []
+
+        lines = [json.dumps({'type': 'assistant', 'n': n}) for n in range(5)]
+        stdin = '\n'.join(lines[:2] + ['plain text'] + lines[2:]) + '\n'
+        env = {
+            **os.environ,
+            'LFG_API_URL': f'http://127.0.0.1:{server.server_port}/',
+            'LFG_API_KEY': 'key',
+            'LFG_TICKET_ID': '7',
+        }
+        result = subprocess.run(
+            ['bash', '-c', SHIPPER_SCRIPT, 'shipper', *shipper_args('run1', flush_lines=3).split()],
+            input=stdin, env=env, capture_output=True, text=True, timeout=60,
+        )
+
+        self.assertEqual(result.stdout.strip(), '5 0')
+        path, api_key, entries = _BatchEndpoint.posts[0]
+        self.assertEqual((path, api_key), ('/api/v1/cli/stream/batch/?ticket_id=7', 'key'))
+        # The first batch is retried after the 503; non-JSON lines are not shipped
+        batches = [[entry['key'] for entry in entries] for _, _, entries in _BatchEndpoint.posts]
+        self.assertEqual(batches, [['run1:1', 'run1:2', 'run1:4'], ['run1:1', 'run1:2', 'run1:4'], ['run1:5', 'run1:6']])
+        self.assertEqual(_BatchEndpoint.posts[-1][2][-1], {'type': 'stream_json', 'key': 'run1:6', 'data': json.loads(lines[-1])})
+
+
+def _running(status):
+    return status.get('status') == 'running'
+
+
+class WorkspaceStateWatcherTests(SimpleTestCase):
+    def setUp(self):
+        from factory import mags
+
+        self.MagsAPIError = mags.MagsAPIError
+        self.watcher = WorkspaceStateWatcher(poll_interval=0.01, idle_exit=0.05)
+        self.list_jobs = mock.patch.object(mags, 'list_jobs').start()
+        self.get_job_status = mock.patch.object(mags, 'get_job_status').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _join(self):
+        thread = self.watcher._thread
+        if thread:
+            thread.join(timeout=5)
+
+    def test_one_list_jobs_call_per_tick_for_many_waiters(self):
+        job_ids = [f'job-{n}' for n in range(5)]
+        states = iter(['pending', 'pending'])
+
+        def list_jobs():
+            state = next(states, 'running')
+            return {'jobs': [{'request_id': job_id, 'status': state} for job_id in job_ids]}
+
+        self.list_jobs.side_effect = list_jobs
+
+        # Register every waiter before the poller's first tick
+        with mock.patch.object(self.watcher, '_ensure_thread'):
+            futures = [self.watcher.watch(job_id, _running) for job_id in job_ids]
+        self.watcher._ensure_thread()
+
+        results = [future.result(timeout=5) for future in futures]
+        self.assertEqual([r['request_id'] for r in results], job_ids)
+        self.assertEqual(self.list_jobs.call_count, 3)
+        self.assertEqual(self.watcher.batch_calls, 3)
+        self.get_job_status.assert_not_called()
+
+    def test_fail_on_state_fails_the_waiter(self):
+        self.get_job_status.return_value = {'request_id': 'job-1', 'status': 'failed'}
+        with self.assertRaisesRegex(self.MagsAPIError, 'terminal state: failed'):
+            self.watcher.wait_for('job-1', _running, timeout=5, fail_on=('failed', 'error'))
+
+    def test_failed_lookup_fails_waiters_that_do_not_accept_unknown(self):
+        self.get_job_status.side_effect = self.MagsAPIError('job not found', status_code=404)
+        with self.assertRaisesRegex(self.MagsAPIError, 'job not found') as raised:
+            self.watcher.wait_for('job-1', _running, timeout=30)
+        self.assertEqual(raised.exception.status_code, 404)
+
+        # "Wait until gone" callers accept the unknown status
+        status = self.watcher.wait_for('job-2', lambda st: st.get('status') not in ('running', 'sleeping'), timeout=5)
+        self.assertEqual(status['status'], 'unknown')
+
+    def test_timeout_reports_last_status_and_stops_tracking(self):
+        self.get_job_status.return_value = {'request_id': 'job-1', 'status': 'pending'}
+        with self.assertRaisesRegex(self.MagsAPIError, 'last status: pending'):
+            self.watcher.wait_for('job-1', _running, timeout=0.2)
+        self.assertEqual(self.watcher.get_stats()['tracked_jobs'], 0)
+
+    def test_poller_exits_when_idle_and_restarts_on_demand(self):
+        self.get_job_status.return_value = {'request_id': 'job-1', 'status': 'running'}
+        self.watcher.wait_for('job-1', _running, timeout=5)
+        self._join()
+        self.assertIsNone(self.watcher._thread)
+
+        self.watcher.wait_for('job-1', _running, timeout=5)
+        self.assertEqual(self.get_job_status.call_count, 2)
+        self._join()
+        self.assertIsNone(self.watcher._thread)
+
+
+def _ssh_client():
+    client = mock.Mock()
+    transport = client.get_transport.return_value
+    transport.is_active.return_value = True
+    transport.is_authenticated.return_value = True
+    transport.open_session.side_effect = lambda timeout=None: mock.Mock()
+    return client
+
+
+class SSHConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = SSHConnectionPool(max_sessions=2, idle_timeout=60, reap_interval=3600)
+        self.addCleanup(self.pool.close_all)
+        self.connect = mock.patch('factory.ssh_pool._connect', side_effect=lambda *args, **kwargs: _ssh_client()).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _run(self, host='10.0.0.1', key='key-a'):
+        with self.pool.session(host, 22, key) as channel:
+            return channel
+
+    def test_commands_share_one_transport(self):
+        first = self._run()
+        second = self._run()
+        self.assertIsNot(first, second)
+        first.close.assert_called_once_with()
+        self.assertEqual(self.connect.call_count, 1)
+        self._run(key='key-b')
+        self._run(host='10.0.0.2')
+
+        stats = self.pool.get_stats()
+        self.assertEqual((stats['connects'], stats['reuses'], stats['active_channels']), (3, 1, 0))
+
+    def test_max_sessions_opens_another_transport(self):
+        with self.pool.session('10.0.0.1', 22, 'key-a'), self.pool.session('10.0.0.1', 22, 'key-a'):
+            with self.pool.session('10.0.0.1', 22, 'key-a'):
+                self.assertEqual(self.pool.get_stats()['active_channels'], 3)
+        self.assertEqual((self.connect.call_count, self.pool.get_stats()['connections']), (2, 2))
+
+    def test_dead_transports_are_replaced(self):
+        self._run()
+        (conn,), = self.pool._connections.values()
+        conn.transport.is_active.return_value = False
+        self._run()
+        conn.client.close.assert_called_once_with()
+        self.assertEqual(self.connect.call_count, 2)
+
+        # Transport dies between the health check and opening the channel
+        (conn,), = self.pool._connections.values()
+        conn.transport.open_session.side_effect = EOFError('connection reset')
+        self._run()
+        self.assertEqual((self.connect.call_count, self.pool.get_stats()['reconnects']), (3, 1))
+
+    def test_reap_idle_and_invalidate(self):
+        self._run()
+        self._run(key='key-b')
+        with self.pool.session('10.0.0.2', 22, 'key-a'):
+            for conns in self.pool._connections.values():
+                conns[0].last_used -= 120
+            self.assertEqual(self.pool.reap_idle(), 2)
+        self.assertEqual(self.pool.get_stats()['connections'], 1)
+
+        self.pool.invalidate('10.0.0.2', 22)
+        self.assertEqual(self.pool.get_stats()['connections'], 0)
+
+    def test_parsed_keys_are_cached(self):
+        from factory import ssh_pool
+
+        key_class = mock.Mock()
+        with mock.patch.object(ssh_pool, '_KEY_CLASSES', (key_class,)), mock.patch.dict(ssh_pool._pkey_cache, clear=True):
+            self.assertIs(ssh_pool.load_private_key('pem-a'), ssh_pool.load_private_key('pem-a'))
+            ssh_pool.load_private_key('pem-b')
+        self.assertEqual(key_class.from_private_key.call_count, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class EnvBundleTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+        self.env = {'API_URL': 'https://api.test', 'QUOTE': "it's"}
+        project = mock.patch('projects.models.Project').start()
+        project.objects.filter.return_value.only.return_value.first.return_value = mock.Mock(id=5)
+        self.get_env = mock.patch(
+            'projects.models.ProjectEnvironmentVariable.get_project_env_dict', side_effect=lambda pk: dict(self.env)
+        ).start()
+        mock.patch.object(env_bundle, '_bundle_cache', EnvBundleCache()).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_bundle_is_cached_until_the_version_is_bumped(self):
+        bundle = env_bundle.get_env_bundle('proj-5')
+        self.assertEqual(bundle.exports, ("export API_URL='https://api.test'", "export QUOTE='it'\\''s'"))
+        self.assertIs(env_bundle.get_env_bundle(5), bundle)
+        self.assertEqual(self.get_env.call_count, 1)
+
+        self.env['API_URL'] = 'https://staging.test'
+        env_bundle.bump_env_version(5)
+        rebuilt = env_bundle.get_env_bundle(5)
+        self.assertEqual((rebuilt.version, rebuilt.exports[0]), (1, "export API_URL='https://staging.test'"))
+        self.assertNotEqual(rebuilt.digest, bundle.digest)
+        self.assertEqual(env_bundle.get_env_bundle_stats()['builds'], 2)
+
+    def test_setup_lines_install_once_per_workspace(self):
+        lines, install = env_setup_lines(5)
+        self.assertEqual((lines[0], install), ("export API_URL='https://api.test'", None))
+
+        lines, install = env_setup_lines(5, workspace_key='job-1')
+        self.assertEqual(lines, install.install_lines())
+        mark_installed('job-1', install)
+        self.assertEqual(env_setup_lines(5, workspace_key='job-1'), (install.source_lines(), None))
+        self.assertEqual(env_setup_lines(5, workspace_key='job-2')[0], install.install_lines())
+
+        env_bundle.forget_installed('job-1')
+        self.assertEqual(env_setup_lines(5, workspace_key='job-1')[0], install.install_lines())
+
+        self.env.clear()
+        env_bundle.bump_env_version(5)
+        self.assertEqual(env_setup_lines(5, workspace_key='job-1'), ([], None))
+
+    @skipUnless(shutil.which('bash'), 'bash is required')
+    def test_installed_file_is_sourced_and_reported_missing(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        mock.patch.object(env_bundle, 'ENV_BUNDLE_DIR', f'{workdir}/env').start()
+        bundle = env_bundle.get_env_bundle(5)
+
+        def run(lines):
+            script = '\n'.join(lines + ['echo "$API_URL $QUOTE"'])
+            proc = subprocess.run(['bash', '-c', script], capture_output=True, text=True, timeout=30)
+            return {'exit_code': proc.returncode, 'stdout': proc.stdout, 'stderr': proc.stderr}
+
+        self.assertEqual(run(bundle.install_lines())['stdout'], "https://api.test it's\n")
+        self.assertEqual(oct(os.stat(bundle.path).st_mode & 0o777), '0o600')
+        self.assertEqual(run(bundle.source_lines())['stdout'], "https://api.test it's\n")
+
+        os.remove(bundle.path)
+        result = run(bundle.source_lines())
+        self.assertEqual((result['exit_code'], result['stdout']), (env_bundle.ENV_MISSING_EXIT, ''))
+        self.assertTrue(is_missing_bundle(result))
+        self.assertFalse(is_missing_bundle({'exit_code': env_bundle.ENV_MISSING_EXIT, 'stderr': 'other failure'}))
+
+
+def _run_locally(workspace_id, command, timeout=300, with_node_env=True, **kwargs):
+    """factory.mags.run_command stand-in that runs the command with local bash."""
+    proc = subprocess.run(['bash', '-c', command], capture_output=True, text=True, timeout=timeout)
+    return {'exit_code': proc.returncode, 'stdout': proc.stdout, 'stderr': proc.stderr}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class WorkspaceSyncTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+
+    def test_paths_and_manifests(self):
+        self.assertEqual(WorkspaceFile('./docs//prd.md', 'x').path, 'docs/prd.md')
+        for bad in ('/etc/passwd', '../outside', 'a/../../b', '.'):
+            with self.subTest(path=bad), self.assertRaises(ValueError):
+                WorkspaceFile(bad, 'x')
+
+        a, b = WorkspaceFile('a.txt', 'one'), WorkspaceFile('b.txt', 'two')
+        remote = parse_sha256sum(f'{a.digest}  a.txt\n{"0" * 64}  b.txt\nsha256sum: c.txt: No such file\n')
+        self.assertEqual(remote, {'a.txt': a.digest, 'b.txt': '0' * 64})
+        self.assertEqual(diff_manifest({'a.txt': a.digest, 'b.txt': b.digest, 'c.txt': 'x'}, remote), ['b.txt', 'c.txt'])
+
+    @skipUnless(shutil.which('bash') and shutil.which('tar') and shutil.which('sha256sum'), 'bash, tar and sha256sum are required')
+    def test_exec_transport_sends_only_changed_files(self):
+        from factory.command_cache import get_workspace_epoch
+
+        mock.patch('factory.mags.enable_ssh_access', side_effect=RuntimeError('overlay workspace')).start()
+        run_command = mock.patch('factory.mags.run_command', side_effect=_run_locally).start()
+        mock.patch.object(workspace_sync, 'EXEC_CHUNK_BYTES', 300).start()
+        self.addCleanup(mock.patch.stopall)
+
+        files = [
+            WorkspaceFile('scripts/setup.sh', '#!/bin/sh\necho ready\n', mode=0o755),
+            WorkspaceFile('.lfg/docs/prd.md', os.urandom(600)),
+        ]
+        result = sync_files('job-1', files, base_dir=self.base_dir)
+        self.assertEqual((result['status'], result['sent'], result['transport']), ('success', ['.lfg/docs/prd.md', 'scripts/setup.sh'], 'exec'))
+        # The archive was split over several exec calls
+        self.assertGreater(run_command.call_count, 1)
+        with open(os.path.join(self.base_dir, '.lfg/docs/prd.md'), 'rb') as fh:
+            self.assertEqual(fh.read(), files[1].content)
+        self.assertTrue(os.access(os.path.join(self.base_dir, 'scripts/setup.sh'), os.X_OK))
+        self.assertEqual(get_workspace_epoch('job-1'), 1)
+        self.assertEqual([name for name in os.listdir('/tmp') if name.startswith('lfg-sync-')], [])
+
+        files[0] = WorkspaceFile('scripts/setup.sh', '#!/bin/sh\necho changed\n', mode=0o755)
+        result = sync_files('job-1', files, base_dir=self.base_dir, check_remote=True)
+        self.assertEqual((result['sent'], result['unchanged']), (['scripts/setup.sh'], 1))
+
+        result = sync_files('job-1', files, base_dir=self.base_dir, check_remote=True)
+        self.assertEqual((result['sent'], result['unchanged'], result['bytes']), ([], 2, 0))
+        self.assertEqual(get_workspace_epoch('job-1'), 2)
+
+    def test_ssh_transport_streams_the_archive_on_stdin(self):
+        channel = mock.MagicMock()
+        channel.makefile.return_value.read.return_value = b''
+        channel.makefile_stderr.return_value.read.return_value = b''
+        channel.recv_exit_status.return_value = 0
+        pool = mock.MagicMock()
+        pool.session.return_value.__enter__.return_value = channel
+        credentials = {'ssh_host': '10.0.0.1', 'ssh_port': '22', 'ssh_private_key': 'pem'}
+
+        with mock.patch('factory.ssh_pool.get_ssh_pool', return_value=pool):
+            result = sync_files('job-1', [WorkspaceFile('a.txt', 'hello')], base_dir='/root/my project', ssh_credentials=credentials)
+
+        self.assertEqual((result['status'], result['transport'], result['compression']), ('success', 'ssh', 'gzip'))
+        channel.exec_command.assert_called_once_with("mkdir -p '/root/my project' && tar -xzf - -C '/root/my project'")
+        archive, = channel.sendall.call_args.args
+        with tarfile.open(fileobj=io.BytesIO(archive), mode='r:gz') as tar:
+            self.assertEqual(tar.extractfile('a.txt').read(), b'hello')
+
+        channel.recv_exit_status.return_value = 2
+        channel.makefile_stderr.return_value.read.return_value = b'tar: write error'
+        with mock.patch('factory.ssh_pool.get_ssh_pool', return_value=pool):
+            result = sync_files('job-1', [WorkspaceFile('a.txt', 'hello')], ssh_credentials=credentials)
+        self.assertEqual(result, {'status': 'error', 'message': 'File sync failed: tar: write error'})
+
+    def test_directory_files_skip_vendor_dirs(self):
+        for path in ('src/app.py', 'run.sh', '.git/HEAD', 'node_modules/x/index.js'):
+            full = os.path.join(self.base_dir, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'w') as fh:
+                fh.write(path)
+        os.chmod(os.path.join(self.base_dir, 'run.sh'), 0o755)
+
+        files = {f.path: f for f in directory_files(self.base_dir, prefix='template')}
+        self.assertEqual(sorted(files), ['template/run.sh', 'template/src/app.py'])
+        self.assertEqual((files['template/run.sh'].mode, files['template/src/app.py'].mode), (0o755, 0o644))
+
+
+def _wait_for_job(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        record = get_dev_server_job(job_id)
+        if record and record['done']:
+            return record
+        if time.monotonic() > deadline:
+            raise AssertionError(f'job {job_id} did not finish: {record}')
+        time.sleep(0.01)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DevServerJobTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+        self.progress = mock.patch('projects.websocket_utils.send_workspace_progress').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_start_job_runs_in_the_background(self):
+        release = threading.Event()
+
+        def work(job):
+            job.transition('installing', 'installing_dependencies', 'Installing...')
+            release.wait(5)
+            job.transition('starting', 'starting_server', 'Starting...')
+            return {'success': True, 'url': 'http://localhost:3000'}
+
+        job = submit_dev_server_job(7, 'start', work, scope='project:7')
+        # A second start for the same scope joins the in-flight job
+        self.assertEqual(submit_dev_server_job(7, 'start', work, scope='project:7').job_id, job.job_id)
+        release.set()
+
+        record = _wait_for_job(job.job_id)
+        self.assertEqual((record['state'], record['result']['url']), ('ready', 'http://localhost:3000'))
+        steps = [(c.args[1], c.kwargs['extra_data']['state']) for c in self.progress.call_args_list]
+        self.assertEqual(steps, [('installing_dependencies', 'installing'), ('starting_server', 'starting'), ('complete', 'ready')])
+        self.assertEqual(self.progress.call_args.kwargs['extra_data']['url'], 'http://localhost:3000')
+
+    @staticmethod
+    def _stop(job):
+        job.transition('stopping', 'stopping_server')
+        return {'success': True}
+
+    def test_illegal_transitions_fail_the_job(self):
+        for work, error in [
+            (lambda job: job.transition('ready'), 'queued -> ready'),
+            (lambda job: {'success': True}, 'queued -> stopped'),
+        ]:
+            job = submit_dev_server_job(7, 'stop', work, scope='project:7')
+            record = _wait_for_job(job.job_id)
+            self.assertEqual(record['state'], 'failed')
+            self.assertIn(f'Illegal dev server job transition {error}', record['error'])
+        self.assertEqual(_wait_for_job(submit_dev_server_job(7, 'stop', self._stop, scope='project:7').job_id)['state'], 'stopped')
+
+    def test_stop_cancels_the_in_flight_start(self):
+        started = threading.Event()
+
+        def start(job):
+            job.transition('installing', 'installing_dependencies')
+            started.set()
+            job.cancel_token.wait(5)
+            job.progress('still_installing')
+            return {'success': True}
+
+        start_job = submit_dev_server_job(7, 'start', start, scope='project:7')
+        self.assertTrue(started.wait(5))
+        stop_job = submit_dev_server_job(7, 'stop', self._stop, scope='project:7')
+
+        start_record = _wait_for_job(start_job.job_id)
+        self.assertEqual((start_record['state'], start_record['error']), ('failed', 'Cancelled'))
+        self.assertEqual(_wait_for_job(stop_job.job_id)['state'], 'stopped')
+        self.assertNotIn('still_installing', [c.args[1] for c in self.progress.call_args_list])
+
+    def test_silent_jobs_read_as_failed(self):
+        from django.core.cache import cache
+
+        cache.set(dev_server_jobs.JOB_KEY.format('dead'), {'job_id': 'dead', 'state': 'starting', 'done': False, 'updated_at': time.time() - 60})
+        record = get_dev_server_job('dead')
+        self.assertEqual((record['state'], record['done']), ('failed', True))
+        self.assertIsNone(get_dev_server_job('unknown'))
+
+
+class WaitUntilListeningTests(SimpleTestCase):
+    def setUp(self):
+        mock.patch.object(dev_server_jobs, 'PROBE_INITIAL_DELAY', 0.01).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _probe(self, *outputs):
+        return mock.Mock(side_effect=[{'stdout': out} for out in outputs])
+
+    def test_ready_after_a_few_probes(self):
+        run = self._probe('', '', f'{dev_server_jobs.READY_MARKER}\n')
+        self.assertEqual(wait_until_listening(run, '/root/project', 3000), (True, ''))
+        self.assertEqual(run.call_count, 3)
+        self.assertIn('[:.]3000[[:space:]]', run.call_args.args[0])
+
+    def test_exited_process_fails_fast_with_its_log(self):
+        run = self._probe(f'{dev_server_jobs.EXITED_MARKER}\nError: Cannot find module next\n')
+        self.assertEqual(wait_until_listening(run, '/root/project', 3000), (False, 'Error: Cannot find module next'))
+
+    def test_timeout_and_cancellation(self):
+        run = mock.Mock(return_value={'stdout': ''})
+        ready, detail = wait_until_listening(run, '/root/project', 3000, timeout=0.05)
+        self.assertFalse(ready)
+        self.assertIn('within 0s', detail)
+
+        token = CancelToken(1)
+        token.cancel()
+        self.assertEqual(wait_until_listening(run, '/root/project', 3000, cancel_token=token), (False, 'Cancelled'))
+
+
+class StreamAccumulatorTests(SimpleTestCase):
+    def _check_accumulation(self, accumulator):
+        self.addCleanup(accumulator.discard, 'prd:1')
+        self.assertEqual(accumulator.append('prd:1', '# Title\n'), (1, True, 8))
+        self.assertEqual(accumulator.append('prd:1', 'world', seq=4), (4, True, 13))
+        self.assertEqual(accumulator.append('prd:1', 'hello ', seq=3), (3, True, 19))
+        # A retried chunk is ignored; allocation continues after the highest sequence
+        self.assertEqual(accumulator.append('prd:1', 'hello ', seq=3), (3, False, 19))
+        self.assertEqual(accumulator.append('prd:1', '!'), (5, True, 20))
+        self.assertEqual(accumulator.append('prd:2', 'other'), (1, True, 5))
+        accumulator.discard('prd:2')
+
+        self.assertEqual(accumulator.assemble('prd:1'), '# Title\nhello world!')
+        accumulator.discard('prd:1')
+        self.assertEqual(accumulator.assemble('prd:1'), '')
+
+    def test_memory_backend(self):
+        accumulator = StreamAccumulator(use_redis=False)
+        self.assertEqual(accumulator.backend, 'memory')
+        self._check_accumulation(accumulator)
+        with self.assertRaises(ValueError):
+            accumulator.append('prd:1', 'x', seq=0)
+
+    def test_memory_streams_expire(self):
+        accumulator = StreamAccumulator(ttl=60, use_redis=False)
+        with mock.patch('factory.stream_accumulator.time.time', return_value=1000):
+            accumulator.append('prd:1', 'stale')
+        with mock.patch('factory.stream_accumulator.time.time', return_value=1100):
+            self.assertEqual(accumulator.append('prd:2', 'fresh'), (1, True, 5))
+        self.assertEqual(accumulator.assemble('prd:1'), '')
+
+    def test_falls_back_to_memory_without_redis(self):
+        with mock.patch('tasks.dispatch.get_redis_client', side_effect=ConnectionError('refused')):
+            self.assertEqual(StreamAccumulator(use_redis=True).backend, 'memory')
+
+    @skipUnless(_redis_reachable(), 'Redis is not reachable')
+    def test_redis_backend(self):
+        accumulator = StreamAccumulator(use_redis=True)
+        self.assertEqual(accumulator.backend, 'redis')
+        self._check_accumulation(accumulator)
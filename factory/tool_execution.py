@@ -468,7 +468,8 @@ async def execute_tool_call(
                 "log_tail",
                 "command",
                 "status",
-                "log_entries"
+                "log_entries",
+                "command_cache"
             ]
             for key in tracked_keys:
                 value = tool_result.get(key)
@@ -598,6 +599,7 @@ async def execute_tool_call(
                     'completed_at': completed_at.isoformat() + "Z",
                     'tool_input_preview': sanitize_for_postgres(tool_input_preview) if tool_input_preview else None,
                     'ticket_context': ticket_context,
+                    'command_cache': extra_fields.get('command_cache'),
                     'status': status
                 }
             )
@@ -0,0 +1,393 @@
+"""
+Workspace File Sync
+
+Writes many files into a Mags workspace as one archive instead of one
+shell command (heredoc or base64 blob) per file.
+
+- Each file is hashed locally (sha256). For larger syncs the workspace's
+  current hashes for the same paths are read with a single `sha256sum`
+  command, and only files whose hash differs are sent.
+- Changed files are packed into one tar archive: zstd-compressed when the
+  `zstandard` module is installed here and `zstd` exists in the workspace,
+  gzip otherwise.
+- With SSH access the archive is streamed on the stdin of one exec channel
+  on a pooled transport (`tar -x` on the remote side). Without SSH (SDK
+  exec only) it is sent base64-encoded in as few exec calls as the command
+  length limit allows.
+
+Usage:
+    from factory.workspace_sync import WorkspaceFile, sync_files
+
+    files = [
+        WorkspaceFile(".gitignore", gitignore_content),
+        WorkspaceFile("scripts/setup.sh", script, mode=0o755),
+    ]
+    result = sync_files(job_id, files, base_dir="/root/project")
+    result["sent"], result["unchanged"], result["bytes"]
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import posixpath
+import shlex
+import tarfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Union
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Below this many bytes, sending everything is cheaper than asking the
+# workspace for its hashes first
+MANIFEST_MIN_BYTES = 64 * 1024
+
+# Raw archive bytes per SDK exec call. The SDK passes the command as one
+# argument (128 KB limit) and run_command base64-encodes it once more.
+EXEC_CHUNK_BYTES = 48 * 1024
+
+# Largest attachment mirrored into a workspace
+MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+
+LFG_DIR = ".lfg"
+_ZSTD_MARKER = "__LFG_HAS_ZSTD__"
+_SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv"}
+
+
+@dataclass
+class WorkspaceFile:
+    """One file to write, relative to the sync's base_dir."""
+    path: str
+    content: Union[bytes, str]
+    mode: int = 0o644
+    _digest: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if isinstance(self.content, str):
+            self.content = self.content.encode("utf-8")
+        self.path = _normalize_path(self.path)
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.content).hexdigest()
+        return self._digest
+
+
+def _normalize_path(path: str) -> str:
+    normalized = posixpath.normpath(str(path).replace("\\", "/"))
+    if normalized.startswith("/") or normalized == "." or normalized.split("/")[0] == "..":
+        raise ValueError(f"Workspace file path must be relative and inside base_dir: {path!r}")
+    return normalized
+
+
+def build_manifest(files: Iterable[WorkspaceFile]) -> Dict[str, str]:
+    """Map of path -> sha256 for a set of files."""
+    return {f.path: f.digest for f in files}
+
+
+def diff_manifest(local: Dict[str, str], remote: Dict[str, str]) -> List[str]:
+    """Paths whose local hash is missing from or different in the workspace."""
+    return sorted(path for path, digest in local.items() if remote.get(path) != digest)
+
+
+def parse_sha256sum(output: str) -> Dict[str, str]:
+    """Parse `sha256sum` output ("<hash>  <path>" per line)."""
+    manifest = {}
+    for line in output.splitlines():
+        digest, sep, path = line.partition("  ")
+        if sep and len(digest) == 64:
+            manifest[path.strip()] = digest
+    return manifest
+
+
+def build_archive(files: Iterable[WorkspaceFile], compression: str = "gzip") -> bytes:
+    """Pack files into a tar archive compressed with gzip or zstd."""
+    raw = io.BytesIO()
+    tar_mode = "w:gz" if compression == "gzip" else "w"
+    now = int(time.time())
+    with tarfile.open(fileobj=raw, mode=tar_mode) as tar:
+        for f in files:
+            info = tarfile.TarInfo(f.path)
+            info.size = len(f.content)
+            info.mode = f.mode
+            info.mtime = now
+            tar.addfile(info, io.BytesIO(f.content))
+    data = raw.getvalue()
+    if compression == "zstd":
+        data = zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def _extract_command(base_dir: str, compression: str, feed: str = None) -> str:
+    """Shell command extracting an archive from stdin (or from `feed | ...`)."""
+    quoted = shlex.quote(base_dir)
+    unpack = f"zstd -dc | tar -xf - -C {quoted}" if compression == "zstd" else f"tar -xzf - -C {quoted}"
+    if feed:
+        unpack = f"{feed} | {unpack}"
+    return f"mkdir -p {quoted} && {unpack}"
+
+
+class _SSHTransport:
+    """Runs commands and uploads archives over pooled SSH channels."""
+
+    name = "ssh"
+
+    def __init__(self, ssh_credentials: dict, timeout: int):
+        self.host = ssh_credentials["ssh_host"]
+        self.port = int(ssh_credentials["ssh_port"])
+        self.private_key = ssh_credentials["ssh_private_key"]
+        self.timeout = timeout
+
+    def _exec(self, command: str, stdin: bytes = None) -> dict:
+        from factory.ssh_pool import get_ssh_pool
+
+        with get_ssh_pool().session(self.host, self.port, self.private_key,
+                                    connect_timeout=min(self.timeout, 30)) as channel:
+            channel.settimeout(self.timeout)
+            channel.exec_command(command)
+            if stdin is not None:
+                channel.sendall(stdin)
+                channel.shutdown_write()
+            stdout = channel.makefile("rb").read().decode("utf-8", errors="replace")
+            stderr = channel.makefile_stderr("rb").read().decode("utf-8", errors="replace")
+            exit_code = channel.recv_exit_status()
+        return {"exit_code": exit_code, "stdout": stdout, "stderr": stderr}
+
+    def run(self, command: str) -> dict:
+        return self._exec(command)
+
+    def upload(self, archive: bytes, base_dir: str, compression: str) -> dict:
+        return self._exec(_extract_command(base_dir, compression), stdin=archive)
+
+
+class _ExecTransport:
+    """Fallback through the Mags SDK exec (no stdin; archive sent as base64)."""
+
+    name = "exec"
+
+    def __init__(self, workspace_id: str, timeout: int):
+        self.workspace_id = workspace_id
+        self.timeout = timeout
+
+    def run(self, command: str) -> dict:
+        from factory.mags import run_command
+
+        return run_command(self.workspace_id, command, timeout=self.timeout, with_node_env=False)
+
+    def upload(self, archive: bytes, base_dir: str, compression: str) -> dict:
+        encoded = base64.b64encode(archive).decode("ascii")
+        staging = f"/tmp/lfg-sync-{uuid.uuid4().hex[:12]}.b64"
+        step = EXEC_CHUNK_BYTES * 4 // 3
+        chunks = [encoded[i:i + step] for i in range(0, len(encoded), step)] or [""]
+        for index, chunk in enumerate(chunks):
+            redirect = ">" if index == 0 else ">>"
+            lines = [f"printf '%s' '{chunk}' {redirect} {staging}"]
+            if index == len(chunks) - 1:
+                lines += [
+                    _extract_command(base_dir, compression, feed=f"base64 -d {staging}"),
+                    "rc=$?",
+                    f"rm -f {staging}",
+                    "exit $rc",
+                ]
+            result = self.run("\n".join(lines))
+            if result.get("exit_code") != 0:
+                self.run(f"rm -f {staging}")
+                return result
+        return result
+
+
+def _get_transport(job_id: str, ssh_credentials: Optional[dict], timeout: int):
+    if not ssh_credentials:
+        from factory.mags import enable_ssh_access
+
+        try:
+            ssh_credentials = enable_ssh_access(job_id)
+        except Exception as e:
+            # Workspace overlay names only support SDK exec (same fallback as run_ssh)
+            logger.info("[SYNC] SSH access unavailable for %s (%s), using SDK exec", job_id, e)
+            return _ExecTransport(job_id, timeout)
+    return _SSHTransport(ssh_credentials, timeout)
+
+
+def _remote_manifest(transport, base_dir: str, paths: List[str]) -> tuple:
+    """Workspace hashes for the given paths, plus whether zstd is available."""
+    quoted_paths = " ".join(shlex.quote(p) for p in paths)
+    command = (
+        f"cd {shlex.quote(base_dir)} 2>/dev/null && sha256sum -- {quoted_paths} 2>/dev/null; "
+        f"command -v zstd >/dev/null 2>&1 && echo {_ZSTD_MARKER}; true"
+    )
+    result = transport.run(command)
+    if result.get("exit_code") != 0:
+        raise RuntimeError(result.get("stderr") or f"exit code {result.get('exit_code')}")
+    stdout = result.get("stdout") or ""
+    return parse_sha256sum(stdout), _ZSTD_MARKER in stdout
+
+
+def sync_files(
+    job_id: str,
+    files: List[WorkspaceFile],
+    base_dir: str = None,
+    ssh_credentials: dict = None,
+    check_remote: Optional[bool] = None,
+    timeout: int = 120,
+) -> dict:
+    """
+    Write files into a workspace, sending only those that changed.
+
+    Args:
+        job_id: Mags job request_id or workspace name
+        files: Files to write, with paths relative to base_dir
+        base_dir: Target directory (defaults to MAGS_WORKING_DIR)
+        ssh_credentials: Optional credentials from enable_ssh_access()
+        check_remote: Compare against the workspace's hashes first. By
+                      default only done once the payload is large enough
+                      for the extra round trip to pay off.
+        timeout: Per-command timeout in seconds
+
+    Returns:
+        Dict with status, sent (paths), unchanged (count), bytes (archive
+        size), transport and compression
+    """
+    from factory.command_cache import bump_workspace_epoch
+    from factory.mags import MAGS_WORKING_DIR
+
+    base_dir = base_dir or MAGS_WORKING_DIR
+    if not files:
+        return {"status": "success", "sent": [], "unchanged": 0, "bytes": 0}
+
+    # Last one wins if a path is given twice
+    by_path = {f.path: f for f in files}
+    total_bytes = sum(len(f.content) for f in by_path.values())
+    if check_remote is None:
+        check_remote = total_bytes >= MANIFEST_MIN_BYTES
+
+    try:
+        transport = _get_transport(job_id, ssh_credentials, timeout)
+
+        changed = sorted(by_path)
+        remote_zstd = False
+        if check_remote:
+            try:
+                remote, remote_zstd = _remote_manifest(transport, base_dir, changed)
+                changed = diff_manifest(build_manifest(by_path.values()), remote)
+            except Exception as e:
+                logger.warning("[SYNC] Could not read workspace manifest for %s, sending all files: %s", job_id, e)
+
+        unchanged = len(by_path) - len(changed)
+        if not changed:
+            logger.info("[SYNC] %s: all %d files up to date in %s", job_id, unchanged, base_dir)
+            return {"status": "success", "sent": [], "unchanged": unchanged, "bytes": 0,
+                    "transport": transport.name}
+
+        compression = "zstd" if remote_zstd and zstandard is not None else "gzip"
+        archive = build_archive([by_path[p] for p in changed], compression=compression)
+        result = transport.upload(archive, base_dir, compression)
+        if result.get("exit_code") != 0:
+            message = (result.get("stderr") or result.get("stdout") or "").strip()[:500]
+            logger.error("[SYNC] Extract failed in %s:%s: %s", job_id, base_dir, message)
+            return {"status": "error", "message": f"File sync failed: {message or result.get('exit_code')}"}
+
+        # Cached inspection results (ls, cat, ...) no longer reflect the workspace
+        bump_workspace_epoch(job_id)
+        logger.info(
+            "[SYNC] %s: sent %d files (%d bytes %s via %s), %d unchanged, into %s",
+            job_id, len(changed), len(archive), compression, transport.name, unchanged, base_dir,
+        )
+        return {
+            "status": "success",
+            "sent": changed,
+            "unchanged": unchanged,
+            "bytes": len(archive),
+            "transport": transport.name,
+            "compression": compression,
+        }
+    except Exception as e:
+        logger.error("[SYNC] Failed to sync files into %s: %s", job_id, e, exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+
+# ============================================================================
+# File sources
+# ============================================================================
+
+def _safe_name(name: str) -> str:
+    cleaned = "".join(c if c.isalnum() or c in "-_. " else "_" for c in (name or "")).strip(" .")
+    return cleaned.replace(" ", "_") or "untitled"
+
+
+def doc_path(file_type: str, name: str) -> str:
+    """Workspace path (relative to MAGS_WORKING_DIR) of a mirrored project document."""
+    filename = _safe_name(name)
+    if not os.path.splitext(filename)[1]:
+        filename += ".md"
+    return f"{LFG_DIR}/docs/{_safe_name(file_type)}/{filename}"
+
+
+def project_doc_files(project, file_types: Iterable[str] = None) -> List[WorkspaceFile]:
+    """Active ProjectFiles (PRDs, implementation plans, ...) as workspace files."""
+    from projects.models import ProjectFile
+
+    qs = ProjectFile.objects.filter(project=project, is_active=True)
+    if file_types:
+        qs = qs.filter(file_type__in=list(file_types))
+    files = []
+    for project_file in qs:
+        content = project_file.file_content
+        if content:
+            files.append(WorkspaceFile(doc_path(project_file.file_type, project_file.name), content))
+    return files
+
+
+def attachment_dir(ticket_id) -> str:
+    """Workspace path (relative to MAGS_WORKING_DIR) holding a ticket's attachments."""
+    return f"{LFG_DIR}/tickets/{ticket_id}/attachments"
+
+
+def ticket_attachment_files(ticket, attachments=None) -> List[WorkspaceFile]:
+    """A ticket's attachments as workspace files (oversized ones are skipped)."""
+    if attachments is None:
+        attachments = list(ticket.attachments.all())
+    files = []
+    seen = set()
+    for attachment in attachments:
+        if attachment.file_size and attachment.file_size > MAX_ATTACHMENT_BYTES:
+            logger.info("[SYNC] Skipping attachment %s (%s bytes)", attachment.id, attachment.file_size)
+            continue
+        name = _safe_name(attachment.original_filename or os.path.basename(attachment.file.name))
+        if name in seen:
+            name = f"{attachment.id}-{name}"
+        seen.add(name)
+        try:
+            with attachment.file.open("rb") as fh:
+                content = fh.read()
+        except Exception as e:
+            logger.warning("[SYNC] Could not read attachment %s: %s", attachment.id, e)
+            continue
+        files.append(WorkspaceFile(f"{attachment_dir(ticket.id)}/{name}", content))
+    return files
+
+
+def directory_files(local_dir: str, prefix: str = "") -> List[WorkspaceFile]:
+    """Files under a local directory (e.g. a boilerplate template) as workspace files."""
+    files = []
+    for root, dirs, names in os.walk(local_dir):
+        dirs[:] = [d for d in dirs if d not in _SKIP_DIRS]
+        for name in names:
+            local_path = os.path.join(root, name)
+            if os.path.islink(local_path):
+                continue
+            relative = os.path.relpath(local_path, local_dir).replace(os.sep, "/")
+            with open(local_path, "rb") as fh:
+                content = fh.read()
+            mode = 0o755 if os.access(local_path, os.X_OK) else 0o644
+            files.append(WorkspaceFile(posixpath.join(prefix, relative) if prefix else relative, content, mode=mode))
+    return files
@@ -0,0 +1,269 @@
+"""
+Compiled Blog Index
+
+Markdown posts in marketing/content/blog are parsed and rendered once into a
+BlogIndex (posts sorted for listing, plus a slug -> post dict), kept in
+process memory and served to the landing, index and detail pages.
+
+- Staleness is checked from a stat() fingerprint of the *.md files (name,
+  size, mtime), at most every BLOG_RECHECK_SECONDS (default 5; 0 checks on
+  every call). Editing, adding or removing a post recompiles on the next
+  check, without a restart.
+- `python manage.py compile_blog` writes the compiled index to
+  BLOG_COMPILED_PATH (default marketing/content/blog/.compiled.json) at
+  deploy time. A process loads it instead of rendering when its content
+  hash (file names and bytes, so a fresh checkout with new mtimes still
+  matches) equals the sources'. A stale or unreadable artifact is ignored.
+- Post dicts are shared between requests; treat them as read-only.
+
+Usage:
+    from marketing.blog import get_blog_index
+
+    index = get_blog_index()
+    latest = index.posts[:3]
+    post = index.by_slug.get(slug)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.safestring import mark_safe
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+BLOG_FRONT_MATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n?(.*)$", re.DOTALL)
+MARKDOWN_EXTENSIONS = ["extra", "fenced_code", "tables", "toc", "sane_lists"]
+RECHECK_SECONDS = float(os.getenv('BLOG_RECHECK_SECONDS', '5'))
+COMPILED_VERSION = 1
+
+Fingerprint = Tuple[Tuple[str, int, int], ...]
+
+
+def blog_content_dir() -> Path:
+    return Path(settings.BASE_DIR) / "marketing" / "content" / "blog"
+
+
+def compiled_path() -> Path:
+    path = getattr(settings, 'BLOG_COMPILED_PATH', None)
+    return Path(path) if path else blog_content_dir() / ".compiled.json"
+
+
+def _parse_date(date_value):
+    if not date_value:
+        return None
+    if hasattr(date_value, "strftime"):
+        return date_value
+    if isinstance(date_value, str):
+        for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+            try:
+                return datetime.strptime(date_value.strip(), fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def _estimate_read_minutes(text: str) -> int:
+    words = max(1, len(text.split()))
+    return max(1, round(words / 200))
+
+
+def _parse_reading_time(value, body_text: str) -> int:
+    if value is not None:
+        try:
+            minutes = int(value)
+            return max(1, minutes)
+        except (TypeError, ValueError):
+            pass
+    return _estimate_read_minutes(body_text)
+
+
+def _render_post(stem: str, raw_text: str) -> Dict:
+    import markdown
+    import yaml
+
+    metadata = {}
+    body = raw_text
+
+    front_matter_match = BLOG_FRONT_MATTER_RE.match(raw_text)
+    if front_matter_match:
+        metadata = yaml.safe_load(front_matter_match.group(1)) or {}
+        body = front_matter_match.group(2)
+
+    slug = slugify(metadata.get("slug") or stem) or stem
+    title = metadata.get("title") or stem.replace("-", " ").title()
+    excerpt = metadata.get("excerpt") or body.strip().split("\n")[0][:180]
+    parsed_date = _parse_date(metadata.get("date"))
+    reading_minutes = _parse_reading_time(metadata.get("reading_time"), body)
+
+    return {
+        "slug": slug,
+        "title": title,
+        "excerpt": excerpt,
+        "date": parsed_date,
+        "date_display": parsed_date.strftime("%b %d, %Y") if parsed_date else "Undated",
+        "reading_minutes": reading_minutes,
+        "content_html": mark_safe(markdown.markdown(body, extensions=MARKDOWN_EXTENSIONS)),
+    }
+
+
+@dataclass
+class BlogIndex:
+    posts: List[Dict] = field(default_factory=list)
+    by_slug: Dict[str, Dict] = field(default_factory=dict)
+    content_hash: str = ''
+    fingerprint: Fingerprint = ()
+
+    @classmethod
+    def from_posts(cls, posts: List[Dict], content_hash: str = '', fingerprint: Fingerprint = ()):
+        posts = sorted(
+            posts,
+            key=lambda item: (
+                item["date"] is not None,
+                item["date"] or datetime.min.date(),
+                item["title"].lower(),
+            ),
+            reverse=True,
+        )
+        by_slug = {}
+        for post in posts:
+            # Same winner as a linear scan of the sorted list
+            by_slug.setdefault(post["slug"], post)
+        return cls(posts=posts, by_slug=by_slug, content_hash=content_hash, fingerprint=fingerprint)
+
+    def recent(self, limit: int = 3, exclude_slug: Optional[str] = None) -> List[Dict]:
+        return [post for post in self.posts if post["slug"] != exclude_slug][:limit]
+
+    def to_json(self) -> Dict:
+        return {
+            'version': COMPILED_VERSION,
+            'content_hash': self.content_hash,
+            'posts': [
+                {**post, 'date': post['date'].isoformat() if post['date'] else None,
+                 'content_html': str(post['content_html'])}
+                for post in self.posts
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict, fingerprint: Fingerprint = ()):
+        posts = []
+        for post in data['posts']:
+            posts.append({
+                **post,
+                'date': date.fromisoformat(post['date']) if post['date'] else None,
+                'content_html': mark_safe(post['content_html']),
+            })
+        return cls.from_posts(posts, content_hash=data['content_hash'], fingerprint=fingerprint)
+
+
+def _source_files(blog_dir: Path) -> List[Path]:
+    return sorted(blog_dir.glob("*.md")) if blog_dir.exists() else []
+
+
+def _fingerprint(files: List[Path]) -> Fingerprint:
+    stats = []
+    for path in files:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        stats.append((path.name, st.st_size, st.st_mtime_ns))
+    return tuple(stats)
+
+
+def _read_sources(files: List[Path]) -> Tuple[List[Tuple[str, str]], str]:
+    """[(stem, text)] and a hash of the file names and contents."""
+    digest = hashlib.sha256(f"v{COMPILED_VERSION}".encode())
+    sources = []
+    for path in files:
+        raw = path.read_bytes()
+        digest.update(path.name.encode('utf-8') + b'\0' + raw + b'\0')
+        sources.append((path.stem, raw.decode('utf-8')))
+    return sources, digest.hexdigest()
+
+
+def load_compiled_index(content_hash: str, fingerprint: Fingerprint = (),
+                        path: Optional[Path] = None) -> Optional[BlogIndex]:
+    """The compiled index at `path`, or None if it is missing or doesn't match `content_hash`."""
+    path = Path(path) if path else compiled_path()
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+        if data.get('version') != COMPILED_VERSION or data.get('content_hash') != content_hash:
+            logger.info(f"[BLOG] Ignoring stale compiled index at {path}")
+            return None
+        return BlogIndex.from_json(data, fingerprint=fingerprint)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"[BLOG] Could not load compiled index {path}: {e}")
+        return None
+
+
+def compile_blog_index(use_compiled: bool = True) -> BlogIndex:
+    """Parse and render every post (or load the matching compiled index)."""
+    files = _source_files(blog_content_dir())
+    fingerprint = _fingerprint(files)
+    sources, content_hash = _read_sources(files)
+
+    if use_compiled:
+        index = load_compiled_index(content_hash, fingerprint)
+        if index is not None:
+            logger.info(f"[BLOG] Loaded {len(index.posts)} posts from compiled index")
+            return index
+
+    start = time.monotonic()
+    posts = [_render_post(stem, raw_text) for stem, raw_text in sources]
+    index = BlogIndex.from_posts(posts, content_hash=content_hash, fingerprint=fingerprint)
+    logger.info(f"[BLOG] Compiled {len(posts)} posts in {(time.monotonic() - start) * 1000:.0f}ms")
+    return index
+
+
+def write_compiled_index(index: BlogIndex, path: Optional[Path] = None) -> Path:
+    """Write the index atomically, for processes to load at startup."""
+    path = Path(path) if path else compiled_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(index.to_json()), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return path
+
+
+_index: Optional[BlogIndex] = None
+_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_blog_index() -> BlogIndex:
+    """Process-wide compiled blog index, recompiled when the posts change."""
+    global _index, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < RECHECK_SECONDS:
+        return _index
+
+    with _index_lock:
+        if _index is not None and now - _checked_at < RECHECK_SECONDS:
+            return _index
+        fingerprint = _fingerprint(_source_files(blog_content_dir()))
+        if _index is None or _index.fingerprint != fingerprint:
+            _index = compile_blog_index()
+        _checked_at = time.monotonic()
+        return _index
+
+
+def reset_blog_index():
+    """Drop the in-process index; the next call recompiles."""
+    global _index, _checked_at
+    with _index_lock:
+        _index = None
+        _checked_at = 0.0
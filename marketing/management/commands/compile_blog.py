@@ -0,0 +1,46 @@
+"""
+Django management command to precompile the marketing blog.
+
+Renders every post in marketing/content/blog and writes the compiled index
+(BLOG_COMPILED_PATH, default marketing/content/blog/.compiled.json), so web
+processes load it at startup instead of rendering Markdown.
+
+Usage:
+    python manage.py compile_blog
+
+Options:
+    --output: Write the compiled index to this path instead
+    --check: Only report whether the compiled index at the path matches the posts (exit 1 if not)
+
+Examples:
+    # At deploy time, before starting the web server
+    python manage.py collectstatic --noinput && python manage.py compile_blog
+"""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from marketing.blog import compile_blog_index, compiled_path, load_compiled_index, write_compiled_index
+
+
+class Command(BaseCommand):
+    help = 'Precompile the marketing blog posts into a cached index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, default=None, help='Path of the compiled index')
+        parser.add_argument('--check', action='store_true', help='Only check that the compiled index is current')
+
+    def handle(self, *args, **options):
+        fresh = compile_blog_index(use_compiled=False)
+        path = options['output'] or compiled_path()
+
+        if options['check']:
+            current = load_compiled_index(fresh.content_hash, path=path)
+            if current is not None and current.to_json() == fresh.to_json():
+                self.stdout.write(self.style.SUCCESS(f"Compiled blog index is current ({len(fresh.posts)} posts)"))
+                return
+            self.stdout.write(self.style.WARNING("Compiled blog index is missing or stale; run compile_blog"))
+            sys.exit(1)
+
+        path = write_compiled_index(fresh, path)
+        self.stdout.write(self.style.SUCCESS(f"Compiled {len(fresh.posts)} blog posts to {path}"))
@@ -1,3 +1,80 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from marketing import blog
+
+POST = """---
+title: Shipping With Agents
+date: 2024-03-05
+reading_time: 4
+excerpt: How we ship.
+---
+# Shipping
+
+Body text.
+"""
+
+
+class BlogIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.base_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+        self.blog_dir = self.base_dir / 'marketing' / 'content' / 'blog'
+        self.blog_dir.mkdir(parents=True)
+
+        settings_override = override_settings(BASE_DIR=self.base_dir, BLOG_COMPILED_PATH=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        blog.reset_blog_index()
+        self.addCleanup(blog.reset_blog_index)
+
+    def _write(self, name, text):
+        (self.blog_dir / name).write_text(text, encoding='utf-8')
+
+    def test_front_matter_is_rendered(self):
+        self._write('shipping.md', POST)
+        post = blog.compile_blog_index().by_slug['shipping']
+        self.assertEqual(post['title'], 'Shipping With Agents')
+        self.assertEqual(post['date'], date(2024, 3, 5))
+        self.assertEqual(post['date_display'], 'Mar 05, 2024')
+        self.assertEqual(post['reading_minutes'], 4)
+        self.assertEqual(post['excerpt'], 'How we ship.')
+        self.assertIn('<h1 id="shipping">Shipping</h1>', post['content_html'])
+
+    def test_posts_sorted_newest_first_with_undated_last(self):
+        self._write('old.md', '---\ntitle: Old\ndate: 2023-01-01\n---\nOld post')
+        self._write('new.md', '---\ntitle: New\ndate: 2024-01-01\n---\nNew post')
+        self._write('undated.md', 'No front matter')
+        index = blog.compile_blog_index()
+        self.assertEqual([post['slug'] for post in index.posts], ['new', 'old', 'undated'])
+        self.assertEqual(index.by_slug['undated']['title'], 'Undated')
+        self.assertEqual([post['slug'] for post in index.recent(limit=2, exclude_slug='new')], ['old', 'undated'])
+
+    def test_compiled_index_is_loaded_only_when_it_matches(self):
+        self._write('shipping.md', POST)
+        path = blog.write_compiled_index(blog.compile_blog_index(use_compiled=False))
+        self.assertEqual(path, self.blog_dir / '.compiled.json')
+
+        with mock.patch.object(blog, '_render_post', side_effect=AssertionError('rendered')):
+            index = blog.compile_blog_index()
+        self.assertEqual(index.by_slug['shipping']['date'], date(2024, 3, 5))
+
+        self._write('shipping.md', POST.replace('Body text.', 'New body.'))
+        index = blog.compile_blog_index()
+        self.assertIn('New body.', index.by_slug['shipping']['content_html'])
+
+    def test_get_blog_index_recompiles_when_posts_change(self):
+        self._write('first.md', 'First post')
+        with mock.patch.object(blog, 'RECHECK_SECONDS', 0):
+            index = blog.get_blog_index()
+            self.assertIs(blog.get_blog_index(), index)
+
+            self._write('second.md', 'Second post')
+            index = blog.get_blog_index()
+        self.assertEqual(sorted(index.by_slug), ['first', 'second'])
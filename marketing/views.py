@@ -1,121 +1,28 @@
 import json
 import logging
-import re
-from datetime import datetime
-from pathlib import Path
 
-import markdown
-import yaml
 from django.conf import settings
 from django.core.mail import send_mail
 from django.http import Http404
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils import timezone
-from django.utils.safestring import mark_safe
-from django.utils.text import slugify
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_http_methods
 
+from .blog import get_blog_index
 from .models import FreePRDRequest, FreePRDVerificationCode, ServiceInquiry
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 
-BLOG_FRONT_MATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n?(.*)$", re.DOTALL)
-
-
-def _blog_content_dir() -> Path:
-    return Path(settings.BASE_DIR) / "marketing" / "content" / "blog"
-
-
-def _parse_date(date_value):
-    if not date_value:
-        return None
-    if hasattr(date_value, "strftime"):
-        return date_value
-    if isinstance(date_value, str):
-        for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
-            try:
-                return datetime.strptime(date_value.strip(), fmt).date()
-            except ValueError:
-                continue
-    return None
-
-
-def _estimate_read_minutes(text: str) -> int:
-    words = max(1, len(text.split()))
-    return max(1, round(words / 200))
-
-
-def _parse_reading_time(value, body_text: str) -> int:
-    if value is not None:
-        try:
-            minutes = int(value)
-            return max(1, minutes)
-        except (TypeError, ValueError):
-            pass
-    return _estimate_read_minutes(body_text)
-
-
-def _load_blog_posts():
-    blog_dir = _blog_content_dir()
-    if not blog_dir.exists():
-        return []
-
-    posts = []
-    for md_file in sorted(blog_dir.glob("*.md")):
-        raw_text = md_file.read_text(encoding="utf-8")
-        metadata = {}
-        body = raw_text
-
-        front_matter_match = BLOG_FRONT_MATTER_RE.match(raw_text)
-        if front_matter_match:
-            metadata = yaml.safe_load(front_matter_match.group(1)) or {}
-            body = front_matter_match.group(2)
-
-        slug = slugify(metadata.get("slug") or md_file.stem) or md_file.stem
-        title = metadata.get("title") or md_file.stem.replace("-", " ").title()
-        excerpt = metadata.get("excerpt") or body.strip().split("\n")[0][:180]
-        parsed_date = _parse_date(metadata.get("date"))
-        reading_minutes = _parse_reading_time(metadata.get("reading_time"), body)
-
-        posts.append({
-            "slug": slug,
-            "title": title,
-            "excerpt": excerpt,
-            "date": parsed_date,
-            "date_display": parsed_date.strftime("%b %d, %Y") if parsed_date else "Undated",
-            "reading_minutes": reading_minutes,
-            "content_html": mark_safe(markdown.markdown(
-                body,
-                extensions=["extra", "fenced_code", "tables", "toc", "sane_lists"],
-            )),
-        })
-
-    posts.sort(
-        key=lambda item: (
-            item["date"] is not None,
-            item["date"] or datetime.min.date(),
-            item["title"].lower(),
-        ),
-        reverse=True,
-    )
-    return posts
-
-
-def _get_blog_post_by_slug(slug: str):
-    for post in _load_blog_posts():
-        if post["slug"] == slug:
-            return post
-    return None
 
 def landing_page(request):
     """Render the home landing page."""
     context = {
         'ENVIRONMENT': getattr(settings, 'ENVIRONMENT', 'local'),
-        'blog_posts': _load_blog_posts()[:3],
+        'blog_posts': get_blog_index().posts[:3],
     }
     return render(request, 'home/landing.html', context)
 
@@ -137,24 +44,25 @@ def docs_page(request):
 
 
 def blog_index_page(request):
-    """Render the blog index page from markdown files."""
+    """Render the blog index page from the compiled blog index."""
     context = {
         'ENVIRONMENT': getattr(settings, 'ENVIRONMENT', 'local'),
-        'blog_posts': _load_blog_posts(),
+        'blog_posts': get_blog_index().posts,
     }
     return render(request, 'home/blog_index.html', context)
 
 
 def blog_detail_page(request, slug):
     """Render an individual blog post by slug."""
-    post = _get_blog_post_by_slug(slug)
+    index = get_blog_index()
+    post = index.by_slug.get(slug)
     if not post:
         raise Http404("Blog post not found")
 
     context = {
         'ENVIRONMENT': getattr(settings, 'ENVIRONMENT', 'local'),
         'post': post,
-        'recent_posts': [p for p in _load_blog_posts() if p["slug"] != slug][:3],
+        'recent_posts': index.recent(3, exclude_slug=slug),
     }
     return render(request, 'home/blog_post.html', context)
 
@@ -14,8 +14,17 @@ class TicketLogsConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time ticket log updates.
     Clients connect to ws://host/ws/tickets/<ticket_id>/logs/
+
+    A reconnecting client passes the id of the last log it has as
+    ?resume_after=<log_id>; the logs it missed are replayed from the
+    database (`logs_replay` frames, then `replay_complete`).
     """
 
+    # Logs replayed per frame, and at most per reconnect (beyond that the
+    # client reloads the page of logs over HTTP)
+    REPLAY_PAGE_SIZE = 500
+    MAX_REPLAY = 5000
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.ticket_id = None
@@ -87,6 +96,13 @@ class TicketLogsConsumer(AsyncWebsocketConsumer):
             )
             logger.info(f"User {self.user.email} joined group {self.ticket_group_name}")
 
+            # Replay what the client missed while disconnected. Joining the
+            # group first means nothing falls in between; the client drops
+            # duplicates by log id.
+            resume_after = query_params.get('resume_after', '')
+            if resume_after.isdigit():
+                await self.replay_logs(int(resume_after))
+
         except Exception as e:
             logger.error(f"Error in TicketLogsConsumer connect: {str(e)}")
             if not connection_accepted:
@@ -129,6 +145,36 @@ class TicketLogsConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error processing message in TicketLogsConsumer: {str(e)}")
 
+    async def replay_logs(self, after_id):
+        """Send the logs created after `after_id`, oldest first, in pages."""
+        from projects.utils.ticket_logs import page_ticket_logs
+
+        replayed = 0
+        complete = True
+        while True:
+            page = await database_sync_to_async(page_ticket_logs)(
+                self.ticket_id, after_id=after_id, limit=self.REPLAY_PAGE_SIZE
+            )
+            if page['logs']:
+                await self.send(text_data=json.dumps({
+                    'type': 'logs_replay',
+                    'logs': page['logs']
+                }))
+            replayed += len(page['logs'])
+            after_id = page['last_id']
+            if not page['has_more']:
+                break
+            if replayed >= self.MAX_REPLAY:
+                complete = False
+                break
+
+        await self.send(text_data=json.dumps({
+            'type': 'replay_complete',
+            'last_id': after_id,
+            'complete': complete
+        }))
+        logger.info(f"Replayed {replayed} logs to client for ticket {self.ticket_id} (complete={complete})")
+
     async def ticket_log_created(self, event):
         """
         Handler for ticket_log_created events sent to the group.
@@ -147,6 +193,20 @@ class TicketLogsConsumer(AsyncWebsocketConsumer):
 
         logger.info(f"Sent new log to client for ticket {self.ticket_id}: {log_data.get('id')}")
 
+    async def ticket_logs_created(self, event):
+        """
+        Handler for ticket_logs_created events (a batch of logs).
+        Sends the whole batch to the WebSocket client in one frame.
+        """
+        logs = event.get('logs', [])
+
+        await self.send(text_data=json.dumps({
+            'type': 'logs_created',
+            'logs': logs
+        }))
+
+        logger.info(f"Sent {len(logs)} new logs to client for ticket {self.ticket_id}")
+
     async def ticket_status_changed(self, event):
         """
         Handler for ticket_status_changed events sent to the group.
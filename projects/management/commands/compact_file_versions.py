@@ -0,0 +1,69 @@
+"""
+Django management command to compact ProjectFile version history.
+
+Rewrites stored versions as full snapshots plus compressed deltas and
+reports how much storage that saves.
+
+Usage:
+    python manage.py compact_file_versions
+
+Options:
+    --project: Only compact files of this project (database id)
+    --file: Only compact this ProjectFile id
+    --dry-run: Report the savings without writing anything
+    --schedule: Register the daily compaction task with django_q instead
+
+Examples:
+    # See what compaction would save across the whole dataset
+    python manage.py compact_file_versions --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+from projects.utils.file_versions import compact_file_versions
+
+
+def _format_bytes(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+class Command(BaseCommand):
+    help = 'Store ProjectFile versions as snapshots plus compressed deltas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None, help='Project database id')
+        parser.add_argument('--file', type=int, default=None, help='ProjectFile id')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the savings')
+        parser.add_argument('--schedule', action='store_true', help='Schedule daily compaction with django_q')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            from tasks.task_manager import TaskManager
+
+            schedule_id = TaskManager.schedule_task(
+                'tasks.task_definitions.compact_project_file_versions',
+                'D',
+                name='compact_project_file_versions',
+            )
+            self.stdout.write(self.style.SUCCESS(f"Scheduled daily compaction (schedule {schedule_id})"))
+            return
+
+        stats = compact_file_versions(
+            project_id=options['project'],
+            file_id=options['file'],
+            dry_run=options['dry_run'],
+        )
+
+        before, after = stats['bytes_before'], stats['bytes_after']
+        saved_pct = (100.0 * stats['bytes_saved'] / before) if before else 0.0
+        self.stdout.write(
+            f"{stats['files']} files, {stats['versions']} versions, "
+            f"{stats['rewritten']} {'to rewrite' if options['dry_run'] else 'rewritten'}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Version storage: {_format_bytes(before)} -> {_format_bytes(after)} "
+            f"({_format_bytes(stats['bytes_saved'])} saved, {saved_pct:.1f}%)"
+        ))
@@ -0,0 +1,29 @@
+"""
+Django management command to rebuild the ProjectFile search text.
+
+Fills `search_text` for files saved before the search index existed,
+fetching S3-backed bodies. The PostgreSQL search vector follows via its
+trigger.
+
+Usage:
+    python manage.py reindex_file_search
+
+Options:
+    --project: Only reindex files of this project (database id)
+    --all: Rebuild every file, not only those without search text
+"""
+from django.core.management.base import BaseCommand
+
+from projects.utils.file_search import rebuild_search_text
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ProjectFile full-text search text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None, help='Project database id')
+        parser.add_argument('--all', action='store_true', help='Rebuild every file')
+
+    def handle(self, *args, **options):
+        updated = rebuild_search_text(project_id=options['project'], only_missing=not options['all'])
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {updated} files"))
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0061_remove_cli_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketlog',
+            name='client_key',
+            field=models.CharField(
+                blank=True,
+                help_text='Client-supplied idempotency key (CLI batch ingestion)',
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='ticketlog',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('client_key__isnull', False)),
+                fields=('ticket', 'client_key'),
+                name='unique_ticketlog_client_key',
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0062_ticketlog_client_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='projectfileversion',
+            name='content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='projectfileversion',
+            name='delta',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectfileversion',
+            name='chain_depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projectfileversion',
+            name='content_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
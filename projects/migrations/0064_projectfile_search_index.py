@@ -0,0 +1,70 @@
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+SEARCH_TEXT_LIMIT = 200000
+
+CREATE_SEARCH_INDEX = """
+CREATE OR REPLACE FUNCTION projects_projectfile_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.search_text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_projectfile_search_vector_trigger ON projects_projectfile;
+CREATE TRIGGER projects_projectfile_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, search_text ON projects_projectfile
+    FOR EACH ROW EXECUTE FUNCTION projects_projectfile_search_vector_update();
+
+CREATE INDEX IF NOT EXISTS projects_projectfile_search_vector_gin
+    ON projects_projectfile USING gin (search_vector);
+
+UPDATE projects_projectfile SET search_text = search_text;
+"""
+
+DROP_SEARCH_INDEX = """
+DROP INDEX IF EXISTS projects_projectfile_search_vector_gin;
+DROP TRIGGER IF EXISTS projects_projectfile_search_vector_trigger ON projects_projectfile;
+DROP FUNCTION IF EXISTS projects_projectfile_search_vector_update();
+"""
+
+
+def fill_search_text(apps, schema_editor):
+    # Database-stored bodies only; S3 bodies are filled by `reindex_file_search`
+    ProjectFile = apps.get_model('projects', 'ProjectFile')
+    for file_obj in ProjectFile.objects.exclude(content__isnull=True).exclude(content='').only('id', 'content').iterator():
+        ProjectFile.objects.filter(pk=file_obj.pk).update(search_text=file_obj.content[:SEARCH_TEXT_LIMIT])
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0063_projectfileversion_delta_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectfile',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='projectfile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,89 @@
+import re
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+ENTRY_SPLIT = re.compile(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2})\]')
+DURATION = re.compile(r'(?:Time|Execution time): ([\d.]+)')
+ERROR = re.compile(r'(?:Error|Reason): (.+?)(?:\n|$)')
+
+
+def _status_for(content):
+    if 'IMPLEMENTATION COMPLETED' in content or 'Complete' in content:
+        return 'completed'
+    if 'IMPLEMENTATION FAILED' in content or 'FATAL ERROR' in content or 'Implementation Failed' in content:
+        return 'failed'
+    if 'BLOCKED' in content:
+        return 'blocked'
+    if 'RETRYABLE ERROR' in content or 'RETRY' in content:
+        return 'retrying'
+    return 'in_progress'
+
+
+def parse_notes_into_runs(apps, schema_editor):
+    # One run per timestamped entry the executors appended to ticket.notes (times were UTC)
+    ProjectTicket = apps.get_model('projects', 'ProjectTicket')
+    TicketExecutionRun = apps.get_model('projects', 'TicketExecutionRun')
+
+    tickets = ProjectTicket.objects.exclude(notes__isnull=True).exclude(notes='').only('id', 'notes')
+    for ticket in tickets.iterator():
+        parts = ENTRY_SPLIT.split(ticket.notes)
+        runs = []
+        for index in range(1, len(parts) - 1, 2):
+            content = parts[index + 1].strip().rstrip('-').strip()
+            try:
+                started_at = datetime.strptime(parts[index], '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            duration = DURATION.search(content)
+            error = ERROR.search(content)
+            status = _status_for(content)
+            runs.append(TicketExecutionRun(
+                ticket_id=ticket.id,
+                run_id=f"legacy-{ticket.id}-{index // 2 + 1}",
+                executor='legacy',
+                status=status,
+                started_at=started_at,
+                ended_at=started_at if status != 'in_progress' else None,
+                duration_seconds=float(duration.group(1).rstrip('.')) if duration else None,
+                error=error.group(1).strip() if error else '',
+                summary=content,
+            ))
+        TicketExecutionRun.objects.bulk_create(runs, batch_size=500)
+
+
+def remove_legacy_runs(apps, schema_editor):
+    TicketExecutionRun = apps.get_model('projects', 'TicketExecutionRun')
+    TicketExecutionRun.objects.filter(executor='legacy').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0064_projectfile_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketExecutionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.CharField(help_text='Identifier of this execution attempt', max_length=64, unique=True)),
+                ('executor', models.CharField(blank=True, default='', help_text='api, claude_cli, chat or legacy', max_length=20)),
+                ('status', models.CharField(choices=[('in_progress', 'In Progress'), ('completed', 'Completed'), ('failed', 'Failed'), ('blocked', 'Blocked'), ('retrying', 'Retrying'), ('cancelled', 'Cancelled')], default='in_progress', max_length=20)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('summary', models.TextField(blank=True, default='', help_text='Human-readable outcome, as appended to the ticket notes')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='execution_runs', to='projects.projectticket')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['ticket', '-id'], name='projects_ti_ticket__14f124_idx')],
+            },
+        ),
+        migrations.RunPython(parse_notes_into_runs, remove_legacy_runs),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0065_ticketexecutionrun'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketlog',
+            index=models.Index(fields=['ticket', 'id'], name='projects_ti_ticket__645f03_idx'),
+        ),
+    ]
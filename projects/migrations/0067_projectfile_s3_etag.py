@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0066_ticketlog_ticket_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectfile',
+            name='s3_etag',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -1,10 +1,55 @@
 from django.db import models
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.urls import reverse
 import uuid
 import os
 
 # Create your models here.
+def _count_subquery(queryset):
+    """Correlated COUNT(*) over `queryset` (already filtered on project=OuterRef('pk')), 0 when empty"""
+    from django.db.models import Count, IntegerField, Subquery
+    from django.db.models.functions import Coalesce
+
+    counts = queryset.order_by().values('project').annotate(n=Count('pk')).values('n')[:1]
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class ProjectQuerySet(models.QuerySet):
+    """Project lookups shared by the listing views and the API"""
+
+    # Tool calls counted as generated documents on the project list
+    DOCUMENT_TOOL_NAMES = ['create_prd', 'create_implementation_plan', 'create_design_schema']
+
+    def accessible_to(self, user):
+        """Projects the user owns or is an active member of, one row each"""
+        memberships = ProjectMember.objects.filter(project=models.OuterRef('pk'), user=user, status='active')
+        return self.filter(models.Q(owner=user) | models.Exists(memberships))
+
+    def with_summary(self):
+        """
+        Annotate the listing counters, one correlated subquery each, so a page
+        of projects costs a single query:
+        conversations_count, documents_count (active files),
+        generated_documents_count (document tool calls) and tickets_count.
+        Owner and indexed repository are joined in.
+        """
+        from chat.models import Conversation
+
+        project = models.OuterRef('pk')
+        return self.select_related('owner', 'indexed_repository').annotate(
+            conversations_count=_count_subquery(Conversation.objects.filter(project=project)),
+            documents_count=_count_subquery(ProjectFile.objects.filter(project=project, is_active=True)),
+            generated_documents_count=_count_subquery(ToolCallHistory.objects.filter(
+                project=project, tool_name__in=self.DOCUMENT_TOOL_NAMES,
+            )),
+            tickets_count=_count_subquery(ProjectTicket.objects.filter(project=project)),
+        )
+
+
 class Project(models.Model):
     # Keep default integer ID for foreign key compatibility
     # Use project_id for URLs and external references
@@ -63,6 +108,8 @@ class Project(models.Model):
         help_text="Currently selected ticket for preview (loads its branch)"
     )
 
+    objects = ProjectQuerySet.as_manager()
+
     def __str__(self):
         return self.name
     
@@ -564,6 +611,77 @@ class TicketMergeHistory(models.Model):
         return f"{self.ticket.name} - {self.action} at {self.created_at}"
 
 
+class TicketExecutionRun(models.Model):
+    """One execution attempt of a ticket, written by the executors"""
+
+    STATUS_CHOICES = [
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('blocked', 'Blocked'),
+        ('retrying', 'Retrying'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    ticket = models.ForeignKey(ProjectTicket, on_delete=models.CASCADE, related_name='execution_runs')
+    run_id = models.CharField(max_length=64, unique=True, help_text='Identifier of this execution attempt')
+    executor = models.CharField(max_length=20, blank=True, default='', help_text='api, claude_cli, chat or legacy')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
+    started_at = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    summary = models.TextField(blank=True, default='', help_text='Human-readable outcome, as appended to the ticket notes')
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['ticket', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket.name} - run {self.run_id} ({self.status})"
+
+    @classmethod
+    def start(cls, ticket, executor: str = '', started_at=None) -> 'TicketExecutionRun':
+        """Record the start of an execution attempt."""
+        return cls.objects.create(
+            ticket=ticket,
+            run_id=uuid.uuid4().hex,
+            executor=executor,
+            started_at=started_at or timezone.now(),
+        )
+
+    def finish(self, status: str, duration_seconds: float = None, error: str = '', summary: str = ''):
+        """Record how the attempt ended."""
+        self.status = status
+        self.ended_at = timezone.now()
+        if duration_seconds is None:
+            duration_seconds = (self.ended_at - self.started_at).total_seconds()
+        self.duration_seconds = duration_seconds
+        self.error = error or ''
+        self.summary = (summary or '').strip()
+        self.save(update_fields=['status', 'ended_at', 'duration_seconds', 'error', 'summary'])
+
+    def to_log_entry(self) -> dict:
+        """Shape returned by the ticket logs API."""
+        execution_time = f"{self.duration_seconds:.2f}" if self.duration_seconds is not None else None
+        label = self.get_status_display()
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'executor': self.executor,
+            'timestamp': self.started_at.strftime('%Y-%m-%d %H:%M'),
+            'started_at': self.started_at.isoformat(),
+            'ended_at': self.ended_at.isoformat() if self.ended_at else None,
+            'status': self.status,
+            'notes': self.summary,
+            'execution_time': execution_time,
+            'error': self.error or None,
+            'summary': f"{label} - {execution_time}s" if execution_time else label,
+        }
+
+
 class ProjectTodoList(models.Model):
     """Model to store tasks associated with each project ticket"""
     ticket = models.ForeignKey(ProjectTicket, on_delete=models.CASCADE, related_name="tasks")
@@ -602,6 +720,7 @@ class TicketLog(models.Model):
     explanation = models.TextField(blank=True, null=True, help_text="Explanation of what this command does")
     output = models.TextField(blank=True, null=True, help_text="Output from the command (or AI response content)")
     exit_code = models.IntegerField(null=True, blank=True, help_text="Command exit code")
+    client_key = models.CharField(max_length=64, null=True, blank=True, help_text="Client-supplied idempotency key (CLI batch ingestion)")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -611,9 +730,17 @@ class TicketLog(models.Model):
         ordering = ['created_at', 'id']
         indexes = [
             models.Index(fields=['ticket']),
+            models.Index(fields=['ticket', 'id']),
             models.Index(fields=['task']),
             models.Index(fields=['log_type']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ticket', 'client_key'],
+                condition=models.Q(client_key__isnull=False),
+                name='unique_ticketlog_client_key',
+            ),
+        ]
 
 
 def get_ticket_attachment_upload_path(instance, filename):
@@ -667,6 +794,12 @@ class ProjectFile(models.Model):
     file_type = models.CharField(max_length=50, choices=FILE_TYPES)
     content = models.TextField(blank=True, null=True)  # Now optional, as content may be in S3
     s3_key = models.CharField(max_length=500, blank=True, null=True)  # S3 object key
+    # ETag of the last S3 save; the content cache serves only a body with this ETag
+    s3_etag = models.CharField(max_length=100, blank=True, null=True)
+    # Searchable copy of the body, also for S3 files (see projects.utils.file_search)
+    search_text = models.TextField(blank=True, default='', editable=False)
+    # Maintained by a database trigger on PostgreSQL, GIN indexed
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -681,6 +814,16 @@ class ProjectFile(models.Model):
     def __str__(self):
         return f"{self.project.name} - {self.name} ({self.get_file_type_display()})"
     
+    def save(self, *args, **kwargs):
+        # S3-backed bodies get their search text in save_content
+        if self.content is not None:
+            from projects.utils.file_search import search_text_for
+            self.search_text = search_text_for(self.content)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        super().save(*args, **kwargs)
+    
     @property
     def file_content(self):
         """Get file content from database or S3"""
@@ -696,12 +839,11 @@ class ProjectFile(models.Model):
             # For S3 storage, we need to extract project_name and file_path from s3_key
             # S3 key format: prefix/project_name/file_path
             if hasattr(storage, 's3_client'):  # Check if it's S3 storage
+                from factory.content_cache import get_content_cache
                 try:
-                    response = storage.s3_client.get_object(
-                        Bucket=storage.bucket_name,
-                        Key=self.s3_key
+                    return get_content_cache().get(
+                        storage.s3_client, storage.bucket_name, self.s3_key, etag=self.s3_etag
                     )
-                    return response['Body'].read().decode('utf-8')
                 except Exception as e:
                     import logging
                     logger = logging.getLogger(__name__)
@@ -710,14 +852,62 @@ class ProjectFile(models.Model):
         
         return None
     
-    def save_content(self, content_text, user=None, change_description=None):
-        """Save content to S3 or database based on settings and create a version"""
+    @staticmethod
+    def get_contents(files):
+        """
+        Content of several files as {file id: content}.
+
+        S3-backed bodies are fetched concurrently through the content cache.
+        """
+        contents = {f.id: f.content for f in files if f.content}
+        s3_files = [f for f in files if not f.content and f.s3_key]
+        if s3_files:
+            from factory.file_storage import get_file_storage
+            storage = get_file_storage()
+            if hasattr(storage, 's3_client'):
+                from factory.content_cache import get_content_cache
+                bodies = get_content_cache().get_many(
+                    storage.s3_client, storage.bucket_name, [f.s3_key for f in s3_files],
+                    etags={f.s3_key: f.s3_etag for f in s3_files},
+                )
+                for f in s3_files:
+                    contents[f.id] = bodies.get(f.s3_key)
+        return {f.id: contents.get(f.id) for f in files}
+    
+    @staticmethod
+    def delete_s3_bodies(s3_keys):
+        """
+        Delete the S3 bodies of deleted files (batched DeleteObjects).
+
+        Call after the rows are gone; database-backed files have no S3 key.
+        """
+        s3_keys = [key for key in s3_keys if key]
+        if not s3_keys:
+            return
+        from factory.file_storage import get_file_storage
+        storage = get_file_storage()
+        if not hasattr(storage, 's3_client'):
+            return
+        from factory.content_cache import get_content_cache
+        from factory.s3_batch import get_s3_batch
+        get_s3_batch().delete_many(storage.bucket_name, s3_keys)
+        for s3_key in s3_keys:
+            get_content_cache().invalidate(s3_key)
+    
+    def save_content(self, content_text, user=None, change_description=None, edit_result=None):
+        """
+        Save content to S3 or database based on settings and create a version.
+
+        edit_result: the EditResult that produced content_text, if any; its
+        changed regions become the next version's delta without re-diffing.
+        """
         from factory.file_storage import get_file_storage
         from django.conf import settings
+        from projects.utils.file_search import search_text_for
         
         # Create a version before saving new content
         if self.pk:  # Only create version if this is an existing file
-            self.create_version(user=user, change_description=change_description)
+            self.create_version(user=user, change_description=change_description, next_edit=edit_result)
         
         storage = get_file_storage()
         
@@ -727,18 +917,22 @@ class ProjectFile(models.Model):
             s3_key = f"project_files/{self.project.project_id}/{self.file_type}/{self.name}"
             
             # Save to S3
+            from factory.content_cache import get_content_cache
             try:
-                storage.s3_client.put_object(
+                response = storage.s3_client.put_object(
                     Bucket=storage.bucket_name,
                     Key=s3_key,
                     Body=content_text.encode('utf-8'),
                     ContentType='text/plain',
                     ContentEncoding='utf-8'
                 )
+                get_content_cache().put(s3_key, content_text, response.get('ETag'))
                 
-                # Store S3 key and clear content field
+                # Store S3 key and ETag and clear content field
                 self.s3_key = s3_key
+                self.s3_etag = response.get('ETag')
                 self.content = None
+                self.search_text = search_text_for(content_text)
                 
                 import logging
                 logger = logging.getLogger(__name__)
@@ -748,42 +942,79 @@ class ProjectFile(models.Model):
                 import logging
                 logger = logging.getLogger(__name__)
                 logger.error(f"Error saving to S3, falling back to database: {e}")
+                get_content_cache().invalidate(s3_key)
                 # Fall back to database storage
                 self.content = content_text
                 self.s3_key = None
+                self.s3_etag = None
         else:
             # Use database storage
             self.content = content_text
             self.s3_key = None
+            self.s3_etag = None
     
-    def create_version(self, user=None, change_description=None):
-        """Create a new version of the file with current content"""
+    def create_version(self, user=None, change_description=None, next_edit=None):
+        """
+        Create a new version of the file with current content.
+
+        The version is stored as a compressed delta against the previous one
+        while the delta chain is short enough, otherwise as a full snapshot
+        (see projects.utils.file_versions). next_edit is the EditResult about
+        to be saved over the current content; its delta is kept for the
+        following version.
+        """
+        from django.db import transaction
+        from projects.utils.file_versions import plan_storage, reconstruct, remember_edit_delta, take_edit_delta
+
         # Get the current content
         current_content = self.file_content
         if current_content is None:
             return None
-            
-        # Get the next version number
-        last_version = self.versions.first()
-        next_version_number = (last_version.version_number + 1) if last_version else 1
-        
-        # Create the version
-        version = ProjectFileVersion.objects.create(
-            file=self,
-            version_number=next_version_number,
-            content=current_content,
-            created_by=user,
-            change_description=change_description
-        )
+
+        with transaction.atomic():
+            # Serialize version numbering (and compaction) per file
+            ProjectFile.objects.select_for_update().filter(pk=self.pk).first()
+
+            last_version = self.versions.first()
+            next_version_number = (last_version.version_number + 1) if last_version else 1
+
+            if last_version:
+                # The edit saved over last_version, if it is still what changed since
+                delta = take_edit_delta(self.pk, last_version.version_number, current_content)
+                if delta is not None:
+                    delta, chain_depth = plan_storage(None, last_version.chain_depth, current_content, delta=delta)
+                else:
+                    delta, chain_depth = plan_storage(reconstruct(last_version), last_version.chain_depth, current_content)
+            else:
+                delta, chain_depth = None, 0
+
+            # Create the version
+            version = ProjectFileVersion.objects.create(
+                file=self,
+                version_number=next_version_number,
+                content='' if delta is not None else current_content,
+                delta=delta,
+                chain_depth=chain_depth,
+                content_size=len(current_content),
+                created_by=user,
+                change_description=change_description
+            )
+
+            if next_edit is not None and next_edit.original == current_content:
+                remember_edit_delta(self.pk, version.version_number, next_edit)
         
         return version
     
     def get_version(self, version_number):
-        """Get a specific version of the file"""
+        """Get a specific version of the file, with its full text in `content`"""
+        from projects.utils.file_versions import reconstruct
+
         try:
-            return self.versions.get(version_number=version_number)
+            version = self.versions.get(version_number=version_number)
         except ProjectFileVersion.DoesNotExist:
             return None
+        version.content = reconstruct(version)
+        return version
     
     def restore_version(self, version_number, user=None):
         """Restore the file to a specific version"""
@@ -826,7 +1057,10 @@ class ProjectFileVersion(models.Model):
     """Model to store versions of project files"""
     file = models.ForeignKey(ProjectFile, on_delete=models.CASCADE, related_name='versions')
     version_number = models.IntegerField()
-    content = models.TextField()
+    content = models.TextField(blank=True)  # Empty for delta versions
+    delta = models.BinaryField(null=True, blank=True)  # Compressed diff against the previous version
+    chain_depth = models.PositiveSmallIntegerField(default=0)  # Deltas since the last full snapshot
+    content_size = models.PositiveIntegerField(default=0)  # Length of the full text
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='file_versions')
     change_description = models.TextField(blank=True, null=True)
@@ -1166,3 +1400,11 @@ class ProjectEnvironmentVariable(models.Model):
 
         return created, updated
 
+
+@receiver(post_save, sender=ProjectEnvironmentVariable)
+@receiver(post_delete, sender=ProjectEnvironmentVariable)
+def invalidate_project_env_bundle(sender, instance, **kwargs):
+    """Bump the env version so cached export bundles (factory.env_bundle) are rebuilt."""
+    from factory.env_bundle import bump_env_version
+    bump_env_version(instance.project_id)
+
@@ -1,3 +1,515 @@
-from django.test import TestCase
+import base64
+import importlib
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from chat.models import Conversation
+from projects.models import (
+    Project,
+    ProjectFile,
+    ProjectMember,
+    ProjectTicket,
+    TicketExecutionRun,
+    TicketLog,
+    ToolCallHistory,
+)
+from projects.utils import file_search, file_versions
+from projects.utils.file_edits import EditConflict, apply_edits
+from projects.utils.file_search import file_type_stats, rebuild_search_text, search_files, snippet_for
+from projects.utils.ticket_logs import PREVIEW_CHARS, clamp_limit, compact_payload, page_ticket_logs, serialize_log
+from projects.utils.file_versions import (
+    apply_delta,
+    compact_file,
+    encode_delta,
+    encode_edit_delta,
+    plan_storage,
+    reconstruct_version,
+)
+from tasks.task_definitions import finish_execution_run, start_execution_run
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'projects-tests'}}
+
+
+def _document(lines):
+    return ''.join(f'Line {n}\n' for n in range(lines))
+
+
+def _random_document(lines, seed):
+    rng = random.Random(seed)
+    return ''.join(base64.b64encode(rng.randbytes(48)).decode() + '\n' for _ in range(lines))
+
+
+class FileVersionDeltaTests(SimpleTestCase):
+    def test_delta_round_trip(self):
+        base = _document(50)
+        for target in [
+            base,
+            '',
+            base.replace('Line 10\n', 'Line ten\nand more\n'),
+            'Header\n' + base + 'Footer without newline',
+            base[:100],
+        ]:
+            with self.subTest(target=target[:30]):
+                self.assertEqual(apply_delta(base, encode_delta(base, target)), target)
+
+    def test_plan_storage_chains_deltas_up_to_max(self):
+        base = _document(200)
+        target = base.replace('Line 5\n', 'Line five\n')
+        delta, depth = plan_storage(base, 0, target)
+        self.assertIsNotNone(delta)
+        self.assertEqual(depth, 1)
+
+        self.assertEqual(plan_storage(base, file_versions.MAX_DELTAS, target), (None, 0))
+        self.assertEqual(plan_storage(None, None, target), (None, 0))
+
+    def test_plan_storage_snapshots_large_deltas(self):
+        self.assertEqual(plan_storage(_random_document(100, 1), 0, _random_document(100, 2)), (None, 0))
+
+
+@override_settings(FILE_STORAGE_TYPE='local', CACHES=LOCMEM_CACHE)
+class FileVersionStorageTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='pw')
+        self.project = Project.objects.create(name='Versions', owner=owner)
+        self.file = ProjectFile.objects.create(project=self.project, name='PRD', file_type='prd', content='v0\n')
+
+    def _save(self, content):
+        self.file.save_content(content)
+        self.file.save()
+
+    def test_versions_are_deltas_after_a_snapshot(self):
+        contents = [_document(100) + f'Revision {n}\n' for n in range(5)]
+        for content in contents:
+            self._save(content)
+
+        versions = list(self.file.versions.order_by('version_number'))
+        self.assertEqual([v.chain_depth for v in versions], [0, 1, 2, 3, 4])
+        self.assertTrue(all(v.delta is not None and v.content == '' for v in versions[1:]))
+        # Version N holds the text saved before save N
+        for number, expected in enumerate(['v0\n'] + contents[:-1], start=1):
+            self.assertEqual(reconstruct_version(self.file, number), expected)
+            self.assertEqual(self.file.get_version(number).content, expected)
+
+    def test_chain_restarts_with_a_snapshot(self):
+        with mock.patch.object(file_versions, 'MAX_DELTAS', 2):
+            for n in range(6):
+                self._save(_document(100) + f'Revision {n}\n')
+        depths = list(self.file.versions.order_by('version_number').values_list('chain_depth', flat=True))
+        self.assertEqual(depths, [0, 1, 2, 0, 1, 2])
+
+    def test_compaction_rewrites_full_copies(self):
+        contents = [_document(100) + f'Revision {n}\n' for n in range(4)]
+        for number, content in enumerate(contents, start=1):
+            self.file.versions.create(version_number=number, content=content, content_size=len(content))
+
+        stats = compact_file(self.file)
+        self.assertEqual(stats['versions'], 4)
+        self.assertEqual(stats['rewritten'], 3)
+        self.assertLess(stats['bytes_after'], stats['bytes_before'])
+        for number, content in enumerate(contents, start=1):
+            self.assertEqual(reconstruct_version(self.file, number), content)
+
+        self.assertEqual(compact_file(self.file)['rewritten'], 0)
+
+
+class TicketLogPayloadTests(SimpleTestCase):
+    def test_clamp_limit(self):
+        self.assertEqual(clamp_limit(None), 200)
+        self.assertEqual(clamp_limit(''), 200)
+        self.assertEqual(clamp_limit('0'), 1)
+        self.assertEqual(clamp_limit('50'), 50)
+        self.assertEqual(clamp_limit(10 ** 6), 1000)
+        with self.assertRaises(ValueError):
+            clamp_limit('abc')
+
+    def test_compact_payload_cuts_long_fields(self):
+        payload = {'id': 1, 'command': 'npm test', 'output': 'x' * (PREVIEW_CHARS + 10)}
+        compact = compact_payload(payload)
+        self.assertEqual(len(compact['output']), PREVIEW_CHARS)
+        self.assertEqual(compact['output_length'], PREVIEW_CHARS + 10)
+        self.assertEqual(compact['truncated'], ['output'])
+        self.assertEqual(compact['command'], 'npm test')
+        # The original dict is left alone
+        self.assertEqual(len(payload['output']), PREVIEW_CHARS + 10)
+        self.assertNotIn('truncated', compact_payload({'id': 2, 'command': 'ls', 'output': 'ok'}))
+
+
+class TicketLogPagingTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='pw')
+        project = Project.objects.create(name='Logs', owner=owner)
+        self.ticket = ProjectTicket.objects.create(project=project, name='Ticket', description='Logs')
+        self.logs = [
+            TicketLog.objects.create(ticket=self.ticket, command=f'echo {n}', output=f'{n}')
+            for n in range(7)
+        ]
+        self.ids = [log.id for log in self.logs]
+
+    def test_newest_page_oldest_first(self):
+        page = page_ticket_logs(self.ticket.id, limit=3)
+        self.assertEqual([entry['id'] for entry in page['logs']], self.ids[-3:])
+        self.assertEqual((page['first_id'], page['last_id']), (self.ids[-3], self.ids[-1]))
+        self.assertTrue(page['has_earlier'])
+        self.assertFalse(page['has_more'])
+
+    def test_before_id_pages_back(self):
+        page = page_ticket_logs(self.ticket.id, before_id=self.ids[4], limit=3)
+        self.assertEqual([entry['id'] for entry in page['logs']], self.ids[1:4])
+        self.assertTrue(page['has_earlier'])
+        self.assertTrue(page['has_more'])
+
+        page = page_ticket_logs(self.ticket.id, before_id=self.ids[1], limit=3)
+        self.assertEqual([entry['id'] for entry in page['logs']], self.ids[:1])
+        self.assertFalse(page['has_earlier'])
+
+    def test_after_id_reads_forward(self):
+        page = page_ticket_logs(self.ticket.id, after_id=self.ids[2], limit=2)
+        self.assertEqual([entry['id'] for entry in page['logs']], self.ids[3:5])
+        self.assertTrue(page['has_more'])
+
+        page = page_ticket_logs(self.ticket.id, after_id=self.ids[-1])
+        self.assertEqual(page['logs'], [])
+        self.assertEqual(page['last_id'], self.ids[-1])
+        self.assertFalse(page['has_more'])
+
+    def test_long_output_is_truncated_until_fetched_in_full(self):
+        long_log = TicketLog.objects.create(ticket=self.ticket, command='npm test', output='y' * (PREVIEW_CHARS * 2))
+        entry = page_ticket_logs(self.ticket.id, limit=1)['logs'][0]
+        self.assertEqual(entry['id'], long_log.id)
+        self.assertEqual(len(entry['output']), PREVIEW_CHARS)
+        self.assertEqual(entry['output_length'], PREVIEW_CHARS * 2)
+        self.assertEqual(entry['truncated'], ['output'])
+        self.assertEqual(entry['command'], 'npm test')
+
+        full = serialize_log(TicketLog.objects.get(id=long_log.id), full=True)
+        self.assertEqual(len(full['output']), PREVIEW_CHARS * 2)
+        self.assertNotIn('truncated', full)
+
+    def test_page_is_one_query_with_null_outputs(self):
+        TicketLog.objects.create(ticket=self.ticket, command='git status', output=None)
+        TicketLog.objects.create(ticket=self.ticket, command='npm test', output='y' * (PREVIEW_CHARS + 1))
+        with self.assertNumQueries(1):
+            page = page_ticket_logs(self.ticket.id, limit=5)
+        self.assertEqual(len(page['logs']), 5)
+        null_entry, long_entry = page['logs'][-2:]
+        self.assertEqual(null_entry['output'], '')
+        self.assertNotIn('truncated', null_entry)
+        self.assertEqual(long_entry['truncated'], ['output'])
+
+
+class FileEditEngineTests(SimpleTestCase):
+    TEXT = 'a\nb\nc\nd'
+
+    def _apply(self, *operations):
+        return apply_edits(self.TEXT, list(operations))
+
+    def test_single_operations(self):
+        cases = [
+            ({'type': 'replace_lines', 'start': 2, 'end': 3, 'content': 'X'}, 'a\nX\nd'),
+            ({'type': 'insert_after', 'line': 0, 'content': 'top'}, 'top\na\nb\nc\nd'),
+            ({'type': 'insert_after', 'line': 1, 'content': 'n'}, 'a\nn\nb\nc\nd'),
+            ({'type': 'insert_after', 'line': 4, 'content': 'end'}, 'a\nb\nc\nd\nend'),
+            ({'type': 'pattern_replace', 'pattern': 'b\nc', 'content': 'bc'}, 'a\nbc\nd'),
+        ]
+        for operation, expected in cases:
+            with self.subTest(operation=operation):
+                self.assertEqual(self._apply(operation).text, expected)
+
+    def test_operations_address_the_original_lines(self):
+        result = self._apply(
+            {'type': 'replace_lines', 'start': 1, 'end': 1, 'content': 'A'},
+            {'type': 'insert_after', 'line': 1, 'content': 'n'},
+            {'type': 'replace_lines', 'start': 3, 'end': 3, 'content': 'C'},
+        )
+        self.assertEqual(result.text, 'A\nn\nb\nC\nd')
+        self.assertEqual(result.summary(), 'Applied 3 edit operations: 2 regions changed (-2/+3 lines)')
+
+    def test_pattern_counts(self):
+        result = apply_edits('x1 x2\nx3', [{'type': 'pattern_replace', 'pattern': 'x', 'content': 'y'}])
+        self.assertEqual(result.text, 'y1 y2\ny3')
+        self.assertEqual(result.pattern_counts, {0: 3})
+
+    def test_conflicts_are_reported_together_and_nothing_applies(self):
+        with self.assertRaises(EditConflict) as raised:
+            self._apply(
+                {'type': 'replace_lines', 'start': 1, 'end': 2, 'content': ''},
+                {'type': 'replace_lines', 'start': 2, 'end': 3, 'content': ''},
+                {'type': 'insert_after', 'line': 9, 'content': 'x'},
+                {'type': 'pattern_replace', 'pattern': '', 'content': 'x'},
+                {'type': 'bogus', 'content': ''},
+            )
+        self.assertEqual(raised.exception.problems, [
+            'operation 3 (insert_after): line 9 is outside 0-4',
+            'operation 4 (pattern_replace): pattern must be a non-empty string',
+            'operation 5 (bogus): type must be one of replace_lines, insert_after, pattern_replace',
+            'operation 2 overlaps operation 1 at line 2',
+        ])
+
+    def test_unified_diff(self):
+        result = self._apply({'type': 'replace_lines', 'start': 2, 'end': 2, 'content': 'B'})
+        self.assertEqual(result.unified_diff(), '--- a/file\n+++ b/file\n@@ -1,4 +1,4 @@\n a\n-b\n+B\n c\n d\n')
+        self.assertTrue(result.unified_diff(max_chars=10).endswith('... (diff truncated)\n'))
+
+    def test_edit_delta_rebuilds_the_edited_text(self):
+        base = _document(30)
+        rng = random.Random(7)
+        for _ in range(50):
+            operations = []
+            for line in sorted(rng.sample(range(1, 30), 4)):
+                if rng.random() < 0.5:
+                    operations.append({'type': 'replace_lines', 'start': line, 'end': line, 'content': rng.choice(['', 'x', 'x\ny'])})
+                else:
+                    operations.append({'type': 'insert_after', 'line': line, 'content': 'new'})
+            result = apply_edits(base, operations)
+            with self.subTest(operations=operations):
+                self.assertEqual(apply_delta(base, encode_edit_delta(result)), result.text)
+
+
+@override_settings(FILE_STORAGE_TYPE='local', CACHES=LOCMEM_CACHE)
+class FileEditVersionTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        owner = User.objects.create_user(username='owner', password='pw')
+        project = Project.objects.create(name='Edits', owner=owner)
+        self.file = ProjectFile.objects.create(project=project, name='PRD', file_type='prd', content=_document(100))
+
+    def _edit(self, operations):
+        result = apply_edits(self.file.file_content, operations)
+        self.file.save_content(result.text, change_description=result.summary(), edit_result=result)
+        self.file.save()
+        return result
+
+    def test_next_version_uses_the_edit_delta(self):
+        first = self._edit([{'type': 'replace_lines', 'start': 10, 'end': 10, 'content': 'Edited'}])
+        with mock.patch.object(file_versions, 'reconstruct', wraps=file_versions.reconstruct) as rebuilt:
+            self._edit([{'type': 'insert_after', 'line': 20, 'content': 'Inserted'}])
+        rebuilt.assert_not_called()
+
+        version = self.file.versions.get(version_number=2)
+        self.assertEqual(version.chain_depth, 1)
+        self.assertEqual(reconstruct_version(self.file, 2), first.text)
+
+    def test_stale_edit_delta_falls_back_to_diffing(self):
+        self._edit([{'type': 'replace_lines', 'start': 10, 'end': 10, 'content': 'Edited'}])
+        self.file.content = 'Changed behind the edit engine\n' + self.file.content
+        self.file.save()
+        with mock.patch.object(file_versions, 'reconstruct', wraps=file_versions.reconstruct) as rebuilt:
+            self.file.save_content(_document(10))
+            self.file.save()
+        rebuilt.assert_called_once()
+        self.assertTrue(reconstruct_version(self.file, 2).startswith('Changed behind the edit engine\n'))
+
+
+class FileSearchSnippetTests(SimpleTestCase):
+    def test_snippet_windows_and_escapes_the_first_match(self):
+        text = 'x' * 300 + ' The <b>Login</b> flow redirects to login. ' + 'y' * 300
+        snippet = snippet_for(ProjectFile(search_text=text), 'login')
+        self.assertTrue(snippet.startswith('… ') and snippet.endswith(' …'))
+        self.assertIn('&lt;b&gt;<mark>Login</mark>&lt;/b&gt;', snippet)
+        self.assertIn('to <mark>login</mark>.', snippet)
+
+    def test_no_match_or_empty_query_gives_no_snippet(self):
+        file_obj = ProjectFile(search_text='Nothing relevant here')
+        self.assertEqual(snippet_for(file_obj, 'checkout'), '')
+        self.assertEqual(snippet_for(file_obj, '  '), '')
+        self.assertEqual(snippet_for(ProjectFile(search_text=''), 'checkout'), '')
+
+    def test_database_headline_is_rendered(self):
+        file_obj = ProjectFile(search_text='ignored')
+        file_obj.search_snippet = 'a <tag> \x02hit\x03 … b'
+        self.assertEqual(snippet_for(file_obj, 'hit'), 'a &lt;tag&gt; <mark>hit</mark> … b')
+        # ts_headline returns the start of the body when only the name matched
+        file_obj.search_snippet = 'first words of the body'
+        self.assertEqual(snippet_for(file_obj, 'prd'), '')
+
+
+@override_settings(FILE_STORAGE_TYPE='local', CACHES=LOCMEM_CACHE)
+class FileSearchTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        owner = User.objects.create_user(username='owner', password='pw')
+        self.project = Project.objects.create(name='Search', owner=owner)
+        self.files = ProjectFile.objects.filter(project=self.project)
+
+    def _create(self, name, file_type, content):
+        return ProjectFile.objects.create(project=self.project, name=name, file_type=file_type, content=content)
+
+    def _save_to_s3(self, name, content):
+        file_obj = ProjectFile(project=self.project, name=name, file_type='implementation')
+        storage = mock.Mock(bucket_name='bucket')
+        storage.s3_client.put_object.return_value = {'ETag': '"etag-1"'}
+        with override_settings(FILE_STORAGE_TYPE='s3'), \
+                mock.patch('factory.file_storage.get_file_storage', return_value=storage):
+            file_obj.save_content(content)
+        file_obj.save()
+        return file_obj
+
+    def test_save_keeps_a_capped_search_copy(self):
+        file_obj = self._create('PRD', 'prd', 'Login flow')
+        self.assertEqual(file_obj.search_text, 'Login flow')
+
+        file_obj.content = 'Checkout flow'
+        file_obj.save(update_fields=['content'])
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.search_text, 'Checkout flow')
+
+        with mock.patch.object(file_search, 'SEARCH_TEXT_LIMIT', 5):
+            self.assertEqual(self._create('Notes', 'other', 'abcdefgh').search_text, 'abcde')
+
+    def test_s3_bodies_are_searchable(self):
+        file_obj = self._save_to_s3('Plan', 'Migrate the billing service')
+        file_obj.refresh_from_db()
+        self.assertIsNone(file_obj.content)
+        self.assertEqual(file_obj.search_text, 'Migrate the billing service')
+        self.assertEqual(list(search_files(self.files, 'BILLING')), [file_obj])
+
+    def test_matches_name_type_and_body(self):
+        prd = self._create('Checkout PRD', 'prd', 'Payments')
+        design = self._create('Wireframes', 'design', 'The checkout page')
+        self._create('Notes', 'other', 'Unrelated')
+
+        self.assertEqual(set(search_files(self.files, 'checkout')), {prd, design})
+        self.assertEqual(list(search_files(self.files, 'design')), [design])
+        self.assertEqual(search_files(self.files, '  ').count(), 3)
+
+    def test_type_stats(self):
+        self._create('A', 'prd', 'a')
+        self._create('B', 'prd', 'b')
+        self._create('C', 'design', 'c')
+        with self.assertNumQueries(1):
+            stats = file_type_stats(self.files)
+        self.assertEqual(stats, {
+            'prd': {'name': dict(ProjectFile.FILE_TYPES)['prd'], 'count': 2},
+            'design': {'name': dict(ProjectFile.FILE_TYPES)['design'], 'count': 1},
+        })
+
+    def test_rebuild_fills_missing_search_text(self):
+        self._create('Indexed', 'prd', 'kept')
+        file_obj = self._save_to_s3('Legacy', 'Body from before the index')
+        ProjectFile.objects.filter(pk=file_obj.pk).update(search_text='')
+
+        with mock.patch.object(ProjectFile, 'file_content', new_callable=mock.PropertyMock,
+                               return_value='Body from before the index'):
+            self.assertEqual(rebuild_search_text(self.project.id), 1)
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.search_text, 'Body from before the index')
+
+
+class ProjectListQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='pw')
+        self.other = User.objects.create_user(username='other', password='pw')
+
+    def test_accessible_to_owned_and_active_memberships(self):
+        owned = Project.objects.create(name='Owned', owner=self.user)
+        shared = Project.objects.create(name='Shared', owner=self.other)
+        pending = Project.objects.create(name='Pending', owner=self.other)
+        Project.objects.create(name='Private', owner=self.other)
+        ProjectMember.objects.create(project=shared, user=self.user, status='active')
+        ProjectMember.objects.create(project=shared, user=self.other, role='owner', status='active')
+        ProjectMember.objects.create(project=pending, user=self.user, status='pending')
+        # Being owner and member at once still gives one row
+        ProjectMember.objects.create(project=owned, user=self.user, role='owner', status='active')
+
+        self.assertEqual(sorted(p.name for p in Project.objects.accessible_to(self.user)), ['Owned', 'Shared'])
+
+    def test_summary_counts_in_one_query(self):
+        busy = Project.objects.create(name='Busy', owner=self.user)
+        Project.objects.create(name='Empty', owner=self.user)
+        for n in range(3):
+            Conversation.objects.create(user=self.user, project=busy, title=f'Chat {n}')
+        ProjectFile.objects.create(project=busy, name='PRD', file_type='prd', content='prd')
+        ProjectFile.objects.create(project=busy, name='Old', file_type='prd', content='old', is_active=False)
+        for tool_name in ('create_prd', 'create_design_schema', 'get_file_list'):
+            ToolCallHistory.objects.create(project=busy, tool_name=tool_name, generated_content='...')
+        for n in range(2):
+            ProjectTicket.objects.create(project=busy, name=f'Ticket {n}', description='')
+
+        with self.assertNumQueries(1):
+            rows = {
+                p.name: (p.conversations_count, p.documents_count, p.generated_documents_count,
+                         p.tickets_count, p.owner.username, hasattr(p, 'indexed_repository'))
+                for p in Project.objects.accessible_to(self.user).with_summary()
+            }
+        self.assertEqual(rows, {'Busy': (3, 1, 2, 2, 'user', False), 'Empty': (0, 0, 0, 0, 'user', False)})
+
+
+class TicketExecutionRunTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pw')
+        self.project = Project.objects.create(name='Runs', owner=self.owner)
+        self.ticket = ProjectTicket.objects.create(project=self.project, name='Ticket', description='Runs')
+
+    def _logs(self, user=None, **params):
+        self.client.force_login(user or self.owner)
+        url = reverse('projects:ticket_logs_api', args=[self.project.project_id, self.ticket.id])
+        return self.client.get(url, params)
+
+    def test_run_lifecycle_and_log_entry(self):
+        started_at = timezone.now() - timedelta(seconds=90)
+        run = start_execution_run(self.ticket, 'claude_cli', started_at=started_at)
+        self.assertEqual((run.status, run.executor, run.ended_at), ('in_progress', 'claude_cli', None))
+
+        finish_execution_run(run, 'failed', '  Implementation Failed  ', error='npm test exited 1')
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.summary, run.error), ('failed', 'Implementation Failed', 'npm test exited 1'))
+        self.assertAlmostEqual(run.duration_seconds, 90, delta=5)
+
+        entry = run.to_log_entry()
+        self.assertEqual(entry['run_id'], run.run_id)
+        self.assertEqual(entry['summary'], f"Failed - {run.duration_seconds:.2f}s")
+        self.assertEqual((entry['status'], entry['notes'], entry['error']), ('failed', 'Implementation Failed', 'npm test exited 1'))
+        self.assertEqual(entry['started_at'], started_at.isoformat())
+
+        # Bookkeeping never breaks the executor
+        finish_execution_run(None, 'completed', 'done')
+        with mock.patch.object(TicketExecutionRun, 'save', side_effect=RuntimeError('db down')):
+            finish_execution_run(run, 'completed', 'done', 1.5)
+        with mock.patch.object(TicketExecutionRun.objects, 'create', side_effect=RuntimeError('db down')):
+            self.assertIsNone(start_execution_run(self.ticket, 'api'))
+
+    def test_logs_api_pages_newest_first(self):
+        runs = [TicketExecutionRun.start(self.ticket, executor='api') for _ in range(5)]
+        runs[0].finish('completed', duration_seconds=12.5, summary='Done')
+
+        first = self._logs(limit=2).json()
+        self.assertEqual([log['id'] for log in first['logs']], [runs[4].id, runs[3].id])
+        self.assertEqual((first['has_more'], first['next_before']), (True, runs[3].id))
+
+        last = self._logs(limit=3, before=first['next_before']).json()
+        self.assertEqual([log['id'] for log in last['logs']], [runs[2].id, runs[1].id, runs[0].id])
+        self.assertEqual((last['has_more'], last['next_before']), (False, None))
+        self.assertEqual((last['logs'][-1]['execution_time'], last['logs'][-1]['summary']), ('12.50', 'Completed - 12.50s'))
+
+        self.assertEqual(self._logs(limit='many').status_code, 400)
+        stranger = User.objects.create_user(username='stranger', password='pw')
+        self.assertEqual(self._logs(user=stranger).status_code, 403)
+
+    def test_migration_turns_notes_into_legacy_runs(self):
+        migration = importlib.import_module('projects.migrations.0065_ticketexecutionrun')
+        self.ticket.notes = (
+            '[2024-05-01 10:00] IMPLEMENTATION FAILED\nError: tests failed\nTime: 42.5s\n---\n'
+            '[2024-05-02 11:30] IMPLEMENTATION COMPLETED\nExecution time: 12.0s'
+        )
+        self.ticket.save()
+
+        migration.parse_notes_into_runs(apps, None)
+        runs = list(TicketExecutionRun.objects.filter(ticket=self.ticket).order_by('started_at'))
+        self.assertEqual(
+            [(r.run_id, r.executor, r.status, r.duration_seconds, r.error) for r in runs],
+            [(f'legacy-{self.ticket.id}-1', 'legacy', 'failed', 42.5, 'tests failed'),
+             (f'legacy-{self.ticket.id}-2', 'legacy', 'completed', 12.0, '')],
+        )
+        self.assertEqual(runs[0].started_at, datetime(2024, 5, 1, 10, 0, tzinfo=dt_timezone.utc))
+
+        migration.remove_legacy_runs(apps, None)
+        self.assertFalse(TicketExecutionRun.objects.exists())
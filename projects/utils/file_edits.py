@@ -0,0 +1,299 @@
+"""
+ProjectFile Edit Engine
+
+Applies a batch of edit operations to a document in one pass, instead of
+splitting it into a line list and rejoining it for every operation.
+
+- Every operation addresses the document as it was before the edit, so
+  operations don't shift each other's line numbers:
+    replace_lines   {start, end, content}  lines start..end (1-based, inclusive)
+    insert_after    {line, content}        after line N (0 = top of file)
+    pattern_replace {pattern, content}     every occurrence of the literal pattern
+- Operations are resolved up front into character ranges of the original
+  text. Out-of-range lines, empty patterns and overlapping edits are
+  reported together as an EditConflict, before anything is applied.
+- The result is built from a piece table: runs copied from the original
+  plus the inserted strings, joined once. The cost is O(document + edits),
+  however many operations there are.
+- `EditResult.unified_diff()` renders the change without re-diffing the
+  two texts; `summary()` is the one-line change description stored on the
+  file version.
+
+Usage:
+    from projects.utils.file_edits import EditConflict, apply_edits
+
+    try:
+        result = apply_edits(text, [
+            {'type': 'replace_lines', 'start': 3, 'end': 4, 'content': 'New line'},
+            {'type': 'pattern_replace', 'pattern': 'v1', 'content': 'v2'},
+        ])
+    except EditConflict as e:
+        print(e.problems)
+    print(result.text, result.unified_diff())
+"""
+
+import bisect
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+OPERATION_TYPES = ('replace_lines', 'insert_after', 'pattern_replace')
+DIFF_MAX_CHARS = 4000  # diff returned to the agent after an edit
+
+
+class EditConflict(ValueError):
+    """One or more operations are invalid or overlap; nothing was applied."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+
+@dataclass
+class Edit:
+    """Replace original[start:end] with text (start == end for an insertion)."""
+    start: int
+    end: int
+    text: str
+    op_index: int
+    # Order of edits at the same position: insert at top, replace, insert after
+    priority: int = 1
+
+
+@dataclass
+class EditResult:
+    original: str
+    text: str
+    edits: List[Edit]
+    operations: int
+    pattern_counts: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def line_count_before(self) -> int:
+        return self.original.count('\n') + 1
+
+    @property
+    def line_count_after(self) -> int:
+        return self.text.count('\n') + 1
+
+    def hunks(self) -> List[Tuple[int, int, int, int]]:
+        """
+        Changed regions as whole lines; edits sharing a line form one region.
+
+        Returns:
+            [(old_start, old_end, new_start, new_end)] character offsets of
+            each region in the original and in the edited text
+        """
+        hunks = []
+        shift = 0
+        for edit in self.edits:
+            old_start = _line_start(self.original, edit.start)
+            old_end = _line_end(self.original, edit.end)
+            new_start = old_start + shift
+            shift += len(edit.text) - (edit.end - edit.start)
+            if hunks and old_start <= hunks[-1][1]:
+                prev = hunks[-1]
+                hunks[-1] = (prev[0], old_end, prev[2], old_end + shift)
+            else:
+                hunks.append((old_start, old_end, new_start, old_end + shift))
+        return hunks
+
+    def unified_diff(self, context: int = 3, name: str = 'file', max_chars: int = None) -> str:
+        """Unified diff of the edit, built from the edit ranges rather than by re-diffing."""
+        original_lines = self.original.split('\n')
+
+        # (first old line, old line count, old lines, new lines) per region, 0-based lines
+        regions = []
+        line, pos = 0, 0
+        for old_start, old_end, new_start, new_end in self.hunks():
+            line += self.original.count('\n', pos, old_start)
+            pos = old_start
+            old_lines = self.original[old_start:old_end].split('\n')
+            regions.append((line, len(old_lines), old_lines, self.text[new_start:new_end].split('\n')))
+
+        out = [f'--- a/{name}', f'+++ b/{name}']
+        delta = 0
+        index = 0
+        while index < len(regions):
+            # Group regions separated by at most 2 * context unchanged lines
+            group = [regions[index]]
+            index += 1
+            while index < len(regions) and regions[index][0] - (group[-1][0] + group[-1][1]) <= 2 * context:
+                group.append(regions[index])
+                index += 1
+
+            first = max(group[0][0] - context, 0)
+            last = min(group[-1][0] + group[-1][1] + context, len(original_lines))
+            body = [f' {text}' for text in original_lines[first:group[0][0]]]
+            group_delta = 0
+            for number, (start, count, old_lines, new_lines) in enumerate(group):
+                if number:
+                    prev_end = group[number - 1][0] + group[number - 1][1]
+                    body.extend(f' {text}' for text in original_lines[prev_end:start])
+                body.extend(_diff_block(old_lines, new_lines))
+                group_delta += len(new_lines) - count
+            body.extend(f' {text}' for text in original_lines[group[-1][0] + group[-1][1]:last])
+
+            old_count = last - first
+            out.append(f'@@ -{first + 1},{old_count} +{first + 1 + delta},{old_count + group_delta} @@')
+            out.extend(body)
+            delta += group_delta
+
+        diff = '\n'.join(out) + '\n'
+        if max_chars is not None and len(diff) > max_chars:
+            diff = diff[:max_chars] + '\n... (diff truncated)\n'
+        return diff
+
+    def summary(self) -> str:
+        """One-line description of the change, for the version history."""
+        added = removed = 0
+        hunks = self.hunks()
+        for old_start, old_end, new_start, new_end in hunks:
+            block = _diff_block(self.original[old_start:old_end].split('\n'), self.text[new_start:new_end].split('\n'))
+            removed += sum(1 for line in block if line[0] == '-')
+            added += sum(1 for line in block if line[0] == '+')
+        regions = len(hunks)
+        return (
+            f"Applied {self.operations} edit operation{'s' if self.operations != 1 else ''}: "
+            f"{regions} region{'s' if regions != 1 else ''} changed "
+            f"(-{removed}/+{added} lines)"
+        )
+
+
+def _line_start(text: str, pos: int) -> int:
+    return text.rfind('\n', 0, pos) + 1
+
+
+def _line_end(text: str, pos: int) -> int:
+    end = text.find('\n', pos)
+    return len(text) if end == -1 else end
+
+
+def _diff_block(old_lines: List[str], new_lines: List[str]) -> List[str]:
+    """Diff lines for one region: common leading/trailing lines as context."""
+    head = 0
+    while head < min(len(old_lines), len(new_lines)) and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(old_lines), len(new_lines)) - head
+           and old_lines[-1 - tail] == new_lines[-1 - tail]):
+        tail += 1
+    lines = [f' {line}' for line in old_lines[:head]]
+    lines += [f'-{line}' for line in old_lines[head:len(old_lines) - tail]]
+    lines += [f'+{line}' for line in new_lines[head:len(new_lines) - tail]]
+    lines += [f' {line}' for line in old_lines[len(old_lines) - tail:]]
+    return lines
+
+
+def line_offsets(text: str) -> List[int]:
+    """Character offset at which each line of `text` starts."""
+    offsets = [0]
+    pos = text.find('\n')
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = text.find('\n', pos + 1)
+    return offsets
+
+
+def resolve_operations(text: str, operations: Sequence[Dict]) -> Tuple[List[Edit], Dict[int, int]]:
+    """
+    Turn operations into non-overlapping character-range edits of `text`.
+
+    Returns:
+        (edits sorted by position, {operation index: occurrences} for patterns)
+
+    Raises:
+        EditConflict listing every invalid or overlapping operation
+    """
+    offsets = line_offsets(text)
+    line_count = len(offsets)
+
+    def line_end(line: int) -> int:
+        # End of 1-based `line`, excluding its newline
+        return offsets[line] - 1 if line < line_count else len(text)
+
+    edits: List[Edit] = []
+    pattern_counts: Dict[int, int] = {}
+    problems: List[str] = []
+
+    for index, op in enumerate(operations):
+        op_type = op.get('type') if isinstance(op, dict) else None
+        label = f"operation {index + 1} ({op_type or 'unknown'})"
+        content = op.get('content') if isinstance(op, dict) else None
+        if op_type not in OPERATION_TYPES:
+            problems.append(f"{label}: type must be one of {', '.join(OPERATION_TYPES)}")
+            continue
+        if not isinstance(content, str):
+            problems.append(f"{label}: content must be a string")
+            continue
+
+        if op_type == 'replace_lines':
+            start, end = op.get('start'), op.get('end')
+            if not isinstance(start, int) or not isinstance(end, int) or not 1 <= start <= end <= line_count:
+                problems.append(f"{label}: lines {start}-{end} are outside 1-{line_count}")
+                continue
+            edits.append(Edit(offsets[start - 1], line_end(end), content, index))
+
+        elif op_type == 'insert_after':
+            line = op.get('line')
+            if not isinstance(line, int) or not 0 <= line <= line_count:
+                problems.append(f"{label}: line {line} is outside 0-{line_count}")
+                continue
+            if line == 0:
+                edits.append(Edit(0, 0, content + '\n', index, priority=0))
+            else:
+                pos = line_end(line)
+                edits.append(Edit(pos, pos, '\n' + content, index, priority=2))
+
+        else:
+            pattern = op.get('pattern')
+            if not isinstance(pattern, str) or not pattern:
+                problems.append(f"{label}: pattern must be a non-empty string")
+                continue
+            count = 0
+            pos = text.find(pattern)
+            while pos != -1:
+                edits.append(Edit(pos, pos + len(pattern), content, index))
+                count += 1
+                pos = text.find(pattern, pos + len(pattern))
+            pattern_counts[index] = count
+
+    edits.sort(key=lambda e: (e.start, e.end, e.priority, e.op_index))
+
+    # An edit may touch its neighbour's boundary but not reach inside it
+    covered_end, covered_by = -1, None
+    for edit in edits:
+        if covered_by is not None and edit.start < covered_end:
+            problems.append(
+                f"operation {edit.op_index + 1} overlaps operation {covered_by.op_index + 1} "
+                f"at line {bisect.bisect_right(offsets, edit.start)}"
+            )
+        if edit.end > covered_end:
+            covered_end, covered_by = edit.end, edit
+
+    if problems:
+        raise EditConflict(list(dict.fromkeys(problems)))
+    return edits, pattern_counts
+
+
+def apply_edits(text: str, operations: Sequence[Dict]) -> EditResult:
+    """Validate and apply a batch of operations to `text` in one pass."""
+    text = text or ''
+    edits, pattern_counts = resolve_operations(text, operations)
+
+    # Piece table: original runs between edits, and the edit texts
+    pieces = []
+    cursor = 0
+    for edit in edits:
+        if edit.start > cursor:
+            pieces.append(text[cursor:edit.start])
+        pieces.append(edit.text)
+        cursor = max(cursor, edit.end)
+    pieces.append(text[cursor:])
+
+    return EditResult(
+        original=text,
+        text=''.join(pieces),
+        edits=edits,
+        operations=len(operations),
+        pattern_counts=pattern_counts,
+    )
@@ -0,0 +1,159 @@
+"""
+ProjectFile Search
+
+Full-text search over project files, covering files whose body lives in
+S3 as well as in the database.
+
+- `ProjectFile.search_text` keeps a searchable copy of the body, capped at
+  SEARCH_TEXT_LIMIT characters. `save()` fills it from `content`, and
+  `save_content()` fills it directly when the body goes to S3.
+- On PostgreSQL a trigger maintains `search_vector` (name weighted above
+  body) from name and search_text, and a GIN index serves the lookups.
+  Matches are ranked with ts_rank and the snippets come from ts_headline.
+- On other databases (SQLite in development) the search falls back to
+  icontains over name and search_text, with snippets cut in Python.
+- Snippets are returned HTML-escaped with matches wrapped in <mark>.
+
+Usage:
+    from projects.utils.file_search import search_files, file_type_stats, snippet_for
+
+    files = search_files(ProjectFile.objects.filter(project=project), 'login flow')
+    for file_obj in files[:20]:
+        print(file_obj.name, snippet_for(file_obj, 'login flow'))
+"""
+
+import html
+import logging
+import re
+from typing import Dict
+
+from django.db import connection
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TEXT_LIMIT = 200000
+SEARCH_CONFIG = 'english'
+SNIPPET_CHARS = 200
+
+# Highlight markers, swapped for <mark> after escaping
+_START_SEL = '\x02'
+_STOP_SEL = '\x03'
+
+
+def uses_search_index() -> bool:
+    """Whether the tsvector/GIN index is available (PostgreSQL only)."""
+    return connection.vendor == 'postgresql'
+
+
+def search_text_for(content) -> str:
+    """The searchable copy of a file body."""
+    return (content or '')[:SEARCH_TEXT_LIMIT]
+
+
+def search_files(queryset, query: str, with_snippets: bool = True):
+    """
+    Filter a ProjectFile queryset to files matching `query`.
+
+    Matches on name, file type or body. On PostgreSQL the result is
+    annotated with `search_rank` and (optionally) `search_snippet`; order by
+    `-search_rank` for relevance.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    name_match = Q(name__icontains=query) | Q(file_type__icontains=query)
+
+    if not uses_search_index():
+        return queryset.filter(name_match | Q(search_text__icontains=query))
+
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+    from django.db.models import F
+
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    queryset = queryset.filter(name_match | Q(search_vector=search_query)).annotate(
+        search_rank=SearchRank(F('search_vector'), search_query),
+    )
+    if with_snippets:
+        queryset = queryset.annotate(
+            search_snippet=SearchHeadline(
+                'search_text',
+                search_query,
+                config=SEARCH_CONFIG,
+                start_sel=_START_SEL,
+                stop_sel=_STOP_SEL,
+                max_fragments=2,
+                fragment_delimiter=' … ',
+            ),
+        )
+    return queryset
+
+
+def _render(raw: str) -> str:
+    return html.escape(raw).replace(_START_SEL, '<mark>').replace(_STOP_SEL, '</mark>')
+
+
+def snippet_for(file_obj, query: str) -> str:
+    """
+    Highlighted excerpt of a search hit.
+
+    Uses the database headline when `search_files` annotated one, otherwise
+    cuts a window around the first term found in search_text.
+    """
+    raw = getattr(file_obj, 'search_snippet', None)
+    if raw is not None:
+        return _render(raw) if _START_SEL in raw else ''
+
+    text = file_obj.search_text or ''
+    terms = [re.escape(t) for t in (query or '').split() if t]
+    if not text or not terms:
+        return ''
+    pattern = re.compile('|'.join(terms), re.IGNORECASE)
+    match = pattern.search(text)
+    if not match:
+        return ''
+
+    start = max(0, match.start() - SNIPPET_CHARS // 2)
+    end = min(len(text), start + SNIPPET_CHARS)
+    window = pattern.sub(lambda m: f"{_START_SEL}{m.group(0)}{_STOP_SEL}", text[start:end])
+    window = ' '.join(window.split())
+    return ('… ' if start else '') + _render(window) + (' …' if end < len(text) else '')
+
+
+def file_type_stats(queryset) -> Dict[str, Dict]:
+    """{file_type: {'name', 'count'}} for the types present, in one query."""
+    from projects.models import ProjectFile
+
+    display = dict(ProjectFile.FILE_TYPES)
+    counts = queryset.order_by().values('file_type').annotate(count=Count('id'))
+    return {
+        row['file_type']: {'name': display.get(row['file_type'], row['file_type']), 'count': row['count']}
+        for row in counts
+        if row['count'] > 0
+    }
+
+
+def rebuild_search_text(project_id: int = None, only_missing: bool = True) -> int:
+    """
+    Refill search_text from each file's body (fetching S3 bodies).
+
+    Needed once for files saved before the search index existed. Returns
+    the number of files updated.
+    """
+    from projects.models import ProjectFile
+
+    files = ProjectFile.objects.all()
+    if project_id is not None:
+        files = files.filter(project_id=project_id)
+    if only_missing:
+        files = files.filter(search_text='')
+
+    updated = 0
+    for file_obj in files.iterator():
+        text = search_text_for(file_obj.file_content)
+        if text:
+            ProjectFile.objects.filter(pk=file_obj.pk).update(search_text=text)
+            updated += 1
+    logger.info(f"[FILE_SEARCH] Rebuilt search text for {updated} files")
+    return updated
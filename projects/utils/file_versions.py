@@ -0,0 +1,307 @@
+"""
+ProjectFile Version Storage
+
+Stores ProjectFileVersion rows as periodic full snapshots with compressed
+deltas in between, instead of a full copy of the document per version.
+
+- A snapshot row keeps the text in `content` and has chain_depth 0.
+- A delta row leaves `content` empty. Its `delta` holds a zlib-compressed
+  line diff against the previous version, and its chain_depth is one more
+  than the previous row's.
+- A chain never exceeds MAX_DELTAS deltas, so rebuilding any version reads
+  one snapshot and at most MAX_DELTAS deltas. A delta that would be more
+  than half the size of the text is stored as a snapshot instead.
+- Versions hold the text a save replaced, so the delta for version N+1 is
+  the change saved right after version N. When that change came from the
+  edit engine, `remember_edit_delta()` encodes it from the edit ranges and
+  keeps it in the cache until the next version is written, which then skips
+  rebuilding version N and re-diffing. If it is missing or no longer
+  matches, the delta is computed by diffing as before.
+- `compact_file_versions()` rewrites existing history (including rows from
+  before delta storage) into this layout. It runs as a scheduled task and
+  from the `compact_file_versions` management command.
+
+Usage:
+    from projects.utils.file_versions import compact_file_versions, reconstruct_version
+
+    content = reconstruct_version(file_obj, 12)
+    stats = compact_file_versions(project_id=project.id)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import zlib
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_DELTAS = int(os.getenv('FILE_VERSION_MAX_DELTAS', '10'))
+# Store a snapshot when the delta is not at least this much smaller
+MAX_DELTA_RATIO = 0.5
+EDIT_DELTA_KEY = 'file_version_edit_delta:{}'
+EDIT_DELTA_TTL = 24 * 60 * 60
+
+
+def encode_delta(base: str, target: str) -> bytes:
+    """
+    Compressed line diff turning `base` into `target`.
+
+    The diff is a JSON list of [start, end] ranges copied from base's lines
+    and literal strings inserted in between.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(''.join(target_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode('utf-8'))
+
+
+def encode_edit_delta(edit_result) -> bytes:
+    """
+    `encode_delta(edit_result.original, edit_result.text)`, built from the
+    edit engine's changed regions instead of by diffing.
+    """
+    original, text = edit_result.original, edit_result.text
+    offsets = [0]
+    for line in original.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+
+    ops = []
+    line = 0
+    for old_start, old_end, new_start, new_end in edit_result.hunks():
+        # Regions are whole lines; take the unchanged newline after one along
+        if old_end < len(original):
+            old_end, new_end = old_end + 1, new_end + 1
+        first, last = bisect_left(offsets, old_start), bisect_left(offsets, old_end)
+        if first > line:
+            ops.append([line, first])
+        if new_end > new_start:
+            ops.append(text[new_start:new_end])
+        line = last
+    if line < len(offsets) - 1:
+        ops.append([line, len(offsets) - 1])
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode('utf-8'))
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    """Rebuild the target text of `encode_delta(base, target)`."""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(bytes(delta)).decode('utf-8')):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def plan_storage(previous_content: Optional[str], previous_depth: Optional[int], content: str,
+                 delta: Optional[bytes] = None) -> Tuple[Optional[bytes], int]:
+    """
+    Decide how to store a version following `previous_content`.
+
+    Args:
+        delta: Precomputed delta from the previous version to `content`;
+               previous_content is not needed when it is given
+
+    Returns:
+        (delta, chain_depth) - delta is None for a snapshot
+    """
+    if previous_depth is None or previous_depth + 1 > MAX_DELTAS:
+        return None, 0
+    if delta is None:
+        if previous_content is None:
+            return None, 0
+        delta = encode_delta(previous_content, content)
+    if len(delta) > len(content.encode('utf-8')) * MAX_DELTA_RATIO:
+        return None, 0
+    return delta, previous_depth + 1
+
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def remember_edit_delta(file_id: int, version_number: int, edit_result):
+    """
+    Keep the delta of an edit saved over version `version_number`, whose
+    text is edit_result.original, for the version written after it.
+    """
+    from django.core.cache import cache
+
+    try:
+        cache.set(EDIT_DELTA_KEY.format(file_id), {
+            'version_number': version_number,
+            'content_hash': _content_hash(edit_result.text),
+            'delta': encode_edit_delta(edit_result),
+        }, EDIT_DELTA_TTL)
+    except Exception as e:
+        logger.warning(f"[FILE_VERSIONS] Could not keep edit delta for file {file_id}: {e}")
+
+
+def take_edit_delta(file_id: int, previous_version_number: int, content: str) -> Optional[bytes]:
+    """
+    The remembered delta from version `previous_version_number` to `content`,
+    or None. The entry is dropped either way; it only serves the next version.
+    """
+    from django.core.cache import cache
+
+    key = EDIT_DELTA_KEY.format(file_id)
+    try:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        cache.delete(key)
+    except Exception as e:
+        logger.warning(f"[FILE_VERSIONS] Could not read edit delta for file {file_id}: {e}")
+        return None
+    if entry['version_number'] != previous_version_number or entry['content_hash'] != _content_hash(content):
+        return None
+    return entry['delta']
+
+
+def stored_size(version) -> int:
+    """Bytes a version row occupies for its text."""
+    return len((version.content or '').encode('utf-8')) + len(bytes(version.delta or b''))
+
+
+def reconstruct_version(file_obj, version_number: int) -> Optional[str]:
+    """Full text of one version of a ProjectFile, or None if it doesn't exist."""
+    version = file_obj.versions.filter(version_number=version_number).first()
+    if version is None:
+        return None
+    return reconstruct(version)
+
+
+def reconstruct(version) -> str:
+    """Full text of a ProjectFileVersion row, reading its chain back to the snapshot."""
+    from projects.models import ProjectFileVersion
+
+    if version.delta is None:
+        return version.content or ''
+
+    start = version.version_number - version.chain_depth
+    chain = list(
+        ProjectFileVersion.objects.filter(file_id=version.file_id)
+        .filter(version_number__gte=start, version_number__lte=version.version_number)
+        .order_by('version_number')
+    )
+    if not chain or chain[0].delta is not None or len(chain) != version.chain_depth + 1:
+        # Numbering gap: walk back to the nearest snapshot instead
+        snapshot = (
+            ProjectFileVersion.objects.filter(file_id=version.file_id)
+            .filter(version_number__lt=version.version_number, delta__isnull=True)
+            .order_by('-version_number')
+            .first()
+        )
+        if snapshot is None:
+            raise ValueError(f"No snapshot found for {version}")
+        chain = list(
+            ProjectFileVersion.objects.filter(file_id=version.file_id)
+            .filter(version_number__gte=snapshot.version_number, version_number__lte=version.version_number)
+            .order_by('version_number')
+        )
+
+    content = chain[0].content or ''
+    for row in chain[1:]:
+        content = row.content if row.delta is None else apply_delta(content, row.delta)
+    return content
+
+
+def compact_file(file_obj, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Re-encode one file's history as snapshots plus deltas.
+
+    Returns:
+        {'versions', 'rewritten', 'bytes_before', 'bytes_after'}
+    """
+    from django.db import transaction
+    from projects.models import ProjectFile, ProjectFileVersion
+
+    stats = {'versions': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+    with transaction.atomic():
+        # Same lock create_version takes, so no version is added mid-rewrite
+        ProjectFile.objects.select_for_update().filter(pk=file_obj.pk).first()
+
+        previous_content = None
+        previous_depth = None
+        changed: List = []
+        for version in file_obj.versions.order_by('version_number').iterator():
+            if version.delta is None:
+                content = version.content or ''
+            else:
+                content = apply_delta(previous_content or '', version.delta)
+
+            stats['versions'] += 1
+            stats['bytes_before'] += stored_size(version)
+
+            delta, depth = plan_storage(previous_content, previous_depth, content)
+            new_content = '' if delta is not None else content
+            if (
+                version.chain_depth != depth
+                or (version.delta is None) != (delta is None)
+                or version.content_size != len(content)
+                or (delta is None and version.content != content)
+                or (delta is not None and bytes(version.delta) != delta)
+            ):
+                version.content = new_content
+                version.delta = delta
+                version.chain_depth = depth
+                version.content_size = len(content)
+                changed.append(version)
+
+            stats['bytes_after'] += stored_size(version)
+            previous_content, previous_depth = content, depth
+
+        stats['rewritten'] = len(changed)
+        if changed and not dry_run:
+            ProjectFileVersion.objects.bulk_update(
+                changed, ['content', 'delta', 'chain_depth', 'content_size'], batch_size=200
+            )
+    return stats
+
+
+def compact_file_versions(project_id: int = None, file_id: int = None, min_versions: int = 2,
+                          dry_run: bool = False) -> Dict[str, int]:
+    """
+    Compact the version history of every file (or one project / file).
+
+    Returns:
+        Totals over all files plus 'files' compacted and 'bytes_saved'
+    """
+    from django.db.models import Count
+    from projects.models import ProjectFile
+
+    files = ProjectFile.objects.annotate(version_count=Count('versions')).filter(version_count__gte=min_versions)
+    if project_id is not None:
+        files = files.filter(project_id=project_id)
+    if file_id is not None:
+        files = files.filter(id=file_id)
+
+    totals = {'files': 0, 'versions': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+    for file_obj in files.only('id').iterator():
+        try:
+            stats = compact_file(file_obj, dry_run=dry_run)
+        except Exception as e:
+            logger.error(f"[FILE_VERSIONS] Compaction failed for file {file_obj.id}: {e}", exc_info=True)
+            continue
+        totals['files'] += 1
+        for key, value in stats.items():
+            totals[key] += value
+
+    totals['bytes_saved'] = totals['bytes_before'] - totals['bytes_after']
+    logger.info(
+        f"[FILE_VERSIONS] {'Would compact' if dry_run else 'Compacted'} {totals['files']} files: "
+        f"{totals['rewritten']}/{totals['versions']} versions rewritten, "
+        f"{totals['bytes_before']} -> {totals['bytes_after']} bytes"
+    )
+    return totals
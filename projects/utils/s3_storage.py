@@ -4,11 +4,12 @@ import uuid
 from typing import Optional, Dict, Tuple
 from django.conf import settings
 from django.core.files.base import ContentFile
-import boto3
 from botocore.exceptions import ClientError
-from botocore.config import Config
 import logging
 
+from factory.content_cache import get_content_cache
+from factory.s3_batch import get_s3_batch
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,19 +30,8 @@ class ProjectS3Storage:
             os.makedirs(self.local_base_path, exist_ok=True)
     
     def _get_s3_client(self):
-        """Get a properly configured S3 client."""
-        region = getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-1')
-        return boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=region,
-            config=Config(
-                signature_version='s3v4',
-                region_name=region,
-                s3={'addressing_style': 'virtual'}
-            )
-        )
+        """Get the shared, pooled S3 client."""
+        return get_s3_batch().client
     
     def _generate_file_key(self, project_id: str, file_type: str, file_name: str = None) -> str:
         """
@@ -96,7 +86,7 @@ class ProjectS3Storage:
                 # Save to S3
                 s3_key = f"{self.prefix}/{file_key}"
                 
-                self.s3_client.put_object(
+                response = self.s3_client.put_object(
                     Bucket=self.bucket_name,
                     Key=s3_key,
                     Body=json_content.encode('utf-8'),
@@ -106,6 +96,7 @@ class ProjectS3Storage:
                         'file_type': file_type
                     }
                 )
+                get_content_cache().put(s3_key, json_content, response.get('ETag'))
                 
                 logger.info(f"Saved {file_type} to S3: {s3_key}")
                 return True, file_key, None
@@ -141,12 +132,9 @@ class ProjectS3Storage:
                 # Load from S3
                 s3_key = f"{self.prefix}/{file_key}"
                 
-                response = self.s3_client.get_object(
-                    Bucket=self.bucket_name,
-                    Key=s3_key
-                )
-                
-                json_content = response['Body'].read().decode('utf-8')
+                json_content = get_content_cache().get(self.s3_client, self.bucket_name, s3_key)
+                if json_content is None:
+                    return False, None, f"File not found: {file_key}"
                 data = json.loads(json_content)
                 
                 logger.info(f"Loaded file from S3: {s3_key}")
@@ -189,6 +177,7 @@ class ProjectS3Storage:
                     Bucket=self.bucket_name,
                     Key=s3_key
                 )
+                get_content_cache().invalidate(s3_key)
                 
                 logger.info(f"Deleted file from S3: {s3_key}")
                 return True, None
@@ -243,16 +232,18 @@ class ProjectS3Storage:
             logger.error(f"Failed to get file URL: {str(e)}")
             return None
     
-    def list_project_files(self, project_id: str, file_type: str = None) -> list:
+    def list_project_files(self, project_id: str, file_type: str = None, include_content: bool = False):
         """
         List all files for a project
         
         Args:
             project_id: The project ID
             file_type: Optional filter by file type
+            include_content: Also load every file (S3 objects concurrently)
         
         Returns:
-            List of file keys
+            List of file keys, or with include_content a dict of
+            {file_key: content or None} in key order
         """
         try:
             prefix = project_id
@@ -285,11 +276,30 @@ class ProjectS3Storage:
                                 relative_key = os.path.relpath(full_path, self.local_base_path)
                                 files.append(relative_key.replace('\\', '/'))  # Normalize path separators
             
-            return sorted(files)
+            files = sorted(files)
+            if include_content:
+                return self._load_files(files)
+            return files
             
         except Exception as e:
             logger.error(f"Failed to list project files: {str(e)}")
-            return []
+            return {} if include_content else []
+    
+    def _load_files(self, file_keys: list) -> Dict[str, Optional[str]]:
+        """{file_key: content or None}, fetching uncached S3 objects concurrently."""
+        if self.storage_type != 's3':
+            return {file_key: self.load_file(file_key)[1] for file_key in file_keys}
+        
+        s3_keys = {file_key: f"{self.prefix}/{file_key}" for file_key in file_keys}
+        bodies = get_content_cache().get_many(self.s3_client, self.bucket_name, s3_keys.values())
+        results = {}
+        for file_key, s3_key in s3_keys.items():
+            try:
+                results[file_key] = json.loads(bodies[s3_key]).get('content', '') if bodies.get(s3_key) else None
+            except ValueError as e:
+                logger.error(f"Failed to parse {s3_key}: {e}")
+                results[file_key] = None
+        return results
 
 
 # Singleton instance
@@ -0,0 +1,140 @@
+"""
+Ticket Log Paging
+
+Keyset pagination and a compact wire format for TicketLog rows, shared by
+the ticket logs API and TicketLogsConsumer.
+
+- Pages are id ranges on the (ticket, id) index. `after_id` reads forward
+  (incremental fetches and WebSocket replay). Without it, a page is the
+  newest `limit` rows before `before_id`, returned oldest first so the
+  client can prepend older pages.
+- Long `command` / `output` values are cut to PREVIEW_CHARS in the
+  database query, so a page never loads the full text. A cut entry
+  carries `truncated: [fields]` and `<field>_length`. The client fetches
+  the full entry on demand from `.../logs/<log_id>/`.
+- `compact_payload()` applies the same cut to the dicts broadcast over the
+  ticket_logs_<id> group.
+
+Usage:
+    from projects.utils.ticket_logs import page_ticket_logs, serialize_log
+
+    page = page_ticket_logs(ticket.id, after_id=last_seen_id, limit=200)
+    for entry in page['logs']:
+        ...
+    full = serialize_log(TicketLog.objects.get(id=log_id), full=True)
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from django.db.models.functions import Coalesce, Left, Length
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+PREVIEW_CHARS = int(os.getenv('TICKET_LOG_PREVIEW_CHARS', '4000'))
+TRUNCATED_FIELDS = ('command', 'output')
+
+
+def clamp_limit(value, default: int = PAGE_SIZE) -> int:
+    """Page size from a query parameter, within 1..MAX_PAGE_SIZE."""
+    if value in (None, ''):
+        return default
+    return min(max(int(value), 1), MAX_PAGE_SIZE)
+
+
+def _compact_queryset(queryset):
+    """
+    Defer the long text columns and select their previews and lengths instead.
+
+    NULL columns annotate as length 0, so serialize_log never has to read a
+    deferred field (one extra query per row) to tell a NULL from a preview.
+    """
+    annotations = {}
+    for field in TRUNCATED_FIELDS:
+        annotations[f'{field}_preview'] = Left(field, PREVIEW_CHARS)
+        annotations[f'{field}_length'] = Coalesce(Length(field), 0)
+    return queryset.defer(*TRUNCATED_FIELDS).annotate(**annotations)
+
+
+def serialize_log(log, full: bool = False) -> Dict[str, Any]:
+    """
+    Wire format of one TicketLog.
+
+    Rows from `page_ticket_logs` carry previews; with full=True (or a row
+    loaded normally) the complete text is returned.
+    """
+    data = {
+        'id': log.id,
+        'log_type': log.log_type or 'command',
+        'explanation': log.explanation or '',
+        'exit_code': log.exit_code,
+        'created_at': log.created_at.isoformat() if log.created_at else None,
+    }
+    truncated = []
+    for field in TRUNCATED_FIELDS:
+        length = getattr(log, f'{field}_length', None)
+        if full or length is None:
+            data[field] = getattr(log, field) or ''
+        else:
+            data[field] = getattr(log, f'{field}_preview', None) or ''
+            if length > PREVIEW_CHARS:
+                truncated.append(field)
+                data[f'{field}_length'] = length
+    if truncated:
+        data['truncated'] = truncated
+    return data
+
+
+def compact_payload(log_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Cut a broadcast log dict the same way serialize_log cuts a page row."""
+    if log_data.get('truncated'):
+        return log_data
+    compact = dict(log_data)
+    truncated = []
+    for field in TRUNCATED_FIELDS:
+        value = compact.get(field)
+        if isinstance(value, str) and len(value) > PREVIEW_CHARS:
+            compact[field] = value[:PREVIEW_CHARS]
+            compact[f'{field}_length'] = len(value)
+            truncated.append(field)
+    if truncated:
+        compact['truncated'] = truncated
+    return compact
+
+
+def page_ticket_logs(ticket_id: int, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                     limit: int = PAGE_SIZE) -> Dict[str, Any]:
+    """
+    One keyset page of a ticket's logs, oldest first.
+
+    Returns:
+        {'logs', 'first_id', 'last_id', 'has_more' (rows after this page),
+         'has_earlier' (rows before it)}
+    """
+    from projects.models import TicketLog
+
+    queryset = _compact_queryset(TicketLog.objects.filter(ticket_id=ticket_id))
+
+    if after_id is not None:
+        rows = list(queryset.filter(id__gt=after_id).order_by('id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        has_earlier = after_id > 0
+    else:
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        rows = list(queryset.order_by('-id')[:limit + 1])
+        has_earlier = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_more = before_id is not None
+
+    return {
+        'logs': [serialize_log(row) for row in rows],
+        'first_id': rows[0].id if rows else None,
+        'last_id': rows[-1].id if rows else after_id,
+        'has_more': has_more,
+        'has_earlier': has_earlier,
+    }
@@ -5,6 +5,8 @@ import logging
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+from projects.utils.ticket_logs import compact_payload
+
 logger = logging.getLogger(__name__)
 
 
@@ -69,7 +71,7 @@ def send_ticket_log_notification(ticket_id, log_data):
             group_name,
             {
                 'type': 'ticket_log_created',
-                'log_data': log_data
+                'log_data': compact_payload(log_data)
             }
         )
 
@@ -136,7 +138,7 @@ async def async_send_ticket_log_notification(ticket_id, log_data):
             group_name,
             {
                 'type': 'ticket_log_created',
-                'log_data': log_data
+                'log_data': compact_payload(log_data)
             }
         )
 
@@ -146,6 +148,39 @@ async def async_send_ticket_log_notification(ticket_id, log_data):
         logger.error(f"Error sending WebSocket notification for ticket {ticket_id}: {e}")
 
 
+async def async_send_ticket_logs_notification(ticket_id, logs):
+    """
+    Send several new logs for a ticket as a single group message.
+
+    Used by batched log ingestion so a batch costs one channel-layer
+    fan-out instead of one per row.
+
+    Args:
+        ticket_id: The ID of the ticket
+        logs: List of log dicts (same shape as send_ticket_log_notification)
+    """
+    if not logs:
+        return
+    try:
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            logger.warning("No channel layer configured, cannot send WebSocket notification")
+            return
+
+        await channel_layer.group_send(
+            f'ticket_logs_{ticket_id}',
+            {
+                'type': 'ticket_logs_created',
+                'logs': [compact_payload(log) for log in logs]
+            }
+        )
+
+        logger.info(f"Sent WebSocket notification for {len(logs)} new logs on ticket {ticket_id}")
+
+    except Exception as e:
+        logger.error(f"Error sending WebSocket notification for ticket {ticket_id}: {e}")
+
+
 # Workspace Setup Progress Steps
 WORKSPACE_STEPS = {
     'checking_workspace': {'order': 1, 'label': 'Checking workspace'},
@@ -5224,6 +5224,80 @@ document.addEventListener('DOMContentLoaded', function() {
                     refreshBtn.classList.add('refreshing');
                 }
 
+                // Helper function to escape HTML
+                const escapeHtml = (text) => {
+                    if (!text) return '';
+                    const div = document.createElement('div');
+                    div.textContent = text;
+                    return div.innerHTML;
+                };
+
+                // One command entry; long outputs arrive truncated with a link to the full entry
+                const renderLogSection = (cmd) => {
+                    const timestamp = new Date(cmd.created_at).toLocaleString();
+                    const truncated = cmd.truncated || [];
+                    const fullChars = truncated.reduce((sum, field) => sum + (cmd[`${field}_length`] || 0), 0);
+                    return `
+                        <div class="logs-section" data-log-id="${cmd.id}">
+                            <div class="logs-section-header">
+                                <i class="fas fa-terminal"></i> Command
+                                <span class="log-timestamp" style="margin-left: auto;">${timestamp}</span>
+                            </div>
+                            <div class="logs-section-content">
+                                <div class="log-command">$ ${escapeHtml(cmd.command)}</div>
+                                ${cmd.output ? `<div class="log-output">${escapeHtml(cmd.output)}</div>` : '<div class="log-output" style="color: #666;">(no output)</div>'}
+                                ${truncated.length ? `<button class="logs-expand-truncated" data-log-id="${cmd.id}" style="background: none; border: none; color: #60a5fa; cursor: pointer; font-size: 12px; padding: 4px 0;"><i class="fas fa-ellipsis-h"></i> Show full output (${fullChars.toLocaleString()} chars)</button>` : ''}
+                            </div>
+                        </div>
+                    `;
+                };
+
+                // Oldest log id shown; "Load earlier logs" pages back from it
+                let firstLogId = null;
+
+                content.onclick = (event) => {
+                    const earlierBtn = event.target.closest('.logs-load-earlier');
+                    const expandBtn = event.target.closest('.logs-expand-truncated');
+                    if (earlierBtn && firstLogId) {
+                        earlierBtn.disabled = true;
+                        fetch(`/api/v1/project-tickets/${ticketId}/logs/?before_id=${firstLogId}`)
+                            .then(response => response.json())
+                            .then(page => {
+                                const html = (page.commands || [])
+                                    .filter(cmd => !content.querySelector(`.logs-section[data-log-id="${cmd.id}"]`))
+                                    .map(renderLogSection)
+                                    .join('');
+                                earlierBtn.insertAdjacentHTML('afterend', html);
+                                if (page.first_id) firstLogId = page.first_id;
+                                if (page.has_earlier) {
+                                    earlierBtn.disabled = false;
+                                } else {
+                                    earlierBtn.remove();
+                                }
+                            })
+                            .catch(error => {
+                                console.error('[ArtifactsLoader] Error loading earlier logs:', error);
+                                earlierBtn.disabled = false;
+                            });
+                    } else if (expandBtn) {
+                        const logId = expandBtn.dataset.logId;
+                        expandBtn.disabled = true;
+                        fetch(`/api/v1/project-tickets/${ticketId}/logs/${logId}/`)
+                            .then(response => {
+                                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                                return response.json();
+                            })
+                            .then(fullLog => {
+                                const section = content.querySelector(`.logs-section[data-log-id="${logId}"]`);
+                                if (section) section.outerHTML = renderLogSection(fullLog);
+                            })
+                            .catch(error => {
+                                console.error('[ArtifactsLoader] Error loading full log entry:', error);
+                                expandBtn.disabled = false;
+                            });
+                    }
+                };
+
                 fetch(`/api/v1/project-tickets/${ticketId}/logs/`)
                 .then(response => {
                     if (!response.ok) {
@@ -5266,13 +5340,15 @@ document.addEventListener('DOMContentLoaded', function() {
 
                     let html = '';
 
-                    // Helper function to escape HTML
-                    const escapeHtml = (text) => {
-                        if (!text) return '';
-                        const div = document.createElement('div');
-                        div.textContent = text;
-                        return div.innerHTML;
-                    };
+                    // Newest page of logs; older pages load on demand
+                    firstLogId = data.first_id || null;
+                    if (data.has_earlier) {
+                        html += `
+                            <button class="logs-load-earlier" style="display: block; margin: 0 auto 12px; background: none; border: 1px solid #333; border-radius: 6px; color: #9ca3af; cursor: pointer; font-size: 12px; padding: 6px 12px;">
+                                <i class="fas fa-history"></i> Load earlier logs
+                            </button>
+                        `;
+                    }
 
                     // Show ticket notes if available
                     // if (data.ticket_notes) {
@@ -5287,21 +5363,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     // }
 
                     // Show command history
-                    data.commands.forEach((cmd, index) => {
-                        const timestamp = new Date(cmd.created_at).toLocaleString();
-                        html += `
-                            <div class="logs-section">
-                                <div class="logs-section-header">
-                                    <i class="fas fa-terminal"></i> Command ${index + 1}
-                                    <span class="log-timestamp" style="margin-left: auto;">${timestamp}</span>
-                                </div>
-                                <div class="logs-section-content">
-                                    <div class="log-command">$ ${escapeHtml(cmd.command)}</div>
-                                    ${cmd.output ? `<div class="log-output">${escapeHtml(cmd.output)}</div>` : '<div class="log-output" style="color: #666;">(no output)</div>'}
-                                </div>
-                            </div>
-                        `;
-                    });
+                    html += data.commands.map(renderLogSection).join('');
 
                     content.innerHTML = html;
 
@@ -6138,7 +6200,16 @@ document.addEventListener('DOMContentLoaded', function() {
                             const fileName = document.createElement('div');
                             fileName.className = 'file-name';
                             fileName.textContent = file.name || file.type_display || 'Unnamed File';
-                            
+
+                            // Matching excerpt when searching (server-escaped, matches in <mark>)
+                            if (file.snippet) {
+                                const fileSnippet = document.createElement('div');
+                                fileSnippet.className = 'file-search-snippet';
+                                fileSnippet.style.cssText = 'font-size: 12px; color: #9ca3af; margin-top: 2px; white-space: normal;';
+                                fileSnippet.innerHTML = file.snippet;
+                                fileName.appendChild(fileSnippet);
+                            }
+
                             // Create type cell with badge
                             const fileType = document.createElement('div');
                             fileType.className = 'file-type-cell';
@@ -13,10 +13,22 @@ Usage:
     result = await executor.execute_ticket(ticket_id, project_id, conversation_id)
 """
 import asyncio
+import contextvars
 import logging
+import time
 from typing import Dict, List, Any, Optional
 from concurrent.futures import ThreadPoolExecutor
 
+from asgiref.sync import sync_to_async
+
+from tasks.metrics import (
+    ACTIVE_TICKETS,
+    TICKET_EXECUTION_SECONDS,
+    TICKET_EXECUTIONS_TOTAL,
+    observe_queue_wait,
+)
+from tasks.tracing import span
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,7 +74,8 @@ class AsyncTicketExecutor:
         self,
         ticket_id: int,
         project_id: int,
-        conversation_id: int
+        conversation_id: int,
+        queued_at: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Execute a single ticket with project-level serialization.
@@ -78,19 +91,28 @@ class AsyncTicketExecutor:
             ticket_id: The ticket to execute
             project_id: The project database ID
             conversation_id: The conversation ID for notifications
+            queued_at: ISO timestamp from dispatch, for queue wait metrics
 
         Returns:
             Dict with execution result
         """
-        from tasks.dispatch import update_ticket_queue_status_async, is_ticket_cancelled
+        from tasks.dispatch import update_ticket_queue_status_async
+        from tasks.cancellation import get_cancellation_bus
 
         project_sem = await self.get_project_semaphore(project_id)
 
         async with self.global_semaphore:  # Limit total concurrent
             async with project_sem:  # Only 1 per project at a time
+                # Register a cancel token for the duration of the run. Checkpoints
+                # inside the worker thread read it instead of polling Redis, and
+                # a publish on the cancellation bus interrupts in-flight work.
+                bus = get_cancellation_bus()
+                await sync_to_async(bus.register)(ticket_id)
+
                 # Check for cancellation BEFORE starting execution
                 # This handles the case where ticket was cancelled while waiting for semaphore
                 if await self._check_cancellation_async(ticket_id):
+                    bus.unregister(ticket_id)
                     logger.info(
                         f"[EXECUTOR] Ticket #{ticket_id} was cancelled before execution, skipping"
                     )
@@ -111,10 +133,15 @@ class AsyncTicketExecutor:
                 except Exception as e:
                     logger.warning(f"[EXECUTOR] Failed to update queue status: {e}")
 
+                observe_queue_wait(queued_at)
+                ACTIVE_TICKETS.inc()
+                exec_start = time.monotonic()
+                mode = 'api'
+                result_status = 'error'
+
                 try:
                     # Import here to avoid circular imports
                     from tasks.task_definitions import execute_ticket_implementation, execute_ticket_with_claude_cli
-                    from asgiref.sync import sync_to_async
 
                     # Check if user prefers CLI mode
                     use_cli_mode = await self._should_use_cli_mode(project_id)
@@ -126,24 +153,27 @@ class AsyncTicketExecutor:
                         logger.info(
                             f"[EXECUTOR] Using Claude Code CLI mode for ticket #{ticket_id}"
                         )
-                        result = await loop.run_in_executor(
-                            self._thread_pool,
-                            execute_ticket_with_claude_cli,
-                            ticket_id,
-                            project_id,
-                            conversation_id
-                        )
                         # CLI mode is strict - no fallback to API mode
                         # If CLI fails, the ticket will be marked as blocked/failed
+                        mode = 'cli'
+                        execute_fn = execute_ticket_with_claude_cli
                     else:
+                        execute_fn = execute_ticket_implementation
+
+                    with span('executor.execute_ticket', ticket_id=ticket_id, project_id=project_id, mode=mode):
+                        # run_in_executor does not carry contextvars; copy them so
+                        # spans opened in the worker thread join this trace
+                        ctx = contextvars.copy_context()
                         result = await loop.run_in_executor(
                             self._thread_pool,
-                            execute_ticket_implementation,
+                            ctx.run,
+                            execute_fn,
                             ticket_id,
                             project_id,
                             conversation_id
                         )
 
+                    result_status = result.get('status') or 'unknown'
                     logger.info(
                         f"[EXECUTOR] Completed ticket #{ticket_id}: "
                         f"status={result.get('status')}"
@@ -161,6 +191,12 @@ class AsyncTicketExecutor:
                         'error': str(e)
                     }
                 finally:
+                    ACTIVE_TICKETS.dec()
+                    TICKET_EXECUTION_SECONDS.labels(mode=mode, status=result_status).observe(
+                        time.monotonic() - exec_start
+                    )
+                    TICKET_EXECUTIONS_TOTAL.labels(mode=mode, status=result_status).inc()
+                    bus.unregister(ticket_id)
                     # Update status to not queued
                     try:
                         await update_ticket_queue_status_async(ticket_id, 'none')
@@ -168,11 +204,19 @@ class AsyncTicketExecutor:
                         logger.warning(f"[EXECUTOR] Failed to clear queue status: {e}")
 
     async def _check_cancellation_async(self, ticket_id: int) -> bool:
-        """Check if a ticket has been cancelled (async wrapper)."""
-        from asgiref.sync import sync_to_async
-        from tasks.dispatch import is_ticket_cancelled
+        """
+        Check if a ticket has been cancelled.
 
-        return await sync_to_async(is_ticket_cancelled)(ticket_id)
+        Answered from the ticket's CancelToken when it is registered, so
+        no blocking Redis call runs on the event loop.
+        """
+        from tasks.cancellation import get_cancellation_bus
+        from tasks.dispatch import read_ticket_cancellation_flag
+
+        local = get_cancellation_bus().check_local(ticket_id)
+        if local is not None:
+            return local
+        return await sync_to_async(read_ticket_cancellation_flag)(ticket_id)
 
     async def _should_use_cli_mode(self, project_id: int) -> bool:
         """
@@ -263,7 +307,9 @@ class AsyncTicketExecutor:
         self,
         project_id: int,
         ticket_ids: List[int],
-        conversation_id: int
+        conversation_id: int,
+        queued_at: Optional[str] = None,
+        ticket_queued_at: Optional[Dict[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Execute all tickets for a project sequentially.
@@ -278,6 +324,10 @@ class AsyncTicketExecutor:
             project_id: The project database ID
             ticket_ids: List of ticket IDs to execute in order
             conversation_id: The conversation ID for notifications
+            queued_at: ISO timestamp from dispatch, for queue wait metrics
+            ticket_queued_at: Per-ticket ISO enqueue timestamps keyed by
+                              str(ticket_id); queued_at is the fallback for
+                              batches queued without them
 
         Returns:
             Dict with batch results
@@ -316,7 +366,10 @@ class AsyncTicketExecutor:
                 f"ticket {i+1}/{len(ticket_ids)} (#{ticket_id})"
             )
 
-            result = await self.execute_ticket(ticket_id, project_id, conversation_id)
+            result = await self.execute_ticket(
+                ticket_id, project_id, conversation_id,
+                queued_at=(ticket_queued_at or {}).get(str(ticket_id), queued_at),
+            )
             results.append(result)
 
             if result.get('status') == 'success':
@@ -472,10 +525,13 @@ class AsyncTicketExecutor:
 
     def get_stats(self) -> Dict[str, Any]:
         """Get executor statistics."""
+        from tasks.cancellation import get_cancellation_bus
+
         return {
             'max_concurrent': self.max_concurrent,
             'active_projects': len(self.project_semaphores),
-            'project_ids': list(self.project_semaphores.keys())
+            'project_ids': list(self.project_semaphores.keys()),
+            'cancellation_bus': get_cancellation_bus().get_stats()
         }
 
     async def shutdown(self):
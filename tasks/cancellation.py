@@ -0,0 +1,352 @@
+"""
+Ticket Cancellation Bus.
+
+Push-based cancellation for running tickets. Instead of every checkpoint
+doing a Redis GET on the cancel flag, each process keeps one background
+subscriber on a Redis pub/sub channel and flips an in-memory CancelToken
+for the tickets it is running.
+
+- Cancellers publish the ticket ID (see tasks.dispatch.set_ticket_cancellation_flag)
+- The executor registers a CancelToken for each running ticket
+- Checkpoints read token.cancelled (no network round-trip)
+- In-flight work (SSH channels, SDK exec calls, LLM streams) registers
+  callbacks or awaits the token so it is interrupted immediately
+
+The Redis flag key is still written, so a token registered after the
+publish (or a process whose subscriber is down) falls back to the flag.
+
+Usage:
+    from tasks.cancellation import get_cancellation_bus
+
+    bus = get_cancellation_bus()
+    token = bus.register(ticket_id)
+    try:
+        ...
+        if token.cancelled:
+            return
+        await token.run_or_cancel(asyncio.to_thread(fn, ...))
+    finally:
+        bus.unregister(ticket_id)
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel carrying cancelled ticket IDs
+CANCEL_CHANNEL = "lfg:ticket_cancel_events"
+
+
+class TicketCancelledError(Exception):
+    """Raised when awaited work is interrupted by a ticket cancellation."""
+
+    def __init__(self, ticket_id: int):
+        self.ticket_id = ticket_id
+        super().__init__(f"Ticket #{ticket_id} was cancelled")
+
+
+class CancelToken:
+    """
+    Cancellation scope for a single running ticket.
+
+    Thread-safe: the bus listener thread calls cancel(), while executor
+    threads and event loops read it or wait on it.
+    """
+
+    def __init__(self, ticket_id: int):
+        self.ticket_id = ticket_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """True once the ticket has been cancelled."""
+        return self._event.is_set()
+
+    def cancel(self):
+        """Mark the ticket cancelled and fire registered callbacks once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+
+        logger.info(f"[CANCEL] Ticket #{self.ticket_id} cancelled, interrupting {len(callbacks)} operation(s)")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"[CANCEL] Callback error for ticket #{self.ticket_id}: {e}")
+
+    def reset(self):
+        """Clear the cancelled state (used when the flag is cleared)."""
+        self._event.clear()
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback to run on cancellation.
+
+        If the token is already cancelled the callback runs immediately.
+
+        Returns:
+            A function that unregisters the callback
+        """
+        with self._lock:
+            already_cancelled = self._event.is_set()
+            if not already_cancelled:
+                self._callbacks.append(callback)
+
+        if already_cancelled:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"[CANCEL] Callback error for ticket #{self.ticket_id}: {e}")
+
+        def _remove():
+            with self._lock:
+                try:
+                    self._callbacks.remove(callback)
+                except ValueError:
+                    pass
+
+        return _remove
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until cancelled or timeout.
+
+        Drop-in replacement for time.sleep() in polling loops: returns
+        True as soon as the ticket is cancelled.
+        """
+        return self._event.wait(timeout)
+
+    async def wait_async(self):
+        """Await cancellation from within an event loop."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        remove = self.add_callback(lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            await event.wait()
+        finally:
+            remove()
+
+    async def run_or_cancel(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Await work, abandoning it as soon as the ticket is cancelled.
+
+        Raises:
+            TicketCancelledError: If cancellation fires first
+        """
+        if self.cancelled:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise TicketCancelledError(self.ticket_id)
+
+        work = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(self.wait_async())
+        try:
+            done, _ = await asyncio.wait({work, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if work in done:
+                return work.result()
+            work.cancel()
+            raise TicketCancelledError(self.ticket_id)
+        finally:
+            waiter.cancel()
+
+
+class CancellationBus:
+    """
+    Process-wide registry of CancelTokens fed by a Redis pub/sub subscriber.
+
+    The subscriber runs in a daemon thread and reconnects with backoff.
+    While it is disconnected, lookups fall back to the Redis flag so no
+    cancellation is lost.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[int, CancelToken] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._stopping = threading.Event()
+
+    def _ensure_listener(self):
+        """Start the subscriber thread on first use."""
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._stopping.clear()
+            self._listener = threading.Thread(
+                target=self._listen_forever,
+                name="lfg-cancel-bus",
+                daemon=True,
+            )
+            self._listener.start()
+
+    def _listen_forever(self):
+        """Subscriber loop - dispatch published ticket IDs to tokens."""
+        from tasks.dispatch import get_redis_client
+
+        backoff = 1
+        while not self._stopping.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CANCEL_CHANNEL)
+                self._connected.set()
+                backoff = 1
+                logger.info(f"[CANCEL] Subscribed to {CANCEL_CHANNEL}")
+
+                # Tokens registered while we were disconnected may have
+                # missed a publish - reconcile them against the flag keys.
+                self._reconcile_from_flags()
+
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._handle_message(message.get('data'))
+
+            except Exception as e:
+                logger.warning(f"[CANCEL] Subscriber error, reconnecting in {backoff}s: {e}")
+            finally:
+                self._connected.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+            if self._stopping.wait(backoff):
+                break
+            backoff = min(backoff * 2, 30)
+
+    def _handle_message(self, data):
+        try:
+            ticket_id = int(data)
+        except (TypeError, ValueError):
+            logger.warning(f"[CANCEL] Ignoring malformed cancel event: {data!r}")
+            return
+
+        token = self._tokens.get(ticket_id)
+        if token:
+            token.cancel()
+
+    def _reconcile_from_flags(self):
+        from tasks.dispatch import read_ticket_cancellation_flag
+
+        for ticket_id, token in list(self._tokens.items()):
+            if not token.cancelled and read_ticket_cancellation_flag(ticket_id):
+                token.cancel()
+
+    def register(self, ticket_id: int) -> CancelToken:
+        """
+        Create (or return) the CancelToken for a ticket about to run.
+
+        Checks the Redis flag once so a cancel issued before registration
+        is not missed.
+        """
+        from tasks.dispatch import read_ticket_cancellation_flag
+
+        self._ensure_listener()
+        with self._lock:
+            token = self._tokens.get(ticket_id)
+            if token is None:
+                token = CancelToken(ticket_id)
+                self._tokens[ticket_id] = token
+
+        if read_ticket_cancellation_flag(ticket_id):
+            token.cancel()
+        return token
+
+    def unregister(self, ticket_id: int):
+        """Drop the token for a ticket that finished executing."""
+        with self._lock:
+            self._tokens.pop(ticket_id, None)
+
+    def get_token(self, ticket_id: int) -> Optional[CancelToken]:
+        """Return the token for a ticket running in this process, if any."""
+        return self._tokens.get(ticket_id)
+
+    def check_local(self, ticket_id: int) -> Optional[bool]:
+        """
+        Answer a cancellation check from memory when possible.
+
+        Returns:
+            True/False if this process tracks the ticket and the subscriber
+            is connected, otherwise None (caller should read the flag)
+        """
+        token = self._tokens.get(ticket_id)
+        if token is None:
+            return None
+        if token.cancelled:
+            return True
+        if not self._connected.is_set():
+            return None
+        return False
+
+    def notify_local(self, ticket_id: int):
+        """Cancel a token in this process without waiting for the round-trip."""
+        token = self._tokens.get(ticket_id)
+        if token:
+            token.cancel()
+
+    def reset_local(self, ticket_id: int):
+        """Clear a token's cancelled state in this process."""
+        token = self._tokens.get(ticket_id)
+        if token:
+            token.reset()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get bus statistics."""
+        return {
+            'connected': self._connected.is_set(),
+            'tracked_tickets': len(self._tokens),
+            'cancelled_tickets': [tid for tid, t in self._tokens.items() if t.cancelled],
+        }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the subscriber thread."""
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.join(timeout)
+        self._listener = None
+
+
+# Global bus instance (singleton)
+_bus: Optional[CancellationBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_cancellation_bus() -> CancellationBus:
+    """Get the process-wide cancellation bus."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = CancellationBus()
+    return _bus
+
+
+def get_cancel_token(ticket_id: Optional[int]) -> Optional[CancelToken]:
+    """Convenience lookup returning None for falsy ticket IDs or untracked tickets."""
+    if not ticket_id:
+        return None
+    return get_cancellation_bus().get_token(ticket_id)
+
+
+def sleep_unless_cancelled(seconds: float, ticket_id: Optional[int] = None) -> bool:
+    """
+    Sleep for `seconds`, waking early if the ticket is cancelled.
+
+    Returns:
+        True if the ticket was cancelled during (or before) the sleep
+    """
+    token = get_cancel_token(ticket_id)
+    if token is None:
+        time.sleep(seconds)
+        return False
+    return token.wait(seconds)
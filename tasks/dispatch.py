@@ -23,6 +23,8 @@ from typing import List, Dict, Any, Optional
 from django.conf import settings
 from django.utils import timezone
 
+from tasks.tracing import inject, span
+
 logger = logging.getLogger(__name__)
 
 # Redis keys
@@ -83,24 +85,30 @@ def dispatch_tickets(
     client = get_redis_client()
     task_id = f"batch_{project_id}_{int(timezone.now().timestamp())}"
 
-    task_data = {
-        'project_id': project_id,
-        'ticket_ids': ticket_ids,
-        'conversation_id': conversation_id,
-        'task_id': task_id,
-        'queued_at': timezone.now().isoformat()
-    }
-
     try:
         # Clear any stale cancellation flags for tickets being queued
-        # This prevents "cancelled before execution" when re-queuing after a previous cancel
+        # This prevents "cancelled before execution" when re-queuing after a previous cancel.
+        # Each ticket is stamped as it is enqueued; queue wait is measured per ticket.
+        ticket_queued_at = {}
         for tid in ticket_ids:
             cancel_key = f"{CANCEL_FLAG_PREFIX}{tid}"
             client.delete(cancel_key)
+            ticket_queued_at[tid] = timezone.now()
         logger.info(f"[DISPATCH] Cleared cancellation flags for {len(ticket_ids)} tickets")
 
-        # Push to Redis queue
-        client.rpush(QUEUE_KEY, json.dumps(task_data))
+        task_data = {
+            'project_id': project_id,
+            'ticket_ids': ticket_ids,
+            'conversation_id': conversation_id,
+            'task_id': task_id,
+            'queued_at': ticket_queued_at[ticket_ids[0]].isoformat(),
+            'ticket_queued_at': {str(tid): stamp.isoformat() for tid, stamp in ticket_queued_at.items()},
+        }
+
+        # Push to Redis queue, starting the trace the executor continues
+        with span('dispatch', project_id=project_id, task_id=task_id, tickets=len(ticket_ids)):
+            task_data['traceparent'] = inject()
+            client.rpush(QUEUE_KEY, json.dumps(task_data))
 
         # Update ticket statuses in database
         from projects.models import ProjectTicket
@@ -112,11 +120,21 @@ def dispatch_tickets(
         ).update(status='pending')
 
         # Set queue status for all tickets
-        ProjectTicket.objects.filter(id__in=ticket_ids).update(
-            queue_status='queued',
-            queued_at=timezone.now(),
-            queue_task_id=task_id
-        )
+        for tid, stamp in ticket_queued_at.items():
+            ProjectTicket.objects.filter(id=tid).update(
+                queue_status='queued',
+                queued_at=stamp,
+                queue_task_id=task_id
+            )
+
+        # Start warming workspaces while the batch waits in the queue
+        try:
+            from projects.models import Project
+            from tasks.workspace_pool import get_workspace_pool
+            stack = Project.objects.filter(id=project_id).values_list('stack', flat=True).first()
+            get_workspace_pool().request_refill(project_id, stack or 'custom')
+        except Exception as pool_error:
+            logger.warning(f"[DISPATCH] Failed to request workspace pool refill: {pool_error}")
 
         # Send WebSocket notifications for each ticket
         from projects.websocket_utils import send_ticket_status_notification
@@ -491,10 +509,8 @@ def force_reset_ticket_queue_status(project_id: int, ticket_id: int) -> Dict[str
     try:
         client = get_redis_client()
 
-        # Step 0: Set cancellation flag to signal running executor thread
-        cancel_key = f"{CANCEL_FLAG_PREFIX}{ticket_id}"
-        client.setex(cancel_key, 3600, "1")  # 1 hour TTL
-        result['cancellation_flag_set'] = True
+        # Step 0: Set cancellation flag and publish to signal running executor thread
+        result['cancellation_flag_set'] = set_ticket_cancellation_flag(ticket_id)
         logger.info(f"[DISPATCH] Set cancellation flag for ticket #{ticket_id}")
 
         # Step 1: Try to remove from Redis queue if present
@@ -560,8 +576,9 @@ def set_ticket_cancellation_flag(ticket_id: int, ttl: int = 3600) -> bool:
     """
     Set a cancellation flag for a ticket.
 
-    This flag can be checked by running executor threads to stop execution early.
-    The flag expires after TTL seconds to prevent stale flags.
+    The flag is also published on the cancellation bus so running executor
+    threads are interrupted immediately. The flag expires after TTL seconds
+    to prevent stale flags.
 
     Args:
         ticket_id: The ticket ID to cancel
@@ -570,10 +587,18 @@ def set_ticket_cancellation_flag(ticket_id: int, ttl: int = 3600) -> bool:
     Returns:
         True if flag was set successfully
     """
+    from tasks.cancellation import CANCEL_CHANNEL, get_cancellation_bus
+
+    # Interrupt work running in this process right away
+    get_cancellation_bus().notify_local(ticket_id)
+
     try:
         client = get_redis_client()
         key = f"{CANCEL_FLAG_PREFIX}{ticket_id}"
-        client.setex(key, ttl, "1")
+        pipe = client.pipeline()
+        pipe.setex(key, ttl, "1")
+        pipe.publish(CANCEL_CHANNEL, str(ticket_id))
+        pipe.execute()
         logger.info(f"[DISPATCH] Set cancellation flag for ticket #{ticket_id}")
         return True
     except Exception as e:
@@ -585,8 +610,8 @@ def is_ticket_cancelled(ticket_id: int) -> bool:
     """
     Check if a ticket has been cancelled.
 
-    This should be called periodically by executor threads to check
-    if they should stop execution.
+    Tickets running in this process are answered from their CancelToken
+    without a Redis round-trip; anything else reads the flag.
 
     Args:
         ticket_id: The ticket ID to check
@@ -594,6 +619,24 @@ def is_ticket_cancelled(ticket_id: int) -> bool:
     Returns:
         True if ticket has been cancelled
     """
+    from tasks.cancellation import get_cancellation_bus
+
+    local = get_cancellation_bus().check_local(ticket_id)
+    if local is not None:
+        return local
+    return read_ticket_cancellation_flag(ticket_id)
+
+
+def read_ticket_cancellation_flag(ticket_id: int) -> bool:
+    """
+    Read a ticket's cancellation flag directly from Redis.
+
+    Args:
+        ticket_id: The ticket ID to check
+
+    Returns:
+        True if the flag is set
+    """
     try:
         client = get_redis_client()
         key = f"{CANCEL_FLAG_PREFIX}{ticket_id}"
@@ -615,6 +658,10 @@ def clear_ticket_cancellation_flag(ticket_id: int) -> bool:
     Returns:
         True if flag was cleared
     """
+    from tasks.cancellation import get_cancellation_bus
+
+    get_cancellation_bus().reset_local(ticket_id)
+
     try:
         client = get_redis_client()
         key = f"{CANCEL_FLAG_PREFIX}{ticket_id}"
@@ -22,6 +22,16 @@ import os
 from typing import Optional, Set
 from datetime import datetime
 
+from tasks.metrics import (
+    ACTIVE_TASKS,
+    CONTENT_TYPE_LATEST,
+    LOCK_CONTENTION_TOTAL,
+    REGISTRY,
+    collect_queue_metrics,
+    render_metrics,
+)
+from tasks.tracing import extract, span
+
 logger = logging.getLogger(__name__)
 
 # Redis queue and lock keys
@@ -39,14 +49,16 @@ class ExecutorService:
     - Graceful shutdown on SIGTERM/SIGINT
     - Automatic reconnection on Redis failures
     - Concurrent task processing with back-pressure
+    - Prometheus metrics endpoint (when metrics_port is set)
     """
 
-    def __init__(self, max_concurrent_tasks: int = 50):
+    def __init__(self, max_concurrent_tasks: int = 50, metrics_port: Optional[int] = None):
         """
         Initialize the executor service.
 
         Args:
             max_concurrent_tasks: Max tasks processing simultaneously
+            metrics_port: Port for the /metrics HTTP listener (None disables it)
         """
         self.redis = None
         self.executor = None
@@ -54,6 +66,8 @@ class ExecutorService:
         self.max_concurrent_tasks = max_concurrent_tasks
         self._active_tasks: Set[asyncio.Task] = set()
         self._task_semaphore = asyncio.Semaphore(max_concurrent_tasks)
+        self.metrics_port = metrics_port
+        self._metrics_server = None
 
         logger.info(
             f"[SERVICE] Initialized with max_concurrent_tasks={max_concurrent_tasks}"
@@ -164,17 +178,22 @@ class ExecutorService:
             logger.warning(
                 f"[SERVICE] Project {project_id} locked, requeueing task"
             )
+            LOCK_CONTENTION_TOTAL.inc()
             await self.redis.rpush(QUEUE_KEY, json.dumps(task_data))
             await asyncio.sleep(5)  # Wait before retry
             return
 
         try:
-            # Execute the batch
-            result = await self.executor.execute_project_batch(
-                project_id,
-                ticket_ids,
-                conversation_id
-            )
+            # Execute the batch, continuing the trace started at dispatch
+            with extract(task_data.get('traceparent')):
+                with span('executor.process_task', project_id=project_id, tickets=len(ticket_ids)):
+                    result = await self.executor.execute_project_batch(
+                        project_id,
+                        ticket_ids,
+                        conversation_id,
+                        queued_at=task_data.get('queued_at'),
+                        ticket_queued_at=task_data.get('ticket_queued_at'),
+                    )
 
             # Log result
             completed = result.get('completed', 0)
@@ -199,10 +218,52 @@ class ExecutorService:
         """Wrapper to handle task completion and semaphore release."""
         try:
             async with self._task_semaphore:
-                await self.process_task(task_data)
+                ACTIVE_TASKS.inc()
+                try:
+                    await self.process_task(task_data)
+                finally:
+                    ACTIVE_TASKS.dec()
         except Exception as e:
             logger.error(f"[SERVICE] Task wrapper error: {e}", exc_info=True)
 
+    async def start_metrics_server(self):
+        """Serve Prometheus metrics on metrics_port (GET /metrics)."""
+        if not self.metrics_port:
+            return
+
+        REGISTRY.add_collector(collect_queue_metrics)
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+                # Drain headers
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), timeout=5)
+                    if not line or line in (b'\r\n', b'\n'):
+                        break
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                    # Queue collectors hit Redis synchronously; keep them off the loop
+                    body = (await asyncio.to_thread(render_metrics)).encode('utf-8')
+                    status, content_type = '200 OK', CONTENT_TYPE_LATEST
+                else:
+                    body, status, content_type = b'Not Found\n', '404 Not Found', 'text/plain'
+
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1')
+                    + body
+                )
+                await writer.drain()
+            except Exception as e:
+                logger.debug(f"[SERVICE] Metrics request error: {e}")
+            finally:
+                writer.close()
+
+        self._metrics_server = await asyncio.start_server(handle, host='0.0.0.0', port=self.metrics_port)
+        logger.info(f"[SERVICE] Metrics listening on :{self.metrics_port}/metrics")
+
     async def run(self):
         """
         Main service loop - consume tasks from Redis queue.
@@ -210,6 +271,7 @@ class ExecutorService:
         Runs until shutdown is requested via SIGTERM/SIGINT.
         """
         await self.connect()
+        await self.start_metrics_server()
 
         logger.info("[SERVICE] Executor service started, waiting for tasks...")
         logger.info(f"[SERVICE] Queue key: {QUEUE_KEY}")
@@ -289,6 +351,10 @@ class ExecutorService:
                 for task in self._active_tasks:
                     task.cancel()
 
+        if self._metrics_server:
+            self._metrics_server.close()
+            await self._metrics_server.wait_closed()
+
         # Close Redis connection
         if self.redis:
             await self.redis.close()
@@ -313,7 +379,10 @@ async def main():
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LFG.settings')
     django.setup()
 
-    service = ExecutorService()
+    from django.conf import settings
+    metrics_port = getattr(settings, 'ASYNC_EXECUTOR', {}).get('metrics_port')
+
+    service = ExecutorService(metrics_port=metrics_port)
 
     # Setup signal handlers for graceful shutdown
     loop = asyncio.get_event_loop()
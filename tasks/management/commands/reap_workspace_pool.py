@@ -0,0 +1,53 @@
+"""
+Django management command to evict idle warm workspaces from the pool.
+
+Stops every pooled workspace that sat unused for longer than
+WORKSPACE_POOL['idle_ttl'], across all (project, stack) pools.
+
+Usage:
+    python manage.py reap_workspace_pool
+
+Options:
+    --schedule: Register the reaper with django_q instead (every --minutes)
+    --minutes: Minutes between scheduled runs (default: 5)
+
+Examples:
+    # Once per deployment: reap idle workspaces every 5 minutes
+    python manage.py reap_workspace_pool --schedule
+"""
+from django.core.management.base import BaseCommand
+
+SCHEDULE_NAME = 'reap_idle_pool_workspaces'
+
+
+class Command(BaseCommand):
+    help = 'Stop warm pool workspaces that exceeded their idle TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true', help='Schedule the reaper with django_q')
+        parser.add_argument('--minutes', type=int, default=5, help='Minutes between scheduled runs')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            from django_q.models import Schedule
+            from tasks.task_manager import TaskManager
+
+            existing = Schedule.objects.filter(name=SCHEDULE_NAME).first()
+            if existing:
+                self.stdout.write(f"Reaper already scheduled (schedule {existing.id})")
+                return
+            schedule_id = TaskManager.schedule_task(
+                'tasks.task_definitions.reap_idle_pool_workspaces',
+                Schedule.MINUTES,
+                name=SCHEDULE_NAME,
+                minutes=options['minutes'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Scheduled pool reaping every {options['minutes']} minutes (schedule {schedule_id})"
+            ))
+            return
+
+        from tasks.workspace_pool import get_workspace_pool
+
+        removed = get_workspace_pool().reap_all()
+        self.stdout.write(self.style.SUCCESS(f"Reaped {removed} idle workspace(s)"))
@@ -6,6 +6,7 @@ Usage:
 
 Options:
     --max-concurrent: Maximum concurrent tasks (default: 50)
+    --metrics-port: Serve Prometheus metrics on this port
 
 Examples:
     # Start with default settings
@@ -29,10 +30,19 @@ class Command(BaseCommand):
             default=50,
             help='Maximum concurrent tasks (default: 50)'
         )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=None,
+            help='Port for the Prometheus /metrics endpoint (default: ASYNC_EXECUTOR["metrics_port"])'
+        )
 
     def handle(self, *args, **options):
         max_concurrent = options['max_concurrent']
 
+        from django.conf import settings
+        metrics_port = options['metrics_port'] or getattr(settings, 'ASYNC_EXECUTOR', {}).get('metrics_port')
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Starting async executor service (max_concurrent={max_concurrent})...'
@@ -49,7 +59,7 @@ class Command(BaseCommand):
         import signal
 
         async def run_service():
-            service = ExecutorService(max_concurrent_tasks=max_concurrent)
+            service = ExecutorService(max_concurrent_tasks=max_concurrent, metrics_port=metrics_port)
 
             # Setup signal handlers
             loop = asyncio.get_event_loop()
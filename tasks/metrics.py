@@ -0,0 +1,357 @@
+"""
+Executor Metrics.
+
+Minimal in-process metrics registry rendered in the Prometheus text
+exposition format (no prometheus_client dependency).
+
+Exposed by:
+- ExecutorService: its own HTTP listener (EXECUTOR_METRICS_PORT)
+- Django: /api/tasks/metrics/ (queue metrics read from Redis + this process)
+
+Usage:
+    from tasks.metrics import TICKET_PHASE_SECONDS, track_phase
+
+    with track_phase('workspace_setup', ticket_id=ticket.id):
+        ...
+
+    TICKET_EXECUTIONS_TOTAL.labels(status='success').inc()
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Buckets sized for ticket work: seconds to tens of minutes
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Base class for a metric family with optional labels."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+
+    def labels(self, **labels):
+        """Return the child series for the given label values."""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._new_child()
+                self._children[key] = child
+            return child
+
+    def clear(self):
+        """Drop all child series (used for gauges recomputed at scrape time)."""
+        with self._lock:
+            self._children.clear()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            if not self.labelnames and () not in self._children:
+                self._children[()] = self._new_child()
+            return list(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+        ]
+        for key, child in self._series():
+            lines.extend(child.render_samples(self.name, self.labelnames, key))
+        return lines
+
+    # Unlabelled metrics proxy straight to their single child
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def render_samples(self, name, labelnames, key):
+        return [f'{name}{_format_labels(labelnames, key)} {_format_value(self._value)}']
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._upper_bounds = list(buckets) + [math.inf]
+        self._counts = [0] * len(self._upper_bounds)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            for i, bound in enumerate(self._upper_bounds):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    def render_samples(self, name, labelnames, key):
+        lines = []
+        with self._lock:
+            cumulative = 0
+            for bound, count in zip(self._upper_bounds, self._counts):
+                cumulative += count
+                le = (('le', _format_value(float(bound))),)
+                lines.append(f'{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labelnames, key)} {_format_value(self._sum)}')
+            lines.append(f'{name}_count{_format_labels(labelnames, key)} {cumulative}')
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+
+class MetricsRegistry:
+    """Holds metric families and scrape-time collectors."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callable that refreshes gauges right before rendering."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"[METRICS] Collector {getattr(collector, '__name__', collector)} failed: {e}")
+
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Prometheus text exposition content type
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# ============================================================================
+# Metric definitions
+# ============================================================================
+
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'lfg_executor_queue_depth',
+    'Tickets waiting in the execution queue, per project.',
+    ['project_id'],
+))
+QUEUE_BATCHES = REGISTRY.register(Gauge(
+    'lfg_executor_queue_batches',
+    'Batches waiting in the execution queue.',
+))
+EXECUTING_PROJECTS = REGISTRY.register(Gauge(
+    'lfg_executor_executing_projects',
+    'Projects holding an execution lock.',
+))
+TICKET_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'lfg_ticket_queue_wait_seconds',
+    'Time from enqueue (dispatch_tickets) to execution start.',
+))
+TICKET_PHASE_SECONDS = REGISTRY.register(Histogram(
+    'lfg_ticket_phase_duration_seconds',
+    'Duration of ticket execution phases.',
+    ['phase', 'mode'],
+))
+TICKET_EXECUTION_SECONDS = REGISTRY.register(Histogram(
+    'lfg_ticket_execution_seconds',
+    'End-to-end ticket execution time inside the executor.',
+    ['mode', 'status'],
+))
+TICKET_EXECUTIONS_TOTAL = REGISTRY.register(Counter(
+    'lfg_ticket_executions_total',
+    'Finished ticket executions by result status.',
+    ['mode', 'status'],
+))
+LOCK_CONTENTION_TOTAL = REGISTRY.register(Counter(
+    'lfg_executor_lock_contention_total',
+    'Times a batch was requeued because its project lock was held.',
+))
+ACTIVE_TASKS = REGISTRY.register(Gauge(
+    'lfg_executor_active_tasks',
+    'Batches currently being processed by the executor service.',
+))
+ACTIVE_TICKETS = REGISTRY.register(Gauge(
+    'lfg_executor_active_tickets',
+    'Tickets currently running in executor worker threads.',
+))
+ACTIVE_THREADS = REGISTRY.register(Gauge(
+    'lfg_executor_threads',
+    'Live Python threads in the process.',
+))
+WORKSPACE_START_SECONDS = REGISTRY.register(Histogram(
+    'lfg_workspace_start_seconds',
+    'Time until a ticket workspace is ready (provisioning + git setup).',
+    ['start', 'mode'],
+))
+SPAN_SECONDS = REGISTRY.register(Histogram(
+    'lfg_trace_span_duration_seconds',
+    'Duration of traced spans.',
+    ['span', 'status'],
+))
+
+
+def _collect_threads():
+    ACTIVE_THREADS.set(threading.active_count())
+
+
+REGISTRY.add_collector(_collect_threads)
+
+
+def collect_queue_metrics():
+    """Refresh queue gauges from Redis (per-project depth and lock count)."""
+    from tasks.dispatch import get_queue_contents, get_executing_projects
+
+    contents = get_queue_contents()
+    depth: Dict[int, int] = {}
+    for task in contents:
+        project_id = task.get('project_id')
+        depth[project_id] = depth.get(project_id, 0) + len(task.get('ticket_ids', []))
+
+    QUEUE_DEPTH.clear()
+    for project_id, count in depth.items():
+        QUEUE_DEPTH.labels(project_id=project_id).set(count)
+    QUEUE_BATCHES.set(len(contents))
+    EXECUTING_PROJECTS.set(len(get_executing_projects()))
+
+
+def observe_queue_wait(queued_at: Optional[str]):
+    """Record enqueue->start wait from an ISO timestamp written at dispatch."""
+    if not queued_at:
+        return
+    try:
+        from datetime import datetime, timezone as dt_timezone
+
+        queued = datetime.fromisoformat(queued_at)
+        if queued.tzinfo is None:
+            queued = queued.replace(tzinfo=dt_timezone.utc)
+        wait = (datetime.now(dt_timezone.utc) - queued).total_seconds()
+        TICKET_WAIT_SECONDS.observe(max(wait, 0.0))
+    except (TypeError, ValueError) as e:
+        logger.debug(f"[METRICS] Could not parse queued_at={queued_at!r}: {e}")
+
+
+@contextmanager
+def track_phase(phase: str, mode: str = 'api', **attributes):
+    """
+    Time a ticket execution phase as both a histogram sample and a span.
+
+    Phases: workspace_setup, git_setup, context_sync, agent_run, commit_push
+    """
+    from tasks.tracing import span
+
+    start = time.monotonic()
+    try:
+        with span(f'ticket.{phase}', mode=mode, **attributes):
+            yield
+    finally:
+        TICKET_PHASE_SECONDS.labels(phase=phase, mode=mode).observe(time.monotonic() - start)
+
+
+def render_metrics() -> str:
+    """Render this process's registry in Prometheus text format."""
+    return REGISTRY.render()
@@ -65,7 +65,7 @@ from django.db import transaction
 from django.utils import timezone
 from asgiref.sync import sync_to_async, async_to_sync
 
-from projects.models import ProjectTicket, Project, TicketLog
+from projects.models import ProjectTicket, Project, TicketExecutionRun, TicketLog
 from factory.ai_providers import get_ai_response
 from factory.ai_functions import _slugify_project_name
 from factory.mags import (
@@ -76,7 +76,8 @@ from factory.mags import (
 from factory.prompts.builder_prompt import get_system_builder_mode
 from factory.ai_tools import tools_builder
 from factory.stack_configs import get_stack_config, get_bootstrap_script, get_gitignore_content
-from development.models import Sandbox
+from factory.workspace_sync import WorkspaceFile, sync_files
+from tasks.metrics import track_phase
 import time
 
 # Context variables to store execution context
@@ -133,6 +134,26 @@ def broadcast_ticket_status_change(ticket_id: int, status: str, queue_status: st
         logger.error(f"Failed to broadcast ticket status change: {exc}")
 
 
+def start_execution_run(ticket, executor: str, started_at=None) -> Optional[TicketExecutionRun]:
+    """Open the TicketExecutionRun row for an execution attempt (None if it could not be written)."""
+    try:
+        return TicketExecutionRun.start(ticket, executor=executor, started_at=started_at)
+    except Exception as exc:
+        logger.error(f"Failed to record execution run for ticket #{ticket.id}: {exc}")
+        return None
+
+
+def finish_execution_run(execution_run: Optional[TicketExecutionRun], status: str, note: str,
+                         duration_seconds: float = None, error: str = '') -> None:
+    """Close an execution run with its outcome; the note is the entry appended to ticket.notes."""
+    if execution_run is None:
+        return
+    try:
+        execution_run.finish(status, duration_seconds=duration_seconds, error=error, summary=note)
+    except Exception as exc:
+        logger.error(f"Failed to finish execution run {execution_run.run_id}: {exc}")
+
+
 def simple_test_task_for_debugging(message: str, delay: int = 1) -> dict:
     """
     A simple test task to verify Django-Q functionality without complex operations.
@@ -168,6 +189,38 @@ def simple_test_task_for_debugging(message: str, delay: int = 1) -> dict:
         }
 
 
+def compact_project_file_versions(project_id: int = None) -> Dict[str, Any]:
+    """
+    Re-encode ProjectFile version history as snapshots plus compressed deltas.
+
+    Scheduled daily (`python manage.py compact_file_versions --schedule`).
+    """
+    from projects.utils.file_versions import compact_file_versions
+
+    try:
+        stats = compact_file_versions(project_id=project_id)
+        return {'status': 'success', **stats}
+    except Exception as e:
+        logger.error(f"File version compaction failed: {str(e)}", exc_info=True)
+        return {'status': 'error', 'error': str(e)}
+
+
+def reap_idle_pool_workspaces() -> Dict[str, Any]:
+    """
+    Stop warm pool workspaces that sat unused longer than the pool's idle_ttl.
+
+    Scheduled every few minutes (`python manage.py reap_workspace_pool --schedule`).
+    """
+    from tasks.workspace_pool import get_workspace_pool
+
+    try:
+        removed = get_workspace_pool().reap_all()
+        return {'status': 'success', 'removed': removed}
+    except Exception as e:
+        logger.error(f"Workspace pool reaping failed: {str(e)}", exc_info=True)
+        return {'status': 'error', 'error': str(e)}
+
+
 def safe_execute_ticket_implementation(ticket_id: int, project_id: int, conversation_id: int) -> Dict[str, Any]:
     """
     A safer version of execute_ticket_implementation that reduces complexity to prevent timer issues.
@@ -626,65 +679,73 @@ ls -la {MAGS_WORKING_DIR}/{project_dir}/ 2>/dev/null && echo "SCAFFOLD_OK" || ec
         # No scaffold — create empty directory (current behavior)
         run_command(workspace_id=job_id, command=f"mkdir -p {MAGS_WORKING_DIR}/{project_dir}", timeout=10)
 
-    commands = [
-        # Create .gitignore file with stack-specific content
-        f"cat > {MAGS_WORKING_DIR}/{project_dir}/.gitignore << 'GITIGNORE_EOF'\n{gitignore_content}\nGITIGNORE_EOF",
-    ]
-
+    # .gitignore (and README) go in as one archive instead of heredoc commands
+    repo_files = [WorkspaceFile('.gitignore', f"{gitignore_content}\n")]
     # Only create README.md if we didn't scaffold (scaffold likely has its own)
     if not scaffolded:
-        commands.append(f"cat > {MAGS_WORKING_DIR}/{project_dir}/README.md << 'README_EOF'\n{readme_content}\nREADME_EOF")
+        repo_files.append(WorkspaceFile('README.md', f"{readme_content}\n"))
 
-    commands += [
+    remote_url = f"https://{token}@github.com/{owner}/{repo_name}.git"
+    # (label, command) pairs run as one script; each step prints a marker so a
+    # failure can be attributed without a round trip per git command
+    steps = [
         # Initialize new git repo
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git init -b main",
+        ("git init", "git init -b main"),
         # Configure git user with actual GitHub account info
-        f'cd {MAGS_WORKING_DIR}/{project_dir} && git config user.email "{git_email}"',
-        f'cd {MAGS_WORKING_DIR}/{project_dir} && git config user.name "{git_name}"',
-        # Add all files
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git add -A",
-        # Create initial commit
-        f'cd {MAGS_WORKING_DIR}/{project_dir} && git commit -m "Initial commit: {stack_name} project initialized by LFG"',
+        ("git config", f'git config user.email "{git_email}" && git config user.name "{git_name}"'),
+        # Add all files and create initial commit
+        ("git add", "git add -A"),
+        ("git commit", f'git commit -m "Initial commit: {stack_name} project initialized by LFG"'),
         # Add remote origin (allow to fail if remote already exists)
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && (git remote add origin https://{token}@github.com/{owner}/{repo_name}.git || git remote set-url origin https://{token}@github.com/{owner}/{repo_name}.git)",
+        ("git remote", f"git remote add origin {remote_url} || git remote set-url origin {remote_url}"),
         # Push main branch to GitHub
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git push -u origin main",
-        # Create lfg-agent branch from main
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git checkout -b lfg-agent",
-        # Push lfg-agent branch to GitHub
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git push -u origin lfg-agent",
-        # Create and checkout feature branch from lfg-agent
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git checkout -b {escaped_branch}",
-        # Push feature branch to GitHub
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git push -u origin {escaped_branch}",
-        # Verify current branch
-        f"cd {MAGS_WORKING_DIR}/{project_dir} && git branch --show-current"
+        ("push main", "git push -u origin main"),
+        # Create lfg-agent branch from main and push it
+        ("create lfg-agent", "git checkout -b lfg-agent"),
+        ("push lfg-agent", "git push -u origin lfg-agent"),
+        # Create and checkout feature branch from lfg-agent, then push it
+        ("create feature branch", f"git checkout -b {escaped_branch}"),
+        ("push feature branch", f"git push -u origin {escaped_branch}"),
     ]
+    script_lines = [f"cd {MAGS_WORKING_DIR}/{project_dir} || exit 1"]
+    for i, (label, cmd) in enumerate(steps):
+        script_lines.append(f"echo '__REPO_INIT_STEP__ {i}'")
+        script_lines.append(f"{cmd} || exit $?")
+    # Verify current branch
+    script_lines.append("echo \"__REPO_INIT_BRANCH__ $(git branch --show-current)\"")
 
     try:
-        current_branch = None
-        for i, cmd in enumerate(commands):
-            result = run_command(job_id, cmd, timeout=120)
-            logger.info(f"[Repo Init {i+1}/{len(commands)}] {cmd[:100]}...")
-
-            stdout = result.get('stdout', '').strip()
-            stderr = result.get('stderr', '').strip()
-            exit_code = result.get('exit_code', 0)
+        sync_result = sync_files(job_id, repo_files, base_dir=f"{MAGS_WORKING_DIR}/{project_dir}")
+        if sync_result.get('status') != 'success':
+            return {'status': 'error', 'message': f"Repository initialization failed: {sync_result.get('message')}"}
 
-            if stdout:
-                logger.info(f"  stdout: {stdout}")
-            if stderr and exit_code != 0:
-                logger.warning(f"  stderr: {stderr}")
+        result = run_command(job_id, "\n".join(script_lines), timeout=120 + 60 * len(steps))
+        stdout = result.get('stdout', '').strip()
+        stderr = result.get('stderr', '').strip()
+        exit_code = result.get('exit_code', 0)
 
-            # Capture the current branch from the last line of stdout
-            if 'git branch --show-current' in cmd and stdout:
-                current_branch = stdout.strip().split('\n')[-1]
+        current_branch = None
+        last_step = None
+        output_lines = []
+        for line in stdout.split('\n'):
+            if line.startswith('__REPO_INIT_STEP__ '):
+                last_step = int(line.split()[1])
+                logger.info(f"[Repo Init {last_step + 1}/{len(steps)}] {steps[last_step][0]}")
+            elif line.startswith('__REPO_INIT_BRANCH__'):
+                current_branch = line[len('__REPO_INIT_BRANCH__'):].strip()
                 logger.info(f"  ✓ Current branch: {current_branch}")
-
-            if exit_code != 0:
-                error_msg = stderr or stdout or f"Command failed with exit code {exit_code}"
-                logger.error(f"  ✗ Git command failed: {error_msg}")
-                return {'status': 'error', 'message': f'Repository initialization failed: {error_msg}'}
+            else:
+                output_lines.append(line)
+        if output_lines:
+            logger.info(f"  stdout: {chr(10).join(output_lines)[-2000:]}")
+        if stderr and exit_code != 0:
+            logger.warning(f"  stderr: {stderr}")
+
+        if exit_code != 0:
+            failed = steps[last_step][0] if last_step is not None else 'setup'
+            error_msg = stderr or '\n'.join(output_lines).strip() or f"Command failed with exit code {exit_code}"
+            logger.error(f"  ✗ Git command failed ({failed}): {error_msg}")
+            return {'status': 'error', 'message': f'Repository initialization failed at {failed}: {error_msg}'}
 
         if current_branch != branch_name:
             logger.warning(f"Branch mismatch: expected {branch_name}, got {current_branch}")
@@ -1728,6 +1789,69 @@ def ensure_workspace_available(ticket_id: int) -> Dict[str, Any]:
         }
 
 
+def claim_warm_workspace(project: 'Project', stack: str, github_owner: str = None, github_repo: str = None) -> Optional[Dict[str, Any]]:
+    """
+    Take a pre-warmed workspace from the pool for this project/stack.
+
+    Entries cloned from a different repo (e.g. the repo was recreated since
+    warming) are stopped and treated as a miss.
+
+    Returns:
+        Pool entry dict, or None for a cold start
+    """
+    from tasks.workspace_pool import get_workspace_pool
+
+    pool = get_workspace_pool()
+    try:
+        entry = pool.claim(project, stack or 'custom')
+    except Exception as e:
+        logger.warning(f"[WORKSPACE POOL] Claim failed, falling back to cold start: {e}")
+        return None
+
+    if entry and github_owner and (entry.get('github_owner'), entry.get('github_repo')) != (github_owner, github_repo):
+        logger.info(
+            f"[WORKSPACE POOL] Warm workspace {entry['workspace_id']} was cloned from "
+            f"{entry.get('github_owner')}/{entry.get('github_repo')}, expected {github_owner}/{github_repo}; discarding"
+        )
+        pool.release(entry)
+        return None
+    return entry
+
+
+def record_workspace_start(ticket_id: int, workspace_id: str, start: str, seconds: float, mode: str = 'api') -> None:
+    """
+    Record workspace start latency as a ticket log and a metric.
+
+    Args:
+        start: 'cold' (new workspace), 'warm' (from the pool) or 'reuse' (ticket's previous workspace)
+    """
+    from tasks.metrics import WORKSPACE_START_SECONDS
+    from projects.websocket_utils import async_send_ticket_log_notification
+
+    WORKSPACE_START_SECONDS.labels(start=start, mode=mode).observe(seconds)
+    message = f"Workspace ready in {seconds:.1f}s ({start} start)"
+    logger.info(f"[WORKSPACE POOL] Ticket #{ticket_id}: {message} [{workspace_id}]")
+
+    try:
+        log_entry = TicketLog.objects.create(
+            ticket_id=ticket_id,
+            log_type='command',
+            command='Workspace',
+            explanation=message,
+            output=f"{message}\nWorkspace: {workspace_id}",
+        )
+        async_to_sync(async_send_ticket_log_notification)(ticket_id, {
+            'id': log_entry.id,
+            'log_type': log_entry.log_type,
+            'command': log_entry.command,
+            'explanation': log_entry.explanation or '',
+            'output': log_entry.output,
+            'created_at': log_entry.created_at.isoformat()
+        })
+    except Exception as e:
+        logger.warning(f"[WORKSPACE POOL] Could not record workspace start log: {e}")
+
+
 def setup_ticket_workspace(
     ticket: 'ProjectTicket',
     project: 'Project',
@@ -1767,7 +1891,7 @@ def setup_ticket_workspace(
 
     # Get stack configuration
     stack = getattr(project, 'stack', '') or 'custom'
-    stack_config = get_stack_config(stack)
+    stack_config = get_stack_config(stack, project)
 
     logger.info(f"\n{'='*60}\n[WORKSPACE SETUP] Starting for ticket #{ticket.id} (stack: {stack})\n{'='*60}")
 
@@ -1851,21 +1975,33 @@ def setup_ticket_workspace(
     # 2. WORKSPACE PROVISIONING (via Mags — per-ticket workspace forked from claude-auth)
     logger.info(f"[WORKSPACE SETUP] Step 2: Creating Mags workspace for ticket...")
 
+    workspace_start = time.monotonic()
+    pool_entry = None
+    if not result['repo_needs_template']:
+        pool_entry = claim_warm_workspace(project, stack, result['github_owner'], result['github_repo'])
+
     try:
         user = project.owner
-        base_ws = get_latest_claude_auth_workspace_id(user.id) or workspace_name_for_claude_auth(user.id)
-        ticket_ws = workspace_name_for_ticket(ticket.id)
+        if pool_entry:
+            base_ws = pool_entry['base_workspace_id']
+            ticket_ws = pool_entry['workspace_id']
+        else:
+            base_ws = get_latest_claude_auth_workspace_id(user.id) or workspace_name_for_claude_auth(user.id)
+            ticket_ws = workspace_name_for_ticket(ticket.id)
         logger.info(
-            "[WORKSPACE SETUP] Resolved base workspace for ticket %s (user=%s): base=%s ticket_ws=%s",
-            ticket.id, user.id, base_ws, ticket_ws
+            "[WORKSPACE SETUP] Resolved base workspace for ticket %s (user=%s): base=%s ticket_ws=%s warm=%s",
+            ticket.id, user.id, base_ws, ticket_ws, bool(pool_entry)
         )
 
-        job = get_or_create_workspace_job(
-            workspace_id=ticket_ws,
-            base_workspace_id=base_ws,
-            script=CLAUDE_AUTH_SETUP_SCRIPT,
-            persistent=True,
-        )
+        # A warm workspace already ran the claude-auth setup steps while
+        # warming; attach it to a persistent job exactly like a cold one
+        with track_phase('workspace_setup', ticket_id=ticket.id):
+            job = get_or_create_workspace_job(
+                workspace_id=ticket_ws,
+                base_workspace_id=base_ws,
+                script=CLAUDE_AUTH_SETUP_SCRIPT,
+                persistent=True,
+            )
         job_id = job["request_id"]
 
         # Create or update workspace record
@@ -1882,7 +2018,11 @@ def setup_ticket_workspace(
                 'mags_base_workspace_id': base_ws,
                 'status': 'ready',
                 'project_path': MAGS_WORKING_DIR,
-                'metadata': {'project_name': project.provided_name or project.name},
+                'metadata': {
+                    'project_name': project.provided_name or project.name,
+                    'ticket_id': ticket.id,
+                    'warm_start': bool(pool_entry),
+                },
             }
         )
         logger.info(f"[MAGS][READY] Workspace ready: {ticket_ws} (job {job_id})")
@@ -1908,27 +2048,28 @@ def setup_ticket_workspace(
     logger.info(f"[WORKSPACE SETUP] Step 3: Setting up Git in workspace...")
 
     if result['github_owner'] and result['github_repo'] and result['feature_branch']:
-        if result['repo_needs_template']:
-            logger.info(f"[WORKSPACE SETUP] Initializing repo and creating branch...")
-            git_setup_result = push_template_and_create_branch(
-                ticket_ws,
-                result['github_owner'],
-                result['github_repo'],
-                result['feature_branch'],
-                github_token,
-                stack=stack,
-                project=project,
-            )
-        else:
-            logger.info(f"[WORKSPACE SETUP] Cloning repo and checking out branch...")
-            git_setup_result = setup_git_in_workspace(
-                ticket_ws,
-                result['github_owner'],
-                result['github_repo'],
-                result['feature_branch'],
-                github_token,
-                stack=stack,
-            )
+        with track_phase('git_setup', ticket_id=ticket.id):
+            if result['repo_needs_template']:
+                logger.info(f"[WORKSPACE SETUP] Initializing repo and creating branch...")
+                git_setup_result = push_template_and_create_branch(
+                    ticket_ws,
+                    result['github_owner'],
+                    result['github_repo'],
+                    result['feature_branch'],
+                    github_token,
+                    stack=stack,
+                    project=project,
+                )
+            else:
+                logger.info(f"[WORKSPACE SETUP] Cloning repo and checking out branch...")
+                git_setup_result = setup_git_in_workspace(
+                    ticket_ws,
+                    result['github_owner'],
+                    result['github_repo'],
+                    result['feature_branch'],
+                    github_token,
+                    stack=stack,
+                )
 
         if git_setup_result['status'] == 'success':
             logger.info(f"[WORKSPACE SETUP] ✓ Git configured on branch {result['feature_branch']}")
@@ -1953,6 +2094,8 @@ def setup_ticket_workspace(
     else:
         logger.info(f"[WORKSPACE SETUP] ⊘ Skipping Git setup - missing configuration")
 
+    record_workspace_start(ticket.id, ticket_ws, 'warm' if pool_entry else 'cold', time.monotonic() - workspace_start)
+
     logger.info(f"[WORKSPACE SETUP] ✓ Setup complete for ticket #{ticket.id}")
     return result
 
@@ -1977,6 +2120,7 @@ def execute_ticket_implementation(ticket_id: int, project_id: int, conversation_
 
     start_time = time.time()
     workspace_id = None
+    execution_run = None
 
     try:
         logger.info(f"\n[STEP 1/6] Fetching ticket and project data...")
@@ -2024,6 +2168,7 @@ Retrying execution...
             ticket.save(update_fields=['notes'])
 
         logger.info(f"[STEP 2/6] ✓ Ticket status: {ticket.status}, proceeding...")
+        execution_run = start_execution_run(ticket, 'api')
 
         attachments = list(ticket.attachments.all())
 
@@ -2064,14 +2209,16 @@ Retrying execution...
 
             ticket.status = 'blocked'
             ticket.queue_status = 'none'  # Clear queue status
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ❌ BLOCKED - Workspace Setup Failed
 Reason: {error_msg}
 Stage: Workspace/GitHub setup
 Action required: Check workspace configuration and GitHub access
 """
+            ticket.notes = (ticket.notes or "") + note
             ticket.save(update_fields=['status', 'queue_status', 'notes'])
+            finish_execution_run(execution_run, 'blocked', note, time.time() - start_time, error_msg)
 
             broadcast_ticket_notification(conversation_id, {
                 'is_notification': True,
@@ -2115,6 +2262,7 @@ Action required: Check workspace configuration and GitHub access
         from tasks.dispatch import is_ticket_cancelled, clear_ticket_cancellation_flag
         if is_ticket_cancelled(ticket_id):
             logger.info(f"[STEP 3/6] ⊘ Ticket #{ticket_id} was cancelled, stopping execution")
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
             return {
                 "status": "cancelled",
                 "ticket_id": ticket_id,
@@ -2277,6 +2425,7 @@ Action required: Check workspace configuration and GitHub access
             logger.info(f"[STEP 6/6] ⊘ Ticket #{ticket_id} was cancelled before AI call, stopping execution")
             ticket.status = 'open'  # Reset to open so it can be re-queued
             ticket.save(update_fields=['status'])
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
             return {
                 "status": "cancelled",
                 "ticket_id": ticket_id,
@@ -2289,16 +2438,17 @@ Action required: Check workspace configuration and GitHub access
         # Wrap AI call with timeout check
         ai_call_start = time.time()
         try:
-            ai_response = async_to_sync(get_ai_response)(
-                user_message=implementation_prompt,
-                system_prompt=system_prompt,
-                project_id=project.project_id,  # Use UUID, not database ID
-                conversation_id=conversation_id,
-                stream=False,
-                tools=tools_builder,
-                attachments=attachments if attachments else None,
-                ticket_id=ticket_id  # Pass ticket_id for cancellation checking during AI execution
-            )
+            with track_phase('agent_run', ticket_id=ticket_id):
+                ai_response = async_to_sync(get_ai_response)(
+                    user_message=implementation_prompt,
+                    system_prompt=system_prompt,
+                    project_id=project.project_id,  # Use UUID, not database ID
+                    conversation_id=conversation_id,
+                    stream=False,
+                    tools=tools_builder,
+                    attachments=attachments if attachments else None,
+                    ticket_id=ticket_id  # Pass ticket_id for cancellation checking during AI execution
+                )
             ai_call_duration = time.time() - ai_call_start
 
             # Check if AI execution was cancelled during tool execution
@@ -2307,6 +2457,7 @@ Action required: Check workspace configuration and GitHub access
                 clear_ticket_cancellation_flag(ticket_id)
                 ticket.status = 'open'
                 ticket.save(update_fields=['status'])
+                finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
                 return {
                     "status": "cancelled",
                     "ticket_id": ticket_id,
@@ -2333,6 +2484,7 @@ Action required: Check workspace configuration and GitHub access
             clear_ticket_cancellation_flag(ticket_id)
             ticket.status = 'open'  # Reset to open so it can be re-queued
             ticket.save(update_fields=['status'])
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
             return {
                 "status": "cancelled",
                 "ticket_id": ticket_id,
@@ -2391,6 +2543,7 @@ Action required: Check workspace configuration and GitHub access
             clear_ticket_cancellation_flag(ticket_id)
             ticket.status = 'open'
             ticket.save(update_fields=['status'])
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
             return {
                 "status": "cancelled",
                 "ticket_id": ticket_id,
@@ -2404,7 +2557,8 @@ Action required: Check workspace configuration and GitHub access
             # Commit and push changes — always push regardless of completion status
             commit_prefix = "feat" if completed and not failed else "wip"
             commit_message = f"{commit_prefix}: {ticket.name}\n\nTicket #{ticket_id}\n\n{ticket.description[:200]}"
-            commit_result = commit_and_push_changes(workspace_id, feature_branch_name, commit_message, ticket_id, stack=stack, github_token=github_token, github_owner=github_owner, github_repo=github_repo)
+            with track_phase('commit_push', ticket_id=ticket_id):
+                commit_result = commit_and_push_changes(workspace_id, feature_branch_name, commit_message, ticket_id, stack=stack, github_token=github_token, github_owner=github_owner, github_repo=github_repo)
 
             if commit_result['status'] == 'success':
                 commit_sha = commit_result.get('commit_sha')
@@ -2471,7 +2625,7 @@ Action required: Check workspace configuration and GitHub access
                         lfg_agent_url = f"{repo_url}/tree/lfg-agent"
                         git_info += f"\nlfg-agent Branch: {lfg_agent_url}"
 
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
                 ---
                 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] IMPLEMENTATION COMPLETED
                 Time: {execution_time:.2f} seconds
@@ -2479,10 +2633,12 @@ Action required: Check workspace configuration and GitHub access
                 Dependencies: {', '.join(set(dependencies))}{git_info}
                 Status: ✓ Complete
                 """
+            ticket.notes = (ticket.notes or "") + note
             # Update execution time tracking
             ticket.execution_time_seconds = (ticket.execution_time_seconds or 0) + execution_time
             ticket.last_execution_at = timezone.now()
             ticket.save(update_fields=['status', 'notes', 'execution_time_seconds', 'last_execution_at'])
+            finish_execution_run(execution_run, 'completed', note, execution_time)
             
             broadcast_ticket_notification(conversation_id, {
                 'is_notification': True,
@@ -2553,7 +2709,7 @@ Action required: Check workspace configuration and GitHub access
 
             # Build failure indicator for notes
             failure_indicator = "⏱️ TIMEOUT" if hit_timeout else ("🔧 TOOL LIMIT" if hit_tool_limit else "❌ BLOCKED")
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] {failure_indicator} - Implementation Failed
 Reason: {error_reason}
@@ -2564,10 +2720,12 @@ Files attempted: {len(files_created)}
 Workspace: {workspace_id}
 Action required: Review error and retry or manually fix
 """
+            ticket.notes = (ticket.notes or "") + note
             # Update execution time tracking even on failure
             ticket.execution_time_seconds = (ticket.execution_time_seconds or 0) + execution_time
             ticket.last_execution_at = timezone.now()
             ticket.save(update_fields=['status', 'queue_status', 'notes', 'execution_time_seconds', 'last_execution_at'])
+            finish_execution_run(execution_run, 'blocked', note, execution_time, error_reason)
 
             broadcast_ticket_notification(conversation_id, {
                 'is_notification': True,
@@ -2614,7 +2772,7 @@ Action required: Review error and retry or manually fix
             # Mark ticket as blocked - no retry logic
             ticket.status = 'blocked'
             ticket.queue_status = 'none'  # Clear queue status
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ❌ BLOCKED - Exception Error
 Reason: {error_msg}
@@ -2623,10 +2781,12 @@ Execution time: {execution_time:.2f}s
 Workspace: {workspace_id or 'N/A'}
 Action required: Check logs for detailed error trace and retry
 """
+            ticket.notes = (ticket.notes or "") + note
             # Update execution time tracking even on exception
             ticket.execution_time_seconds = (ticket.execution_time_seconds or 0) + execution_time
             ticket.last_execution_at = timezone.now()
             ticket.save(update_fields=['status', 'queue_status', 'notes', 'execution_time_seconds', 'last_execution_at'])
+            finish_execution_run(execution_run, 'blocked', note, execution_time, error_msg)
 
             broadcast_ticket_notification(conversation_id, {
                 'is_notification': True,
@@ -2665,6 +2825,38 @@ Action required: Check logs for detailed error trace and retry
         }
 
 
+def sync_ticket_context(workspace_id: str, ticket, project, attachments=None) -> str:
+    """
+    Mirror a ticket's attachments and the project's documents into its workspace.
+
+    Everything goes in as one archive; files already present with the same
+    hash are skipped. Returns a prompt note listing where the files are, or
+    '' if nothing was synced.
+    """
+    from factory.workspace_sync import attachment_dir, project_doc_files, ticket_attachment_files, LFG_DIR
+
+    try:
+        attachment_files = ticket_attachment_files(ticket, attachments)
+        doc_files = project_doc_files(project)
+    except Exception as e:
+        logger.warning(f"[SYNC] Could not collect ticket context files for ticket {ticket.id}: {e}")
+        return ''
+    if not attachment_files and not doc_files:
+        return ''
+
+    result = sync_files(workspace_id, attachment_files + doc_files, base_dir=MAGS_WORKING_DIR)
+    if result.get('status') != 'success':
+        logger.warning(f"[SYNC] Ticket context sync failed for ticket {ticket.id}: {result.get('message')}")
+        return ''
+
+    notes = []
+    if attachment_files:
+        notes.append(f"Attachment files are available in {MAGS_WORKING_DIR}/{attachment_dir(ticket.id)}/")
+    if doc_files:
+        notes.append(f"Full project documents (PRD, technical plan, ...) are in {MAGS_WORKING_DIR}/{LFG_DIR}/docs/")
+    return "\n".join(notes)
+
+
 def execute_ticket_with_claude_cli(ticket_id: int, project_id: int, conversation_id: int, max_execution_time: int = 1200) -> Dict[str, Any]:
     """
     Execute a ticket using Claude Code CLI instead of direct API calls.
@@ -2686,6 +2878,7 @@ def execute_ticket_with_claude_cli(ticket_id: int, project_id: int, conversation
         parse_claude_json_stream,
         create_ticket_logs_from_claude_output
     )
+    from factory.claude_stream import TicketLogStreamWriter
     from accounts.models import Profile
     from projects.websocket_utils import async_send_ticket_log_notification
 
@@ -2695,6 +2888,7 @@ def execute_ticket_with_claude_cli(ticket_id: int, project_id: int, conversation
 
     start_time = time.time()
     workspace_id = None
+    execution_run = None
 
     try:
         def _emit_cli_status(message: str) -> None:
@@ -2771,6 +2965,8 @@ Using Claude Code CLI mode
 """
             ticket.save(update_fields=['notes'])
 
+        execution_run = start_execution_run(ticket, 'claude_cli')
+
         # Get attachments
         attachments = list(ticket.attachments.all())
 
@@ -2800,21 +2996,34 @@ Using Claude Code CLI mode
         # 3. CREATE OR REUSE PER-TICKET WORKSPACE (forked from claude-auth base)
         from development.models import Sandbox
 
+        from django.db.models import Q
+        from codebase_index.models import IndexedRepository
+
+        workspace_start = time.monotonic()
         base_ws = get_latest_claude_auth_workspace_id(user.id) or workspace_name_for_claude_auth(user.id)
-        # Reuse existing ticket sandbox if available, otherwise create a fresh one
+        # Reuse existing ticket sandbox if available (including one claimed
+        # from the warm pool), otherwise take a warm one or create a fresh one
         prev_sandbox = Sandbox.objects.filter(
-            mags_workspace_id__startswith=f'{ticket.id}-',
+            Q(mags_workspace_id__startswith=f'{ticket.id}-') | Q(metadata__ticket_id=ticket.id),
             workspace_type='ticket',
         ).order_by('-updated_at').first()
         previous_ticket_ws = prev_sandbox.mags_workspace_id if prev_sandbox else None
-        ticket_ws = previous_ticket_ws or workspace_name_for_ticket(ticket.id)
         is_reuse = bool(previous_ticket_ws)
+        pool_entry = None
+        if not is_reuse:
+            repo_ref = IndexedRepository.objects.filter(project=project).values_list(
+                'github_owner', 'github_repo_name'
+            ).first() or (None, None)
+            pool_entry = claim_warm_workspace(project, project.stack, *repo_ref)
+        ticket_ws = previous_ticket_ws or (pool_entry and pool_entry['workspace_id']) or workspace_name_for_ticket(ticket.id)
         logger.info(
-            "[CLI STEP 3/7] Resolved workspace for ticket %s (user=%s): base=%s ticket_ws=%s reuse=%s",
-            ticket.id, user.id, base_ws, ticket_ws, is_reuse
+            "[CLI STEP 3/7] Resolved workspace for ticket %s (user=%s): base=%s ticket_ws=%s reuse=%s warm=%s",
+            ticket.id, user.id, base_ws, ticket_ws, is_reuse, bool(pool_entry)
         )
         if is_reuse:
             _emit_cli_status("Reconnecting to existing sandbox...")
+        elif pool_entry:
+            _emit_cli_status("Using pre-warmed sandbox workspace...")
         else:
             _emit_cli_status("Provisioning sandbox workspace...")
         workspace_id = ticket_ws  # SDK uses overlay name directly
@@ -2826,37 +3035,39 @@ Using Claude Code CLI mode
             # When reusing, pass base_workspace_id=None to avoid re-creating.
             # Timeout is 180s because new workspace provisioning (VM boot +
             # overlay restore from base) can take 1-2 minutes.
-            probe_result = run_command(
-                workspace_id=ticket_ws,
-                command='echo "WORKSPACE_READY"',
-                timeout=180,
-                with_node_env=False,
-                base_workspace_id=None if is_reuse else base_ws,
-            )
-            if 'WORKSPACE_READY' not in probe_result.get('stdout', ''):
-                if is_reuse:
-                    # Existing workspace is gone — fall back to creating a fresh one
-                    logger.warning(f"[CLI STEP 3/7] Reuse of {ticket_ws} failed, creating fresh workspace...")
-                    _emit_cli_status("Existing sandbox unavailable, provisioning new one...")
-                    ticket_ws = workspace_name_for_ticket(ticket.id)
-                    workspace_id = ticket_ws
-                    is_reuse = False
-                    # Clear stale session since workspace changed
-                    if prev_sandbox:
-                        prev_sandbox.cli_session_id = None
-                        prev_sandbox.save(update_fields=['cli_session_id'])
-                    probe_result = run_command(
-                        workspace_id=ticket_ws,
-                        command='echo "WORKSPACE_READY"',
-                        timeout=180,
-                        with_node_env=False,
-                        base_workspace_id=base_ws,
-                    )
+            with track_phase('workspace_setup', mode='cli', ticket_id=ticket_id):
+                probe_result = run_command(
+                    workspace_id=ticket_ws,
+                    command='echo "WORKSPACE_READY"',
+                    timeout=180,
+                    with_node_env=False,
+                    base_workspace_id=None if (is_reuse or pool_entry) else base_ws,
+                )
                 if 'WORKSPACE_READY' not in probe_result.get('stdout', ''):
-                    raise MagsAPIError(
-                        f"Workspace probe failed: exit={probe_result.get('exit_code')}, "
-                        f"stderr={probe_result.get('stderr', '')[:200]}"
-                    )
+                    if is_reuse or pool_entry:
+                        # Existing workspace is gone — fall back to creating a fresh one
+                        logger.warning(f"[CLI STEP 3/7] Reuse of {ticket_ws} failed, creating fresh workspace...")
+                        _emit_cli_status("Existing sandbox unavailable, provisioning new one...")
+                        ticket_ws = workspace_name_for_ticket(ticket.id)
+                        workspace_id = ticket_ws
+                        is_reuse = False
+                        pool_entry = None
+                        # Clear stale session since workspace changed
+                        if prev_sandbox:
+                            prev_sandbox.cli_session_id = None
+                            prev_sandbox.save(update_fields=['cli_session_id'])
+                        probe_result = run_command(
+                            workspace_id=ticket_ws,
+                            command='echo "WORKSPACE_READY"',
+                            timeout=180,
+                            with_node_env=False,
+                            base_workspace_id=base_ws,
+                        )
+                    if 'WORKSPACE_READY' not in probe_result.get('stdout', ''):
+                        raise MagsAPIError(
+                            f"Workspace probe failed: exit={probe_result.get('exit_code')}, "
+                            f"stderr={probe_result.get('stderr', '')[:200]}"
+                        )
 
             # Create or update workspace record
             ticket_workspace, _ = Sandbox.objects.update_or_create(
@@ -2870,6 +3081,7 @@ Using Claude Code CLI mode
                     'mags_base_workspace_id': base_ws,
                     'workspace_type': 'ticket',
                     'status': 'ready',
+                    **({'metadata': {'ticket_id': ticket.id, 'warm_start': True}} if pool_entry else {}),
                 }
             )
             logger.info(f"[CLI STEP 3/7] ✓ Ticket workspace ready: {ticket_ws}")
@@ -2880,13 +3092,15 @@ Using Claude Code CLI mode
 
             ticket.status = 'blocked'
             ticket.queue_status = 'none'
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ❌ BLOCKED - Could Not Create Workspace
 Reason: {error_msg}
 Mode: Claude Code CLI
 """
+            ticket.notes = (ticket.notes or "") + note
             ticket.save(update_fields=['status', 'queue_status', 'notes'])
+            finish_execution_run(execution_run, 'blocked', note, time.time() - start_time, error_msg)
             broadcast_ticket_status_change(ticket_id, 'blocked', 'none')
 
             return {
@@ -2898,8 +3112,6 @@ Mode: Claude Code CLI
             }
 
         # Setup git in the ticket workspace
-        from codebase_index.models import IndexedRepository
-
         github_token = get_github_token(project.owner)
         github_owner = None
         github_repo = None
@@ -2965,7 +3177,8 @@ Mode: Claude Code CLI
             git branch --show-current
             """
 
-            git_result = run_command(workspace_id=workspace_id, command=git_setup_script, timeout=120)
+            with track_phase('git_setup', mode='cli', ticket_id=ticket_id):
+                git_result = run_command(workspace_id=workspace_id, command=git_setup_script, timeout=120)
             git_stdout = git_result.get('stdout', '')
 
             if 'GIT_SETUP_COMPLETE' in git_stdout:
@@ -2982,12 +3195,22 @@ Mode: Claude Code CLI
         else:
             git_setup_error = "No GitHub repo configured or missing token"
 
+        # Attachments and project docs go into the workspace as files
+        with track_phase('context_sync', mode='cli', ticket_id=ticket_id):
+            context_note = sync_ticket_context(workspace_id, ticket, project, attachments)
+        if context_note:
+            attachments_summary = f"{attachments_summary}\n{context_note}"
+
+        workspace_start_kind = 'reuse' if is_reuse else ('warm' if pool_entry else 'cold')
+        record_workspace_start(ticket.id, workspace_id, workspace_start_kind, time.monotonic() - workspace_start, mode='cli')
         logger.info(f"[CLI STEP 3/7] ✓ Workspace ready: {workspace_id}")
 
         # Check for cancellation
         from tasks.dispatch import is_ticket_cancelled, clear_ticket_cancellation_flag
+        from tasks.cancellation import get_cancel_token
         if is_ticket_cancelled(ticket_id):
             logger.info(f"[CLI STEP 3/7] ⊘ Ticket cancelled")
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
             return {
                 "status": "cancelled",
                 "ticket_id": ticket_id,
@@ -3076,14 +3299,16 @@ Mode: Claude Code CLI
 
                     ticket.status = 'blocked'
                     ticket.queue_status = 'none'
-                    ticket.notes = (ticket.notes or "") + f"""
+                    note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ❌ BLOCKED - Claude Auth Failed
 Reason: {error_msg}
 Mode: Claude Code CLI
 Action: Please go to Settings > Claude Code and reconnect
 """
+                    ticket.notes = (ticket.notes or "") + note
                     ticket.save(update_fields=['status', 'queue_status', 'notes'])
+                    finish_execution_run(execution_run, 'blocked', note, time.time() - start_time, error_msg)
 
                     broadcast_ticket_notification(conversation_id, {
                         'is_notification': True,
@@ -3302,325 +3527,47 @@ You can also output (for logging purposes):
             _emit_cli_status("Starting Claude Code execution...")
         cli_start = time.time()
 
-        # Real-time streaming callback to create logs and broadcast to UI
-        streamed_log_count = [0]  # Use list to allow mutation in closure
-        line_buffer = ['']  # Buffer for partial lines (byte-based tail may split lines)
-        last_raw_log_time = [0.0]
-        last_raw_log_line = ['']
-
-        def stream_output_callback(new_output: str):
-            """Parse streaming output and create TicketLogs in real-time."""
-            import json
-
-            logger.info(f"[CLI CALLBACK] Received {len(new_output)} bytes")
-
-            # Prepend any leftover from previous call (partial line)
-            if line_buffer[0]:
-                logger.info(f"[CLI CALLBACK] Prepending {len(line_buffer[0])} bytes from buffer")
-                new_output = line_buffer[0] + new_output
-                line_buffer[0] = ''
-
-            lines = new_output.split('\n')
-
-            # If last line doesn't end with newline, it might be partial - save for next call
-            if new_output and not new_output.endswith('\n'):
-                line_buffer[0] = lines[-1]
-                lines = lines[:-1]
-                logger.info(f"[CLI CALLBACK] Buffered {len(line_buffer[0])} bytes for next call")
-
-            logger.info(f"[CLI CALLBACK] Processing {len(lines)} lines")
-            json_objects_found = 0
-            logs_created = 0
-
-            def parse_json_objects(text):
-                """Parse multiple JSON objects from a string (handles concatenated JSON)."""
-                decoder = json.JSONDecoder()
-                idx = 0
-                objects = []
-                text = text.strip()
-                while idx < len(text):
-                    # Skip whitespace
-                    while idx < len(text) and text[idx] in ' \t\r\n':
-                        idx += 1
-                    if idx >= len(text):
-                        break
-                    try:
-                        obj, end_idx = decoder.raw_decode(text, idx)
-                        objects.append(obj)
-                        idx += end_idx
-                    except json.JSONDecodeError:
-                        # Can't parse more, return what we have
-                        break
-                return objects
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                # Skip status/metadata lines and wrapper control markers
-                if (line.startswith('STATUS=') or line.startswith('OUTPUT_SIZE=') or
-                    line.startswith('EXIT_CODE=') or line.startswith('___CLAUDE_')):
-                    continue
+        # Parse output as it streams. With log shipping the workspace posts the
+        # text/tool rows itself (factory.cli_log_shipper); the writer keeps raw
+        # output rows and the TodoWrite sync.
+        ship_logs = getattr(settings, 'CLI_LOG_SHIPPING', True)
+        log_writer = TicketLogStreamWriter(ticket.id, structured_logs=not ship_logs)
 
-                # Parse potentially multiple JSON objects from the line
-                json_objects = parse_json_objects(line)
-                if not json_objects and line.startswith('{'):
-                    logger.warning(f"[CLI CALLBACK] Could not parse JSON from line: {line[:100]}...")
-                    continue
-                if not json_objects and line:
-                    now_ts = time.time()
-                    # Log raw non-JSON output at most every 3s and skip duplicates.
-                    if (now_ts - last_raw_log_time[0]) >= 3 and line != last_raw_log_line[0]:
-                        try:
-                            raw_snippet = line[:120].replace('\r', ' ').replace('\n', ' ')
-                            raw_log = TicketLog.objects.create(
-                                ticket_id=ticket.id,
-                                log_type='command',
-                                command='CLI output',
-                                explanation=f"Agent output: {raw_snippet}",
-                                output=line[:4000],
-                            )
-                            async_to_sync(async_send_ticket_log_notification)(ticket.id, {
-                                'id': raw_log.id,
-                                'log_type': raw_log.log_type,
-                                'command': raw_log.command,
-                                'explanation': raw_log.explanation or '',
-                                'output': raw_log.output,
-                                'created_at': raw_log.created_at.isoformat()
-                            })
-                            streamed_log_count[0] += 1
-                            last_raw_log_time[0] = now_ts
-                            last_raw_log_line[0] = line
-                        except Exception as raw_err:
-                            logger.warning(f"[CLI CALLBACK] Raw output log failed: {raw_err}")
-                    continue
+        with track_phase('agent_run', mode='cli', ticket_id=ticket_id):
+            cli_result = run_claude_cli(
+                workspace_id=workspace_id,
+                prompt=implementation_prompt,
+                session_id=existing_session_id,  # None = new session, otherwise resume
+                timeout=max_execution_time,
+                working_dir=MAGS_WORKING_DIR,
+                project_id=str(project.project_id),
+                event_callback=log_writer,
+                ship_logs=ship_logs,
+                lfg_env={
+                    'LFG_API_URL': api_base_url,
+                    'LFG_API_KEY': cli_api_key,
+                    'LFG_TICKET_ID': str(ticket.id),
+                    'LFG_PROJECT_ID': str(project.project_id)
+                },
+                cancel_token=get_cancel_token(ticket_id)
+            )
 
-                for msg in json_objects:
-                    json_objects_found += 1
-                    msg_type = msg.get('type', '')
-
-                    # Handle assistant messages (which may contain text AND tool_use blocks)
-                    if msg_type == 'assistant':
-                        content_blocks = msg.get('message', {}).get('content', [])
-                        if not isinstance(content_blocks, list):
-                            content_blocks = [content_blocks] if content_blocks else []
-
-                        for block in content_blocks:
-                            if not isinstance(block, dict):
-                                continue
-
-                            block_type = block.get('type')
-                            log_entry = None
-
-                            # Handle text content
-                            if block_type == 'text':
-                                text = block.get('text', '')
-                                if text and len(text) > 10:  # Skip tiny messages
-                                    log_entry = TicketLog.objects.create(
-                                        ticket_id=ticket.id,
-                                        log_type='ai_response',
-                                        command="Claude CLI Response",
-                                        output=text[:4000]
-                                    )
-                                    logs_created += 1
-                                    logger.info(f"[CLI CALLBACK] Created ai_response log: {text[:50]}...")
-
-                            # Handle tool_use blocks (nested inside assistant message)
-                            elif block_type == 'tool_use':
-                                tool_name = block.get('name', 'unknown')
-                                tool_input = block.get('input', {})
-                                # Format tool input and explanation based on tool type
-                                if tool_name == 'Bash':
-                                    cmd = tool_input.get('command', '')
-                                    desc = tool_input.get('description', '')
-                                    output_str = f"{desc}\n{cmd}" if desc else cmd
-                                    explanation = desc if desc else f"Running command: {cmd[:80]}"
-                                elif tool_name == 'Read':
-                                    file_path = tool_input.get('file_path', '')
-                                    output_str = f"File: {file_path}"
-                                    explanation = f"Reading file: {file_path.split('/')[-1] if file_path else 'unknown'}"
-                                elif tool_name == 'Write':
-                                    file_path = tool_input.get('file_path', '')
-                                    output_str = f"File: {file_path}"
-                                    explanation = f"Writing file: {file_path.split('/')[-1] if file_path else 'unknown'}"
-                                elif tool_name == 'Edit':
-                                    file_path = tool_input.get('file_path', '')
-                                    output_str = f"File: {file_path}"
-                                    explanation = f"Editing file: {file_path.split('/')[-1] if file_path else 'unknown'}"
-                                elif tool_name == 'Glob':
-                                    pattern = tool_input.get('pattern', '')
-                                    output_str = f"Pattern: {pattern}"
-                                    explanation = f"Searching for files: {pattern}"
-                                elif tool_name == 'Grep':
-                                    pattern = tool_input.get('pattern', '')
-                                    path = tool_input.get('path', 'codebase')
-                                    output_str = f"Search: {pattern} in {path}"
-                                    explanation = f"Searching for: {pattern}"
-                                elif tool_name == 'TodoWrite':
-                                    output_str = str(tool_input)[:1000]
-                                    explanation = "Updating task list"
-
-                                    # Sync todos to ProjectTodoList
-                                    try:
-                                        from projects.models import ProjectTodoList
-                                        todos = tool_input.get('todos', [])
-                                        if todos and isinstance(todos, list):
-                                            # Status mapping: Claude CLI -> ProjectTodoList
-                                            status_map = {
-                                                'completed': 'success',
-                                                'in_progress': 'in_progress',
-                                                'pending': 'pending'
-                                            }
-
-                                            # Get existing tasks for this ticket (keyed by cli_task_id)
-                                            existing_tasks = {
-                                                t.cli_task_id: t for t in
-                                                ProjectTodoList.objects.filter(ticket_id=ticket.id)
-                                                if t.cli_task_id
-                                            }
-
-                                            synced_task_ids = set()
-                                            for idx, todo in enumerate(todos):
-                                                cli_id = todo.get('id', str(idx))
-                                                content = todo.get('content', '')
-                                                status = status_map.get(todo.get('status', 'pending'), 'pending')
-
-                                                if cli_id in existing_tasks:
-                                                    # Update existing task
-                                                    task = existing_tasks[cli_id]
-                                                    task.description = content
-                                                    task.status = status
-                                                    task.order = idx
-                                                    task.save(update_fields=['description', 'status', 'order', 'updated_at'])
-                                                else:
-                                                    # Create new task
-                                                    task = ProjectTodoList.objects.create(
-                                                        ticket_id=ticket.id,
-                                                        description=content,
-                                                        status=status,
-                                                        order=idx,
-                                                        cli_task_id=cli_id
-                                                    )
-
-                                                synced_task_ids.add(cli_id)
-
-                                                # Broadcast task update
-                                                try:
-                                                    async_to_sync(async_send_ticket_log_notification)(ticket.id, {
-                                                        'is_notification': True,
-                                                        'notification_type': 'task_update',
-                                                        'ticket_id': ticket.id,
-                                                        'task': {
-                                                            'id': task.id,
-                                                            'content': task.description,
-                                                            'status': task.status,
-                                                            'order': task.order
-                                                        }
-                                                    })
-                                                except Exception:
-                                                    pass
-
-                                            logger.info(f"[CLI CALLBACK] Synced {len(todos)} tasks to ProjectTodoList")
-                                    except Exception as e:
-                                        logger.warning(f"[CLI CALLBACK] Failed to sync todos: {e}")
-                                elif tool_name == 'Task':
-                                    output_str = str(tool_input)[:1000]
-                                    explanation = tool_input.get('description', 'Running subtask')
-                                else:
-                                    output_str = str(tool_input)[:1000]
-                                    explanation = f"Using tool: {tool_name}"
-
-                                log_entry = TicketLog.objects.create(
-                                    ticket_id=ticket.id,
-                                    log_type='command',
-                                    command=tool_name,
-                                    explanation=explanation,
-                                    output=output_str[:4000]
-                                )
-                                logs_created += 1
-                                logger.info(f"[CLI CALLBACK] Created tool_use log: {tool_name}")
-
-                            # Broadcast if log was created
-                            if log_entry:
-                                streamed_log_count[0] += 1
-                                try:
-                                    async_to_sync(async_send_ticket_log_notification)(ticket.id, {
-                                        'id': log_entry.id,
-                                        'log_type': log_entry.log_type,
-                                        'command': log_entry.command,
-                                        'explanation': log_entry.explanation or '',
-                                        'output': log_entry.output,
-                                        'created_at': log_entry.created_at.isoformat()
-                                    })
-                                except Exception as e:
-                                    logger.warning(f"[CLI CALLBACK] Broadcast error: {e}")
-
-                    # Handle user messages (which contain tool_result blocks)
-                    elif msg_type == 'user':
-                        content_blocks = msg.get('message', {}).get('content', [])
-                        if not isinstance(content_blocks, list):
-                            content_blocks = [content_blocks] if content_blocks else []
-
-                        for block in content_blocks:
-                            if not isinstance(block, dict):
-                                continue
-
-                            block_type = block.get('type')
-                            log_entry = None
-
-                            # Handle tool_result blocks (nested inside user message)
-                            if block_type == 'tool_result':
-                                result_content = str(block.get('content', ''))[:4000]
-                                is_error = block.get('is_error', False)
-
-                                # Only log significant results
-                                if result_content and len(result_content) > 50:
-                                    result_snippet = result_content.replace('\n', ' ').strip()[:100]
-                                    log_entry = TicketLog.objects.create(
-                                        ticket_id=ticket.id,
-                                        log_type='command',
-                                        command='Result' + (' (Error)' if is_error else ''),
-                                        explanation=f"{'Error' if is_error else 'Result'}: {result_snippet}",
-                                        output=result_content
-                                    )
-                                    logs_created += 1
-                                    logger.info(f"[CLI CALLBACK] Created tool_result log: {result_content[:50]}...")
-
-                            # Broadcast if log was created
-                            if log_entry:
-                                streamed_log_count[0] += 1
-                                try:
-                                    async_to_sync(async_send_ticket_log_notification)(ticket.id, {
-                                        'id': log_entry.id,
-                                        'log_type': log_entry.log_type,
-                                        'command': log_entry.command,
-                                        'explanation': log_entry.explanation or '',
-                                        'output': log_entry.output,
-                                        'created_at': log_entry.created_at.isoformat()
-                                    })
-                                except Exception as e:
-                                    logger.warning(f"[CLI CALLBACK] Broadcast error: {e}")
-
-            logger.info(f"[CLI CALLBACK] Summary: {json_objects_found} JSON objects parsed, {logs_created} logs created")
+        log_writer.close()
+        cli_duration = time.time() - cli_start
+        logger.info(f"[CLI STEP 7/7] CLI completed in {cli_duration:.1f}s, streamed {log_writer.logs_written} logs")
 
-        cli_result = run_claude_cli(
-            workspace_id=workspace_id,
-            prompt=implementation_prompt,
-            session_id=existing_session_id,  # None = new session, otherwise resume
-            timeout=max_execution_time,
-            working_dir=MAGS_WORKING_DIR,
-            project_id=str(project.project_id),
-            poll_callback=stream_output_callback,
-            lfg_env={
-                'LFG_API_URL': api_base_url,
-                'LFG_API_KEY': cli_api_key,
-                'LFG_TICKET_ID': str(ticket.id),
-                'LFG_PROJECT_ID': str(project.project_id)
+        if cli_result.get('status') == 'cancelled':
+            logger.info(f"[CLI STEP 7/7] ⊘ Ticket #{ticket_id} was cancelled during Claude execution")
+            clear_ticket_cancellation_flag(ticket_id)
+            ticket.status = 'open'
+            ticket.save(update_fields=['status'])
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
+            return {
+                "status": "cancelled",
+                "ticket_id": ticket_id,
+                "message": "Cancelled during Claude execution",
+                "execution_time": f"{time.time() - start_time:.2f}s"
             }
-        )
-
-        cli_duration = time.time() - cli_start
-        logger.info(f"[CLI STEP 7/7] CLI completed in {cli_duration:.1f}s, streamed {streamed_log_count[0]} logs")
         _emit_cli_status("Claude execution finished. Finalizing results...")
 
         # Check for auth errors and update profile if token expired
@@ -3648,6 +3595,7 @@ You can also output (for logging purposes):
             ticket.queue_status = 'none'
             ticket.save(update_fields=['status', 'queue_status'])
 
+            finish_execution_run(execution_run, 'failed', 'Claude Code token expired', time.time() - start_time, 'Claude Code token expired')
             return {
                 "status": "auth_error",
                 "ticket_id": ticket_id,
@@ -3702,14 +3650,17 @@ ATTACHMENTS:
                 timeout=max_execution_time,
                 working_dir=MAGS_WORKING_DIR,
                 project_id=str(project.project_id),
-                poll_callback=stream_output_callback,
+                event_callback=log_writer,
+                ship_logs=ship_logs,
                 lfg_env={
                     'LFG_API_URL': api_base_url,
                     'LFG_API_KEY': cli_api_key,
                     'LFG_TICKET_ID': str(ticket.id),
                     'LFG_PROJECT_ID': str(project.project_id)
-                }
+                },
+                cancel_token=get_cancel_token(ticket_id)
             )
+            log_writer.close()
 
         # Save session_id on sandbox for potential resume (allows chat replies to continue conversation)
         session_id = cli_result.get('session_id')
@@ -3720,7 +3671,8 @@ ATTACHMENTS:
 
         # Only create logs from full output if streaming didn't capture any
         # (fallback for cases where streaming callback didn't work)
-        if cli_result.get('messages') and streamed_log_count[0] == 0:
+        structured_logs = cli_result.get('logs_shipped') if ship_logs else log_writer.logs_written
+        if cli_result.get('messages') and not structured_logs:
             logger.info(f"[CLI] No logs streamed, creating from full output as fallback")
             def broadcast_log(ticket_id, log_data):
                 try:
@@ -3735,7 +3687,12 @@ ATTACHMENTS:
             )
             logger.info(f"[CLI STEP 7/7] Created {len(logs)} ticket logs from fallback")
         else:
-            logger.info(f"[CLI STEP 7/7] Streamed {streamed_log_count[0]} logs during execution, skipping post-processing")
+            logger.info(
+                f"[CLI STEP 7/7] Streamed {log_writer.logs_written} logs and shipped "
+                f"{cli_result.get('logs_shipped') or 0} during execution, skipping post-processing"
+            )
+            if cli_result.get('logs_dropped'):
+                logger.warning(f"[CLI] Workspace log shipper dropped {cli_result['logs_dropped']} entries")
 
         # Check CLI result
         execution_time = time.time() - start_time
@@ -3770,6 +3727,7 @@ ATTACHMENTS:
             clear_ticket_cancellation_flag(ticket_id)
             ticket.status = 'open'
             ticket.save(update_fields=['status'])
+            finish_execution_run(execution_run, 'cancelled', 'Cancelled by user', time.time() - start_time)
             return {
                 "status": "cancelled",
                 "ticket_id": ticket_id,
@@ -3782,11 +3740,12 @@ ATTACHMENTS:
 
             commit_prefix = "feat" if completed and not failed else "wip"
             commit_message = f"{commit_prefix}: {ticket.name}\n\nTicket #{ticket_id} (via Claude Code CLI)\n\n{ticket.description[:200]}"
-            commit_result = commit_and_push_changes(
-                workspace_id, feature_branch_name, commit_message, ticket_id,
-                stack=stack, github_token=github_token,
-                github_owner=github_owner, github_repo=github_repo,
-            )
+            with track_phase('commit_push', mode='cli', ticket_id=ticket_id):
+                commit_result = commit_and_push_changes(
+                    workspace_id, feature_branch_name, commit_message, ticket_id,
+                    stack=stack, github_token=github_token,
+                    github_owner=github_owner, github_repo=github_repo,
+                )
 
             if commit_result['status'] == 'success':
                 commit_sha = commit_result.get('commit_sha')
@@ -3838,15 +3797,17 @@ ATTACHMENTS:
                     merge_emoji = '✓' if merge_status == 'merged' else ('⚠' if merge_status == 'conflict' else '✗')
                     git_info += f"\nMerge: {merge_emoji} {merge_status}"
 
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ✅ IMPLEMENTATION COMPLETED (Claude Code CLI)
 Execution time: {execution_time:.2f}s
 CLI duration: {cli_duration:.2f}s{git_info}
 """
+            ticket.notes = (ticket.notes or "") + note
             ticket.execution_time_seconds = (ticket.execution_time_seconds or 0) + execution_time
             ticket.last_execution_at = timezone.now()
             ticket.save(update_fields=['status', 'notes', 'execution_time_seconds', 'last_execution_at'])
+            finish_execution_run(execution_run, 'completed', note, execution_time)
 
             broadcast_ticket_notification(conversation_id, {
                 'is_notification': True,
@@ -3909,16 +3870,18 @@ CLI duration: {cli_duration:.2f}s{git_info}
 
             ticket.status = 'blocked'
             ticket.queue_status = 'none'
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ❌ BLOCKED - Claude Code CLI Failed
 Reason: {error_reason}
 Execution time: {execution_time:.2f}s
 Workspace: {workspace_id}
 """
+            ticket.notes = (ticket.notes or "") + note
             ticket.execution_time_seconds = (ticket.execution_time_seconds or 0) + execution_time
             ticket.last_execution_at = timezone.now()
             ticket.save(update_fields=['status', 'queue_status', 'notes', 'execution_time_seconds', 'last_execution_at'])
+            finish_execution_run(execution_run, 'blocked', note, execution_time, error_reason)
 
             # Create a TicketLog entry so the error shows in the Actions tab
             error_log = TicketLog.objects.create(
@@ -3973,16 +3936,18 @@ Workspace: {workspace_id}
         if 'ticket' in locals():
             ticket.status = 'blocked'
             ticket.queue_status = 'none'
-            ticket.notes = (ticket.notes or "") + f"""
+            note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] ❌ BLOCKED - CLI Exception
 Reason: {error_msg}
 Execution time: {execution_time:.2f}s
 Workspace: {workspace_id or 'N/A'}
 """
+            ticket.notes = (ticket.notes or "") + note
             ticket.execution_time_seconds = (ticket.execution_time_seconds or 0) + execution_time
             ticket.last_execution_at = timezone.now()
             ticket.save(update_fields=['status', 'queue_status', 'notes', 'execution_time_seconds', 'last_execution_at'])
+            finish_execution_run(execution_run, 'blocked', note, execution_time, error_msg)
 
             broadcast_ticket_notification(conversation_id, {
                 'is_notification': True,
@@ -4265,190 +4230,17 @@ def execute_ticket_chat_cli(
         except Exception as e:
             logger.warning(f"[CLI_CHAT] Project directory check failed: {e}")
 
-        # Streaming callback for real-time logs
-        last_stream_heartbeat = [0.0]
-        def stream_callback(new_output: str):
-            import json
-
-            # Heartbeat fallback for non-JSON/partial stream chunks.
-            try:
-                now_ts = time.time()
-                if new_output.strip() and (now_ts - last_stream_heartbeat[0]) >= 15:
-                    snippet = new_output.replace('\r', ' ').replace('\n', ' ').strip()[:240]
-                    if snippet:
-                        hb_log = TicketLog.objects.create(
-                            ticket_id=ticket_id,
-                            log_type='command',
-                            command='Agent working',
-                            explanation=f"Agent working: {snippet[:120]}",
-                            output=snippet,
-                        )
-                        async_to_sync(async_send_ticket_log_notification)(ticket_id, {
-                            'id': hb_log.id,
-                            'log_type': hb_log.log_type,
-                            'command': hb_log.command,
-                            'explanation': hb_log.explanation or '',
-                            'output': hb_log.output,
-                            'created_at': hb_log.created_at.isoformat()
-                        })
-                        last_stream_heartbeat[0] = now_ts
-            except Exception as hb_err:
-                logger.warning(f"[CLI_CHAT] Heartbeat log failed: {hb_err}")
-
-            for line in new_output.strip().split('\n'):
-                if not line.strip():
-                    continue
-                if line.strip().startswith('___CLAUDE_'):
-                    continue
-                try:
-                    msg = json.loads(line)
-                    msg_type = msg.get('type', '')
-
-                    if msg_type == 'assistant':
-                        content_blocks = msg.get('message', {}).get('content', [])
-                        if not isinstance(content_blocks, list):
-                            content_blocks = [content_blocks] if content_blocks else []
-
-                        for block in content_blocks:
-                            if not isinstance(block, dict):
-                                continue
-                            block_type = block.get('type')
-                            log_entry = None
-
-                            if block_type == 'text':
-                                text = block.get('text', '')
-                                if text and text.strip():
-                                    log_entry = TicketLog.objects.create(
-                                        ticket_id=ticket_id,
-                                        log_type='ai_response',
-                                        command='Claude CLI Response',
-                                        output=text[:4000]
-                                    )
-
-                            elif block_type == 'tool_use':
-                                tool_name = block.get('name', 'unknown')
-                                tool_input = block.get('input', {})
-                                explanation = f"Using tool: {tool_name}"
-
-                                if tool_name == 'Bash':
-                                    output_str = tool_input.get('command', '')
-                                elif tool_name in ['Read', 'Write', 'Edit']:
-                                    output_str = f"File: {tool_input.get('file_path', '')}"
-                                elif tool_name == 'TodoWrite':
-                                    output_str = str(tool_input)[:1000]
-                                    explanation = "Updating task list"
-
-                                    # Sync todos to ProjectTodoList
-                                    try:
-                                        from projects.models import ProjectTodoList
-                                        todos = tool_input.get('todos', [])
-                                        if todos and isinstance(todos, list):
-                                            status_map = {
-                                                'completed': 'success',
-                                                'in_progress': 'in_progress',
-                                                'pending': 'pending'
-                                            }
-                                            existing_tasks = {
-                                                t.cli_task_id: t for t in
-                                                ProjectTodoList.objects.filter(ticket_id=ticket_id)
-                                                if t.cli_task_id
-                                            }
-                                            for idx, todo in enumerate(todos):
-                                                cli_id = todo.get('id', str(idx))
-                                                content = todo.get('content', '')
-                                                status = status_map.get(todo.get('status', 'pending'), 'pending')
-
-                                                if cli_id in existing_tasks:
-                                                    task = existing_tasks[cli_id]
-                                                    task.description = content
-                                                    task.status = status
-                                                    task.order = idx
-                                                    task.save(update_fields=['description', 'status', 'order', 'updated_at'])
-                                                else:
-                                                    task = ProjectTodoList.objects.create(
-                                                        ticket_id=ticket_id,
-                                                        description=content,
-                                                        status=status,
-                                                        order=idx,
-                                                        cli_task_id=cli_id
-                                                    )
-
-                                                # Broadcast task update
-                                                try:
-                                                    async_to_sync(async_send_ticket_log_notification)(ticket_id, {
-                                                        'is_notification': True,
-                                                        'notification_type': 'task_update',
-                                                        'ticket_id': ticket_id,
-                                                        'task': {
-                                                            'id': task.id,
-                                                            'content': task.description,
-                                                            'status': task.status,
-                                                            'order': task.order
-                                                        }
-                                                    })
-                                                except Exception:
-                                                    pass
-                                            logger.info(f"[CLI_CHAT] Synced {len(todos)} tasks to ProjectTodoList")
-                                    except Exception as e:
-                                        logger.warning(f"[CLI_CHAT] Failed to sync todos: {e}")
-                                else:
-                                    output_str = str(tool_input)[:1000]
-
-                                log_entry = TicketLog.objects.create(
-                                    ticket_id=ticket_id,
-                                    log_type='command',
-                                    command=tool_name,
-                                    explanation=explanation,
-                                    output=output_str[:4000]
-                                )
-
-                            if log_entry:
-                                try:
-                                    async_to_sync(async_send_ticket_log_notification)(ticket_id, {
-                                        'id': log_entry.id,
-                                        'log_type': log_entry.log_type,
-                                        'command': log_entry.command,
-                                        'explanation': log_entry.explanation or '',
-                                        'output': log_entry.output or '',
-                                        'created_at': log_entry.created_at.isoformat()
-                                    })
-                                except Exception:
-                                    pass
-
-                    elif msg_type == 'user':
-                        # Handle tool_result blocks inside user messages
-                        content_blocks = msg.get('message', {}).get('content', [])
-                        if not isinstance(content_blocks, list):
-                            content_blocks = [content_blocks] if content_blocks else []
-
-                        for block in content_blocks:
-                            if isinstance(block, dict) and block.get('type') == 'tool_result':
-                                result_content = str(block.get('content', ''))[:4000]
-                                if result_content and len(result_content) > 50:
-                                    result_snippet = result_content.replace('\n', ' ').strip()[:100]
-                                    log_entry = TicketLog.objects.create(
-                                        ticket_id=ticket_id,
-                                        log_type='command',
-                                        command='Result',
-                                        explanation=f"Result: {result_snippet}",
-                                        output=result_content
-                                    )
-                                    try:
-                                        async_to_sync(async_send_ticket_log_notification)(ticket_id, {
-                                            'id': log_entry.id,
-                                            'log_type': log_entry.log_type,
-                                            'command': log_entry.command,
-                                            'explanation': log_entry.explanation or '',
-                                            'output': log_entry.output,
-                                            'created_at': log_entry.created_at.isoformat()
-                                        })
-                                    except Exception:
-                                        pass
-
-                except json.JSONDecodeError:
-                    pass
-                except Exception:
-                    pass
+        # Parse output as it streams and write TicketLogs in small batches;
+        # non-JSON output shows up as an 'Agent working' heartbeat every 15s
+        from factory.claude_stream import TicketLogStreamWriter
+        log_writer = TicketLogStreamWriter(
+            ticket_id,
+            min_text_chars=0,
+            raw_interval=15,
+            raw_command='Agent working',
+            raw_label='Agent working',
+            log_prefix='[CLI_CHAT]',
+        )
 
         if session_id:
             logger.info(f"[CLI_CHAT] Running CLI with --resume {session_id[:20]}...")
@@ -4546,8 +4338,9 @@ Please respond to the user's message in the context of this ticket."""
             session_id=session_id,  # None = new session, otherwise --resume
             timeout=600,  # 10 minute timeout for chat
             working_dir=MAGS_WORKING_DIR,
-            poll_callback=stream_callback,
+            event_callback=log_writer,
         )
+        log_writer.close()
 
         # Check for auth errors and update profile if token expired
         # Be specific to avoid false positives (e.g., Claude mentioning "401" in conversation)
@@ -4689,8 +4482,9 @@ Note: The previous conversation session was lost. The conversation history above
                 session_id=None,
                 timeout=600,
                 working_dir=MAGS_WORKING_DIR,
-                poll_callback=stream_callback,
+                event_callback=log_writer,
             )
+            log_writer.close()
             # Fall through to save new session_id below
 
         if not session_not_found or cli_result.get('session_id'):
@@ -5675,13 +5469,15 @@ def continue_ticket_with_message(ticket_id: int, project_id: int, user_message:
                         merge_emoji = '✓' if merge_status == 'merged' else ('⚠' if merge_status == 'conflict' else '✗')
                         git_info += f"\nMerge to lfg-agent: {merge_emoji} {merge_status}"
 
-                ticket.notes = (ticket.notes or "") + f"""
+                note = f"""
 ---
 [{datetime.now().strftime('%Y-%m-%d %H:%M')}] IMPLEMENTATION COMPLETED (via chat)
 Time: {execution_time:.2f} seconds{git_info}
 Status: ✓ Complete
 """
+                ticket.notes = (ticket.notes or "") + note
                 ticket.save(update_fields=['status', 'notes'])
+                finish_execution_run(start_execution_run(ticket, 'chat', started_at=timezone.now() - timedelta(seconds=execution_time)), 'completed', note, execution_time)
 
                 # Send completion notification
                 broadcast_ticket_notification(None, {
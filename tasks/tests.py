@@ -0,0 +1,356 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from tasks import dispatch
+from tasks.cancellation import CANCEL_CHANNEL, CancellationBus, CancelToken, TicketCancelledError
+from tasks.metrics import (
+    SPAN_SECONDS, TICKET_PHASE_SECONDS, TICKET_WAIT_SECONDS, Counter, Gauge, Histogram, MetricsRegistry,
+    observe_queue_wait, track_phase,
+)
+from tasks.tracing import current_context, extract, inject, span
+from tasks.workspace_pool import POOL_KEY_PREFIX, WorkspacePool
+
+
+class CancelTokenTests(SimpleTestCase):
+    def test_callbacks_fire_once_and_late_callbacks_run_immediately(self):
+        token = CancelToken(1)
+        calls = []
+        token.add_callback(lambda: calls.append('a'))
+        remove = token.add_callback(lambda: calls.append('removed'))
+        remove()
+
+        token.cancel()
+        token.cancel()
+        self.assertTrue(token.cancelled)
+        self.assertEqual(calls, ['a'])
+
+        token.add_callback(lambda: calls.append('late'))
+        self.assertEqual(calls, ['a', 'late'])
+
+    def test_wait_returns_as_soon_as_cancelled(self):
+        token = CancelToken(1)
+        self.assertFalse(token.wait(0.01))
+        threading.Timer(0.05, token.cancel).start()
+        self.assertTrue(token.wait(5))
+
+    def test_run_or_cancel(self):
+        async def work(result, delay):
+            await asyncio.sleep(delay)
+            return result
+
+        token = CancelToken(1)
+        self.assertEqual(asyncio.run(token.run_or_cancel(work('done', 0))), 'done')
+
+        # Cancelled from another thread while the work is in flight
+        threading.Timer(0.05, token.cancel).start()
+        with self.assertRaises(TicketCancelledError):
+            asyncio.run(token.run_or_cancel(work('never', 30)))
+
+        # Already cancelled: the coroutine is closed without running
+        with self.assertRaises(TicketCancelledError):
+            asyncio.run(token.run_or_cancel(work('never', 0)))
+
+
+class CancellationBusTests(SimpleTestCase):
+    def setUp(self):
+        self.bus = CancellationBus()
+        mock.patch.object(self.bus, '_ensure_listener').start()
+        self.read_flag = mock.patch.object(dispatch, 'read_ticket_cancellation_flag', return_value=False).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_published_ids_cancel_registered_tokens(self):
+        token = self.bus.register(5)
+        self.bus._handle_message(b'5')
+        self.bus._handle_message(b'not-a-ticket')
+        self.bus._handle_message('6')
+        self.assertTrue(token.cancelled)
+        self.assertEqual(self.bus.get_stats()['cancelled_tickets'], [5])
+
+    def test_register_and_reconnect_read_the_flag(self):
+        self.read_flag.return_value = True
+        self.assertTrue(self.bus.register(5).cancelled)
+
+        self.read_flag.return_value = False
+        missed = self.bus.register(6)
+        self.read_flag.side_effect = lambda ticket_id: ticket_id == 6
+        self.bus._reconcile_from_flags()
+        self.assertTrue(missed.cancelled)
+
+    def test_check_local_falls_back_while_disconnected(self):
+        self.assertIsNone(self.bus.check_local(5))
+        token = self.bus.register(5)
+        self.assertIsNone(self.bus.check_local(5))
+
+        self.bus._connected.set()
+        self.assertFalse(self.bus.check_local(5))
+        token.cancel()
+        self.assertTrue(self.bus.check_local(5))
+
+        self.bus.reset_local(5)
+        self.assertFalse(self.bus.check_local(5))
+        self.bus.unregister(5)
+        self.assertIsNone(self.bus.get_token(5))
+
+    def test_set_flag_notifies_locally_and_publishes(self):
+        token = self.bus.register(5)
+        client = mock.Mock()
+        with mock.patch('tasks.cancellation.get_cancellation_bus', return_value=self.bus), \
+                mock.patch.object(dispatch, 'get_redis_client', return_value=client):
+            self.assertTrue(dispatch.set_ticket_cancellation_flag(5))
+            self.assertTrue(token.cancelled)
+
+            # Answered from the token, not Redis
+            self.bus._connected.set()
+            self.assertTrue(dispatch.is_ticket_cancelled(5))
+        client.exists.assert_not_called()
+
+        pipe = client.pipeline.return_value
+        pipe.setex.assert_called_once_with(f'{dispatch.CANCEL_FLAG_PREFIX}5', 3600, '1')
+        pipe.publish.assert_called_once_with(CANCEL_CHANNEL, '5')
+        pipe.execute.assert_called_once_with()
+
+
+def _sample(metric, suffix='', **labels):
+    """Value of one rendered sample, or None if the series is absent."""
+    label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    prefix = f'{metric.name}{suffix}' + (f'{{{label_text}}}' if label_text else '')
+    for line in metric.render():
+        if line.startswith(prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry()
+        runs = registry.register(Counter('test_runs_total', 'Runs.', ['status']))
+        depth = registry.register(Gauge('test_depth', 'Depth.'))
+        wait = registry.register(Histogram('test_wait_seconds', 'Wait.', buckets=(1, 5)))
+        self.assertIs(registry.register(Counter('test_runs_total', 'Duplicate.')), runs)
+
+        runs.labels(status='ok').inc()
+        runs.labels(status='ok').inc(2)
+        runs.labels(status='say "hi"').inc()
+        depth.set(4)
+        depth.dec()
+        for value in (0.5, 3, 10):
+            wait.observe(value)
+        registry.add_collector(lambda: depth.inc(10))
+
+        text = registry.render().splitlines()
+        self.assertIn('# TYPE test_runs_total counter', text)
+        self.assertIn('test_runs_total{status="ok"} 3', text)
+        self.assertIn('test_runs_total{status="say \\"hi\\""} 1', text)
+        self.assertIn('test_depth 13', text)
+        self.assertIn('test_wait_seconds_bucket{le="1"} 1', text)
+        self.assertIn('test_wait_seconds_bucket{le="5"} 2', text)
+        self.assertIn('test_wait_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_wait_seconds_sum 13.5', text)
+        self.assertIn('test_wait_seconds_count 3', text)
+
+    def test_collector_failures_do_not_break_render(self):
+        registry = MetricsRegistry()
+        registry.register(Gauge('test_up', 'Up.')).set(1)
+        registry.add_collector(mock.Mock(side_effect=RuntimeError('redis down')))
+        self.assertIn('test_up 1', registry.render())
+
+    def test_labelled_metric_requires_labels(self):
+        with self.assertRaises(ValueError):
+            Counter('test_labelled_total', 'Labelled.', ['status']).inc()
+
+    def test_observe_queue_wait(self):
+        before = _sample(TICKET_WAIT_SECONDS, '_count') or 0
+        observe_queue_wait(None)
+        observe_queue_wait('not a timestamp')
+        self.assertEqual(_sample(TICKET_WAIT_SECONDS, '_count'), before)
+
+        queued_at = (datetime.now(dt_timezone.utc) - timedelta(seconds=30)).isoformat()
+        observe_queue_wait(queued_at)
+        self.assertEqual(_sample(TICKET_WAIT_SECONDS, '_count'), before + 1)
+        self.assertEqual(_sample(TICKET_WAIT_SECONDS, '_bucket', le='10'), _sample(TICKET_WAIT_SECONDS, '_bucket', le='1'))
+        self.assertGreater(_sample(TICKET_WAIT_SECONDS, '_bucket', le='60'), _sample(TICKET_WAIT_SECONDS, '_bucket', le='10'))
+
+    def test_track_phase_records_histogram_and_span(self):
+        labels = {'phase': 'git_setup', 'mode': 'cli'}
+        before = _sample(TICKET_PHASE_SECONDS, '_count', **labels) or 0
+        with self.assertRaises(RuntimeError), self.assertLogs('tasks.tracing', 'INFO') as logs:
+            with track_phase('git_setup', mode='cli', ticket_id=7):
+                raise RuntimeError('clone failed')
+
+        self.assertEqual(_sample(TICKET_PHASE_SECONDS, '_count', **labels), before + 1)
+        self.assertIn('name=ticket.git_setup status=error', logs.output[0])
+        self.assertIn('ticket_id=7', logs.output[0])
+
+class DispatchQueueTimeTests(SimpleTestCase):
+    def test_dispatch_stamps_each_ticket(self):
+        client = mock.Mock()
+        with mock.patch.object(dispatch, 'get_redis_client', return_value=client), \
+                mock.patch('projects.models.ProjectTicket') as tickets, \
+                mock.patch('projects.models.Project'), \
+                mock.patch('tasks.workspace_pool.get_workspace_pool'), \
+                mock.patch('projects.websocket_utils.send_ticket_status_notification'):
+            self.assertTrue(dispatch.dispatch_tickets(1, [10, 11], conversation_id=5))
+
+        (key, payload), _ = client.rpush.call_args
+        task = json.loads(payload)
+        self.assertEqual(key, dispatch.QUEUE_KEY)
+        self.assertEqual(set(task['ticket_queued_at']), {'10', '11'})
+        self.assertEqual(task['queued_at'], task['ticket_queued_at']['10'])
+        self.assertLessEqual(task['ticket_queued_at']['10'], task['ticket_queued_at']['11'])
+        self.assertTrue(task['traceparent'].startswith('00-'))
+
+        stamps = [c.kwargs['queued_at'].isoformat() for c in tickets.objects.filter.return_value.update.call_args_list
+                  if 'queued_at' in c.kwargs]
+        self.assertEqual(stamps, [task['ticket_queued_at']['10'], task['ticket_queued_at']['11']])
+
+
+class TracingTests(SimpleTestCase):
+    def test_nested_spans_share_the_trace(self):
+        self.assertIsNone(inject())
+        with span('outer') as outer:
+            with span('inner') as inner:
+                self.assertEqual(inner.context.trace_id, outer.context.trace_id)
+                self.assertEqual(inner.context.parent_id, outer.context.span_id)
+                self.assertEqual(inject(), f'00-{outer.context.trace_id}-{inner.context.span_id}-01')
+            self.assertIs(current_context(), outer.context)
+        self.assertIsNone(current_context())
+        self.assertGreaterEqual(_sample(SPAN_SECONDS, '_count', span='inner', status='ok'), 1)
+
+    def test_extract_continues_a_remote_trace(self):
+        with span('dispatch'):
+            traceparent = inject()
+
+        with extract(traceparent) as remote:
+            with span('executor.process_task') as child:
+                self.assertEqual(f'00-{child.context.trace_id}-{child.context.parent_id}-01', traceparent)
+        self.assertEqual(remote.span_id, traceparent.split('-')[2])
+
+        for malformed in (None, '', 'garbage', '00-abc-def-01'):
+            with extract(malformed) as ctx:
+                self.assertIsNone(ctx)
+                with span('fresh') as fresh:
+                    self.assertIsNone(fresh.context.parent_id)
+
+
+class FakeRedisLists:
+    """The handful of Redis list/key commands WorkspacePool uses."""
+
+    def __init__(self):
+        self.lists = {}
+        self.keys = {}
+
+    def lpop(self, key):
+        items = self.lists.get(key)
+        return items.pop(0) if items else None
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    def scan_iter(self, match):
+        return [key for key in self.lists if key.startswith(match.rstrip('*'))]
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return False
+        self.keys[key] = value
+        return True
+
+    def delete(self, key):
+        self.keys.pop(key, None)
+
+
+class WorkspacePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedisLists()
+        self.pool = WorkspacePool(target_size=2, max_size=3, idle_ttl=60, enabled=True)
+        mock.patch.object(dispatch, 'get_redis_client', return_value=self.redis).start()
+        self.stopped = mock.patch.object(WorkspacePool, '_stop_workspace').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _add(self, workspace_id, age=0, project_id=1, stack='python'):
+        entry = {'workspace_id': workspace_id, 'created_at': time.time() - age}
+        self.redis.rpush(WorkspacePool._key(project_id, stack), json.dumps(entry))
+
+    def test_claim_skips_idle_entries_and_requests_refill(self):
+        self._add('ws-old', age=120)
+        self._add('ws-fresh')
+        self._add('ws-spare')
+        project = mock.Mock(id=1)
+
+        with mock.patch.object(self.pool, 'request_refill') as refill:
+            self.assertEqual(self.pool.claim(project, 'python')['workspace_id'], 'ws-fresh')
+        self.stopped.assert_called_once_with('ws-old')
+        refill.assert_called_once_with(1, 'python')
+        self.assertEqual(self.redis.llen(WorkspacePool._key(1, 'python')), 1)
+
+        with mock.patch.object(self.pool, 'request_refill'):
+            self.assertIsNone(self.pool.claim(mock.Mock(id=2), 'python'))
+        self.pool.enabled = False
+        self.assertIsNone(self.pool.claim(project, 'python'))
+
+    def test_reap_all_evicts_only_idle_entries(self):
+        self._add('ws-old', age=120)
+        self._add('ws-fresh')
+        self._add('ws-other-old', age=120, project_id=2, stack='node')
+
+        self.assertEqual(self.pool.reap_all(), 2)
+        self.assertEqual(sorted(c.args[0] for c in self.stopped.call_args_list), ['ws-old', 'ws-other-old'])
+        self.assertEqual(self.redis.lists[f'{POOL_KEY_PREFIX}1:python'], [mock.ANY])
+        self.assertEqual(self.pool.get_stats()['pools'][0], {'project_id': '1', 'stack': 'python', 'size': 1})
+
+    def test_refill_tops_up_to_target_under_a_lock(self):
+        warmed = iter(range(10))
+        warm = mock.patch.object(
+            self.pool, '_warm_workspace',
+            side_effect=lambda project, stack: {'workspace_id': f'ws-{next(warmed)}', 'created_at': time.time(), 'warm_seconds': 1.0},
+        ).start()
+        mock.patch('projects.models.Project').start()
+
+        self._add('ws-ready')
+        self.pool._refill(1, 'python')
+        self.assertEqual(warm.call_count, 1)
+        self.assertEqual(self.redis.llen(WorkspacePool._key(1, 'python')), 2)
+        self.assertEqual(self.redis.keys, {})
+
+        # Another process holds the refill lock
+        self.redis.lpop(WorkspacePool._key(1, 'python'))
+        self.redis.set('lfg:ws_pool_refill:1:python', '1')
+        self.pool._refill(1, 'python')
+        self.assertEqual(warm.call_count, 1)
+
+    def test_refill_stops_surplus_past_max_size(self):
+        self.pool.max_size = 1
+        mock.patch.object(self.pool, '_warm_workspace', return_value={'workspace_id': 'ws-surplus', 'warm_seconds': 1.0}).start()
+        mock.patch('projects.models.Project').start()
+        self._add('ws-ready')
+
+        self.pool.target_size = 2
+        self.pool._refill(1, 'python')
+        self.stopped.assert_called_once_with('ws-surplus')
+        self.assertEqual(self.redis.llen(WorkspacePool._key(1, 'python')), 1)
+
+    def test_drain_and_release_stop_workspaces(self):
+        self._add('ws-a')
+        self._add('ws-b')
+        self.assertEqual(self.pool.drain(1, 'python'), 2)
+        self.pool.release({'workspace_id': 'ws-c'})
+        self.assertEqual([c.args[0] for c in self.stopped.call_args_list], ['ws-a', 'ws-b', 'ws-c'])
@@ -0,0 +1,130 @@
+"""
+Lightweight span tracing for the ticket execution pipeline.
+
+OpenTelemetry-style spans (trace_id / span_id / parent) that follow a
+ticket from dispatch_tickets through the Redis queue, ExecutorService,
+AsyncTicketExecutor and into execute_ticket_implementation.
+
+The context is carried across the queue as a W3C ``traceparent`` string
+in the task payload, and across threads via contextvars. Finished spans
+are logged with a ``[TRACE]`` prefix and recorded in the
+``lfg_trace_span_duration_seconds`` histogram.
+
+Usage:
+    from tasks.tracing import span, inject, extract
+
+    with span('dispatch', project_id=1):
+        task_data['traceparent'] = inject()
+
+    with extract(task_data.get('traceparent')):
+        with span('executor.process_task'):
+            ...
+"""
+import contextvars
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpanContext:
+    """Identifiers that link a span to its trace and parent."""
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+
+
+@dataclass
+class Span:
+    """A timed unit of work within a trace."""
+    name: str
+    context: SpanContext
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    status: str = 'ok'
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+
+_current_span: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar(
+    'lfg_current_span', default=None
+)
+
+
+def _new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def _new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def current_context() -> Optional[SpanContext]:
+    """Return the active span context, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Open a child span of the current context (or a new trace)."""
+    parent = _current_span.get()
+    ctx = SpanContext(
+        trace_id=parent.trace_id if parent else _new_trace_id(),
+        span_id=_new_span_id(),
+        parent_id=parent.span_id if parent else None,
+    )
+    current = Span(name=name, context=ctx, attributes=attributes)
+    token = _current_span.set(ctx)
+    started = time.monotonic()
+    try:
+        yield current
+    except BaseException:
+        current.status = 'error'
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current, time.monotonic() - started)
+
+
+def _finish(current: Span, duration: float):
+    from tasks.metrics import SPAN_SECONDS
+
+    SPAN_SECONDS.labels(span=current.name, status=current.status).observe(duration)
+    attrs = ' '.join(f'{k}={v}' for k, v in current.attributes.items())
+    logger.info(
+        f"[TRACE] trace={current.context.trace_id} span={current.context.span_id} "
+        f"parent={current.context.parent_id or '-'} name={current.name} "
+        f"status={current.status} duration_ms={duration * 1000:.1f} {attrs}".rstrip()
+    )
+
+
+def inject() -> Optional[str]:
+    """Serialize the current context as a W3C traceparent header value."""
+    ctx = _current_span.get()
+    if ctx is None:
+        return None
+    return f"00-{ctx.trace_id}-{ctx.span_id}-01"
+
+
+@contextmanager
+def extract(traceparent: Optional[str]):
+    """Continue a trace from a traceparent value carried across a process boundary."""
+    ctx = None
+    if traceparent:
+        parts = traceparent.split('-')
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            ctx = SpanContext(trace_id=parts[1], span_id=parts[2])
+        else:
+            logger.debug(f"[TRACE] Ignoring malformed traceparent: {traceparent!r}")
+
+    token = _current_span.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current_span.reset(token)
@@ -8,6 +8,7 @@ urlpatterns = [
     path('status/<str:task_id>/', views.get_task_status, name='get_task_status'),
     path('result/<str:task_id>/', views.get_task_result, name='get_task_result'),
     path('queue/status/', views.get_queue_status, name='get_queue_status'),
+    path('metrics/', views.executor_metrics, name='executor_metrics'),
     
     # Scheduling endpoints
     path('schedule/cancel/<int:schedule_id>/', views.cancel_scheduled_task, name='cancel_scheduled_task'),
@@ -1,5 +1,7 @@
+import hmac
 import logging
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
@@ -122,4 +124,31 @@ def cancel_scheduled_task(request, schedule_id):
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }, status=500) 
\ No newline at end of file
+        }, status=500) 
+
+
+@require_http_methods(["GET"])
+def executor_metrics(request):
+    """
+    Prometheus scrape endpoint for ticket queue metrics.
+
+    Queue depth and lock counts are read from Redis, so this works even
+    though tickets execute in the separate executor process (which serves
+    its own per-process metrics on ASYNC_EXECUTOR['metrics_port']).
+
+    Auth: staff session, or `Authorization: Bearer <METRICS_AUTH_TOKEN>`.
+    """
+    from tasks.metrics import CONTENT_TYPE_LATEST, REGISTRY, collect_queue_metrics, render_metrics
+
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    token_ok = bool(token) and hmac.compare_digest(auth_header, f"Bearer {token}")
+    if not token_ok and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+
+    try:
+        REGISTRY.add_collector(collect_queue_metrics)
+        return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+    except Exception as e:
+        logger.error(f"Error rendering executor metrics: {str(e)}")
+        return HttpResponse(f'# error: {e}\n', status=500, content_type='text/plain')
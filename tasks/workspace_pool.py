@@ -0,0 +1,431 @@
+"""
+Warm Workspace Pool.
+
+Pre-provisioned Mags workspaces per (project, stack) so ticket execution
+can skip the cold start (fork from the claude-auth base, clone the repo,
+install dependencies) that dominates short tickets.
+
+- Pool entries live in a Redis list per (project, stack), so the Django
+  process (which triggers refills on dispatch) and the executor process
+  (which claims workspaces) share one pool
+- Warm workspaces have the repo cloned on lfg-agent with dependencies
+  installed; claimers only fetch and check out the feature branch
+- Refill runs in a background thread guarded by a Redis lock, so only
+  one process fills a given pool at a time
+- Entries older than idle_ttl are stopped instead of handed out, and the
+  pool never grows past max_size
+- `reap_all()` evicts idle entries from every pool. It runs as the
+  reap_idle_pool_workspaces django-q schedule (`python manage.py
+  reap_workspace_pool --schedule`), so pools that are never refilled
+  don't keep paid VMs running
+
+Usage:
+    from tasks.workspace_pool import get_workspace_pool
+
+    pool = get_workspace_pool()
+    pool.request_refill(project.id, stack)   # on dispatch
+
+    entry = pool.claim(project, stack)       # on execution
+    if entry:
+        workspace_id = entry['workspace_id']
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis keys
+POOL_KEY_PREFIX = "lfg:ws_pool:"
+REFILL_LOCK_PREFIX = "lfg:ws_pool_refill:"
+
+# Upper bound for one refill pass (provisioning + clone + install per workspace)
+REFILL_LOCK_TTL = 1800
+
+
+def _pool_settings() -> Dict[str, Any]:
+    return getattr(settings, 'WORKSPACE_POOL', {}) or {}
+
+
+def workspace_name_for_pool(project_id: int) -> str:
+    """Get a unique workspace name for a pooled (not yet assigned) workspace."""
+    return f"pool-{project_id}-{uuid.uuid4().hex[:8]}"
+
+
+class WorkspacePool:
+    """
+    Redis-backed pool of warm ticket workspaces.
+
+    Entries are JSON dicts:
+        workspace_id, job_id, base_workspace_id, project_id, stack,
+        github_owner, github_repo, created_at, warm_seconds
+    """
+
+    def __init__(self, target_size: int = 1, max_size: int = 3, idle_ttl: int = 1800, enabled: bool = False):
+        """
+        Initialize the pool.
+
+        Args:
+            target_size: Warm workspaces to keep ready per (project, stack)
+            max_size: Hard cap per (project, stack)
+            idle_ttl: Seconds a warm workspace may sit unused before it is stopped
+            enabled: Whether claims and refills are active
+        """
+        self.target_size = max(0, target_size)
+        self.max_size = max(self.target_size, max_size)
+        self.idle_ttl = idle_ttl
+        self.enabled = enabled
+        self._refilling: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+        logger.info(
+            f"[POOL] Initialized (enabled={enabled}, target={self.target_size}, "
+            f"max={self.max_size}, idle_ttl={idle_ttl}s)"
+        )
+
+    @staticmethod
+    def _key(project_id: int, stack: str) -> str:
+        return f"{POOL_KEY_PREFIX}{project_id}:{stack or 'custom'}"
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get('created_at', 0) > self.idle_ttl
+
+    # ------------------------------------------------------------------
+    # Claiming
+    # ------------------------------------------------------------------
+
+    def claim(self, project, stack: str) -> Optional[Dict[str, Any]]:
+        """
+        Take a warm workspace for this project/stack, if one is ready.
+
+        Expired entries encountered on the way are stopped. A refill is
+        requested whenever something was taken (or found missing).
+
+        Returns:
+            Pool entry dict, or None if the pool is empty/disabled
+        """
+        if not self.enabled:
+            return None
+
+        from tasks.dispatch import get_redis_client
+
+        key = self._key(project.id, stack)
+        client = get_redis_client()
+        claimed = None
+
+        try:
+            while True:
+                raw = client.lpop(key)
+                if raw is None:
+                    break
+                entry = json.loads(raw)
+                if self._is_expired(entry):
+                    logger.info(f"[POOL] Discarding idle workspace {entry['workspace_id']} (older than {self.idle_ttl}s)")
+                    self._stop_workspace(entry['workspace_id'])
+                    continue
+                claimed = entry
+                break
+        except Exception as e:
+            logger.warning(f"[POOL] Claim failed for {key}: {e}")
+            return None
+
+        if claimed:
+            logger.info(f"[POOL] Claimed warm workspace {claimed['workspace_id']} for project {project.id} ({stack})")
+        else:
+            logger.info(f"[POOL] No warm workspace for project {project.id} ({stack}), cold start")
+
+        self.request_refill(project.id, stack)
+        return claimed
+
+    # ------------------------------------------------------------------
+    # Refilling
+    # ------------------------------------------------------------------
+
+    def request_refill(self, project_id: int, stack: str):
+        """Top the pool up to target_size in a background thread."""
+        if not self.enabled or self.target_size == 0:
+            return
+
+        key = self._key(project_id, stack)
+        with self._lock:
+            thread = self._refilling.get(key)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(
+                target=self._refill,
+                args=(project_id, stack),
+                name=f"lfg-ws-pool-{project_id}",
+                daemon=True,
+            )
+            self._refilling[key] = thread
+            thread.start()
+
+    def _refill(self, project_id: int, stack: str):
+        from tasks.dispatch import get_redis_client
+        from projects.models import Project
+
+        key = self._key(project_id, stack)
+        lock_key = f"{REFILL_LOCK_PREFIX}{project_id}:{stack or 'custom'}"
+        client = get_redis_client()
+
+        # One filler per pool across all processes
+        if not client.set(lock_key, "1", nx=True, ex=REFILL_LOCK_TTL):
+            logger.debug(f"[POOL] Refill already running for {key}")
+            return
+
+        try:
+            self.reap_idle(project_id, stack)
+            project = Project.objects.select_related('owner').get(id=project_id)
+
+            while client.llen(key) < self.target_size:
+                entry = self._warm_workspace(project, stack)
+                if entry is None:
+                    break
+                # Re-check the cap: a concurrent claim/refill may have changed it
+                if client.llen(key) >= self.max_size:
+                    logger.info(f"[POOL] {key} at max size, stopping surplus {entry['workspace_id']}")
+                    self._stop_workspace(entry['workspace_id'])
+                    break
+                client.rpush(key, json.dumps(entry))
+                logger.info(
+                    f"[POOL] Added {entry['workspace_id']} to {key} "
+                    f"(warmed in {entry['warm_seconds']:.1f}s, size={client.llen(key)})"
+                )
+        except Exception as e:
+            logger.error(f"[POOL] Refill failed for {key}: {e}", exc_info=True)
+        finally:
+            client.delete(lock_key)
+
+    def _warm_workspace(self, project, stack: str) -> Optional[Dict[str, Any]]:
+        """
+        Provision one workspace: fork from the owner's claude-auth base, run
+        the claude-auth setup steps, clone the repo on lfg-agent and install
+        dependencies.
+
+        Returns:
+            Pool entry, or None if the project cannot be pre-warmed
+        """
+        from codebase_index.models import IndexedRepository
+        from factory.mags import (
+            CLAUDE_AUTH_SETUP_STEPS,
+            MAGS_WORKING_DIR,
+            MagsAPIError,
+            get_latest_claude_auth_workspace_id,
+            run_command,
+            workspace_name_for_claude_auth,
+            _find_existing_workspace_job,
+        )
+        from factory.stack_configs import get_stack_config
+        from tasks.task_definitions import get_github_token
+
+        # Only repos that already exist can be pre-cloned; new repos still
+        # go through push_template_and_create_branch on the cold path.
+        indexed_repo = IndexedRepository.objects.filter(project=project).first()
+        github_token = get_github_token(project.owner)
+        if not indexed_repo or not github_token:
+            logger.info(f"[POOL] Project {project.id} has no linked repo/token, not pre-warming")
+            return None
+
+        stack_config = get_stack_config(stack, project)
+        project_dir = stack_config.get('project_dir', 'project')
+        install_cmd = stack_config.get('install_cmd', '')
+        owner, repo = indexed_repo.github_owner, indexed_repo.github_repo_name
+
+        base_ws = get_latest_claude_auth_workspace_id(project.owner_id) or workspace_name_for_claude_auth(project.owner_id)
+        pool_ws = workspace_name_for_pool(project.id)
+        started = time.monotonic()
+
+        try:
+            probe = run_command(
+                workspace_id=pool_ws,
+                command='echo "WORKSPACE_READY"',
+                timeout=180,
+                with_node_env=False,
+                base_workspace_id=base_ws,
+            )
+            if 'WORKSPACE_READY' not in probe.get('stdout', ''):
+                raise MagsAPIError(f"Workspace probe failed: exit={probe.get('exit_code')}")
+
+            # Same setup a cold ticket workspace gets from CLAUDE_AUTH_SETUP_SCRIPT
+            setup = run_command(
+                workspace_id=pool_ws,
+                command=f"set -eux\n{CLAUDE_AUTH_SETUP_STEPS}",
+                timeout=600,
+                with_node_env=False,
+            )
+            if 'CLAUDE_AUTH_SETUP_COMPLETE' not in setup.get('stdout', ''):
+                raise MagsAPIError(
+                    f"Claude setup failed: exit={setup.get('exit_code')}, stderr={setup.get('stderr', '')[:200]}"
+                )
+
+            warm_script = f"""
+            cd {MAGS_WORKING_DIR}
+            rm -rf {project_dir}
+            git clone https://{github_token}@github.com/{owner}/{repo}.git {project_dir}
+            cd {project_dir}
+            git checkout lfg-agent 2>/dev/null || git checkout -b lfg-agent origin/lfg-agent 2>/dev/null || git checkout main
+            {install_cmd or 'true'}
+            echo "POOL_WARM_COMPLETE"
+            """
+            warm = run_command(
+                workspace_id=pool_ws,
+                command=warm_script,
+                timeout=900,
+                project_id=str(project.project_id),
+            )
+            if 'POOL_WARM_COMPLETE' not in warm.get('stdout', ''):
+                raise MagsAPIError(
+                    f"Warm-up failed: exit={warm.get('exit_code')}, stderr={warm.get('stderr', '')[:200]}"
+                )
+
+            try:
+                job = _find_existing_workspace_job(pool_ws)
+                job_id = job.get("request_id") or job.get("id") or pool_ws
+            except MagsAPIError:
+                job_id = pool_ws
+
+        except Exception as e:
+            logger.warning(f"[POOL] Failed to warm {pool_ws}: {e}")
+            self._stop_workspace(pool_ws)
+            return None
+
+        return {
+            'workspace_id': pool_ws,
+            'job_id': job_id,
+            'base_workspace_id': base_ws,
+            'project_id': project.id,
+            'stack': stack,
+            'project_dir': project_dir,
+            'github_owner': owner,
+            'github_repo': repo,
+            'created_at': time.time(),
+            'warm_seconds': time.monotonic() - started,
+        }
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+
+    def reap_idle(self, project_id: int, stack: str) -> int:
+        """Stop warm workspaces that exceeded idle_ttl. Returns count removed."""
+        from tasks.dispatch import get_redis_client
+
+        key = self._key(project_id, stack)
+        client = get_redis_client()
+        removed = 0
+
+        for raw in client.lrange(key, 0, -1):
+            try:
+                entry = json.loads(raw)
+            except (TypeError, ValueError):
+                client.lrem(key, 1, raw)
+                continue
+            # LREM makes removal race-safe against a concurrent claim
+            if self._is_expired(entry) and client.lrem(key, 1, raw):
+                logger.info(f"[POOL] Evicting idle workspace {entry['workspace_id']}")
+                self._stop_workspace(entry['workspace_id'])
+                removed += 1
+
+        return removed
+
+    def reap_all(self) -> int:
+        """Evict idle workspaces from every (project, stack) pool. Returns count removed."""
+        from tasks.dispatch import get_redis_client
+
+        removed = 0
+        client = get_redis_client()
+        for key in client.scan_iter(match=f"{POOL_KEY_PREFIX}*"):
+            project_id, _, stack = key[len(POOL_KEY_PREFIX):].partition(':')
+            try:
+                removed += self.reap_idle(int(project_id), stack)
+            except Exception as e:
+                logger.warning(f"[POOL] Reaping {key} failed: {e}")
+
+        if removed:
+            logger.info(f"[POOL] Reaped {removed} idle workspace(s)")
+        return removed
+
+    def release(self, entry: Dict[str, Any]):
+        """Stop a claimed workspace that won't be used (e.g. cloned from the wrong repo)."""
+        logger.info(f"[POOL] Releasing workspace {entry['workspace_id']}")
+        self._stop_workspace(entry['workspace_id'])
+
+    def drain(self, project_id: int, stack: str) -> int:
+        """Stop and remove every warm workspace for a project/stack."""
+        from tasks.dispatch import get_redis_client
+
+        key = self._key(project_id, stack)
+        client = get_redis_client()
+        drained = 0
+
+        while True:
+            raw = client.lpop(key)
+            if raw is None:
+                break
+            try:
+                self._stop_workspace(json.loads(raw)['workspace_id'])
+            except (TypeError, ValueError, KeyError):
+                pass
+            drained += 1
+
+        logger.info(f"[POOL] Drained {drained} workspace(s) from {key}")
+        return drained
+
+    @staticmethod
+    def _stop_workspace(workspace_id: str):
+        try:
+            from factory.mags import _get_mags_client, _stop_workspace_job
+            _stop_workspace_job(_get_mags_client(), workspace_id)
+        except Exception as e:
+            logger.warning(f"[POOL] Failed to stop workspace {workspace_id}: {e}")
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool sizes per (project, stack)."""
+        from tasks.dispatch import get_redis_client
+
+        pools: List[Dict[str, Any]] = []
+        try:
+            client = get_redis_client()
+            for key in client.scan_iter(match=f"{POOL_KEY_PREFIX}*"):
+                project_id, _, stack = key[len(POOL_KEY_PREFIX):].partition(':')
+                pools.append({'project_id': project_id, 'stack': stack, 'size': client.llen(key)})
+        except Exception as e:
+            logger.warning(f"[POOL] Failed to collect stats: {e}")
+
+        return {
+            'enabled': self.enabled,
+            'target_size': self.target_size,
+            'max_size': self.max_size,
+            'idle_ttl': self.idle_ttl,
+            'pools': pools,
+        }
+
+
+# Global pool instance (singleton)
+_pool: Optional[WorkspacePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_workspace_pool() -> WorkspacePool:
+    """Get the process-wide workspace pool configured from settings.WORKSPACE_POOL."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = _pool_settings()
+                _pool = WorkspacePool(
+                    target_size=config.get('target_size', 1),
+                    max_size=config.get('max_size', 3),
+                    idle_ttl=config.get('idle_ttl', 1800),
+                    enabled=config.get('enabled', False),
+                )
+    return _pool